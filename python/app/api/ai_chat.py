@@ -1,15 +1,22 @@
 import json
-from fastapi import APIRouter, Depends, HTTPException, Body, WebSocket, WebSocketDisconnect
+import uuid
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
 from datetime import datetime
 import logging
-import asyncio
 
 # 核心依赖导入
 from app.database import get_db
 from app.models.user import User, UserRole
 from app.api.auth import get_current_user
 from app.services.ai_service import ai_service
+from app.services.context_cache import context_cache
+from app.services.conversation_memory import conversation_memory
+from app.services.intent_matcher import intent_matcher
+from app.services.llm_client import llm_client
+from app.services.response_cache import response_cache
+from app.services.websocket_manager import websocket_manager, CLOSE_POLICY_VIOLATION
 
 # 日志配置
 logging.basicConfig(level=logging.INFO)
@@ -19,27 +26,29 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-# 添加WebSocket连接管理器
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-
-
-manager = ConnectionManager()
+# 访客在对话中只能使用的关键词
+GUEST_KEYWORDS = ['灯', '开', '关', '你好', '状态']
 
 
 # 添加WebSocket路由
 @router.websocket("/ws/chat")
-async def websocket_chat_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+async def websocket_chat_endpoint(
+        websocket: WebSocket,
+        token: str = Query(...),
+        session_id: Optional[str] = Query(None, max_length=64, description="对话会话ID，缺省时每个连接使用独立的会话")
+):
+    """流式AI对话：握手和每条消息都用 token 验证用户，对话记忆按用户和会话隔离"""
+    try:
+        current_user = await get_current_user(token)
+    except HTTPException:
+        await websocket.close(code=CLOSE_POLICY_VIOLATION)
+        return
+
+    # 未指定会话的连接各用一个会话，不同客户端不会共享对话记忆
+    connection_session = session_id or f"ws-{uuid.uuid4().hex}"
+    conn = await websocket_manager.connect(websocket)
+    if conn is None:
+        return
     try:
         while True:
             # 接收前端发送的消息
@@ -47,73 +56,81 @@ async def websocket_chat_endpoint(websocket: WebSocket):
             message_data = json.loads(data)
 
             user_message = message_data.get("message", "")
-            history = message_data.get("history", [])
+            message_session = str(message_data.get("session_id") or connection_session)[:64]
 
             if not user_message:
                 continue
 
-            # 这里需要获取当前用户，但WebSocket中较难获取JWT token
-            # 简化处理：使用默认用户或者通过前端传递token
+            # 每条消息重新取用户（命中认证缓存），令牌过期、角色变更或用户被删除时立即生效
+            try:
+                current_user = await get_current_user(token)
+            except HTTPException:
+                await websocket.close(code=CLOSE_POLICY_VIOLATION)
+                break
+
+            if current_user.role == UserRole.GUEST and not any(k in user_message.lower() for k in GUEST_KEYWORDS):
+                websocket_manager.send(conn, {
+                    "error": "访客只能使用基础设备控制和问候功能",
+                    "event": "ERROR"
+                })
+                continue
+
+            # 获取数据库会话
+            db = next(get_db())
             try:
-                # 获取数据库会话
-                db = next(get_db())
-
-                # 简化处理：使用第一个用户（生产环境需要通过token验证）
-                current_user = db.query(User).first()
-                if not current_user:
-                    await websocket.send_text(json.dumps({
-                        "error": "未找到用户",
-                        "event": "ERROR"
-                    }))
-                    continue
-
-                # 调用AI服务处理消息
-                result = await ai_service.process_message(user_message, current_user, db)
+                sent = []
+
+                def on_token(text: str):
+                    # 大模型的增量输出到达即转发
+                    websocket_manager.send(conn, {
+                        "token": text,
+                        "index": len(sent)
+                    })
+                    sent.append(text)
+
+                # 调用AI服务处理消息（流式）
+                result = await ai_service.process_message(user_message, current_user, db, on_token=on_token,
+                                                          session_id=message_session)
                 reply = result.get("reply", "抱歉，我无法理解您的请求。")
+                if not sent:
+                    on_token(reply)
 
-                # 模拟流式返回 - 将回复分成小块发送
-                tokens = reply.split()
-                for i, token in enumerate(tokens):
-                    await websocket.send_text(json.dumps({
-                        "token": token + " ",
-                        "index": i
-                    }))
-                    await asyncio.sleep(0.05)  # 控制发送速度
-
-                # 发送完成信号
-                await websocket.send_text(json.dumps({
+                # 发送完成信号；执行动作后的最终回复可能与流式文字不同，以 reply 为准
+                websocket_manager.send(conn, {
                     "event": "DONE",
+                    "reply": reply,
                     "actions": result.get("actions", []),
-                    "suggestions": result.get("suggestions", [])
-                }))
-
-                db.close()
+                    "suggestions": result.get("suggestions", []),
+                    "timing": result.get("timing")
+                })
 
             except Exception as e:
                 logger.error(f"WebSocket处理消息时出错: {e}")
-                await websocket.send_text(json.dumps({
+                websocket_manager.send(conn, {
                     "error": f"处理消息时出错: {str(e)}",
                     "event": "ERROR"
-                }))
+                })
+            finally:
+                db.close()
 
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
         logger.info("WebSocket客户端断开连接")
     except Exception as e:
         logger.error(f"WebSocket异常: {e}")
-        manager.disconnect(websocket)
+    finally:
+        websocket_manager.disconnect(conn)
 
 
 @router.post("/chat")
 async def handle_chat(
         query: str = Body(..., embed=True),
+        session_id: str = Body("default", embed=True),
         current_user: User = Depends(get_current_user),
         db: Session = Depends(get_db)
 ):
     if current_user.role == UserRole.GUEST:
         # 访客只能使用基础对话功能
-        allowed_keywords = ['灯', '开', '关', '你好', '状态']
-        if not any(keyword in query.lower() for keyword in allowed_keywords):
+        if not any(keyword in query.lower() for keyword in GUEST_KEYWORDS):
             raise HTTPException(
                 status_code=403,
                 detail="访客只能使用基础设备控制和问候功能"
@@ -121,7 +138,7 @@ async def handle_chat(
 
     try:
         # 调用AI服务处理消息
-        result = await ai_service.process_message(query, current_user, db)
+        result = await ai_service.process_message(query, current_user, db, session_id=session_id)
 
         return {
             "reply": result.get("reply", "我理解了您的需求"),
@@ -247,21 +264,21 @@ async def get_smart_suggestions(
 @router.get("/conversation-history")
 async def get_conversation_history(
         limit: int = 10,
+        session_id: str = "default",
         current_user: User = Depends(get_current_user)
 ):
-    """获取对话历史"""
+    """获取当前用户某个会话的对话历史（最近的消息和较早对话的摘要）"""
     if current_user.role == UserRole.GUEST:
         raise HTTPException(status_code=403, detail="访客无法查看对话历史")
 
     try:
-        history = ai_service.conversation_history
-
-        # 只返回最近的对话记录
-        recent_history = history[-limit:] if len(history) > limit else history
+        history = await conversation_memory.history_async(current_user.id, session_id, limit)
 
         return {
-            "conversation_history": recent_history,
-            "total_messages": len(history),
+            "conversation_history": history["messages"],
+            "summary": history["summary"],
+            "total_messages": history["total_messages"],
+            "session_id": session_id,
             "user": current_user.username,
             "timestamp": datetime.now()
         }
@@ -275,15 +292,16 @@ async def get_conversation_history(
 
 
 @router.delete("/conversation-history")
-async def clear_conversation_history(
+def clear_conversation_history(
+        session_id: Optional[str] = None,
         current_user: User = Depends(get_current_user)
 ):
-    """清空对话历史"""
+    """清空当前用户的对话历史，不指定 session_id 时清空全部会话"""
     if current_user.role == UserRole.GUEST:
         raise HTTPException(status_code=403, detail="访客无法清空对话历史")
 
     try:
-        ai_service.conversation_history = []
+        conversation_memory.clear(current_user.id, session_id)
 
         return {
             "message": "对话历史已清空",
@@ -316,6 +334,12 @@ async def get_ai_status():
         "supported_languages": ["中文"],
         "voice_support": False,  # 语音功能可后续添加
         "conversation_memory": True,
+        "streaming": ai_service.get_stream_stats(),
+        "context_cache": context_cache.get_stats(),
+        "llm": llm_client.get_stats(),
+        "response_cache": response_cache.get_stats(),
+        "conversation_memory": conversation_memory.get_stats(),
+        "fast_path": intent_matcher.get_stats(),
         "status": "运行中",
         "timestamp": datetime.now()
     }
@@ -2,19 +2,20 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-from app.database import get_db
+from app.database import get_db, AsyncSessionLocal
 from app.models.user import User, UserRole
 from app.schemas.user import UserCreate, Token, UserResponse, GuestInvite
 from app.utils.security import verify_password, get_password_hash, create_access_token
 from jose import JWTError, jwt
 from app.config import settings
+from app.services.auth_service import auth_cache
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
 
 @router.post("/register", response_model=UserResponse)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+def register(user: UserCreate, db: Session = Depends(get_db)):
     """用户注册"""
     # 检查用户是否已存在
     db_user = db.query(User).filter(User.phone == user.phone).first()
@@ -59,31 +60,31 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
 
     access_token_expires = timedelta(days=7)
     access_token = create_access_token(
-        data={"sub": user.phone}, expires_delta=access_token_expires
+        data={"sub": str(user.id)}, expires_delta=access_token_expires
     )
 
     return {"access_token": access_token, "token_type": "bearer"}
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """获取当前用户"""
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    """获取当前用户（令牌和用户均命中缓存时不访问数据库）"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="认证失败",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        phone: str = payload.get("sub")
-        if phone is None:
-            raise credentials_exception
-    except JWTError:
+    user_id = auth_cache.verify_token(token)
+    if user_id is None:
         raise credentials_exception
 
-    user = db.query(User).filter(User.phone == phone).first()
+    user = auth_cache.get_user(user_id)
     if user is None:
-        raise credentials_exception
+        async with AsyncSessionLocal() as db:
+            user = await db.get(User, user_id)
+        if user is None:
+            raise credentials_exception
+        auth_cache.put_user(user)
     return user
 
 
@@ -94,7 +95,7 @@ async def read_users_me(current_user: User = Depends(get_current_user)):
 
 
 @router.post("/invite-guest")
-async def invite_guest(
+def invite_guest(
         guest_invite: GuestInvite,
         current_user: User = Depends(get_current_user),
         db: Session = Depends(get_db)
@@ -111,6 +112,7 @@ async def invite_guest(
         existing_user.house_id = current_user.house_id
         existing_user.guest_expire_time = datetime.now() + timedelta(hours=guest_invite.expire_hours)
         db.commit()
+        auth_cache.invalidate_user(existing_user.id)
         return {"message": "访客权限已更新", "phone": guest_invite.phone, "expire_hours": guest_invite.expire_hours}
     else:
         # 创建新的访客用户
@@ -129,7 +131,7 @@ async def invite_guest(
 
 
 @router.delete("/remove-guest/{phone}")
-async def remove_guest(
+def remove_guest(
         phone: str,
         current_user: User = Depends(get_current_user),
         db: Session = Depends(get_db)
@@ -149,5 +151,6 @@ async def remove_guest(
 
     db.delete(guest)
     db.commit()
+    auth_cache.invalidate_user(guest.id)
 
     return {"message": "访客已移除", "phone": phone}
\ No newline at end of file
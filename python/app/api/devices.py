@@ -1,9 +1,10 @@
 import random
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
 from typing import List
-from app.database import get_db
+from app.database import get_db, get_async_db, run_write
 from app.models.device import Device, Room
 from app.models.user import User, UserRole
 from app.schemas.device import (
@@ -11,6 +12,7 @@ from app.schemas.device import (
     RoomCreate, RoomResponse, DeviceUpdate
 )
 from app.api.auth import get_current_user
+from app.services.command_dispatcher import command_dispatcher, device_bits_for
 
 router = APIRouter()
 
@@ -21,13 +23,13 @@ async def get_devices(
     # room_id: int = None,
     # device_type: str = None,
     # current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取设备列表"""
-    query = db.query(Device, User.username, Room.name) \
+    query = select(Device, User.username, Room.name) \
         .join(User, Device.user_id == User.id) \
         .join(Room, Device.room_id == Room.id) \
-        .filter(User.username == username, Device.house_id == 1)
+        .where(User.username == username, Device.house_id == 1)
 
     # 访客只能看到灯光设备
     # if current_user.role == UserRole.GUEST:
@@ -49,7 +51,7 @@ async def get_devices(
                 "scene": device[2],
                 "online": device[0].is_online,
                 "desc": device[0].description,
-            } for device in query.all()
+            } for device in (await db.execute(query)).all()
         }
     }
     
@@ -57,7 +59,7 @@ async def get_devices(
 
 
 @router.post("/{username}", response_model=DeviceResponse)
-async def create_device(
+def create_device(
         username: str,
         device_in: DeviceCreate,
         db: Session = Depends(get_db)
@@ -134,7 +136,7 @@ async def create_device(
 
 
 @router.put("/{device_id}", response_model=DeviceResponse)
-async def update_device(
+def update_device(
         device_id: int,
         device_update: DeviceUpdate,
         current_user: User = Depends(get_current_user),
@@ -172,46 +174,43 @@ async def update_device(
 async def control_device(
         username: str,
         control: list[DeviceControl],
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """控制设备（集成MQTT）"""
-    module_control = [0,0,0,1,0,1,0,0]
-    device_control = [2,0,0,0,0,0,0,0,0,0]
+    module_bits, device_bits = {}, {}
+    updates = []
     for cmd in control:
-        device = db.query(Device).join(User, User.id == Device.user_id \
-        ).filter(
-            User.username == username,
-            Device.id == cmd.device_id,
-        ).first()
-        print(device.name)
+        device = (await db.execute(
+            select(Device).join(User, User.id == Device.user_id).where(
+                User.username == username,
+                Device.id == cmd.device_id,
+            )
+        )).scalars().first()
         if not device:
             raise HTTPException(status_code=404, detail="设备未找到")
-        # 更新数据库状态
-        device.status = cmd.status
-        device.is_online = True
-        if device.status["power"]:
-            if device.device_type == "air":
-                module_control[device.module] = 1
-                device_control[device.device] = 1
-            else:
-                module_control[device.module] = 1
-                device_control[device.device] = 1
-        else:
-            module_control[device.module] = 0
-            device_control[device.device] = 0
-        db.commit()
-    module_control[0] = 0
-    device_control[0] = 2
-
-    # 发送MQTT控制指令
-    from app.services.mqtt_service import mqtt_service
-    mqtt_service.publish_device_control(''.join(map(str, module_control)), ''.join(map(str, device_control)))
+        bits = device_bits_for(device, cmd.status.get("power"))
+        if bits:
+            module_bits.update(bits[0])
+            device_bits.update(bits[1])
+        updates.append((device.id, cmd.status))
+
+    # 更新数据库状态：一个写事务，在唯一的写连接上执行
+    def save(session):
+        for device_id, status in updates:
+            device = session.get(Device, device_id)
+            device.status = status
+            device.is_online = True
+
+    await run_write(save)
+
+    # 发送MQTT控制指令（同一开发板上并发到达的指令会合并为一组帧）
+    await command_dispatcher.send(module_bits, device_bits)
 
     return {}
 
 
 @router.delete("/{username}/{device_id}")
-async def delete_device(
+def delete_device(
         username: str,
         device_id: int,
         db: Session = Depends(get_db)
@@ -239,19 +238,20 @@ async def delete_device(
 @router.get("/rooms/", response_model=List[RoomResponse])
 async def get_rooms(
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """获取房间列表"""
     # 查询房间及其设备数量
-    rooms_query = db.query(
-        Room.id,
-        Room.name,
-        Room.house_id,
-        func.count(Device.id).label('device_count')
-    ).outerjoin(Device, Room.id == Device.room_id) \
-        .filter(Room.house_id == current_user.house_id) \
-        .group_by(Room.id, Room.name, Room.house_id) \
-        .all()
+    rooms_query = (await db.execute(
+        select(
+            Room.id,
+            Room.name,
+            Room.house_id,
+            func.count(Device.id).label('device_count')
+        ).outerjoin(Device, Room.id == Device.room_id)
+        .where(Room.house_id == current_user.house_id)
+        .group_by(Room.id, Room.name, Room.house_id)
+    )).all()
 
     rooms = []
     for room_data in rooms_query:
@@ -266,7 +266,7 @@ async def get_rooms(
 
 
 @router.post("/rooms/", response_model=RoomResponse)
-async def create_room(
+def create_room(
         room: RoomCreate,
         current_user: User = Depends(get_current_user),
         db: Session = Depends(get_db)
@@ -1,49 +1,122 @@
 import datetime
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+import json
+from typing import Optional
 
-from app.database import get_db
-from app.models.sensor_data import AlertLog
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.auth import get_current_user
+from app.config import settings
+from app.database import get_async_db, AsyncSessionLocal
+from app.models.user import User
+from app.services.alert_stream import alert_stream
+from app.services.websocket_manager import websocket_manager, CLOSE_POLICY_VIOLATION
 
 router = APIRouter()
-default = datetime.datetime(2025, 9, 4, 12)
-time = {
-    "fire": default,
-    "gas": default,
-    "temp": default,
-    "human": default,
-    "time": datetime.datetime.now(),
-}
-def get_log_info():
-    global time
-    return time
-
-def update_log(log):
-    global time
-    time = log
-    return
+
+
+async def read_alerts(db: AsyncSession, cursor: int, house_id: Optional[int] = None, limit: int = 100):
+    """游标之后的警报：优先读内存缓冲，缓冲无法覆盖时按索引查库"""
+    alerts = alert_stream.read_buffer(cursor, house_id, limit)
+    if alerts is None:
+        alerts = await db.run_sync(lambda session: alert_stream.read(session, cursor, house_id, limit))
+    return alerts
+
 
 @router.get("/")
 async def get_messages(
-    db: Session = Depends(get_db)
+        response: Response,
+        client_id: Optional[str] = Query(None, description="同一用户多个客户端各自的标识，缺省时共用一个读取位置"),
+        cursor: Optional[int] = Query(None, ge=0, description="从该警报ID之后读取，缺省时沿用该客户端上次的位置"),
+        limit: int = Query(100, ge=1, le=500, description="返回数量限制"),
+        current_user: User = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    轮询本家庭的新警报：每个用户（及其 client_id）有独立的读取位置和同类警报限流，
+    下一次读取的游标通过 X-Next-Cursor 响应头返回
+    """
+    state = alert_stream.client(f"{current_user.id}:{client_id or ''}")
+    start = cursor if cursor is not None else state.cursor
+
+    alerts = await read_alerts(db, start, current_user.house_id, limit=limit)
+    state.cursor = alerts[-1]["id"] if alerts else start
+    response.headers["X-Next-Cursor"] = str(state.cursor)
+
+    return alert_stream.throttle(state, alerts, datetime.datetime.now())
+
+
+@router.get("/stream")
+async def stream_messages(
+        request: Request,
+        token: str = Query(...),
+        cursor: Optional[int] = Query(None, ge=0, description="从该警报ID之后推送，也可用 Last-Event-ID 请求头")
 ):
-    log = get_log_info()
-    # print(log_time)
-    alerts = db.query(AlertLog).filter(AlertLog.created_at > log["time"]).all()
-    log["time"] = datetime.datetime.now()
-    messages = []
-    for message in alerts:
-        print(message.alert_type)
-        if (log["time"] - log[message.alert_type]).total_seconds() > 60:
-            messages.append(
-                {
-                    "id": message.id,
-                    "type": message.alert_type,
-                    "content": message.message,
-                    "time": log["time"]
-                }
-            )
-            log[message.alert_type] = log["time"]
-    update_log(log)
-    return messages
\ No newline at end of file
+    """Server-Sent Events 推送本家庭的警报，断线重连时从 Last-Event-ID 继续"""
+    user = await get_current_user(token)
+    last_event_id = request.headers.get("last-event-id")
+    if cursor is None and last_event_id and last_event_id.isdigit():
+        cursor = int(last_event_id)
+    if cursor is None:
+        cursor = alert_stream.last_id
+
+    async def events():
+        position = cursor
+        while True:
+            changed = alert_stream.current_event()
+            # 长连接期间不占用数据库会话，只在回退查库时短暂打开
+            async with AsyncSessionLocal() as db:
+                alerts = await read_alerts(db, position, user.house_id)
+            for alert in alerts:
+                position = alert["id"]
+                yield f"id: {position}\nevent: alert\ndata: {json.dumps(alert, ensure_ascii=False)}\n\n"
+            if alerts:
+                continue
+            if await request.is_disconnected():
+                break
+            if not await alert_stream.wait(settings.WEBSOCKET_HEARTBEAT_INTERVAL, changed):
+                yield ": keepalive\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.websocket("/ws")
+async def notifications_websocket(
+        websocket: WebSocket,
+        token: str = Query(...),
+        cursor: Optional[int] = Query(None, ge=0, description="重连时补发该警报ID之后的警报")
+):
+    """推送通道：日程提醒、警报等通知按用户和家庭推送到这里（客户端按消息 id 去重）"""
+    try:
+        user = await get_current_user(token)
+    except HTTPException:
+        await websocket.close(code=CLOSE_POLICY_VIOLATION)
+        return
+
+    conn = await websocket_manager.connect(websocket, user.id, user.house_id)
+    if conn is None:
+        return
+    try:
+        if cursor is not None:
+            async with AsyncSessionLocal() as db:
+                for alert in await read_alerts(db, cursor, user.house_id, limit=settings.WEBSOCKET_SEND_QUEUE_SIZE // 2):
+                    websocket_manager.send(conn, {"type": "alert", "alert": alert})
+        while True:
+            data = await websocket.receive_text()
+            try:
+                message = json.loads(data)
+            except ValueError:
+                continue
+            if isinstance(message, dict) and message.get("type") == "ping":
+                websocket_manager.send(conn, {"type": "pong", "timestamp": message.get("timestamp")})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        websocket_manager.disconnect(conn)
+
+
+@router.get("/ws/stats")
+async def notifications_stats():
+    """推送中心连接和发送统计"""
+    return {**websocket_manager.get_stats(), "alerts": alert_stream.get_stats()}
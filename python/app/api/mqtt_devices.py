@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any
-from app.database import get_db
+from app.database import get_db, run_write
 from app.models.user import User, UserRole
 from app.api.auth import get_current_user
 from app.services.mqtt_service import mqtt_service
+from app.services.command_dispatcher import command_dispatcher, device_bits_for
+from app.services.ingest_service import ingest_service
+from app.services.sensor_decoders import decoder_registry
 
 router = APIRouter()
 
@@ -64,13 +67,16 @@ async def control_device_mqtt(
     if current_user.role == UserRole.GUEST and device.device_type != "light":
         raise HTTPException(status_code=403, detail="访客只能控制灯光设备")
 
-    # 发送MQTT控制指令
-    success = mqtt_service.publish_device_control(device_id, command)
+    # 发送MQTT控制指令并等待发送确认
+    bits = device_bits_for(device, command.get("power"))
+    success = bits is not None and (await command_dispatcher.send(*bits))["success"]
 
     if success:
-        # 更新数据库状态（预期状态）
-        device.status = command
-        db.commit()
+        # 更新数据库状态（预期状态），写入在线程池中执行，不阻塞事件循环
+        def save(session: Session):
+            session.get(Device, device.id).status = command
+
+        await run_write(save)
 
         return {
             "message": "控制指令已发送",
@@ -99,10 +105,22 @@ async def get_mqtt_service_status(current_user: User = Depends(get_current_user)
         "service_running": mqtt_service.running,
         "online_devices_count": len(mqtt_service.online_devices),
         "broker_host": mqtt_service.client._host if hasattr(mqtt_service.client, '_host') else "unknown",
-        "retry_count": mqtt_service.connection_retry_count
+        "retry_count": mqtt_service.connection_retry_count,
+        "ingest": ingest_service.get_stats(),
+        "decoder": decoder_registry.stats,
+        "commands": command_dispatcher.get_stats()
     }
 
 
+@router.get("/ingest/stats")
+async def get_ingest_stats(current_user: User = Depends(get_current_user)):
+    """获取传感器数据写入管道统计（队列深度、丢弃/落盘数量、批量写入耗时）"""
+    if current_user.role == UserRole.GUEST:
+        raise HTTPException(status_code=403, detail="访客无法查看服务状态")
+
+    return ingest_service.get_stats()
+
+
 @router.post("/service/restart")
 async def restart_mqtt_service(current_user: User = Depends(get_current_user)):
     """重启MQTT服务"""
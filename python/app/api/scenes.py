@@ -1,13 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, desc, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, desc, func, select
 from typing import List, Optional
 from datetime import datetime, timedelta
-import asyncio
-import time
 
-from app.database import get_db
-from app.models.scene import Scene, SceneExecutionLog, Automation
+from app.database import get_db, get_async_db
+from app.models.scene import Scene, Automation
 from app.models.device import Device
 from app.models.user import User, UserRole
 from app.schemas.scene import (
@@ -15,6 +14,8 @@ from app.schemas.scene import (
     SceneExecutionResult, AutomationCreate, AutomationResponse
 )
 from app.api.auth import get_current_user
+from app.services.scene_service import SceneService
+from app.services.automation_engine import automation_engine
 
 router = APIRouter()
 
@@ -23,13 +24,15 @@ router = APIRouter()
 async def get_scenes(
         category: Optional[str] = Query(None, description="场景分类筛选"),
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """获取场景列表"""
     if current_user.role == UserRole.GUEST:
         raise HTTPException(status_code=403, detail="访客无法访问场景功能")
 
-    scenes = db.query(Scene).filter(Scene.house_id == current_user.house_id).all()
+    scenes = (await db.execute(
+        select(Scene).where(Scene.house_id == current_user.house_id)
+    )).scalars().all()
 
     # 为每个场景计算涉及的设备数量
     result = []
@@ -52,7 +55,7 @@ async def get_scenes(
 
 
 @router.post("/", response_model=SceneResponse)
-async def create_scene(
+def create_scene(
         scene: SceneCreate,
         current_user: User = Depends(get_current_user),
         db: Session = Depends(get_db)
@@ -111,119 +114,38 @@ async def create_scene(
     )
 
 
-# 在execute_scene函数中，找到执行场景的部分，更新为：
-
 @router.post("/{scene_id}/execute", response_model=SceneExecutionResult)
 async def execute_scene(
         scene_id: int,
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """执行场景（集成MQTT）"""
     if current_user.role == UserRole.GUEST:
         raise HTTPException(status_code=403, detail="访客无法执行场景")
 
-    scene = db.query(Scene).filter(
-        Scene.id == scene_id,
-        Scene.house_id == current_user.house_id
-    ).first()
+    scene = (await db.execute(
+        select(Scene).where(
+            Scene.id == scene_id,
+            Scene.house_id == current_user.house_id
+        )
+    )).scalars().first()
 
     if not scene:
         raise HTTPException(status_code=404, detail="场景未找到")
 
-    print(f"Executing scene: {scene.name}")
-    start_time = time.time()
-
-    # 发送场景执行MQTT消息
-    from app.services.mqtt_service import mqtt_service
-    mqtt_success = mqtt_service.publish_scene_execution(scene.name, scene.actions)
-
-    # 执行场景动作
-    executed_actions = []
-    failed_actions = []
-
-    for action_data in scene.actions:
-        try:
-            device_id = action_data.get("device_id")
-            action = action_data.get("action")
-            parameters = action_data.get("parameters", {})
-
-            device = db.query(Device).filter(Device.id == device_id).first()
-            if not device:
-                failed_actions.append({
-                    "device_id": device_id,
-                    "error": "设备不存在",
-                    "action": action
-                })
-                continue
-
-            # 更新数据库状态
-            old_status = device.status.copy() if device.status else {}
-            device.status = parameters
-            device.is_online = True
-            db.commit()
-
-            # 发送MQTT控制指令
-            mqtt_device_success = mqtt_service.publish_device_control(device.device_id, {
-                "action": action,
-                "parameters": parameters
-            })
-
-            print(f"Device: {device.name} -> {action}, MQTT: {mqtt_device_success}")
-
-            executed_actions.append({
-                "device_id": device_id,
-                "device_name": device.name,
-                "device_type": device.device_type,
-                "action": action,
-                "old_status": old_status,
-                "new_status": parameters,
-                "mqtt_sent": mqtt_device_success,
-                "timestamp": datetime.now().isoformat()
-            })
-
-            await asyncio.sleep(0.2)
-
-        except Exception as e:
-            failed_actions.append({
-                "device_id": action_data.get("device_id"),
-                "action": action_data.get("action"),
-                "error": str(e),
-                "timestamp": datetime.now().isoformat()
-            })
-
-    execution_time = time.time() - start_time
-    success = len(failed_actions) == 0
-
-    print(f"Scene completed: {scene.name}, Success: {success}, Time: {execution_time:.2f}s")
-
-    # 记录执行日志
-    execution_log = SceneExecutionLog(
-        scene_id=scene_id,
-        executed_by=current_user.id,
-        house_id=current_user.house_id,
-        execution_result={
-            "executed_actions": executed_actions,
-            "failed_actions": failed_actions,
-            "execution_time": execution_time,
-            "mqtt_scene_sent": mqtt_success
-        },
-        success=success,
-        error_message=None if success else f"{len(failed_actions)} actions failed"
-    )
-    db.add(execution_log)
-    db.commit()
-
+    report = await SceneService(db).execute_scene(scene, current_user)
     return SceneExecutionResult(
         scene_id=scene_id,
         scene_name=scene.name,
-        success=success,
-        executed_actions=executed_actions,
-        failed_actions=failed_actions,
-        execution_time=round(execution_time, 2),
-        total_devices=len(scene.actions),
-        success_count=len(executed_actions),
-        failed_count=len(failed_actions)
+        success=report["success"],
+        executed_actions=report["executed_actions"],
+        failed_actions=report["failed_actions"],
+        execution_time=round(report["execution_time"], 2),
+        total_devices=report["total_actions"],
+        success_count=report["success_count"],
+        failed_count=report["failed_count"],
+        max_latency_ms=report["max_latency_ms"]
     )
 
 
@@ -231,20 +153,29 @@ async def execute_scene(
 @router.get("/automations/", response_model=List[AutomationResponse])
 async def get_automations(
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """获取自动化规则列表"""
     if current_user.role == UserRole.GUEST:
         raise HTTPException(status_code=403, detail="访客无法访问自动化功能")
 
-    automations = db.query(Automation).filter(
-        Automation.house_id == current_user.house_id
-    ).all()
+    automations = (await db.execute(
+        select(Automation).where(Automation.house_id == current_user.house_id)
+    )).scalars().all()
     return automations
 
 
+@router.get("/automations/engine")
+async def get_automation_engine_stats(current_user: User = Depends(get_current_user)):
+    """获取自动化引擎统计（已编译规则数、事件数、规则计算次数、触发次数）"""
+    if current_user.role == UserRole.GUEST:
+        raise HTTPException(status_code=403, detail="访客无法访问自动化功能")
+
+    return automation_engine.get_stats()
+
+
 @router.post("/automations/", response_model=AutomationResponse)
-async def create_automation(
+def create_automation(
         automation: AutomationCreate,
         current_user: User = Depends(get_current_user),
         db: Session = Depends(get_db)
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, HTTPException, Query, Depends
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional, Dict, Any
 from datetime import datetime, date
 
-from app.database import get_db
+from app.database import get_db, get_async_db, run_write
 from app.services.schedule_service import ScheduleService
 from app.schemas.schedule import (
     ScheduleCreate, ScheduleUpdate, ScheduleResponse, ScheduleListQuery,
@@ -16,11 +17,10 @@ router = APIRouter()
 @router.get("/{schedule_id}", response_model=ScheduleResponse)
 async def get_schedule_by_id(
         schedule_id: int,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """获取单个日程详情"""
-    schedule_service = ScheduleService(db)
-    schedule = schedule_service.get_schedule_by_id(schedule_id)
+    schedule = await db.run_sync(lambda session: ScheduleService(session).get_schedule_by_id(schedule_id))
 
     if not schedule:
         raise HTTPException(status_code=404, detail="日程不存在")
@@ -29,7 +29,7 @@ async def get_schedule_by_id(
 
 
 @router.put("/{schedule_id}", response_model=ScheduleResponse)
-async def update_schedule(
+def update_schedule(
         schedule_id: int,
         schedule_data: ScheduleUpdate,
         db: Session = Depends(get_db)
@@ -45,7 +45,7 @@ async def update_schedule(
 
 
 @router.delete("/{schedule_id}")
-async def delete_schedule(
+def delete_schedule(
         schedule_id: int,
         db: Session = Depends(get_db)
 ):
@@ -62,11 +62,10 @@ async def delete_schedule(
 @router.patch("/{schedule_id}/complete", response_model=ScheduleResponse)
 async def toggle_schedule_complete(
         schedule_id: int,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """切换日程完成状态"""
-    schedule_service = ScheduleService(db)
-    updated_schedule = schedule_service.toggle_complete_status(schedule_id)
+    updated_schedule = await run_write(lambda session: ScheduleService(session).toggle_complete_status(schedule_id))
 
     if not updated_schedule:
         raise HTTPException(status_code=404, detail="日程不存在")
@@ -78,7 +77,7 @@ async def toggle_schedule_complete(
 async def get_calendar_data(
         year: int,
         month: int,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """获取月历视图数据"""
     if not (1 <= month <= 12):
@@ -88,15 +87,14 @@ async def get_calendar_data(
         raise HTTPException(status_code=400, detail="年份必须在2020-2030之间")
 
     try:
-        schedule_service = ScheduleService(db)
-        calendar_data = schedule_service.get_calendar_data(year, month)
+        calendar_data = await db.run_sync(lambda session: ScheduleService(session).get_calendar_data(year, month))
         return calendar_data
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"获取月历数据失败: {str(e)}")
 
 
 @router.post("/batch")
-async def batch_operations(
+def batch_operations(
         batch_data: BatchOperation,
         db: Session = Depends(get_db)
 ):
@@ -113,13 +111,15 @@ async def batch_operations(
             raise HTTPException(status_code=400, detail=result["message"])
 
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"批量操作失败: {str(e)}")
 
 
 @router.get("/today/summary")
 async def get_today_summary(
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """获取今日日程摘要"""
     try:
@@ -132,8 +132,7 @@ async def get_today_summary(
             size=50
         )
 
-        schedule_service = ScheduleService(db)
-        result = schedule_service.get_schedules_list(query)
+        result = await db.run_sync(lambda session: ScheduleService(session).get_schedules_list(query))
 
         schedules = result["schedules"]
 
@@ -154,7 +153,7 @@ async def get_today_summary(
 
 @router.get("/upcoming/week")
 async def get_upcoming_week(
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """获取未来一周的日程"""
     try:
@@ -171,14 +170,20 @@ async def get_upcoming_week(
             size=100
         )
 
-        schedule_service = ScheduleService(db)
-        result = schedule_service.get_schedules_list(query)
+        def load(session):
+            service = ScheduleService(session)
+            return service.get_schedules_list(query), service.get_recurring_occurrences(today, end_date)
+
+        result, occurrences = await db.run_sync(load)
+
+        # 合并一次性日程和重复日程实例
+        schedules = sorted(result["schedules"] + occurrences, key=lambda s: (s.date, s.time))
 
         return {
             "start_date": today.strftime("%Y-%m-%d"),
             "end_date": end_date.strftime("%Y-%m-%d"),
-            "schedules": result["schedules"],
-            "total_count": result["total"]
+            "schedules": schedules,
+            "total_count": result["total"] + len(occurrences)
         }
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"获取未来一周日程失败: {str(e)}")
@@ -186,63 +191,18 @@ async def get_upcoming_week(
 
 @router.get("/statistics/overview")
 async def get_statistics_overview(
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """获取日程统计概览"""
     try:
-        from datetime import timedelta
-
         today = datetime.now().date()
-        week_ago = today - timedelta(days=7)
-        month_ago = today - timedelta(days=30)
-
-        schedule_service = ScheduleService(db)
-
-        # 本周统计
-        week_query = ScheduleListQuery(
-            start_date=week_ago.strftime("%Y-%m-%d"),
-            end_date=today.strftime("%Y-%m-%d"),
-            page=1,
-            size=1000
-        )
-        week_result = schedule_service.get_schedules_list(week_query)
-        week_schedules = week_result["schedules"]
-
-        # 本月统计
-        month_query = ScheduleListQuery(
-            start_date=month_ago.strftime("%Y-%m-%d"),
-            end_date=today.strftime("%Y-%m-%d"),
-            page=1,
-            size=1000
-        )
-        month_result = schedule_service.get_schedules_list(month_query)
-        month_schedules = month_result["schedules"]
-
-        return {
-            "week_stats": {
-                "total": len(week_schedules),
-                "completed": sum(1 for s in week_schedules if s.completed),
-                "completion_rate": round(sum(1 for s in week_schedules if s.completed) / len(week_schedules) * 100,
-                                         1) if week_schedules else 0
-            },
-            "month_stats": {
-                "total": len(month_schedules),
-                "completed": sum(1 for s in month_schedules if s.completed),
-                "completion_rate": round(sum(1 for s in month_schedules if s.completed) / len(month_schedules) * 100,
-                                         1) if month_schedules else 0
-            },
-            "priority_distribution": {
-                "high": sum(1 for s in month_schedules if s.priority.value == "high"),
-                "medium": sum(1 for s in month_schedules if s.priority.value == "medium"),
-                "low": sum(1 for s in month_schedules if s.priority.value == "low")
-            }
-        }
+        return await db.run_sync(lambda session: ScheduleService(session).get_statistics_overview(today))
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"获取统计数据失败: {str(e)}")
 
 
 @router.post("/", response_model=ScheduleResponse)
-async def create_schedule(
+def create_schedule(
         schedule_data: ScheduleCreate,
         db: Session = Depends(get_db)
 ):
@@ -263,9 +223,10 @@ async def get_schedules(
         priority: Optional[str] = Query(None, description="优先级筛选"),
         page: int = Query(1, ge=1, description="页码"),
         size: int = Query(50, ge=1, le=200, description="每页大小"),
-        db: Session = Depends(get_db)
+        cursor: Optional[str] = Query(None, description="键集分页游标，传空字符串取第一页"),
+        db: AsyncSession = Depends(get_async_db)
 ):
-    """获取日程列表"""
+    """获取日程列表（指定 cursor 时按键集分页，不返回总数）"""
     try:
         query = ScheduleListQuery(
             start_date=start_date,
@@ -273,11 +234,21 @@ async def get_schedules(
             completed=completed,
             priority=priority,
             page=page,
-            size=size
+            size=size,
+            cursor=cursor
         )
 
-        schedule_service = ScheduleService(db)
-        result = schedule_service.get_schedules_list(query)
+        result = await db.run_sync(lambda session: ScheduleService(session).get_schedules_list(query))
+
+        if cursor is not None:
+            return {
+                "schedules": result["schedules"],
+                "pagination": {
+                    "size": result["size"],
+                    "has_more": result["has_more"],
+                    "next_cursor": result["next_cursor"]
+                }
+            }
 
         return {
             "schedules": result["schedules"],
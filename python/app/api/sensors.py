@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, and_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import desc, and_, func, select
 from datetime import datetime, timedelta
 from typing import List
-from app.database import get_db
+from app.database import get_db, get_async_db
 from app.models.sensor_data import SensorData, AlertLog
 from app.models.user import User, UserRole
 from app.schemas.sensor import (
@@ -11,6 +12,12 @@ from app.schemas.sensor import (
     SensorDataCreate, AlertResponse, AlertCreate
 )
 from app.api.auth import get_current_user
+from app.services.retention_service import retention_service
+from app.services.rollup_service import rollup_service, ROLLUP_METRICS
+from app.services.sensor_cache import latest_cache
+from app.services.automation_engine import automation_engine
+from app.services.context_cache import context_cache
+from app.services.alert_stream import alert_stream, alert_message
 
 router = APIRouter()
 
@@ -19,13 +26,14 @@ router = APIRouter()
 async def get_latest_sensor_data(
     type: str,
     range: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """获取最新环境数据摘要"""
-    time_format = {
-        "3hours": '%Y-%m-%d %H:%M:00',
-        "day": '%Y-%m-%d %H:00:00',
-        "15days": '%Y-%m-%d'
+    """获取环境数据趋势（读取时间桶汇总表）"""
+    # 时间范围 -> (汇总粒度, 时间桶数量)
+    trend_ranges = {
+        "3hours": ("minute", 180),
+        "day": ("hour", 24),
+        "15days": ("day", 15)
     }
     num_data = {
         "3hours": 18,
@@ -33,29 +41,12 @@ async def get_latest_sensor_data(
         "15days": 15
     }
 
-    if type == "temperature":
-        query = db.query(
-            func.strftime(time_format[range], SensorData.timestamp).label('time'),
-            func.avg(SensorData.temperature).label('avg')
-        ).filter(
-            SensorData.temperature != None, SensorData.timestamp >= (datetime.now() - timedelta(hours=3))
-        ).group_by(
-            func.strftime(time_format[range], SensorData.timestamp)
-        ).order_by(
-            desc('time')
-        )
-    elif type == "humidity":
-        query = db.query(
-            func.strftime(time_format[range], SensorData.timestamp).label('time'),
-            func.avg(SensorData.humidity).label('avg')
-        ).filter(
-            SensorData.humidity != None, SensorData.timestamp >= (datetime.now() - timedelta(hours=3))
-        ).group_by(
-            func.strftime(time_format[range], SensorData.timestamp)
-        ).order_by(
-            desc('time')
-        )
-    data = [data.avg for data in query.all()]
+    if type not in ROLLUP_METRICS or range not in trend_ranges:
+        raise HTTPException(status_code=400, detail="不支持的数据类型或时间范围")
+
+    granularity, buckets = trend_ranges[range]
+    rows = await db.run_sync(lambda session: rollup_service.trend(session, type, granularity, buckets))
+    data = [row.avg for row in rows]
     if not data:
         data = [0]
     while (len(data) < num_data[range]):
@@ -67,19 +58,17 @@ async def get_latest_sensor_data(
 
 
 @router.get("/latest", response_model=SensorDataResponse)
-async def get_sensor_history(
-        db: Session = Depends(get_db)
-):
-    """获取历史传感器数据"""
+async def get_sensor_history():
+    """获取最新传感器数据（由内存缓存提供）"""
     data = {
-        "temp": db.query(SensorData.temperature).filter(SensorData.temperature > 0).order_by(desc(SensorData.timestamp)).limit(1).first(),
-        "humidity": db.query(SensorData.humidity).filter(SensorData.humidity != None).order_by(desc(SensorData.timestamp)).limit(1).first(),
-        "gasConcentration": db.query(SensorData.gas_level).filter(SensorData.gas_level > 0).order_by(desc(SensorData.timestamp)).limit(1).first(),
-        "flameLevel": db.query(SensorData.flame_detected).filter(SensorData.flame_detected != None).order_by(desc(SensorData.timestamp)).limit(1).first(),
+        "temp": latest_cache.house_positive_value(1, "temperature"),
+        "humidity": latest_cache.house_value(1, "humidity"),
+        "gasConcentration": latest_cache.house_positive_value(1, "gas_level"),
+        "flameLevel": latest_cache.house_value(1, "flame_detected"),
     }
     for k, v in data.items():
-        if v:
-            data[k] = round(v[0], 2)
+        if v is not None:
+            data[k] = round(v, 2)
         else:
             data[k] = 0
     data["tempStatus"] = "normal"
@@ -89,7 +78,7 @@ async def get_sensor_history(
 
 
 @router.post("/data")
-async def receive_sensor_data(
+def receive_sensor_data(
         data: SensorDataCreate,
         db: Session = Depends(get_db)
 ):
@@ -103,15 +92,21 @@ async def receive_sensor_data(
         gas_level=data.gas_level,
         flame_detected=data.flame_detected,
         soil_moisture=data.soil_moisture,
-        data_json=data.data_json
+        data_json=data.data_json,
+        timestamp=datetime.now()
     )
 
     db.add(sensor_data)
+    db.flush()
+    rollup_service.apply(db, [sensor_data])
     db.commit()
     db.refresh(sensor_data)
+    latest_cache.update(sensor_data)
+    context_cache.on_readings([sensor_data])
+    automation_engine.on_readings([sensor_data])
 
     # 检查是否需要触发警报
-    alerts = await check_and_create_alerts(sensor_data, db)
+    alerts = check_and_create_alerts(sensor_data, db)
 
     response = {"message": "数据接收成功", "sensor_data_id": sensor_data.id}
     if alerts:
@@ -120,9 +115,11 @@ async def receive_sensor_data(
     return response
 
 
-async def check_and_create_alerts(sensor_data: SensorData, db: Session):
-    """检查传感器数据并创建警报"""
+def check_and_create_alerts(sensor_data: SensorData, db: Session):
+    """检查传感器数据并创建警报，提交后推送给订阅的客户端"""
     alerts = []
+    records = []
+    now = datetime.now()
 
     # 火焰检测
     if sensor_data.flame_detected:
@@ -131,9 +128,11 @@ async def check_and_create_alerts(sensor_data: SensorData, db: Session):
             device_id=sensor_data.device_id,
             alert_type="fire",
             message="检测到火焰，请立即查看！",
-            severity="high"
+            severity="high",
+            created_at=now
         )
         db.add(alert)
+        records.append(alert)
         alerts.append("🔥 检测到火焰")
 
     # 可燃气体检测
@@ -143,9 +142,11 @@ async def check_and_create_alerts(sensor_data: SensorData, db: Session):
             device_id=sensor_data.device_id,
             alert_type="gas",
             message=f"可燃气体浓度过高({sensor_data.gas_level}%)，请注意安全！",
-            severity="high"
+            severity="high",
+            created_at=now
         )
         db.add(alert)
+        records.append(alert)
         alerts.append(f"⚠️ 可燃气体浓度: {sensor_data.gas_level}%")
 
     # 温度异常
@@ -155,9 +156,11 @@ async def check_and_create_alerts(sensor_data: SensorData, db: Session):
             device_id=sensor_data.device_id,
             alert_type="temperature",
             message=f"室内温度过高({sensor_data.temperature}°C)，建议开启空调",
-            severity="medium"
+            severity="medium",
+            created_at=now
         )
         db.add(alert)
+        records.append(alert)
         alerts.append(f"🌡️ 高温警报: {sensor_data.temperature}°C")
 
     # 土壤湿度过低（植物养护）
@@ -167,41 +170,59 @@ async def check_and_create_alerts(sensor_data: SensorData, db: Session):
             device_id=sensor_data.device_id,
             alert_type="soil",
             message=f"土壤湿度过低({sensor_data.soil_moisture}%)，需要浇水",
-            severity="low"
+            severity="low",
+            created_at=now
         )
         db.add(alert)
+        records.append(alert)
         alerts.append(f"🌱 需要浇水: {sensor_data.soil_moisture}%")
 
     if alerts:
+        db.flush()
+        # 提交后对象会过期，先取出推送内容
+        messages = [
+            alert_message(r.id, r.house_id, r.device_id, r.alert_type, r.message, r.severity, r.created_at)
+            for r in records
+        ]
+        alert_stream.publish_on_commit(db, messages)
         db.commit()
         print(f"⚠️ 生成 {len(alerts)} 个警报")
 
     return alerts
 
 
+@router.get("/retention")
+async def get_retention_status(current_user: User = Depends(get_current_user)):
+    """获取传感器数据保留任务的策略与清理进度"""
+    if current_user.role == UserRole.GUEST:
+        raise HTTPException(status_code=403, detail="访客无法查看服务状态")
+
+    return retention_service.get_stats()
+
+
 @router.get("/alerts", response_model=List[AlertResponse])
 async def get_alerts(
         resolved: bool = Query(None, description="是否已解决"),
         limit: int = Query(50, description="返回数量限制", le=200),
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """获取警报列表"""
     if current_user.role == UserRole.GUEST:
         raise HTTPException(status_code=403, detail="访客无法查看警报")
 
-    query = db.query(AlertLog).filter(AlertLog.house_id == current_user.house_id)
+    query = select(AlertLog).where(AlertLog.house_id == current_user.house_id)
 
     if resolved is not None:
-        query = query.filter(AlertLog.is_resolved == resolved)
+        query = query.where(AlertLog.is_resolved == resolved)
 
-    alerts = query.order_by(desc(AlertLog.created_at)).limit(limit).all()
+    alerts = (await db.execute(query.order_by(desc(AlertLog.created_at)).limit(limit))).scalars().all()
 
     return alerts
 
 
 @router.put("/alerts/{alert_id}/resolve")
-async def resolve_alert(
+def resolve_alert(
         alert_id: int,
         current_user: User = Depends(get_current_user),
         db: Session = Depends(get_db)
@@ -5,17 +5,53 @@ load_dotenv()  # 加载项目根目录下的 .env 文件
 class Settings:
     # 数据库配置
     DATABASE_URL = os.getenv("DATABASE_URL")
+    DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL")  # WAL 模式下读写互不阻塞
+    DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")  # WAL 下 NORMAL 已能保证数据库一致性
+    DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", 256 * 1024 * 1024))  # 内存映射大小（字节）
+    DB_CACHE_SIZE = int(os.getenv("DB_CACHE_SIZE", -64000))  # 页缓存，负数表示KiB
+    DB_BUSY_TIMEOUT = int(os.getenv("DB_BUSY_TIMEOUT", 5000))  # 遇到锁时的等待时间（毫秒）
+    DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", 8))  # 读连接池大小
+    DB_READ_POOL_OVERFLOW = int(os.getenv("DB_READ_POOL_OVERFLOW", 8))  # 读连接池临时扩容数
+    DB_WRITE_TIMEOUT = float(os.getenv("DB_WRITE_TIMEOUT", 30))  # 等待写连接的超时时间（秒）
 
     # 安全配置
     SECRET_KEY = os.getenv("SECRET_KEY")
     ALGORITHM = os.getenv("ALGORITHM")
     ACCESS_TOKEN_EXPIRE_MINUTES = eval(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
+    AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", 10000))  # 已验证令牌缓存条数
+    AUTH_USER_CACHE_TTL = int(os.getenv("AUTH_USER_CACHE_TTL", 300))  # 用户对象缓存时间（秒）
 
     # MQTT配置
     MQTT_BROKER_HOST = os.getenv("MQTT_BROKER_HOST") # MQTT地址
     MQTT_BROKER_PORT = int(os.getenv("MQTT_BROKER_PORT"))
     MQTT_USERNAME = os.getenv("MQTT_USERNAME")
     MQTT_PASSWORD = os.getenv("MQTT_PASSWORD")
+    MQTT_COMMAND_TOPIC = os.getenv("MQTT_COMMAND_TOPIC", "hi3861/subscribe")  # 开发板控制指令主题
+    MQTT_FRAME_INTERVAL = float(os.getenv("MQTT_FRAME_INTERVAL", 1.0))  # 模块帧与设备帧之间的间隔（秒）
+    MQTT_COMMAND_QOS = int(os.getenv("MQTT_COMMAND_QOS", 0))
+    MQTT_ACK_TIMEOUT = float(os.getenv("MQTT_ACK_TIMEOUT", 5.0))  # 等待发送确认的超时（秒）
+    SCENE_ACTION_TIMEOUT = float(os.getenv("SCENE_ACTION_TIMEOUT", 5.0))  # 场景中单个动作的指令确认超时（秒）
+
+    # 日程提醒配置
+    REMINDER_HORIZON_HOURS = int(os.getenv("REMINDER_HORIZON_HOURS", 24))  # 提醒队列预载入的时间窗口（小时）
+    REMINDER_RETRY_SECONDS = float(os.getenv("REMINDER_RETRY_SECONDS", 60))  # 用户离线时提醒重新投递的间隔（秒）
+    RECURRENCE_WINDOW_DAYS = int(os.getenv("RECURRENCE_WINDOW_DAYS", 62))  # 重复日程每次展开的最小窗口（天）
+
+    # 传感器数据写入配置
+    INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 10000))  # 内存队列上限（条）
+    INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 200))  # 单次批量写入条数
+    INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", 1.0))  # 最长刷新间隔（秒）
+    INGEST_OVERFLOW_POLICY = os.getenv("INGEST_OVERFLOW_POLICY", "drop_oldest")  # 队列满时: drop_oldest / spill
+    INGEST_SPILL_PATH = os.getenv("INGEST_SPILL_PATH", "./data/ingest_spill.jsonl")  # 溢出落盘文件
+
+    # 传感器数据保留策略（天数为0表示永久保留）
+    RETENTION_RAW_DAYS = int(os.getenv("RETENTION_RAW_DAYS", 7))  # 原始数据
+    RETENTION_MINUTE_ROLLUP_DAYS = int(os.getenv("RETENTION_MINUTE_ROLLUP_DAYS", 90))  # 分钟汇总
+    RETENTION_HOUR_ROLLUP_DAYS = int(os.getenv("RETENTION_HOUR_ROLLUP_DAYS", 0))  # 小时汇总
+    RETENTION_DAY_ROLLUP_DAYS = int(os.getenv("RETENTION_DAY_ROLLUP_DAYS", 0))  # 天汇总
+    RETENTION_CHUNK_SIZE = int(os.getenv("RETENTION_CHUNK_SIZE", 2000))  # 每个事务删除的行数
+    RETENTION_CHUNK_PAUSE = float(os.getenv("RETENTION_CHUNK_PAUSE", 0.05))  # 两次删除之间让出写锁（秒）
+    RETENTION_INTERVAL = int(os.getenv("RETENTION_INTERVAL", 3600))  # 清理任务执行间隔（秒）
 
     # 应用配置
     DEBUG = os.getenv("DEBUG")
@@ -28,12 +64,32 @@ class Settings:
     DESCRIPTION = os.getenv("DESCRIPTION")
 
     # AI服务配置
-    AI_MODEL = "qwen-plus"
-    AI_TIMEOUT = 30
+    AI_MODEL = os.getenv("AI_MODEL", "qwen-turbo")
+    AI_TIMEOUT = float(os.getenv("AI_TIMEOUT", 30))  # 单次调用超时（秒）
+    AI_STREAM_TIMEOUT = float(os.getenv("AI_STREAM_TIMEOUT", 120))  # 一次流式调用的总时长上限（秒）
+    AI_BASE_URL = os.getenv("AI_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")  # 可指向本地桩服务
+    AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", 4))  # 同时进行的大模型调用上限
+    AI_BREAKER_FAILURES = int(os.getenv("AI_BREAKER_FAILURES", 5))  # 连续失败多少次后熔断
+    AI_BREAKER_COOLDOWN = float(os.getenv("AI_BREAKER_COOLDOWN", 30))  # 熔断后多久放行试探请求（秒）
     DASHSCOPE_API_KEY = os.getenv("DASHSCOPE_API_KEY")
+    AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL", 600))  # 缓存的指令动作有效期（秒）
+    AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", 500))  # 指令缓存条目上限
+    AI_CACHE_SIMILARITY = float(os.getenv("AI_CACHE_SIMILARITY", 0.75))  # 相近指令的最低相似度
+    AI_FAST_PATH = os.getenv("AI_FAST_PATH", "true").lower() == "true"  # 无歧义的简单指令本地识别，不调用大模型
+    AI_MEMORY_TOKEN_BUDGET = int(os.getenv("AI_MEMORY_TOKEN_BUDGET", 1200))  # 每个会话近期消息的 token 预算
+    AI_MEMORY_SUMMARY_TOKENS = int(os.getenv("AI_MEMORY_SUMMARY_TOKENS", 300))  # 较早对话摘要的 token 上限
+    AI_MEMORY_MAX_MESSAGES = int(os.getenv("AI_MEMORY_MAX_MESSAGES", 40))  # 每个会话保留的近期消息条数上限
+    AI_MEMORY_MAX_SESSIONS = int(os.getenv("AI_MEMORY_MAX_SESSIONS", 1000))  # 内存中保留的会话数上限
 
     # WebSocket配置
-    WEBSOCKET_HEARTBEAT_INTERVAL = 30  # 心跳间隔（秒）
-    MAX_WEBSOCKET_CONNECTIONS = 100  # 最大连接数
+    WEBSOCKET_HEARTBEAT_INTERVAL = float(os.getenv("WEBSOCKET_HEARTBEAT_INTERVAL", 30))  # 心跳间隔（秒）
+    MAX_WEBSOCKET_CONNECTIONS = int(os.getenv("MAX_WEBSOCKET_CONNECTIONS", 100))  # 最大连接数
+    WEBSOCKET_SEND_QUEUE_SIZE = int(os.getenv("WEBSOCKET_SEND_QUEUE_SIZE", 100))  # 每个连接待发送消息上限
+    WEBSOCKET_SEND_TIMEOUT = float(os.getenv("WEBSOCKET_SEND_TIMEOUT", 5.0))  # 单条消息发送超时（秒）
+
+    # 警报推送配置
+    ALERT_BUFFER_SIZE = int(os.getenv("ALERT_BUFFER_SIZE", 1000))  # 内存中保留的最近警报条数
+    ALERT_THROTTLE_SECONDS = int(os.getenv("ALERT_THROTTLE_SECONDS", 60))  # 轮询时同类警报的最小间隔（秒）
+    ALERT_MAX_CLIENTS = int(os.getenv("ALERT_MAX_CLIENTS", 1000))  # 记录读取位置的轮询客户端上限
 
 settings = Settings()
\ No newline at end of file
@@ -1,18 +1,130 @@
-from sqlalchemy import create_engine
+import asyncio
+import re
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
 from app.config import settings
 import os
 
 # 确保data目录存在
 os.makedirs("./python/data", exist_ok=True)
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False}
+
+def _create_engine(**pool_options):
+    return create_engine(
+        settings.DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        **pool_options
+    )
+
+
+def _create_async_engine(**pool_options):
+    # 同一个数据库文件，驱动换成 aiosqlite
+    url = make_url(settings.DATABASE_URL).set(drivername="sqlite+aiosqlite")
+    return create_async_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        **pool_options
+    )
+
+
+# 读连接池：接口查询、看板读取等并发读
+engine = _create_engine(
+    pool_size=settings.DB_READ_POOL_SIZE,
+    max_overflow=settings.DB_READ_POOL_OVERFLOW
+)
+
+# 写连接：只有一个连接，所有写事务在此串行执行，避免多个写者争抢数据库锁
+write_engine = _create_engine(
+    pool_size=1,
+    max_overflow=0,
+    pool_timeout=settings.DB_WRITE_TIMEOUT
+)
+
+
+def _apply_pragmas(dbapi_connection, connection_record):
+    """新建连接时设置 SQLite 运行参数"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.DB_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.DB_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size={settings.DB_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size={settings.DB_CACHE_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={settings.DB_BUSY_TIMEOUT}")
+    cursor.close()
+
+
+# 异步引擎（供 async 接口读取使用），只有读连接池；写入经 run_write 交给上面唯一的写连接
+async_engine = _create_async_engine(
+    pool_size=settings.DB_READ_POOL_SIZE,
+    max_overflow=settings.DB_READ_POOL_OVERFLOW
+)
+
+
+if engine.dialect.name == "sqlite":
+    for _engine in (engine, write_engine, async_engine.sync_engine):
+        event.listen(_engine, "connect", _apply_pragmas)
+
+
+# text() 语句中的写操作（包括 WITH ... 开头的 CTE 写入）
+_TEXT_DML = re.compile(
+    r"^\s*(with\b.*\b)?(insert|update|delete|replace|create|alter|drop)\b",
+    re.IGNORECASE | re.DOTALL
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _is_write(clause) -> bool:
+    if isinstance(clause, UpdateBase):
+        return True
+    return isinstance(clause, TextClause) and _TEXT_DML.match(clause.text) is not None
+
+
+class RoutingSession(Session):
+    """
+    读写分离的会话：查询走读连接池，flush、INSERT/UPDATE/DELETE 以及写操作的 text() 语句走写连接。
+    事务中一旦发生写入，后续语句都留在写连接上，保证能读到本事务尚未提交的数据。
+    写连接只有一个，事件循环中不要直接用会话写入，应改用 run_write 或同步接口（在线程池中执行）。
+    """
+    read_bind = engine
+    write_bind = write_engine
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.info.get("writing") or self._flushing or _is_write(clause):
+            self.info["writing"] = True
+            return self.write_bind
+        return self.read_bind
+
+
+class AsyncRoutingSession(RoutingSession):
+    """
+    AsyncSession 内部使用的同步会话，只读，查询走异步读连接池。
+    写入须用 run_write，与同步会话共用唯一的写连接，避免出现第二个写者
+    """
+    read_bind = async_engine.sync_engine
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or _is_write(clause):
+            raise RuntimeError("异步会话只读，写入请使用 run_write")
+        return self.read_bind
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _reset_routing(session, transaction):
+    # 最外层事务结束（提交或回滚）后恢复为读连接
+    if transaction.parent is None:
+        session.info.pop("writing", None)
+
+
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False)
+# run_write 使用的会话：提交后不过期对象，返回给事件循环的对象不会再触发查询
+WriteSessionLocal = sessionmaker(class_=RoutingSession, autoflush=False, expire_on_commit=False)
+# 提交后不过期对象，避免在异步接口中访问属性时触发隐式IO
+AsyncSessionLocal = async_sessionmaker(
+    class_=AsyncSession, sync_session_class=AsyncRoutingSession,
+    autoflush=False, expire_on_commit=False
+)
 Base = declarative_base()
 
 def get_db():
@@ -22,7 +134,28 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def _write(fn):
+    with WriteSessionLocal() as session:
+        session.info["writing"] = True
+        result = fn(session)
+        session.commit()
+        return result
+
+async def run_write(fn):
+    """
+    在线程池中用写连接执行 fn(session) 并提交，返回 fn 的返回值。
+    等待写连接和执行写事务都不占用事件循环，async 接口中的写入都通过这里完成。
+    """
+    return await asyncio.to_thread(_write, fn)
+
 def init_db():
-    """初始化数据库表"""
-    Base.metadata.create_all(bind=engine)
-    print("INFO:\t ✅ 数据库表创建完成")
\ No newline at end of file
+    """初始化数据库表并执行未应用的迁移"""
+    from app.migrations import run_migrations
+
+    Base.metadata.create_all(bind=write_engine)
+    print("INFO:\t ✅ 数据库表创建完成")
+    run_migrations(write_engine)
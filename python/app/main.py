@@ -12,8 +12,18 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from app.api import auth, devices, sensors, scenes, mqtt_devices, ai_chat, messages, schedules
 from app.config import settings
-from app.database import init_db
+from app.database import init_db, SessionLocal
 from app.services.mqtt_service import mqtt_service
+from app.services.command_dispatcher import command_dispatcher
+from app.services.ingest_service import ingest_service
+from app.services.retention_service import retention_service
+from app.services.sensor_cache import latest_cache
+from app.services.automation_engine import automation_engine
+from app.services.timer_scheduler import timer_scheduler
+from app.services.schedule_tasks import schedule_task_manager
+from app.services.websocket_manager import websocket_manager
+from app.services.alert_stream import alert_stream
+from app.services.llm_client import llm_client
 
 # 应用启动和关闭事件
 @asynccontextmanager
@@ -21,9 +31,24 @@ async def lifespan(app: FastAPI):
     """应用启动事件"""
     # 初始化数据库
     init_db()
+    db = SessionLocal()
+    try:
+        latest_cache.load(db)
+        automation_engine.load(db)
+        alert_stream.load(db)
+    finally:
+        db.close()
     print("🚀 Starting Hongmeng Smart Home API")
     print("📡 Starting MQTT service...")
+    alert_stream.start()
+    ingest_service.start()
     mqtt_service.start()
+    command_dispatcher.start()
+    automation_engine.start()
+    timer_scheduler.start()
+    websocket_manager.start()
+    await schedule_task_manager.start_background_tasks()
+    retention_service.start()
     print("🤖 AI Assistant service initialized")
     print(f"📚 API docs: http://{settings.HOST}:{settings.PORT}/docs")
     print(f"🔗 WebSocket endpoint: ws://{settings.HOST}:{settings.PORT}/ws/chat")
@@ -39,7 +64,16 @@ async def lifespan(app: FastAPI):
     yield
     """应用关闭事件"""
     print("🛑 Stopping Hongmeng Smart Home API")
+    retention_service.stop()
+    await schedule_task_manager.stop_background_tasks()
+    await websocket_manager.stop()
+    await timer_scheduler.stop()
+    automation_engine.stop()
+    await command_dispatcher.stop()
     mqtt_service.stop()
+    ingest_service.stop()
+    alert_stream.stop()
+    await llm_client.stop()
     print("🤖 AI Assistant service stopped")
 
 # 创建FastAPI应用
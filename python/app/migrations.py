@@ -0,0 +1,90 @@
+"""
+数据库迁移
+
+init_db 中的 create_all 只会创建缺失的表，不会修改已有的表结构，
+已上线数据库的结构变更（索引、新增列、数据回填等）按版本号追加到 MIGRATIONS 中。
+每个迁移在单独的事务中执行，执行成功后记录到 schema_migrations 表。
+"""
+from datetime import datetime
+from typing import Callable, List, Tuple, Union
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+def _backfill_sensor_rollups(conn: Connection):
+    from app.services.rollup_service import rollup_service
+    rollup_service.backfill(conn)
+
+
+def _add_recurring_start_date(conn: Connection):
+    # create_all 新建的表已经包含该列
+    columns = [row[1] for row in conn.execute(text("PRAGMA table_info(recurring_schedules)"))]
+    if "start_date" not in columns:
+        conn.execute(text("ALTER TABLE recurring_schedules ADD COLUMN start_date VARCHAR(10)"))
+
+
+# (版本号, 说明, [SQL语句 或 接收Connection的函数])
+Migration = Tuple[int, str, List[Union[str, Callable[[Connection], None]]]]
+
+MIGRATIONS: List[Migration] = [
+    (1, "sensor_data / alert_logs 热点查询索引", [
+        "CREATE INDEX IF NOT EXISTS ix_sensor_data_timestamp ON sensor_data (timestamp)",
+        "CREATE INDEX IF NOT EXISTS ix_sensor_data_house_timestamp ON sensor_data (house_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS ix_sensor_data_device_timestamp ON sensor_data (device_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS ix_alert_logs_created_at ON alert_logs (created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_alert_logs_house_created ON alert_logs (house_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_alert_logs_house_resolved_created ON alert_logs (house_id, is_resolved, created_at)",
+    ]),
+    # sensor_rollups 表由 create_all 创建，这里用已有原始数据回填
+    (2, "传感器数据时间桶汇总回填", [_backfill_sensor_rollups]),
+    (3, "重复日程开始日期", [_add_recurring_start_date]),
+    (4, "schedules 月历/分页索引", [
+        "CREATE INDEX IF NOT EXISTS ix_schedules_date_time_id ON schedules (date, time, id)",
+    ]),
+    (5, "alert_logs 按家庭游标读取索引", [
+        "CREATE INDEX IF NOT EXISTS ix_alert_logs_house_id ON alert_logs (house_id, id)",
+    ]),
+]
+
+
+def _ensure_version_table(conn: Connection):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "description VARCHAR(200) NOT NULL, "
+        "applied_at DATETIME NOT NULL)"
+    ))
+
+
+def get_current_version(engine: Engine) -> int:
+    """获取当前数据库的迁移版本"""
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        version = conn.execute(text("SELECT MAX(version) FROM schema_migrations")).scalar()
+    return version or 0
+
+
+def run_migrations(engine: Engine) -> int:
+    """按顺序执行尚未应用的迁移，返回执行的迁移数量"""
+    current = get_current_version(engine)
+    applied = 0
+
+    for version, description, steps in MIGRATIONS:
+        if version <= current:
+            continue
+
+        with engine.begin() as conn:
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(text(step))
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {"v": version, "d": description, "t": datetime.now()}
+            )
+
+        applied += 1
+        print(f"INFO:\t ✅ 数据库迁移 {version}: {description}")
+
+    return applied
@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, PrimaryKeyConstraint
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class ConversationMessage(Base):
+    """AI 对话中尚未被摘要的消息，被折叠进摘要后删除"""
+    __tablename__ = "conversation_messages"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    session_id = Column(String(64), nullable=False, default="default")
+    role = Column(String(20), nullable=False)  # user, assistant
+    content = Column(Text, nullable=False)
+    tokens = Column(Integer, nullable=False, default=0)  # 估算的 token 数
+    created_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        Index("ix_conversation_messages_user_session", "user_id", "session_id", "id"),
+    )
+
+
+class ConversationSession(Base):
+    """每个用户、每个会话的较早对话摘要和消息总数"""
+    __tablename__ = "conversation_sessions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    session_id = Column(String(64), nullable=False, default="default")
+    summary = Column(Text, nullable=False, default="")  # 每行一条被折叠的消息
+    total_messages = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        PrimaryKeyConstraint("user_id", "session_id"),
+    )
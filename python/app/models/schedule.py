@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Text, Enum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Text, Enum, Index
 from sqlalchemy.sql import func
 from app.database import Base
 import enum
@@ -32,6 +32,11 @@ class Schedule(Base):
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     completed_at = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        # 月历分组统计和列表键集分页按 (date, time, id) 顺序扫描
+        Index("ix_schedules_date_time_id", "date", "time", "id"),
+    )
+
 
 class ScheduleReminder(Base):
     """日程提醒记录表"""
@@ -64,6 +69,7 @@ class RecurringSchedule(Base):
     repeat_end_date = Column(String(10), nullable=True)  # 重复结束日期
     repeat_count = Column(Integer, nullable=True)  # 重复次数限制
     weekdays = Column(String(20), nullable=True)  # 仅周重复时使用："1,2,3,4,5"
+    start_date = Column(String(10), nullable=True)  # 重复开始日期，为空时按创建日期
 
     # 关联信息
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, Float, DateTime, String, Boolean, JSON
+from sqlalchemy import Column, Integer, Float, DateTime, String, Boolean, JSON, Index, PrimaryKeyConstraint
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -20,6 +20,13 @@ class SensorData(Base):
     data_json = Column(JSON, nullable=True)  # 其他传感器数据
     timestamp = Column(DateTime, default=datetime.now())
 
+    # 索引通过 app/migrations.py 同步到已有数据库
+    __table_args__ = (
+        Index("ix_sensor_data_timestamp", "timestamp"),
+        Index("ix_sensor_data_house_timestamp", "house_id", "timestamp"),
+        Index("ix_sensor_data_device_timestamp", "device_id", "timestamp"),
+    )
+
 
 class AlertLog(Base):
     __tablename__ = "alert_logs"
@@ -32,4 +39,35 @@ class AlertLog(Base):
     severity = Column(String(20), default="medium")  # high, medium, low
     is_resolved = Column(Boolean, default=False)  # 是否已解决
     created_at = Column(DateTime, default=func.now())
-    resolved_at = Column(DateTime, nullable=True)
\ No newline at end of file
+    resolved_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_alert_logs_created_at", "created_at"),
+        Index("ix_alert_logs_house_created", "house_id", "created_at"),
+        Index("ix_alert_logs_house_resolved_created", "house_id", "is_resolved", "created_at"),
+        Index("ix_alert_logs_house_id", "house_id", "id"),
+    )
+
+
+class SensorRollup(Base):
+    """传感器数据时间桶汇总（minute / hour / day），由写入管道增量维护"""
+    __tablename__ = "sensor_rollups"
+
+    granularity = Column(String(10), nullable=False)  # minute, hour, day
+    metric = Column(String(50), nullable=False)  # temperature, humidity等
+    bucket = Column(DateTime, nullable=False)  # 时间桶起点
+    house_id = Column(Integer, nullable=False, default=1)
+    device_id = Column(String(100), nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    sum = Column(Float, nullable=False, default=0)  # 保存总和而非均值，便于增量合并
+    min = Column(Float, nullable=True)
+    max = Column(Float, nullable=True)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("granularity", "metric", "bucket", "house_id", "device_id"),
+        Index("ix_sensor_rollups_granularity_bucket", "granularity", "bucket"),
+    )
+
+    @property
+    def avg(self):
+        return self.sum / self.count if self.count else None
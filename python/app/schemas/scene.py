@@ -85,6 +85,7 @@ class SceneExecutionResult(BaseModel):
     total_devices: int
     success_count: int
     failed_count: int
+    max_latency_ms: float = 0.0  # 最慢动作的指令确认耗时（毫秒）
 
 
 # 自动化相关Schema
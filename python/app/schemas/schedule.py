@@ -76,11 +76,28 @@ class ScheduleResponse(ScheduleBase):
     created_at: datetime
     updated_at: datetime
     completed_at: Optional[datetime] = None
+    is_recurring: bool = False
 
     class Config:
         from_attributes = True
 
 
+class ScheduleOccurrence(BaseModel):
+    """重复日程在某一天的发生实例（由规则展开，不对应 schedules 表中的记录）"""
+    recurring_id: int
+    title: str
+    description: Optional[str] = None
+    date: str
+    time: str
+    location: Optional[str] = None
+    priority: Priority = Priority.MEDIUM
+    reminder: Optional[str] = None
+    completed: bool = False
+    is_recurring: bool = True
+    created_by: int
+    house_id: int
+
+
 class ScheduleListQuery(BaseModel):
     """日程列表查询参数"""
     start_date: Optional[str] = Field(None, pattern=r'^\d{4}-\d{2}-\d{2}$', description="开始日期")
@@ -89,6 +106,7 @@ class ScheduleListQuery(BaseModel):
     priority: Optional[Priority] = Field(None, description="优先级筛选")
     page: int = Field(1, ge=1, description="页码")
     size: int = Field(50, ge=1, le=200, description="每页大小")
+    cursor: Optional[str] = Field(None, description="键集分页游标，传空字符串取第一页；指定后忽略 page 且不统计总数")
 
 
 class ScheduleCalendarResponse(BaseModel):
@@ -103,8 +121,8 @@ class ScheduleCalendarResponse(BaseModel):
 class BatchOperation(BaseModel):
     """批量操作请求模型"""
     schedule_ids: List[int] = Field(..., min_items=1, description="日程ID列表")
-    operation: str = Field(..., pattern=r'^(complete|delete|update_priority)$', description="操作类型")
-    data: Optional[dict] = Field(None, description="操作参数")
+    operation: str = Field(..., pattern=r'^(complete|delete|update_priority|reschedule)$', description="操作类型")
+    data: Optional[dict] = Field(None, description="操作参数：update_priority 需要 priority，reschedule 需要 date（可选 time）")
 
 
 # 重复日程相关schemas
@@ -129,6 +147,7 @@ class RecurringScheduleCreate(RecurringScheduleBase):
 
 class RecurringScheduleResponse(RecurringScheduleBase):
     id: int
+    start_date: Optional[str] = None
     created_by: int
     house_id: int
     is_active: bool
@@ -1,7 +1,9 @@
 import json
 import asyncio
 import logging
-from typing import Dict, List, Optional, Any
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.attributes import flag_modified
@@ -18,6 +20,14 @@ from app.schemas.device import DeviceControl
 
 # 提示词管理器
 from app.utils.prompts import prompt_manager
+from app.utils.json_stream import ResponseTextExtractor
+from app.services.rollup_service import rollup_service
+from app.services.sensor_cache import latest_cache
+from app.services.llm_client import llm_client, LLMError
+from app.services.response_cache import response_cache
+from app.services.intent_matcher import intent_matcher
+from app.services.conversation_memory import conversation_memory
+from app.database import run_write
 
 # 日志配置
 logging.basicConfig(level=logging.INFO)
@@ -27,10 +37,18 @@ logger = logging.getLogger(__name__)
 class AIService:
 
     def __init__(self):
-        # 对话历史记录
-        self.conversation_history = []
+        # 对话历史按用户和会话保存在 conversation_memory 中
         self.log_time = datetime.now()
 
+        # 流式调用的首字延迟统计（毫秒）
+        self.ttft_samples = deque(maxlen=200)
+        self.stream_stats = {
+            "streams": 0,
+            "errors": 0,
+            "last_ttft_ms": None,
+            "last_total_ms": None,
+        }
+
     async def check_and_alert_safety_issues(self, db: Session, current_user: User) -> str:
         """
         主动检测安全问题并生成警报消息
@@ -133,7 +151,9 @@ class AIService:
 
         return "\n".join(messages) + "\n\n如需帮助请告诉我。"
 
-    async def process_message(self, query: str, current_user: User, db: Session) -> Dict[str, Any]:
+    async def process_message(self, query: str, current_user: User, db: Session,
+                              on_token: Optional[Callable[[str], None]] = None,
+                              session_id: str = "default") -> Dict[str, Any]:
         """
         处理用户消息的主要入口
 
@@ -141,6 +161,8 @@ class AIService:
             query: 用户查询
             current_user: 当前用户
             db: 数据库会话
+            on_token: 流式模式下接收回复文字片段的回调，为空时一次性调用大模型
+            session_id: 对话会话ID，同一用户的不同会话互不共享历史
 
         Returns:
             包含AI回复和操作结果的字典
@@ -150,8 +172,10 @@ class AIService:
 
             if safety_alert:
                 # 如果有安全问题，直接返回安全警报，忽略用户的其他请求
-                self.conversation_history.append({"role": "user", "content": query})
-                self.conversation_history.append({"role": "assistant", "content": safety_alert})
+                await conversation_memory.append_async(current_user.id, session_id, "user", query)
+                await conversation_memory.append_async(current_user.id, session_id, "assistant", safety_alert)
+                if on_token is not None:
+                    on_token(safety_alert)
 
                 return {
                     "reply": safety_alert,
@@ -162,34 +186,51 @@ class AIService:
                 }
 
             # 1. 更新对话历史
-            self.conversation_history.append({"role": "user", "content": query})
-
-            # 2. 收集实时上下文数据
-            print("收集实时上下文数据")
-            context_data = prompt_manager.build_context_data(db, current_user)
-
-
-            # 3. 构建完整的Prompt
-            full_prompt = prompt_manager.build_full_prompt(context_data, self.conversation_history)
+            await conversation_memory.append_async(current_user.id, session_id, "user", query)
+
+            # 2. 无歧义的简单指令本地识别；相同或相近的设备控制、场景指令直接重放缓存的动作，不调用大模型
+            timing = None
+            cached = False
+            pending = None
+            llm_response_json = intent_matcher.match(db, current_user.house_id, query)
+            fast_path = llm_response_json is not None
+            if not fast_path:
+                llm_response_json = response_cache.lookup(db, current_user.house_id, query)
+                cached = llm_response_json is not None
+            if llm_response_json is None:
+                # 3. 收集实时上下文数据并构建完整的Prompt
+                logger.debug("收集实时上下文数据")
+                context_data = prompt_manager.build_context_data(db, current_user)
+                history_json = await conversation_memory.prompt_json_async(current_user.id, session_id)
+                full_prompt = prompt_manager.build_full_prompt(context_data, history_json)
+
+                # 4. 调用大模型（流式模式下回复文字边生成边转发，结束后再解析动作）
+                start = time.perf_counter()
+                if on_token is None:
+                    llm_response_json = await self._call_large_language_model(full_prompt, query)
+                else:
+                    llm_response_json, timing = await self._stream_large_language_model(full_prompt, query, on_token)
+                intent_matcher.record_llm((time.perf_counter() - start) * 1000)
 
-            # 4. 调用大模型
-            llm_response_json = await self._call_large_language_model(full_prompt, query)
+                # 执行前记录计划及涉及设备的当前状态，执行成功后才加入缓存
+                pending = response_cache.prepare(db, current_user.house_id, query, llm_response_json)
 
             # 5. 执行LLM返回的动作
-            final_response = await self._execute_llm_action(llm_response_json, db, current_user)
-
-            # 6. 更新对话历史
-            self.conversation_history.append({"role": "assistant", "content": final_response})
+            final_response, succeeded = await self._run_llm_action(llm_response_json, db, current_user)
+            if pending is not None and succeeded:
+                response_cache.add(pending)
 
-            # 7. 保持对话历史长度
-            if len(self.conversation_history) > 20:  # 保留最近20条消息
-                self.conversation_history = self.conversation_history[-20:]
+            # 6. 更新对话历史（超出 token 预算的较早消息折叠为摘要）
+            await conversation_memory.append_async(current_user.id, session_id, "assistant", final_response)
 
             return {
                 "reply": final_response,
                 "actions": [{"action": "AI处理完成", "success": True}],
                 "suggestions": [],
-                "intent": llm_response_json.get("action", "unknown")
+                "intent": llm_response_json.get("action", "unknown"),
+                "timing": timing,
+                "cached": cached,
+                "fast_path": fast_path
             }
 
         except Exception as e:
@@ -201,65 +242,154 @@ class AIService:
                 "error": str(e)
             }
 
+    @staticmethod
+    def _llm_messages(prompt: str, user_query: str) -> List[Dict]:
+        return [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": user_query}
+        ]
+
     async def _call_large_language_model(self, prompt: str, user_query: str) -> Dict:
-        """通义千问API调用 - 最简版本"""
+        """通义千问API调用（异步客户端，受超时、并发上限和熔断保护）"""
         try:
-            import dashscope
-            from app.config import settings
-
-            # 设置API密钥
-            dashscope.api_key = settings.DASHSCOPE_API_KEY
-
-            # 调用API（使用默认参数）
-            from dashscope import Generation
-
-            response = Generation.call(
-                model="qwen-turbo",  # 直接写死模型名
-                messages=[
-                    {"role": "system", "content": prompt},
-                    {"role": "user", "content": user_query}
-                ],
-                result_format='message'
-            )
-
-            if response.status_code == 200:
-                ai_text = response.output.choices[0].message.content
-
-                # 简单的JSON解析
-                with open('temp_123.txt', 'a', encoding='utf-8') as f:
-                    # json.dump(ai_text, f, ensure_ascii=False, indent=4)
-                    f.write(ai_text)
-                    f.write('\n')
-                try:
-                    return json.loads(ai_text)
-                except:
-                    # 解析失败就包装成回复格式
-                    return {
-                        "action": "answer_user",
-                        "parameters": {"response": ai_text}
-                    }
-            else:
-                raise Exception("API调用失败")
-
-        except Exception as e:
+            ai_text = await llm_client.chat(self._llm_messages(prompt, user_query))
+            return self._parse_llm_text(ai_text)
+        except LLMError as e:
             return {
                 "action": "answer_user",
                 "parameters": {"response": f"AI暂时不可用: {str(e)}"}
             }
 
+    def _iter_llm_deltas(self, prompt: str, user_query: str) -> AsyncIterator[str]:
+        """通义千问流式调用，逐个产出增量文本"""
+        return llm_client.stream(self._llm_messages(prompt, user_query))
+
+    async def _stream_large_language_model(self, prompt: str, user_query: str,
+                                           on_token: Callable[[str], None]) -> Tuple[Dict, Dict]:
+        """
+        流式调用大模型：response 字段的文字到达即通过 on_token 转发，
+        输出结束后一次性解析JSON动作。返回 (动作, 耗时统计)
+        """
+        extractor = ResponseTextExtractor()
+        chunks = []
+        start = time.perf_counter()
+        first_token_at = None
+        self.stream_stats["streams"] += 1
+        try:
+            async for delta in self._iter_llm_deltas(prompt, user_query):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                chunks.append(delta)
+                text = extractor.feed(delta)
+                if text:
+                    on_token(text)
+        except Exception as e:
+            self.stream_stats["errors"] += 1
+            logger.error(f"大模型流式调用失败: {e}")
+            if not chunks:
+                return {
+                    "action": "answer_user",
+                    "parameters": {"response": f"AI暂时不可用: {str(e)}"}
+                }, {"ttft_ms": None, "total_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+        timing = {
+            "ttft_ms": round((first_token_at - start) * 1000, 1) if first_token_at is not None else None,
+            "total_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+        if timing["ttft_ms"] is not None:
+            self.ttft_samples.append(timing["ttft_ms"])
+        self.stream_stats["last_ttft_ms"] = timing["ttft_ms"]
+        self.stream_stats["last_total_ms"] = timing["total_ms"]
+        return self._parse_llm_text("".join(chunks)), timing
+
+    @staticmethod
+    def _parse_llm_text(ai_text: str) -> Dict:
+        """解析大模型输出的JSON动作，允许外层包着 ``` 代码块"""
+        text = ai_text.strip()
+        if text.startswith("```"):
+            text = text.split("\n", 1)[1] if "\n" in text else ""
+            text = text.rsplit("```", 1)[0]
+        try:
+            action = json.loads(text)
+            if isinstance(action, dict):
+                return action
+        except ValueError:
+            pass
+        # 解析失败就包装成回复格式
+        return {
+            "action": "answer_user",
+            "parameters": {"response": ai_text}
+        }
+
+    def get_stream_stats(self) -> Dict:
+        """流式调用的首字延迟统计"""
+        samples = sorted(self.ttft_samples)
+        return {
+            **self.stream_stats,
+            "ttft_p50_ms": samples[len(samples) // 2] if samples else None,
+            "ttft_p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] if samples else None,
+        }
+
+    @staticmethod
+    def _apply_device_ops(db: Session, devices_to_control: List[Dict], house_id: int) -> Tuple[List, List]:
+        """
+        更新指令涉及设备的状态（在 run_write 中执行）。
+        返回 (已更新设备的 (设备标识, MQTT控制位) 列表, 未找到的设备ID列表)
+        """
+        from app.services.command_dispatcher import device_bits_for
+
+        updated, missing = [], []
+        for device_op in devices_to_control:
+            device_id = device_op.get("device_id")
+            status = device_op.get("status")
+
+            device = db.query(Device).filter(
+                Device.id == device_id,
+                Device.house_id == house_id
+            ).first()
+            if not device:
+                missing.append(device_id)
+                continue
+
+            print(f"✅ 找到设备: {device.name}, 当前状态: {device.status}")
+            if device.status:
+                device.status.update(status)
+            else:
+                device.status = status
+            # 无论status是新建还是更新，都标记为已修改
+            flag_modified(device, 'status')
+            device.is_online = True
+            print(f"🔧 更新后状态: {device.status}")
+
+            updated.append((device.device_id, device_bits_for(device, device.status.get("power"))))
+
+        db.commit()
+        print("✅ 数据库已提交")
+        return updated, missing
+
+    @staticmethod
+    def _add(db: Session, obj):
+        db.add(obj)
+        db.commit()
+        return obj
+
     async def _execute_llm_action(self, action: Dict, db: Session, current_user: User) -> str:
+        return (await self._run_llm_action(action, db, current_user))[0]
+
+    async def _run_llm_action(self, action: Dict, db: Session, current_user: User) -> Tuple[str, bool]:
+        """执行动作，返回 (回复, 是否成功)"""
 
         action_name = action.get("action")
         parameters = action.get("parameters")
 
         if not action_name or not parameters:
-            return "AI返回格式错误，请重试。"
+            return "AI返回格式错误，请重试。", False
 
         logger.info(f"准备执行动作: {action_name}")
 
         try:
             if action_name == "answer_user":
-                return parameters.get("response", "我不知道该说什么。")
+                return parameters.get("response", "我不知道该说什么。"), True
 
                 # ai_service.py -> _execute_llm_action 方法内
 
@@ -269,86 +399,31 @@ class AIService:
 
                 devices_to_control = parameters.get("devices", [])
 
-                for device_op in devices_to_control:
-
-                    device_id = device_op.get("device_id")
-
-                    status = device_op.get("status")
-
-                    action_type = device_op.get("action")
-
-                    # 1. 查找设备
-
-                    device = db.query(Device).filter(
-
-                        Device.id == device_id,
-
-                        Device.house_id == current_user.house_id
-
-                    ).first()
-
-                    # 2. 如果找到了设备，才执行所有操作
-
-                    if device:
-
-                        print(f"✅ 找到设备: {device.name}, 当前状态: {device.status}")
-
-                        # 2.1 更新设备状态
-
-                        if device.status:
-
-                            device.status.update(status)
-
-                        else:
-
-                            device.status = status
-
-                        # 【修正点1】: flag_modified 应在更新操作后、commit之前调用
-
-                        # 无论status是新建还是更新，都标记为已修改
-
-                        flag_modified(device, 'status')
-
-                        device.is_online = True
-
-                        print(f"🔧 更新后状态: {device.status}")
-
-                        # 2.2 提交更改到数据库
-
-                        db.commit()
-
-                        print("✅ 数据库已提交")
-
-                        # 【修正点2】: MQTT指令应该在数据库成功提交后，对已找到的设备发送
-
-                        try:
-
-                            from app.services.mqtt_service import mqtt_service
-
-                            print(f"🚀 准备向设备 {device.device_id} 发送MQTT指令...")
-
-                            mqtt_service.publish_device_control(device.device_id, {
-
-                                "action": action_type,
-
-                                "parameters": status
+                # 在写连接上一个事务更新全部设备状态（线程池中执行，不阻塞事件循环），提交后再下发指令
+                updated, missing = await run_write(
+                    lambda session: self._apply_device_ops(session, devices_to_control, current_user.house_id)
+                )
 
-                            })
+                for device_id in missing:
+                    print(f"❌ 未找到设备 ID: {device_id}")
 
-                            print("✅ MQTT指令已发送")
+                for device_key, bits in updated:
+                    try:
+                        from app.services.command_dispatcher import command_dispatcher
 
-                        except Exception as mqtt_error:
+                        print(f"🚀 准备向设备 {device_key} 发送MQTT指令...")
 
-                            logger.warning(f"MQTT发送失败: {mqtt_error}")
+                        if bits:
 
+                            ack = await command_dispatcher.send(*bits)
 
-                    # 3. 如果没找到设备，就只打印日志
+                            print(f"✅ MQTT指令已发送: {ack['success']}")
 
-                    else:
+                    except Exception as mqtt_error:
 
-                        print(f"❌ 未找到设备 ID: {device_id}")
+                        logger.warning(f"MQTT发送失败: {mqtt_error}")
 
-                return response_text
+                return response_text, not missing
 
             elif action_name == "execute_scene":
                 scene_id = parameters.get("scene_id")
@@ -360,19 +435,15 @@ class AIService:
                 ).first()
 
                 if scene:
-                    # 执行场景中的所有动作
-                    for action_data in scene.actions:
-                        device_id = action_data.get("device_id")
-                        device_params = action_data.get("parameters", {})
+                    # 执行场景中的所有动作（批量更新状态并并发下发指令）
+
+                    from app.services.scene_service import SceneService
 
-                        device = db.query(Device).filter(Device.id == device_id).first()
-                        if device:
-                            device.status = device_params
-                            db.commit()
+                    await SceneService(db).execute_scene(scene, current_user)
 
-                    return parameters.get("response", f"场景 {scene.name} 已执行。")
+                    return parameters.get("response", f"场景 {scene.name} 已执行。"), True
                 else:
-                    return "未找到指定场景。"
+                    return "未找到指定场景。", False
 
             elif action_name == "create_scene":
                 scene_data = parameters.get("scene_data")
@@ -388,69 +459,66 @@ class AIService:
                     created_by=current_user.id
                 )
 
-                db.add(new_scene)
-                db.commit()
-                db.refresh(new_scene)
+                await run_write(lambda session: self._add(session, new_scene))
 
-                return parameters.get("response", f"场景 {new_scene.name} 已创建。")
+                return parameters.get("response", f"场景 {new_scene.name} 已创建。"), True
 
             elif action_name == "create_automation_rule":
                 # 这里可以添加自动化规则创建逻辑
-                return parameters.get("response", "自动化规则创建功能正在开发中。")
+                return parameters.get("response", "自动化规则创建功能正在开发中。"), True
 
             else:
                 logger.warning(f"接收到未知的动作: {action_name}")
-                return "抱歉，我暂时无法执行这个操作。"
+                return "抱歉，我暂时无法执行这个操作。", False
 
         except Exception as e:
             logger.error(f"执行动作时发生错误: {e}", exc_info=True)
-            return f"执行操作时出现错误: {str(e)}"
+            return f"执行操作时出现错误: {str(e)}", False
 
     async def get_daily_summary(self, user: User, db: Session) -> str:
         """生成每日数据摘要"""
         try:
-            yesterday = datetime.now() - timedelta(days=1)
+            today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            yesterday = today - timedelta(days=1)
 
-            # 获取昨天的环境数据
-            sensor_data = db.query(SensorData).filter(
-                SensorData.house_id == user.house_id,
-                SensorData.timestamp >= yesterday.date(),
-                SensorData.timestamp < datetime.now().date()
-            ).all()
+            # 昨天的环境数据从天粒度汇总中读取，不依赖已被清理的原始数据
+            summary = rollup_service.summary(db, user.house_id, "day", yesterday, today)
 
-            if not sensor_data:
+            if not summary:
                 return f"😊 {user.username}，早上好！昨天没有收集到环境数据，今天是美好的一天！"
 
-            # 计算统计数据
-            temperatures = [d.temperature for d in sensor_data if d.temperature]
-            humidities = [d.humidity for d in sensor_data if d.humidity]
-
             summary_parts = [f"😊 {user.username}，早上好！这是昨日的家庭环境摘要："]
 
-            if temperatures:
-                avg_temp = sum(temperatures) / len(temperatures)
-                max_temp = max(temperatures)
-                min_temp = min(temperatures)
-                summary_parts.append(f"🌡️ 温度：平均{avg_temp:.1f}°C，最高{max_temp:.1f}°C，最低{min_temp:.1f}°C")
+            temperature = summary.get("temperature")
+            if temperature:
+                summary_parts.append(
+                    f"🌡️ 温度：平均{temperature['avg']:.1f}°C，最高{temperature['max']:.1f}°C，最低{temperature['min']:.1f}°C"
+                )
 
-            if humidities:
-                avg_humidity = sum(humidities) / len(humidities)
-                summary_parts.append(f"💧 湿度：平均{avg_humidity:.1f}%")
+            humidity = summary.get("humidity")
+            if humidity:
+                summary_parts.append(f"💧 湿度：平均{humidity['avg']:.1f}%")
 
             # 检查异常情况
             alerts = []
-            for data in sensor_data:
-                if data.flame_detected:
-                    alerts.append("火焰警报")
-                if data.gas_level and data.gas_level > 80:
-                    alerts.append("可燃气体浓度过高")
+            fire_alerts = db.query(AlertLog.id).filter(
+                AlertLog.house_id == user.house_id,
+                AlertLog.created_at >= yesterday,
+                AlertLog.created_at < today,
+                AlertLog.alert_type == "fire"
+            ).first()
+            if fire_alerts:
+                alerts.append("火焰警报")
+            gas = summary.get("gas_level")
+            if gas and gas["max"] > 80:
+                alerts.append("可燃气体浓度过高")
 
             if alerts:
-                summary_parts.append(f"⚠️ 异常事件：{', '.join(set(alerts))}")
+                summary_parts.append(f"⚠️ 异常事件：{', '.join(alerts)}")
             else:
                 summary_parts.append("✅ 安全状况良好")
 
-            summary_parts.append(f"📊 共记录{len(sensor_data)}条数据")
+            summary_parts.append(f"📊 共记录{max(item['count'] for item in summary.values())}条数据")
             summary_parts.append("🌟 祝您今天过得愉快！")
 
             return "\n".join(summary_parts)
@@ -474,26 +542,24 @@ class AIService:
         elif 22 <= current_hour <= 24:
             suggestions.append("🌙 夜深了，要不要执行睡眠模式？")
 
-        # 环境相关建议
+        # 环境相关建议（读取最新读数缓存）
         try:
-            from sqlalchemy import desc
-            latest_sensor = db.query(SensorData).filter(
-                SensorData.house_id == user.house_id
-            ).order_by(desc(SensorData.timestamp)).first()
-
-            if latest_sensor:
-                if latest_sensor.temperature and latest_sensor.temperature > 28:
-                    suggestions.append("🌡️ 室内温度较高，建议调低空调温度")
-                elif latest_sensor.temperature and latest_sensor.temperature < 18:
-                    suggestions.append("❄️ 室内温度较低，建议调高空调温度")
-
-                if latest_sensor.humidity and latest_sensor.humidity < 40:
-                    suggestions.append("💧 空气有些干燥，建议开启加湿器")
-                elif latest_sensor.humidity and latest_sensor.humidity > 70:
-                    suggestions.append("💨 湿度较高，建议开启除湿功能")
-
-                if latest_sensor.gas_level and latest_sensor.gas_level > 50:
-                    suggestions.append("⚠️ 可燃气体浓度偏高，请注意通风安全")
+            temperature = latest_cache.house_value(user.house_id, "temperature")
+            humidity = latest_cache.house_value(user.house_id, "humidity")
+            gas_level = latest_cache.house_value(user.house_id, "gas_level")
+
+            if temperature and temperature > 28:
+                suggestions.append("🌡️ 室内温度较高，建议调低空调温度")
+            elif temperature and temperature < 18:
+                suggestions.append("❄️ 室内温度较低，建议调高空调温度")
+
+            if humidity and humidity < 40:
+                suggestions.append("💧 空气有些干燥，建议开启加湿器")
+            elif humidity and humidity > 70:
+                suggestions.append("💨 湿度较高，建议开启除湿功能")
+
+            if gas_level and gas_level > 50:
+                suggestions.append("⚠️ 可燃气体浓度偏高，请注意通风安全")
 
         except Exception as e:
             logger.warning(f"获取环境建议时出错: {e}")
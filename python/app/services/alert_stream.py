@@ -0,0 +1,210 @@
+import asyncio
+import bisect
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import RoutingSession
+from app.models.sensor_data import AlertLog
+from app.services.websocket_manager import websocket_manager
+
+
+def alert_message(alert_id: int, house_id: int, device_id: str, alert_type: str, message: str,
+                  severity: str, created_at: datetime) -> Dict:
+    """推送和轮询共用的警报消息格式"""
+    return {
+        "id": alert_id,
+        "house_id": house_id,
+        "device_id": device_id,
+        "type": alert_type,
+        "content": message,
+        "severity": severity,
+        "time": created_at.isoformat() if created_at else None,
+    }
+
+
+class ClientCursor:
+    """单个轮询客户端的读取位置及按类型的限流时间"""
+
+    def __init__(self, cursor: int):
+        self.cursor = cursor
+        self.last_by_type: Dict[str, datetime] = {}
+
+
+class AlertStream:
+    """
+    警报推送流：写入警报的事务用 publish_on_commit 登记，提交时按家庭推送到 WebSocket 并唤醒 SSE 订阅者；
+    最近的警报保存在内存环形缓冲中，按警报ID作为游标读取，断线重连后从游标继续。
+    游标早于缓冲区时回退到按 (house_id, id) 索引查询数据库。
+    警报在提交时、写连接释放之前发布，发布顺序与提交顺序（即ID顺序）一致；缓冲区也按ID有序插入。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buffer = deque(maxlen=settings.ALERT_BUFFER_SIZE)
+        self.last_id = 0
+        # 缓冲区之前的警报都已写入数据库，游标不小于该值时缓冲区即可完整回答
+        self.buffer_floor = 0
+        self.throttle_seconds = settings.ALERT_THROTTLE_SECONDS
+        self.clients: "OrderedDict[str, ClientCursor]" = OrderedDict()
+        self.max_clients = settings.ALERT_MAX_CLIENTS
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.changed: Optional[asyncio.Event] = None
+
+        self.stats = {
+            "published": 0,
+            "pushed": 0,
+            "buffer_reads": 0,
+            "db_reads": 0,
+        }
+
+    def load(self, db: Session):
+        """启动时记录当前最大警报ID，新客户端从这里开始读取"""
+        last_id = db.query(func.max(AlertLog.id)).scalar() or 0
+        with self.lock:
+            self.last_id = max(self.last_id, last_id)
+            if not self.buffer:
+                self.buffer_floor = self.last_id
+
+    def publish_on_commit(self, session: Session, alerts: List[Dict]):
+        """在写入警报的事务中登记，事务提交时发布，回滚则丢弃"""
+        session.info.setdefault("alert_stream", []).extend(alerts)
+
+    def publish(self, alerts: List[Dict]):
+        """警报提交后调用（可在写入线程中调用），alerts 为 alert_message 格式"""
+        if not alerts:
+            return
+        with self.lock:
+            for alert in alerts:
+                self.last_id = max(self.last_id, alert["id"])
+                if alert["id"] > self.buffer_floor and len(self.buffer) == self.buffer.maxlen:
+                    self.buffer_floor = self.buffer.popleft()["id"]
+                if alert["id"] <= self.buffer_floor:
+                    # 早于缓冲区的警报只能从数据库读取
+                    continue
+                if not self.buffer or alert["id"] > self.buffer[-1]["id"]:
+                    self.buffer.append(alert)
+                else:
+                    bisect.insort(self.buffer, alert, key=lambda item: item["id"])
+            self.stats["published"] += len(alerts)
+
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(self._push(alerts), loop)
+
+    async def _push(self, alerts: List[Dict]):
+        """在事件循环中推送给各家庭的 WebSocket 连接，并唤醒 SSE 订阅者"""
+        for alert in alerts:
+            self.stats["pushed"] += await websocket_manager.send_to_house(alert["house_id"], {"type": "alert", "alert": alert})
+        if self.changed is not None:
+            self.changed.set()
+            self.changed = asyncio.Event()
+
+    def current_event(self) -> asyncio.Event:
+        """读取前先取得当前事件，读取与等待之间发布的警报也能唤醒等待者"""
+        if self.changed is None:
+            self.changed = asyncio.Event()
+        return self.changed
+
+    async def wait(self, timeout: float, changed: Optional[asyncio.Event] = None) -> bool:
+        """等待新警报，超时返回 False"""
+        try:
+            await asyncio.wait_for((changed or self.current_event()).wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def read_buffer(self, cursor: int, house_id: Optional[int] = None, limit: int = 100) -> Optional[List[Dict]]:
+        """从内存缓冲读取游标之后的警报；游标早于缓冲区时返回 None"""
+        with self.lock:
+            if cursor < self.buffer_floor:
+                return None
+            alerts = []
+            # 缓冲区按ID递增，从尾部向前找到游标位置
+            for alert in reversed(self.buffer):
+                if alert["id"] <= cursor:
+                    break
+                if house_id is None or alert["house_id"] == house_id:
+                    alerts.append(alert)
+            self.stats["buffer_reads"] += 1
+        alerts.reverse()
+        return alerts[:limit]
+
+    def read(self, db: Session, cursor: int, house_id: Optional[int] = None, limit: int = 100) -> List[Dict]:
+        """读取游标之后的警报，缓冲区无法覆盖时查询数据库"""
+        alerts = self.read_buffer(cursor, house_id, limit)
+        if alerts is not None:
+            return alerts
+
+        self.stats["db_reads"] += 1
+        query = db.query(
+            AlertLog.id, AlertLog.house_id, AlertLog.device_id, AlertLog.alert_type,
+            AlertLog.message, AlertLog.severity, AlertLog.created_at
+        ).filter(AlertLog.id > cursor)
+        if house_id is not None:
+            query = query.filter(AlertLog.house_id == house_id)
+        return [alert_message(*row) for row in query.order_by(AlertLog.id).limit(limit).all()]
+
+    def client(self, key: str) -> ClientCursor:
+        """获取轮询客户端的读取状态，新客户端从最新的警报之后开始（更早的警报通过游标参数读取）"""
+        with self.lock:
+            state = self.clients.get(key)
+            if state is None:
+                state = self.clients[key] = ClientCursor(self.last_id)
+                if len(self.clients) > self.max_clients:
+                    self.clients.popitem(last=False)
+            else:
+                self.clients.move_to_end(key)
+            return state
+
+    def throttle(self, state: ClientCursor, alerts: List[Dict], now: datetime) -> List[Dict]:
+        """同一客户端同类警报在限流时间内只返回一次"""
+        result = []
+        for alert in alerts:
+            last = state.last_by_type.get(alert["type"])
+            if last is None or (now - last).total_seconds() > self.throttle_seconds:
+                state.last_by_type[alert["type"]] = now
+                result.append(alert)
+        return result
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.changed = asyncio.Event()
+
+    def stop(self):
+        self.loop = None
+        if self.changed is not None:
+            self.changed.set()
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {
+                **self.stats,
+                "last_id": self.last_id,
+                "buffered": len(self.buffer),
+                "buffer_floor": self.buffer_floor,
+                "clients": len(self.clients),
+            }
+
+
+# 全局警报推送流实例
+alert_stream = AlertStream()
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _publish_committed_alerts(session):
+    # 此时写连接尚未归还连接池，下一个写事务只能在发布之后提交
+    alerts = session.info.pop("alert_stream", None)
+    if alerts:
+        alert_stream.publish(alerts)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _discard_alerts(session):
+    session.info.pop("alert_stream", None)
@@ -0,0 +1,131 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from jose import JWTError, jwt
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached, object_session
+
+from app.config import settings
+from app.database import RoutingSession
+from app.models.user import User
+
+
+class AuthCache:
+    """
+    认证缓存：已验证令牌按摘要缓存到令牌过期为止，用户对象按TTL缓存。
+    命中时 get_current_user 不需要解码JWT，也不需要查询数据库。
+    """
+
+    def __init__(self):
+        self.max_tokens = settings.AUTH_TOKEN_CACHE_SIZE
+        self.user_ttl = settings.AUTH_USER_CACHE_TTL
+
+        self.lock = threading.Lock()
+        # 令牌摘要 -> (用户ID, 过期时间戳)
+        self._tokens: "OrderedDict[bytes, tuple]" = OrderedDict()
+        # 用户ID -> (用户字段快照, 缓存过期时间戳)
+        self._users: Dict[int, tuple] = {}
+
+        self.stats = {
+            "token_hits": 0,
+            "token_misses": 0,
+            "user_hits": 0,
+            "user_misses": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def verify_token(self, token: str) -> Optional[int]:
+        """验证令牌并返回用户ID，无效或过期返回None"""
+        key = self._digest(token)
+        now = time.time()
+        with self.lock:
+            entry = self._tokens.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._tokens.move_to_end(key)
+                    self.stats["token_hits"] += 1
+                    return entry[0]
+                del self._tokens[key]
+
+        self.stats["token_misses"] += 1
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+            user_id = int(payload["sub"])
+            expire = float(payload["exp"])
+        except (JWTError, KeyError, TypeError, ValueError):
+            return None
+
+        with self.lock:
+            self._tokens[key] = (user_id, expire)
+            self._tokens.move_to_end(key)
+            while len(self._tokens) > self.max_tokens:
+                self._tokens.popitem(last=False)
+        return user_id
+
+    def get_user(self, user_id: int) -> Optional[User]:
+        """从缓存获取用户，每次返回新的游离对象，避免请求之间共享同一实例"""
+        with self.lock:
+            entry = self._users.get(user_id)
+            if entry is None or entry[1] <= time.time():
+                self._users.pop(user_id, None)
+                self.stats["user_misses"] += 1
+                return None
+            self.stats["user_hits"] += 1
+            fields = entry[0]
+
+        user = User(**fields)
+        make_transient_to_detached(user)
+        return user
+
+    def put_user(self, user: User):
+        """缓存用户字段快照"""
+        fields = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+        with self.lock:
+            self._users[user.id] = (fields, time.time() + self.user_ttl)
+
+    def invalidate_user(self, user_id: int):
+        """用户被修改或删除后清除缓存（令牌缓存保留，用户会在下次请求时重新查询）"""
+        with self.lock:
+            if self._users.pop(user_id, None) is not None:
+                self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self.lock:
+            self._tokens.clear()
+            self._users.clear()
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {**self.stats, "tokens_cached": len(self._tokens), "users_cached": len(self._users)}
+
+
+# 全局认证缓存实例
+auth_cache = AuthCache()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _track_user_change(mapper, connection, target):
+    # 任何途径修改角色、房屋或删除用户时都要清除缓存。记录在会话上，提交成功后再清除：
+    # flush 时就清除的话，提交前到达的请求会从读连接取到旧数据并重新放进缓存
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("auth_users", set()).add(target.id)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _invalidate_committed_users(session):
+    for user_id in session.info.pop("auth_users", ()):
+        auth_cache.invalidate_user(user_id)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _discard_user_changes(session):
+    session.info.pop("auth_users", None)
@@ -0,0 +1,392 @@
+import asyncio
+import operator
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app.database import RoutingSession
+from app.models.device import Device
+from app.models.scene import Automation
+from app.services.sensor_cache import latest_cache, METRICS
+from app.services.timer_scheduler import timer_scheduler
+
+OPERATORS = {
+    "==": operator.eq,
+    ">": operator.gt,
+    "<": operator.lt,
+    ">=": operator.ge,
+    "<=": operator.le,
+}
+
+TIME_FIELDS = {
+    "hour": lambda now: now.hour,
+    "minute": lambda now: now.minute,
+}
+
+# 时间字段的取值范围和进位单位
+TIME_UNITS = {
+    "hour": (24, timedelta(days=1)),
+    "minute": (60, timedelta(hours=1)),
+}
+
+
+def next_time_boundary(triggers: Iterable[tuple], now: datetime) -> datetime:
+    """
+    时间条件的结果只可能在字段取值为 value、value+1 或 0 的那一刻变化，
+    返回所有时间条件中最近的一个变化时刻
+    """
+    candidates = []
+    for field, value in triggers:
+        size, carry = TIME_UNITS[field]
+        for boundary in {value % size, (value + 1) % size, 0}:
+            if field == "hour":
+                moment = now.replace(hour=boundary, minute=0, second=0, microsecond=0)
+            else:
+                moment = now.replace(minute=boundary, second=0, microsecond=0)
+            if moment <= now:
+                moment += carry
+            candidates.append(moment)
+    return min(candidates)
+
+
+def _never() -> bool:
+    return False
+
+
+def compile_condition(condition: dict, house_id: int, device_states: Dict[tuple, dict]) -> Tuple[Callable[[], bool], Optional[tuple]]:
+    """
+    把一个条件编译为无参谓词，同时返回它依赖的索引键：
+    ("sensor", (house_id, device_id, metric)) / ("device", (house_id, device_id)) / ("time", (field, value))。
+    格式错误的条件编译为恒假谓词
+    """
+    condition_type = condition.get("type")
+    parameter = condition.get("parameter")
+    compare = OPERATORS.get(condition.get("operator"))
+    # 空字符串与未指定设备相同，按全屋条件索引
+    device_id = condition.get("device_id") or None
+    if compare is None:
+        return _never, None
+
+    try:
+        if condition_type == "time":
+            field = TIME_FIELDS.get(parameter)
+            value = int(condition.get("value"))
+            if field is None or condition.get("operator") not in ("==", ">", "<"):
+                return _never, None
+            return (lambda: compare(field(datetime.now()), value)), ("time", (parameter, value))
+
+        if condition_type == "sensor":
+            if parameter not in METRICS:
+                return _never, None
+            value = float(condition.get("value"))
+            if compare is operator.eq:
+                # 传感器读数为浮点，相等按 0.1 的误差判断
+                matches = lambda current: abs(current - value) < 0.1
+            else:
+                matches = lambda current: compare(current, value)
+            if device_id:
+                read = lambda: latest_cache.get(house_id, device_id, parameter)
+            else:
+                # 未指定设备时取全屋最新值
+                read = lambda: latest_cache.house_value(house_id, parameter)
+
+            def sensor_predicate() -> bool:
+                current = read()
+                return current is not None and matches(current)
+            return sensor_predicate, ("sensor", (house_id, device_id, parameter))
+
+        if condition_type == "device":
+            if not device_id:
+                return _never, None
+            key = (house_id, device_id)
+            if compare is operator.eq:
+                target = str(condition.get("value"))
+
+                def device_predicate() -> bool:
+                    current = (device_states.get(key) or {}).get(parameter)
+                    return current is not None and str(current) == target
+            else:
+                value = float(condition.get("value"))
+
+                def device_predicate() -> bool:
+                    current = (device_states.get(key) or {}).get(parameter)
+                    try:
+                        return current is not None and compare(float(current), value)
+                    except (TypeError, ValueError):
+                        return False
+            return device_predicate, ("device", key)
+
+    except (TypeError, ValueError):
+        return _never, None
+
+    return _never, None
+
+
+class CompiledRule:
+    """编译后的自动化规则"""
+
+    def __init__(self, automation: Automation, device_states: Dict[tuple, dict]):
+        self.id = automation.id
+        self.name = automation.name
+        self.house_id = automation.house_id
+        self.actions = list(automation.actions or [])
+        self.keys: Set[tuple] = set()
+        # 时间条件 (field, value)，由定时调度器在结果可能变化的时刻重新计算
+        self.time_triggers: List[tuple] = []
+
+        predicates = []
+        for condition in automation.conditions or []:
+            predicate, key = compile_condition(condition, automation.house_id, device_states)
+            predicates.append(predicate)
+            if key is None:
+                continue
+            if key[0] == "time":
+                self.time_triggers.append(key[1])
+            else:
+                self.keys.add(key)
+
+        predicates = tuple(predicates)
+        combine = all if automation.condition_logic == "AND" else any
+        self.predicate = lambda: combine(p() for p in predicates)
+        self.last_result = False
+
+
+class AutomationEngine:
+    """
+    事件驱动的自动化引擎：规则条件在加载时编译为谓词，并按依赖的传感器指标和设备建立索引。
+    每条读数或设备状态变化只重新计算受影响的规则，条件由假变真时执行动作。
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.rules: Dict[int, CompiledRule] = {}
+        # 索引键 -> 规则ID集合
+        self.index: Dict[tuple, Set[int]] = defaultdict(set)
+        # (house_id, device_id) -> 设备状态，设备条件直接读取此快照
+        self.device_states: Dict[tuple, dict] = {}
+
+        self.stats = {
+            "events": 0,
+            "evaluations": 0,
+            "fired": 0,
+            "fire_errors": 0,
+            "last_event_us": 0.0,
+        }
+
+    def load(self, db: Session):
+        """启动时加载全部启用的规则和设备状态"""
+        with self.lock:
+            self.rules.clear()
+            self.index.clear()
+            self.device_states.clear()
+            for house_id, device_id, status in db.query(Device.house_id, Device.device_id, Device.status):
+                self.device_states[(house_id, device_id)] = dict(status or {})
+            for automation in db.query(Automation).filter(Automation.is_active == True):
+                self.add_rule(automation)
+
+        print(f"INFO:\t ✅ 自动化规则已编译: {len(self.rules)} 条")
+
+    def compile_rule(self, automation: Automation) -> Optional[CompiledRule]:
+        """编译一条规则，停用的规则返回 None"""
+        return CompiledRule(automation, self.device_states) if automation.is_active else None
+
+    def add_rule(self, automation: Automation):
+        """编译并索引一条规则（已存在则替换）"""
+        self.install_rule(automation.id, self.compile_rule(automation))
+
+    def install_rule(self, automation_id: int, rule: Optional[CompiledRule]):
+        """用编译好的规则替换已有规则（rule 为 None 时只移除），初始结果只记录不触发"""
+        with self.lock:
+            self.remove_rule(automation_id)
+            if rule is None:
+                return
+            rule.last_result = rule.predicate()
+            self.rules[rule.id] = rule
+            for key in rule.keys:
+                self.index[key].add(rule.id)
+            self._schedule_time(rule)
+
+    def remove_rule(self, automation_id: int):
+        with self.lock:
+            rule = self.rules.pop(automation_id, None)
+            if rule is None:
+                return
+            if rule.time_triggers:
+                timer_scheduler.cancel(("automation", automation_id))
+            for key in rule.keys:
+                rule_ids = self.index.get(key)
+                if rule_ids is not None:
+                    rule_ids.discard(automation_id)
+                    if not rule_ids:
+                        del self.index[key]
+
+    def evaluate(self, automation: Automation) -> bool:
+        """立即计算一条规则当前是否满足（未加载的规则临时编译）"""
+        rule = self.rules.get(automation.id)
+        if rule is None:
+            rule = CompiledRule(automation, self.device_states)
+        return rule.predicate()
+
+    def on_readings(self, readings: Iterable):
+        """传感器读数写入并更新最新值缓存后调用"""
+        keys = set()
+        for reading in readings:
+            for metric in METRICS:
+                if getattr(reading, metric) is not None:
+                    keys.add(("sensor", (reading.house_id, reading.device_id, metric)))
+                    keys.add(("sensor", (reading.house_id, None, metric)))
+        self._dispatch(keys)
+
+    def on_rule_changes(self, changes: Dict[int, Optional[CompiledRule]]):
+        """规则提交后调用，changes 为 automation_id -> 编译后的规则（删除或停用时为 None）"""
+        for automation_id, rule in changes.items():
+            self.install_rule(automation_id, rule)
+
+    def on_device_changes(self, changes: Dict[tuple, dict]):
+        """设备状态提交后调用，changes 为 (house_id, device_id) -> 新状态"""
+        with self.lock:
+            self.device_states.update(changes)
+        self._dispatch({("device", key) for key in changes})
+
+    def _schedule_time(self, rule: CompiledRule):
+        """把含时间条件的规则登记到定时调度器，在下一个可能变化的时刻重新计算"""
+        if rule.time_triggers:
+            timer_scheduler.schedule(
+                ("automation", rule.id),
+                next_time_boundary(rule.time_triggers, datetime.now()),
+                lambda: self.on_time(rule.id)
+            )
+
+    def on_time(self, rule_id: int):
+        """定时调度器回调：重新计算规则并登记下一个时刻"""
+        with self.lock:
+            rule = self.rules.get(rule_id)
+            if rule is None:
+                return
+            fired = self._evaluate_rules([rule_id])
+            self._schedule_time(rule)
+        for rule in fired:
+            self._schedule_fire(rule)
+
+    def _dispatch(self, keys: Set[tuple]):
+        """按索引找出受影响的规则并重新计算"""
+        start = time.perf_counter()
+        with self.lock:
+            rule_ids = set()
+            for key in keys:
+                rule_ids.update(self.index.get(key, ()))
+            fired = self._evaluate_rules(rule_ids)
+        self.stats["events"] += 1
+        self.stats["last_event_us"] = round((time.perf_counter() - start) * 1e6, 1)
+        for rule in fired:
+            self._schedule_fire(rule)
+
+    def _evaluate_rules(self, rule_ids: Iterable[int]) -> List[CompiledRule]:
+        """重新计算规则（调用方持有锁），返回由假变真的规则"""
+        fired = []
+        for rule_id in rule_ids:
+            rule = self.rules.get(rule_id)
+            if rule is None:
+                continue
+            result = rule.predicate()
+            self.stats["evaluations"] += 1
+            if result and not rule.last_result:
+                fired.append(rule)
+            rule.last_result = result
+        return fired
+
+    def _schedule_fire(self, rule: CompiledRule):
+        """在事件循环中执行规则动作（可能从写入线程调用）"""
+        if self.loop is None or self.loop.is_closed():
+            print(f"Automation triggered but engine not started: {rule.name}")
+            return
+        asyncio.run_coroutine_threadsafe(self._fire(rule), self.loop)
+
+    async def _fire(self, rule: CompiledRule):
+        from app.database import run_write
+        from app.services.scene_service import SceneService
+
+        print(f"Automation triggered: {rule.name}")
+        try:
+            applied, failed_actions = await run_write(
+                lambda session: SceneService(session).apply_actions(rule.actions, rule.house_id)
+            )
+            failed_actions += await SceneService.dispatch_actions(applied)
+            self.stats["fired"] += 1
+            if failed_actions:
+                print(f"Automation {rule.name}: {len(failed_actions)} actions failed")
+        except Exception as e:
+            self.stats["fire_errors"] += 1
+            print(f"Automation error: {rule.name}: {e}")
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {
+                **self.stats,
+                "rules": len(self.rules),
+                "index_keys": len(self.index),
+                "time_rules": sum(1 for rule in self.rules.values() if rule.time_triggers),
+                "timers": timer_scheduler.get_stats()
+            }
+
+    def start(self):
+        """绑定当前事件循环（在应用启动时调用）"""
+        self.loop = asyncio.get_running_loop()
+
+    def stop(self):
+        self.loop = None
+
+
+# 全局自动化引擎实例
+automation_engine = AutomationEngine()
+
+
+def _track_rule(target, rule: Optional[CompiledRule]):
+    # flush 时对象属性仍可读取，先编译好记录在会话上，提交成功后再替换引擎中的规则
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("automation_rules", {})[target.id] = rule
+
+
+@event.listens_for(Automation, "after_insert")
+@event.listens_for(Automation, "after_update")
+def _track_rule_change(mapper, connection, target):
+    # 规则新增或修改后重新编译
+    _track_rule(target, automation_engine.compile_rule(target))
+
+
+@event.listens_for(Automation, "after_delete")
+def _track_rule_delete(mapper, connection, target):
+    _track_rule(target, None)
+
+
+@event.listens_for(Device, "after_insert")
+@event.listens_for(Device, "after_update")
+def _track_device_change(mapper, connection, target):
+    # 记录在会话上，提交成功后再通知引擎
+    session = object_session(target)
+    if session is not None:
+        changes = session.info.setdefault("automation_devices", {})
+        changes[(target.house_id, target.device_id)] = dict(target.status or {})
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _publish_changes(session):
+    rules = session.info.pop("automation_rules", None)
+    if rules:
+        automation_engine.on_rule_changes(rules)
+    changes = session.info.pop("automation_devices", None)
+    if changes:
+        automation_engine.on_device_changes(changes)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("automation_rules", None)
+    session.info.pop("automation_devices", None)
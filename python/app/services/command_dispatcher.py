@@ -0,0 +1,191 @@
+import asyncio
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import paho.mqtt.client as mqtt
+
+from app.config import settings
+from app.services.mqtt_service import mqtt_service
+
+# hi3861 控制帧模板：模块帧首位为0，设备帧首位为2（帧类型标识），其余位为各路开关
+MODULE_FRAME_BASE = (0, 0, 0, 1, 0, 1, 0, 0)
+DEVICE_FRAME_BASE = (2, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+
+
+def build_frame(base: tuple, bits: Dict[int, int]) -> str:
+    """在模板上叠加开关位，首位始终保留为帧类型"""
+    frame = list(base)
+    for index, value in bits.items():
+        if 0 < index < len(frame):
+            frame[index] = value
+    return "".join(map(str, frame))
+
+
+def device_bits_for(device, power) -> Optional[Tuple[Dict[int, int], Dict[int, int]]]:
+    """根据设备的模块位/设备位和目标开关状态生成叠加位，未配置硬件位的设备返回None"""
+    if device.module is None or device.device is None:
+        return None
+    value = 1 if power else 0
+    return {device.module: value}, {device.device: value}
+
+
+class _BoardQueue:
+    """单块开发板的待发送指令"""
+
+    def __init__(self):
+        # (模块位, 设备位, Future, 提交时间)
+        self.pending: List[tuple] = []
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+
+class DeviceCommandDispatcher:
+    """
+    异步设备指令下发：每块开发板一个发送队列，模块帧与设备帧之间用 asyncio.sleep 间隔，
+    不阻塞事件循环；发送间隔内到达的多条指令合并为一组最终帧。
+    """
+
+    def __init__(self):
+        self.default_topic = settings.MQTT_COMMAND_TOPIC
+        self.frame_interval = settings.MQTT_FRAME_INTERVAL
+        self.qos = settings.MQTT_COMMAND_QOS
+        self.ack_timeout = settings.MQTT_ACK_TIMEOUT
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.boards: Dict[str, _BoardQueue] = {}
+        # publish 可能在调用线程内同步触发 on_publish，使用可重入锁
+        self.publish_lock = threading.RLock()
+        self.inflight: Dict[int, asyncio.Future] = {}
+
+        self.stats = {
+            "submitted": 0,
+            "frames_sent": 0,
+            "coalesced": 0,
+            "failed": 0,
+            "last_latency_ms": 0.0,
+        }
+
+    def submit(self, module_bits: Dict[int, int], device_bits: Dict[int, int],
+               topic: Optional[str] = None) -> asyncio.Future:
+        """提交一条指令（在事件循环中调用），返回在帧发送完成后得到结果的 Future"""
+        loop = asyncio.get_running_loop()
+        if self.loop is None:
+            self.loop = loop
+        future = loop.create_future()
+        self.stats["submitted"] += 1
+
+        if not mqtt_service.connected:
+            self.stats["failed"] += 1
+            future.set_result({"success": False, "error": "MQTT not connected", "coalesced": 1})
+            return future
+
+        topic = topic or self.default_topic
+        board = self.boards.get(topic)
+        if board is None:
+            board = self.boards[topic] = _BoardQueue()
+        if board.task is None or board.task.done():
+            board.task = loop.create_task(self._board_worker(topic, board))
+
+        board.pending.append((module_bits, device_bits, future, time.perf_counter()))
+        board.wakeup.set()
+        return future
+
+    async def send(self, module_bits: Dict[int, int], device_bits: Dict[int, int],
+                   topic: Optional[str] = None) -> dict:
+        """提交指令并等待发送确认，超时返回失败结果"""
+        future = self.submit(module_bits, device_bits, topic)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.ack_timeout + self.frame_interval)
+        except asyncio.TimeoutError:
+            return {"success": False, "error": "ack timeout", "coalesced": 1}
+
+    async def _board_worker(self, topic: str, board: _BoardQueue):
+        """发送循环：取出当前全部待发送指令，合并后依次发送模块帧和设备帧"""
+        while True:
+            await board.wakeup.wait()
+            board.wakeup.clear()
+            if not board.pending:
+                continue
+
+            batch, board.pending = board.pending, []
+            module_bits: Dict[int, int] = {}
+            device_bits: Dict[int, int] = {}
+            for module_update, device_update, _, _ in batch:
+                module_bits.update(module_update)
+                device_bits.update(device_update)
+
+            module_frame = build_frame(MODULE_FRAME_BASE, module_bits)
+            device_frame = build_frame(DEVICE_FRAME_BASE, device_bits)
+            result = {"success": True, "topic": topic, "module_frame": module_frame,
+                      "device_frame": device_frame, "coalesced": len(batch)}
+            try:
+                await self._publish(topic, module_frame)
+                print(f"Control module sent: {module_frame}")
+                await asyncio.sleep(self.frame_interval)
+                await self._publish(topic, device_frame)
+                print(f"Control device sent: {device_frame}")
+                self.stats["frames_sent"] += 2
+                self.stats["coalesced"] += len(batch) - 1
+            except Exception as e:
+                print(f"Control send error: {e}")
+                self.stats["failed"] += len(batch)
+                result = {**result, "success": False, "error": str(e)}
+
+            now = time.perf_counter()
+            for _, _, future, submitted_at in batch:
+                if not future.done():
+                    future.set_result({**result, "latency_ms": round((now - submitted_at) * 1000, 1)})
+            self.stats["last_latency_ms"] = round((now - batch[0][3]) * 1000, 1)
+
+    async def _publish(self, topic: str, payload: str):
+        """发布一帧并等待 on_publish 确认"""
+        future = self.loop.create_future()
+        with self.publish_lock:
+            info = mqtt_service.client.publish(topic, payload, qos=self.qos)
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                raise RuntimeError(f"publish failed: {info.rc}")
+            if info.is_published():
+                future.set_result(True)
+            else:
+                self.inflight[info.mid] = future
+
+        try:
+            await asyncio.wait_for(future, self.ack_timeout)
+        finally:
+            with self.publish_lock:
+                self.inflight.pop(info.mid, None)
+
+    def on_publish(self, client, userdata, mid):
+        """MQTT网络线程回调：消息已发出（QoS>0 时为已收到broker确认）"""
+        with self.publish_lock:
+            future = self.inflight.pop(mid, None)
+        if future is not None and self.loop is not None:
+            self.loop.call_soon_threadsafe(lambda: future.done() or future.set_result(True))
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "pending": {topic: len(board.pending) for topic, board in self.boards.items()},
+            "inflight": len(self.inflight),
+        }
+
+    def start(self):
+        """绑定当前事件循环并接管MQTT发布回调（在应用启动时调用）"""
+        self.loop = asyncio.get_running_loop()
+        mqtt_service.client.on_publish = self.on_publish
+
+    async def stop(self):
+        """停止各开发板的发送循环，未发送的指令返回失败结果"""
+        for board in self.boards.values():
+            if board.task:
+                board.task.cancel()
+            for _, _, future, _ in board.pending:
+                if not future.done():
+                    future.set_result({"success": False, "error": "dispatcher stopped", "coalesced": 1})
+            board.pending = []
+        self.boards.clear()
+
+
+# 全局设备指令下发实例
+command_dispatcher = DeviceCommandDispatcher()
@@ -0,0 +1,143 @@
+import threading
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import object_session
+
+from app.database import RoutingSession
+from app.models.device import Device, Room
+from app.models.scene import Scene
+from app.models.sensor_data import AlertLog
+
+# 提示词上下文中使用的传感器设备
+CONTEXT_SENSORS = ("sensor_living_env", "sensor_kitchen_safety")
+# 设备清单（不含状态）相关的字段，修改时递增 inventory 版本
+INVENTORY_FIELDS = ("name", "device_type", "room_id", "house_id")
+
+
+class PromptContextCache:
+    """
+    AI 提示词上下文缓存：按 (house_id, 类别) 保存已序列化的 JSON 片段及其版本号。
+    设备、场景、传感器、警报的写入方在提交后递增对应版本，
+    读取时版本未变即直接使用缓存片段，安静的家庭重复对话不访问数据库。
+    """
+
+    # inventory 只记录设备增删、改名、换房间，不随设备状态变化
+    KINDS = ("devices", "inventory", "scenes", "sensors", "alerts")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (house_id, 类别) -> 版本号
+        self.versions: Dict[Tuple[int, str], int] = {}
+        # (house_id, 类别) -> (构建时的版本号, 片段)
+        self.fragments: Dict[Tuple[int, str], Tuple[int, Any]] = {}
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "bumps": 0,
+        }
+
+    def bump(self, kind: str, house_ids: Iterable[int]):
+        """写入提交后递增这些家庭该类别的版本"""
+        with self.lock:
+            for house_id in set(house_ids):
+                key = (house_id, kind)
+                self.versions[key] = self.versions.get(key, 0) + 1
+                self.stats["bumps"] += 1
+
+    def on_readings(self, readings: Iterable):
+        """新读数写入最新读数缓存后调用，只有上下文用到的传感器才使版本失效"""
+        houses = {reading.house_id for reading in readings if reading.device_id in CONTEXT_SENSORS}
+        if houses:
+            self.bump("sensors", houses)
+
+    def version(self, house_id: int, kind: str) -> int:
+        with self.lock:
+            return self.versions.get((house_id, kind), 0)
+
+    def get(self, house_id: int, kind: str, build: Callable[[], Any]) -> Any:
+        """版本未变时返回缓存片段，否则调用 build 重新构建"""
+        key = (house_id, kind)
+        with self.lock:
+            version = self.versions.get(key, 0)
+            entry = self.fragments.get(key)
+            if entry is not None and entry[0] == version:
+                self.stats["hits"] += 1
+                return entry[1]
+            self.stats["misses"] += 1
+
+        # 构建期间若版本被递增，存入的旧版本号会让下次读取重新构建
+        value = build()
+        with self.lock:
+            self.fragments[key] = (version, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.fragments.clear()
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            total = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round(self.stats["hits"] / total, 3) if total else None,
+                "fragments": len(self.fragments),
+            }
+
+
+# 全局提示词上下文缓存实例
+context_cache = PromptContextCache()
+
+
+def _track(target, kind: str):
+    # 记录在会话上，提交成功后再递增版本；house_id 被修改时新旧家庭都失效
+    session = object_session(target)
+    if session is None:
+        return
+    houses = session.info.setdefault("context_changes", {}).setdefault(kind, set())
+    houses.add(target.house_id)
+    houses.update(inspect(target).attrs.house_id.history.deleted or ())
+
+
+@event.listens_for(Device, "after_insert")
+@event.listens_for(Device, "after_delete")
+@event.listens_for(Room, "after_update")
+@event.listens_for(Room, "after_delete")
+def _track_inventory_change(mapper, connection, target):
+    # 房间改名会改变设备列表中的 room_name
+    _track(target, "devices")
+    _track(target, "inventory")
+
+
+@event.listens_for(Device, "after_update")
+def _track_device_change(mapper, connection, target):
+    _track(target, "devices")
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in INVENTORY_FIELDS):
+        _track(target, "inventory")
+
+
+@event.listens_for(Scene, "after_insert")
+@event.listens_for(Scene, "after_update")
+@event.listens_for(Scene, "after_delete")
+def _track_scene_change(mapper, connection, target):
+    _track(target, "scenes")
+
+
+@event.listens_for(AlertLog, "after_insert")
+@event.listens_for(AlertLog, "after_update")
+@event.listens_for(AlertLog, "after_delete")
+def _track_alert_change(mapper, connection, target):
+    _track(target, "alerts")
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _publish_context_changes(session):
+    for kind, houses in session.info.pop("context_changes", {}).items():
+        context_cache.bump(kind, houses)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _discard_context_changes(session):
+    session.info.pop("context_changes", None)
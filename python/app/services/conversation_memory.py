@@ -0,0 +1,271 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.conversation import ConversationMessage, ConversationSession
+
+logger = logging.getLogger(__name__)
+
+# 每条消息角色、分隔符等的固定开销
+MESSAGE_OVERHEAD_TOKENS = 4
+# 折叠进摘要时每条消息保留的字数
+SUMMARY_LINE_CHARS = 40
+ROLE_NAMES = {"user": "用户", "assistant": "助手"}
+
+
+def estimate_tokens(text: str) -> int:
+    """估算 token 数：中日韩文字每字约一个 token，其他字符约四个一个"""
+    wide = sum(1 for ch in text if ord(ch) >= 0x2E80)
+    return wide + (len(text) - wide + 3) // 4 + MESSAGE_OVERHEAD_TOKENS
+
+
+class MemorySession:
+    """一个用户一个会话的对话记忆：近期消息的环形缓冲 + 较早消息的摘要行"""
+
+    __slots__ = ("key", "turns", "tokens", "summary", "summary_tokens", "total", "prompt_json")
+
+    def __init__(self, key: Tuple[int, str]):
+        self.key = key
+        # (消息ID, 角色, 内容, token 数)，持久化失败时消息ID为 None
+        self.turns: deque = deque()
+        self.tokens = 0
+        self.summary: deque = deque()
+        self.summary_tokens = 0
+        self.total = 0
+        # 提示词中的对话历史 JSON，追加消息后重新生成
+        self.prompt_json: Optional[str] = None
+
+    def add_summary_line(self, line: str):
+        self.summary.append(line)
+        self.summary_tokens += estimate_tokens(line)
+
+
+class ConversationMemory:
+    """
+    按 (user_id, session_id) 隔离的 AI 对话记忆。近期消息按 token 预算保存在环形缓冲中，
+    超出预算的最早消息逐条折叠为摘要行（摘要本身也有 token 上限），提示词只带摘要和近期消息。
+    消息和摘要写入 SQLite，重启后首次访问会话时载入；内存中的会话数超过上限时淘汰最久未用的。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.token_budget = settings.AI_MEMORY_TOKEN_BUDGET
+        self.summary_budget = settings.AI_MEMORY_SUMMARY_TOKENS
+        self.max_messages = settings.AI_MEMORY_MAX_MESSAGES
+        self.max_sessions = settings.AI_MEMORY_MAX_SESSIONS
+
+        self.sessions: "OrderedDict[Tuple[int, str], MemorySession]" = OrderedDict()
+        # user_id -> 内存中的会话ID，清空某个用户全部会话时使用
+        self.user_sessions: Dict[int, Set[str]] = {}
+
+        self.stats = {
+            "appends": 0,
+            "summarized": 0,
+            "loads": 0,
+            "evicted_sessions": 0,
+            "persist_errors": 0,
+        }
+
+    def _load(self, key: Tuple[int, str]) -> MemorySession:
+        user_id, session_id = key
+        session = MemorySession(key)
+        db = SessionLocal()
+        try:
+            row = db.get(ConversationSession, (user_id, session_id))
+            if row is not None:
+                for line in row.summary.splitlines():
+                    session.add_summary_line(line)
+                session.total = row.total_messages
+            messages = db.query(
+                ConversationMessage.id, ConversationMessage.role,
+                ConversationMessage.content, ConversationMessage.tokens
+            ).filter(
+                ConversationMessage.user_id == user_id,
+                ConversationMessage.session_id == session_id
+            ).order_by(ConversationMessage.id).all()
+            for message in messages:
+                session.turns.append(tuple(message))
+                session.tokens += message.tokens
+        finally:
+            db.close()
+        self.stats["loads"] += 1
+        return session
+
+    def _session(self, user_id: int, session_id: str) -> MemorySession:
+        key = (user_id, session_id)
+        with self.lock:
+            session = self.sessions.get(key)
+            if session is not None:
+                self.sessions.move_to_end(key)
+                return session
+
+        session = self._load(key)
+        with self.lock:
+            session = self.sessions.setdefault(key, session)
+            self.sessions.move_to_end(key)
+            self.user_sessions.setdefault(user_id, set()).add(session_id)
+            while len(self.sessions) > self.max_sessions:
+                (old_user, old_session), _ = self.sessions.popitem(last=False)
+                self._forget(old_user, old_session)
+                self.stats["evicted_sessions"] += 1
+        return session
+
+    def _forget(self, user_id: int, session_id: str):
+        """从用户索引中移除会话（调用方持有锁）"""
+        sessions = self.user_sessions.get(user_id)
+        if sessions is not None:
+            sessions.discard(session_id)
+            if not sessions:
+                del self.user_sessions[user_id]
+
+    def _fold(self, session: MemorySession) -> List[int]:
+        """把超出预算的最早消息折叠为摘要行，返回被折叠消息的ID（调用方持有锁）"""
+        folded = []
+        while session.turns and (len(session.turns) > self.max_messages or
+                                 (session.tokens > self.token_budget and len(session.turns) > 1)):
+            message_id, role, content, tokens = session.turns.popleft()
+            session.tokens -= tokens
+            text = " ".join(content.split())
+            if len(text) > SUMMARY_LINE_CHARS:
+                text = text[:SUMMARY_LINE_CHARS] + "…"
+            session.add_summary_line(f"{ROLE_NAMES.get(role, role)}：{text}")
+            while session.summary_tokens > self.summary_budget and len(session.summary) > 1:
+                session.summary_tokens -= estimate_tokens(session.summary.popleft())
+            if message_id is not None:
+                folded.append(message_id)
+            self.stats["summarized"] += 1
+        return folded
+
+    def append(self, user_id: int, session_id: str, role: str, content: str):
+        """追加一条消息并写入数据库"""
+        session = self._session(user_id, session_id)
+        tokens = estimate_tokens(content)
+
+        db = SessionLocal()
+        try:
+            message = ConversationMessage(user_id=user_id, session_id=session_id, role=role,
+                                          content=content, tokens=tokens)
+            db.add(message)
+            db.flush()
+            message_id = message.id
+        except Exception as e:
+            db.rollback()
+            db.close()
+            db = None
+            message_id = None
+            self.stats["persist_errors"] += 1
+            logger.warning(f"对话消息写入失败: {e}")
+
+        with self.lock:
+            session.turns.append((message_id, role, content, tokens))
+            session.tokens += tokens
+            session.total += 1
+            session.prompt_json = None
+            folded = self._fold(session)
+            summary = "\n".join(session.summary)
+            total = session.total
+            self.stats["appends"] += 1
+
+        if db is None:
+            return
+        try:
+            if folded:
+                db.query(ConversationMessage).filter(
+                    ConversationMessage.id.in_(folded)
+                ).delete(synchronize_session=False)
+            row = db.get(ConversationSession, (user_id, session_id))
+            if row is None:
+                row = ConversationSession(user_id=user_id, session_id=session_id)
+                db.add(row)
+            row.summary = summary
+            row.total_messages = total
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self.stats["persist_errors"] += 1
+            logger.warning(f"对话记忆写入失败: {e}")
+        finally:
+            db.close()
+
+    async def append_async(self, user_id: int, session_id: str, role: str, content: str):
+        """在线程池中追加消息：等待写连接和写事务都不占用事件循环（async 代码中使用）"""
+        await asyncio.to_thread(self.append, user_id, session_id, role, content)
+
+    async def _ensure_loaded(self, user_id: int, session_id: str):
+        """未在内存中的会话在线程池中从数据库载入，已载入的会话不切换线程"""
+        with self.lock:
+            if (user_id, session_id) in self.sessions:
+                return
+        await asyncio.to_thread(self._session, user_id, session_id)
+
+    async def history_async(self, user_id: int, session_id: str, limit: int = 10) -> Dict:
+        """history 的异步版本：载入冷会话不占用事件循环（async 代码中使用）"""
+        await self._ensure_loaded(user_id, session_id)
+        return self.history(user_id, session_id, limit)
+
+    async def prompt_json_async(self, user_id: int, session_id: str) -> str:
+        """prompt_json 的异步版本：载入冷会话不占用事件循环（async 代码中使用）"""
+        await self._ensure_loaded(user_id, session_id)
+        return self.prompt_json(user_id, session_id)
+
+    def history(self, user_id: int, session_id: str, limit: int = 10) -> Dict:
+        """最近 limit 条消息、摘要和消息总数"""
+        session = self._session(user_id, session_id)
+        with self.lock:
+            count = min(max(limit, 0), len(session.turns))
+            recent = list(islice(reversed(session.turns), count))
+            return {
+                "messages": [{"role": role, "content": content} for _, role, content, _ in reversed(recent)],
+                "summary": "\n".join(session.summary),
+                "total_messages": session.total,
+                "tokens": session.tokens,
+            }
+
+    def prompt_json(self, user_id: int, session_id: str) -> str:
+        """提示词中的对话历史（摘要 + 近期消息），在下一次追加消息前复用同一份 JSON"""
+        session = self._session(user_id, session_id)
+        with self.lock:
+            if session.prompt_json is None:
+                history = []
+                if session.summary:
+                    history.append({"role": "system", "content": "较早的对话摘要：\n" + "\n".join(session.summary)})
+                history.extend({"role": role, "content": content} for _, role, content, _ in session.turns)
+                session.prompt_json = json.dumps(history, ensure_ascii=False)
+            return session.prompt_json
+
+    def clear(self, user_id: int, session_id: Optional[str] = None):
+        """清空用户某个会话（session_id 为空时清空全部会话）的记忆"""
+        with self.lock:
+            session_ids = [session_id] if session_id is not None else list(self.user_sessions.get(user_id, ()))
+            for sid in session_ids:
+                if self.sessions.pop((user_id, sid), None) is not None:
+                    self._forget(user_id, sid)
+
+        db = SessionLocal()
+        try:
+            for model in (ConversationMessage, ConversationSession):
+                query = db.query(model).filter(model.user_id == user_id)
+                if session_id is not None:
+                    query = query.filter(model.session_id == session_id)
+                query.delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {
+                **self.stats,
+                "sessions": len(self.sessions),
+                "token_budget": self.token_budget,
+            }
+
+
+# 全局对话记忆实例
+conversation_memory = ConversationMemory()
@@ -0,0 +1,307 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import insert
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.sensor_data import SensorData, AlertLog
+from app.services.alert_stream import alert_stream, alert_message
+from app.services.automation_engine import automation_engine
+from app.services.context_cache import context_cache
+from app.services.rollup_service import rollup_service
+from app.services.sensor_cache import latest_cache
+from app.services.sensor_decoders import SensorReading
+
+
+def build_alerts(reading: SensorReading) -> List[dict]:
+    """根据一条传感器读数生成警报记录"""
+    alerts = []
+
+    # 火焰检测
+    if reading.flame_detected:
+        alerts.append({"alert_type": "fire", "severity": "high", "message": "Fire detected"})
+
+    # 可燃气体检测
+    if reading.gas_level and reading.gas_level > 300:
+        alerts.append({"alert_type": "gas", "severity": "high", "message": f"可燃气体检测超标: {reading.gas_level}pp"})
+
+    # 温度异常
+    if reading.temperature and reading.temperature > 35:
+        alerts.append({"alert_type": "temp", "severity": "medium", "message": f"室内温度过高: {reading.temperature}°C"})
+
+    # 人体检测
+    if reading.human_detected and reading.human_detected > 1000:
+        alerts.append({"alert_type": "human", "severity": "medium", "message": "有人经过，请注意！"})
+
+    for alert in alerts:
+        alert["device_id"] = reading.device_id
+        alert["house_id"] = reading.house_id
+        alert["created_at"] = reading.timestamp
+    return alerts
+
+
+class SensorIngestService:
+    """传感器数据写入管道：MQTT回调只负责入队，后台线程按数量或时间批量落库"""
+
+    def __init__(self):
+        self.max_queue = settings.INGEST_QUEUE_SIZE
+        self.batch_size = settings.INGEST_BATCH_SIZE
+        self.flush_interval = settings.INGEST_FLUSH_INTERVAL
+        self.overflow_policy = settings.INGEST_OVERFLOW_POLICY
+        self.spill_path = settings.INGEST_SPILL_PATH
+
+        self.queue = deque()
+        self.cond = threading.Condition()
+        # 溢出文件的追加与改名互斥，与队列锁分开
+        self.spill_lock = threading.Lock()
+        # 有待补写的溢出文件（启动时检查上次遗留的文件）
+        self.spill_pending = False
+        self.running = False
+        self.writer_thread = None
+
+        # 背压统计
+        self.stats = {
+            "enqueued": 0,
+            "written": 0,
+            "alerts_written": 0,
+            "rollup_rows": 0,
+            "dropped": 0,
+            "spilled": 0,
+            "spill_restored": 0,
+            "failed": 0,
+            "batches": 0,
+            "max_queue_depth": 0,
+            "last_batch_size": 0,
+            "last_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    def submit(self, reading: SensorReading) -> bool:
+        """读数入队（在MQTT网络线程中调用，不访问数据库）"""
+        spill = None
+        with self.cond:
+            if len(self.queue) >= self.max_queue:
+                spill = self._handle_overflow()
+
+            self.queue.append(reading)
+            self.stats["enqueued"] += 1
+            depth = len(self.queue)
+            if depth > self.stats["max_queue_depth"]:
+                self.stats["max_queue_depth"] = depth
+            if depth >= self.batch_size:
+                self.cond.notify()
+
+        # 溢出文件在释放队列锁之后写入，不阻塞写入线程取批
+        if spill:
+            self._spill(spill)
+        return True
+
+    def _handle_overflow(self) -> List[SensorReading]:
+        """队列已满：丢弃最旧的读数，或取出最旧的一批返回给调用方写入溢出文件（调用方持有队列锁）"""
+        if self.overflow_policy == "spill":
+            count = min(self.batch_size, len(self.queue))
+            return [self.queue.popleft() for _ in range(count)]
+
+        self.queue.popleft()
+        self.stats["dropped"] += 1
+        return []
+
+    def _spill(self, readings: List[SensorReading]):
+        """追加写入溢出文件；写入失败时按丢弃计数"""
+        with self.spill_lock:
+            try:
+                spill_dir = os.path.dirname(self.spill_path)
+                if spill_dir:
+                    os.makedirs(spill_dir, exist_ok=True)
+                with open(self.spill_path, "a", encoding="utf-8") as f:
+                    for reading in readings:
+                        record = reading._asdict()
+                        record["timestamp"] = record["timestamp"].isoformat()
+                        f.write(json.dumps(record, ensure_ascii=False))
+                        f.write("\n")
+            except OSError as e:
+                print(f"Ingest spill error: {e}")
+                self.stats["dropped"] += len(readings)
+                return
+            self.stats["spilled"] += len(readings)
+            self.spill_pending = True
+
+    def _draining_files(self) -> List[str]:
+        """待补写的溢出文件（按改名先后），包括上次中途退出时未补写完的文件"""
+        spill_dir = os.path.dirname(self.spill_path) or "."
+        prefix = os.path.basename(self.spill_path) + "."
+        try:
+            names = os.listdir(spill_dir)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            os.path.join(spill_dir, name) for name in names
+            if name.startswith(prefix) and name.endswith(".draining")
+        )
+
+    def _restore_spilled(self):
+        """队列空闲时将溢出文件中的读数分批补写入库"""
+        with self.spill_lock:
+            self.spill_pending = False
+            if os.path.exists(self.spill_path):
+                # 每次改名使用新文件名，不会覆盖尚未补写完的文件
+                os.replace(self.spill_path, f"{self.spill_path}.{time.time_ns()}.draining")
+            draining_paths = self._draining_files()
+
+        for draining_path in draining_paths:
+            if not self._restore_file(draining_path):
+                # 写库失败（如数据库不可用）：保留剩余文件，下次空闲时重试
+                with self.spill_lock:
+                    self.spill_pending = True
+                return
+
+    def _restore_file(self, draining_path: str) -> bool:
+        """补写一个溢出文件，完成后删除；某一批写入失败时文件只保留尚未写入的读数，返回是否全部写入"""
+        with open(draining_path, "r", encoding="utf-8") as f:
+            batch, lines = [], []
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                record["timestamp"] = datetime.fromisoformat(record["timestamp"])
+                batch.append(SensorReading(**record))
+                lines.append(line if line.endswith("\n") else line + "\n")
+                if len(batch) >= self.batch_size:
+                    if not self._flush(batch):
+                        self._keep_unwritten(draining_path, lines + list(f))
+                        return False
+                    self.stats["spill_restored"] += len(batch)
+                    batch, lines = [], []
+        if batch:
+            if not self._flush(batch):
+                self._keep_unwritten(draining_path, lines)
+                return False
+            self.stats["spill_restored"] += len(batch)
+        os.remove(draining_path)
+        return True
+
+    @staticmethod
+    def _keep_unwritten(draining_path: str, lines: List[str]):
+        """用尚未写入的读数原子替换补写文件，已写入的批次不会重复补写"""
+        tmp_path = draining_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        os.replace(tmp_path, draining_path)
+
+    def _take_batch(self) -> List[SensorReading]:
+        """等待满一批或到达刷新间隔后取出一批读数"""
+        with self.cond:
+            if self.running and len(self.queue) < self.batch_size:
+                self.cond.wait(timeout=self.flush_interval)
+            count = min(self.batch_size, len(self.queue))
+            return [self.queue.popleft() for _ in range(count)]
+
+    def _flush(self, batch: List[SensorReading]) -> bool:
+        """单个事务内批量写入读数、警报及时间桶汇总，返回是否写入成功"""
+        start = time.perf_counter()
+        # 到写库时才把读数元组转换为数据库行
+        rows = [reading._asdict() for reading in batch]
+        alerts = [alert for reading in batch for alert in build_alerts(reading)]
+
+        db = SessionLocal()
+        try:
+            db.execute(insert(SensorData), rows)
+            if alerts:
+                # 取回警报ID作为推送游标
+                alert_ids = db.execute(
+                    insert(AlertLog).returning(AlertLog.id, sort_by_parameter_order=True), alerts
+                ).scalars().all()
+                # 提交时按提交顺序推送给订阅的客户端
+                alert_stream.publish_on_commit(db, [
+                    alert_message(alert_id, alert["house_id"], alert["device_id"], alert["alert_type"],
+                                  alert["message"], alert["severity"], alert["created_at"])
+                    for alert_id, alert in zip(alert_ids, alerts)
+                ])
+            rollup_rows = rollup_service.apply(db, batch)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self.stats["failed"] += len(batch)
+            print(f"Ingest flush error: {e}")
+            return False
+        finally:
+            db.close()
+
+        # 写库成功后同步更新最新读数缓存
+        latest_cache.update_many(batch)
+        context_cache.on_readings(batch)
+        if alerts:
+            # 批量插入不经过ORM事件，直接让这些家庭的警报上下文失效
+            context_cache.bump("alerts", (alert["house_id"] for alert in alerts))
+        # 只重新计算依赖这些读数的自动化规则
+        automation_engine.on_readings(batch)
+
+        for alert in alerts:
+            print(f"alert: {alert['message']}")
+
+        elapsed = (time.perf_counter() - start) * 1000
+        self.stats["written"] += len(batch)
+        self.stats["alerts_written"] += len(alerts)
+        self.stats["rollup_rows"] += rollup_rows
+        self.stats["batches"] += 1
+        self.stats["last_batch_size"] = len(batch)
+        self.stats["last_flush_ms"] = round(elapsed, 2)
+        self.stats["total_flush_ms"] += elapsed
+        return True
+
+    def _writer_loop(self):
+        """后台写入线程"""
+        while True:
+            batch = self._take_batch()
+            if batch:
+                self._flush(batch)
+            elif not self.running:
+                break
+            elif self.spill_pending:
+                self._restore_spilled()
+
+    def get_stats(self) -> Dict:
+        """获取写入管道统计信息"""
+        with self.cond:
+            depth = len(self.queue)
+        batches = self.stats["batches"]
+        return {
+            **{k: v for k, v in self.stats.items() if k != "total_flush_ms"},
+            "running": self.running,
+            "queue_depth": depth,
+            "queue_capacity": self.max_queue,
+            "queue_usage": round(depth / self.max_queue, 4) if self.max_queue else 0,
+            "avg_flush_ms": round(self.stats["total_flush_ms"] / batches, 2) if batches else 0,
+            "overflow_policy": self.overflow_policy,
+        }
+
+    def start(self):
+        """启动后台写入线程"""
+        if self.running:
+            return
+        self.running = True
+        self.spill_pending = os.path.exists(self.spill_path) or bool(self._draining_files())
+        self.writer_thread = threading.Thread(target=self._writer_loop, name="sensor-ingest", daemon=True)
+        self.writer_thread.start()
+        print("INFO:\t ✅ 传感器数据写入管道已启动")
+
+    def stop(self):
+        """停止写入线程，退出前写完队列中剩余的读数"""
+        if not self.running:
+            return
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        if self.writer_thread:
+            self.writer_thread.join()
+            self.writer_thread = None
+
+
+# 全局传感器写入服务实例
+ingest_service = SensorIngestService()
@@ -0,0 +1,240 @@
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.device import Device, Room
+from app.models.scene import Scene
+from app.services.context_cache import context_cache
+from app.services.response_cache import DEVICE_TYPE_WORDS, normalize_query
+
+# 动作词（长的在前，"打开"优先于"开"）
+ON_VERBS = ("打开", "开启", "启动", "开")
+OFF_VERBS = ("关闭", "关掉", "关上", "关")
+SCENE_VERBS = ("切换到", "切换成", "执行", "开启", "启动", "打开", "进入", "切到", "来个", "")
+# 出现这些字词说明是提问、否定或相对调节，交给大模型
+_UNCERTAIN_WORDS = ("吗", "么", "多少", "几", "是否", "没有", "状态", "不", "别", "没", "一点", "一些", "再", "?")
+_SET_VALUE = re.compile(r"^(?P<target>.+?)(?:调到|调成|调至|设置为|设置成|设置到|设为|设成|开到)(?P<value>\d{1,3})(?:摄氏度|度)?$")
+_TARGET_SEPARATORS = re.compile(r"和|跟|与|及|还有")
+
+# 数值设置：设备类型 -> (状态字段, 下限, 上限, 动作名, 回复模板)
+VALUE_SETTINGS = {
+    "light": ("brightness", 0, 100, "adjust_brightness", "好的，已将{name}的亮度调到{value}%。"),
+    "air": ("temperature", 16, 30, "adjust_temperature", "好的，已将{name}调到{value}度。"),
+}
+
+
+class _HouseIndex:
+    """一个家庭的设备别名和场景名索引"""
+
+    __slots__ = ("key", "aliases", "devices", "scenes")
+
+    def __init__(self, key: Tuple[int, int]):
+        self.key = key
+        # 归一化别名 -> 设备ID集合（同一别名对应多个设备即为有歧义）
+        self.aliases: Dict[str, Set[int]] = {}
+        # 设备ID -> (显示名称, 设备类型)
+        self.devices: Dict[int, Tuple[str, str]] = {}
+        # 归一化场景名 -> (场景ID, 场景名)
+        self.scenes: Dict[str, Tuple[int, str]] = {}
+
+    def add_alias(self, alias: str, device_id: int):
+        if alias:
+            self.aliases.setdefault(alias, set()).add(device_id)
+
+
+class IntentMatcher:
+    """
+    本地快速意图识别：在调用大模型之前，用设备名、房间名、场景名和动作词表
+    确定性地匹配"打开客厅灯""把卧室空调调到26度""开启电影模式"这类无歧义指令，
+    直接生成 _execute_llm_action 可执行的动作。提问、否定、相对调节、
+    名称有歧义等情况一律返回 None，交给大模型处理。
+    索引按家庭构建，设备清单或场景版本变化后重建。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.enabled = settings.AI_FAST_PATH
+        self.indexes: Dict[int, _HouseIndex] = {}
+
+        # 最近的大模型调用耗时（毫秒），用于估算快速通道节省的时间
+        self.llm_samples = deque(maxlen=200)
+        self.stats = {
+            "attempts": 0,
+            "hits": 0,
+            "fallbacks": 0,
+            "already_in_state": 0,
+            "index_builds": 0,
+            "match_ms_total": 0.0,
+            "saved_ms": 0.0,
+        }
+
+    @staticmethod
+    def context_key(house_id: int) -> Tuple[int, int]:
+        return context_cache.version(house_id, "inventory"), context_cache.version(house_id, "scenes")
+
+    def _build_index(self, db: Session, house_id: int, key: Tuple[int, int]) -> _HouseIndex:
+        index = _HouseIndex(key)
+        rows = db.query(
+            Device.id, Device.name, Device.device_type, Room.name
+        ).outerjoin(
+            Room, Room.id == Device.room_id
+        ).filter(
+            Device.house_id == house_id,
+            Device.device_type != "sensor"
+        ).all()
+
+        for device_id, name, device_type, room_name in rows:
+            device_name = normalize_query(name)
+            room = normalize_query(room_name) if room_name else ""
+            display = name if not room_name or name.startswith(room_name) else f"{room_name}{name}"
+            index.devices[device_id] = (display, device_type)
+
+            index.add_alias(device_name, device_id)
+            if room:
+                if device_name.startswith(room):
+                    # "客厅主灯" 也可以只说 "主灯"
+                    index.add_alias(device_name[len(room):], device_id)
+                else:
+                    index.add_alias(room + device_name, device_id)
+            for word in DEVICE_TYPE_WORDS.get(device_type, ()):
+                index.add_alias(word, device_id)
+                if room:
+                    index.add_alias(room + word, device_id)
+
+        for scene_id, name in db.query(Scene.id, Scene.name).filter(Scene.house_id == house_id).all():
+            index.scenes.setdefault(normalize_query(name), (scene_id, name))
+
+        self.stats["index_builds"] += 1
+        return index
+
+    def _index(self, db: Session, house_id: int) -> _HouseIndex:
+        key = self.context_key(house_id)
+        with self.lock:
+            index = self.indexes.get(house_id)
+        if index is None or index.key != key:
+            index = self._build_index(db, house_id, key)
+            with self.lock:
+                self.indexes[house_id] = index
+        return index
+
+    @staticmethod
+    def _resolve(index: _HouseIndex, target: str) -> Optional[List[int]]:
+        """把目标文字解析为设备ID列表，每个部分都必须唯一对应一个设备"""
+        if not target:
+            return None
+        ids = index.aliases.get(target)
+        if ids is not None:
+            return list(ids) if len(ids) == 1 else None
+
+        resolved = []
+        for part in _TARGET_SEPARATORS.split(target):
+            ids = index.aliases.get(part)
+            if ids is None or len(ids) != 1:
+                return None
+            resolved.extend(ids)
+        return list(dict.fromkeys(resolved))
+
+    def _match_scene(self, index: _HouseIndex, text: str) -> Optional[Dict]:
+        for verb in SCENE_VERBS:
+            if text.startswith(verb) and text[len(verb):] in index.scenes:
+                scene_id, name = index.scenes[text[len(verb):]]
+                return {"action": "execute_scene", "parameters": {
+                    "scene_id": scene_id, "response": f"好的，已为您执行{name}。"}}
+        return None
+
+    def _match_value(self, index: _HouseIndex, text: str) -> Optional[Tuple[List[int], Dict, str, str]]:
+        match = _SET_VALUE.match(text)
+        if not match:
+            return None
+        ids = self._resolve(index, match.group("target"))
+        if not ids or len(ids) != 1:
+            return None
+        setting = VALUE_SETTINGS.get(index.devices[ids[0]][1])
+        value = int(match.group("value"))
+        if setting is None or not setting[1] <= value <= setting[2]:
+            return None
+        field, _, _, action, reply = setting
+        status = {"power": value > 0, field: value}
+        return ids, status, action, reply.format(name=index.devices[ids[0]][0], value=value)
+
+    def _match_power(self, index: _HouseIndex, text: str) -> Optional[Tuple[List[int], Dict, str, str]]:
+        for verbs, power, action, verb_text in ((ON_VERBS, True, "turn_on", "打开"),
+                                                (OFF_VERBS, False, "turn_off", "关闭")):
+            for verb in verbs:
+                if text.startswith(verb):
+                    target = text[len(verb):]
+                elif text.endswith(verb):
+                    target = text[:-len(verb)]
+                else:
+                    continue
+                ids = self._resolve(index, target)
+                if ids:
+                    names = "、".join(index.devices[i][0] for i in ids)
+                    return ids, {"power": power}, action, f"好的，已为您{verb_text}{names}。"
+        return None
+
+    def _build_plan(self, db: Session, house_id: int, index: _HouseIndex,
+                    matched: Tuple[List[int], Dict, str, str]) -> Dict:
+        ids, status, action, reply = matched
+        current = dict(db.query(Device.id, Device.status).filter(
+            Device.house_id == house_id, Device.id.in_(ids)
+        ).all())
+        if all(all((current.get(i) or {}).get(k) == v for k, v in status.items()) for i in ids):
+            # 设备已经是目标状态，告知用户而不重复下发
+            self.stats["already_in_state"] += 1
+            names = "、".join(index.devices[i][0] for i in ids)
+            return {"action": "answer_user", "parameters": {"response": f"{names}已经是您要的状态了。"}}
+        return {"action": "control_device", "parameters": {
+            "devices": [{"device_id": i, "action": action, "status": dict(status)} for i in ids],
+            "response": reply}}
+
+    def match(self, db: Session, house_id: int, query: str) -> Optional[Dict]:
+        """返回可直接执行的动作；没有把握时返回 None"""
+        if not self.enabled:
+            return None
+        start = time.perf_counter()
+        self.stats["attempts"] += 1
+
+        plan = None
+        text = normalize_query(query)
+        if text and not any(word in query or word in text for word in _UNCERTAIN_WORDS + ("？",)):
+            index = self._index(db, house_id)
+            plan = self._match_scene(index, text)
+            if plan is None:
+                matched = self._match_value(index, text) or self._match_power(index, text)
+                if matched is not None:
+                    plan = self._build_plan(db, house_id, index, matched)
+
+        elapsed = (time.perf_counter() - start) * 1000
+        self.stats["match_ms_total"] += elapsed
+        if plan is None:
+            self.stats["fallbacks"] += 1
+            return None
+        self.stats["hits"] += 1
+        if self.llm_samples:
+            self.stats["saved_ms"] += max(sum(self.llm_samples) / len(self.llm_samples) - elapsed, 0.0)
+        return plan
+
+    def record_llm(self, elapsed_ms: float):
+        """记录一次大模型调用的耗时"""
+        self.llm_samples.append(elapsed_ms)
+
+    def get_stats(self) -> Dict:
+        attempts = self.stats["attempts"]
+        return {
+            **{k: v for k, v in self.stats.items() if k != "match_ms_total"},
+            "enabled": self.enabled,
+            "hit_rate": round(self.stats["hits"] / attempts, 3) if attempts else None,
+            "avg_match_ms": round(self.stats["match_ms_total"] / attempts, 3) if attempts else None,
+            "avg_llm_ms": round(sum(self.llm_samples) / len(self.llm_samples), 1) if self.llm_samples else None,
+            "saved_ms": round(self.stats["saved_ms"], 1),
+        }
+
+
+# 全局本地意图识别实例
+intent_matcher = IntentMatcher()
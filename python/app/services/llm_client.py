@@ -0,0 +1,232 @@
+import asyncio
+import json
+import logging
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LLMError(Exception):
+    """大模型调用失败（超时、服务端错误、并发已满或熔断中）"""
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败达到阈值后打开，冷却期内直接拒绝调用；
+    冷却结束后放行一个试探请求，成功则关闭，失败则重新打开
+    """
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.probing or time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+
+class LLMClient:
+    """
+    异步大模型客户端：通过 DashScope 的 OpenAI 兼容接口直接发起 HTTP 请求，
+    复用连接池，不阻塞事件循环。每次调用受 AI_TIMEOUT 限制，
+    并发数由信号量限制，连续失败触发熔断。AI_BASE_URL 可指向本地桩服务用于测试。
+    """
+
+    def __init__(self):
+        self.base_url = settings.AI_BASE_URL.rstrip("/")
+        self.model = settings.AI_MODEL
+        self.timeout = settings.AI_TIMEOUT
+        self.stream_timeout = settings.AI_STREAM_TIMEOUT
+        self.max_concurrency = settings.AI_MAX_CONCURRENCY
+        self.breaker = CircuitBreaker(settings.AI_BREAKER_FAILURES, settings.AI_BREAKER_COOLDOWN)
+
+        # 连接池和信号量绑定创建它们的事件循环
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.client: Optional[httpx.AsyncClient] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+
+        self.stats = {
+            "requests": 0,
+            "streams": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "timeouts": 0,
+            "rejected_busy": 0,
+            "rejected_open": 0,
+        }
+
+    def _ensure_client(self):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop = loop
+            self.client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency),
+            )
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if settings.DASHSCOPE_API_KEY:
+            headers["Authorization"] = f"Bearer {settings.DASHSCOPE_API_KEY}"
+        return headers
+
+    async def _acquire(self):
+        """等待并发名额，熔断打开或排队超时时直接失败"""
+        self._ensure_client()
+        if not self.breaker.allow():
+            self.stats["rejected_open"] += 1
+            raise LLMError("AI服务暂时不可用（熔断中）")
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            # 未真正调用服务，不计入熔断
+            self.breaker.probing = False
+            self.stats["rejected_busy"] += 1
+            raise LLMError("AI服务繁忙，请稍后再试")
+        self.in_flight += 1
+
+    def _release(self):
+        self.in_flight -= 1
+        self.semaphore.release()
+
+    def _failed(self, error: Exception) -> LLMError:
+        """记录失败；只有超时、网络错误和服务端错误计入熔断"""
+        self.stats["failed"] += 1
+        if isinstance(error, (asyncio.TimeoutError, httpx.TimeoutException)):
+            self.stats["timeouts"] += 1
+            self.breaker.record_failure()
+            return LLMError(f"AI服务响应超时（{self.timeout}秒）")
+        if isinstance(error, httpx.HTTPStatusError):
+            status = error.response.status_code
+            if status == 429 or status >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.probing = False
+            return LLMError(f"API调用失败: {status}")
+        self.breaker.record_failure()
+        return LLMError(f"API调用失败: {error}")
+
+    def _payload(self, messages: List[Dict], stream: bool) -> Dict:
+        return {"model": self.model, "messages": messages, "stream": stream}
+
+    async def chat(self, messages: List[Dict]) -> str:
+        """一次性调用，返回完整回复文本"""
+        self.stats["requests"] += 1
+        await self._acquire()
+        try:
+            response = await asyncio.wait_for(
+                self.client.post("/chat/completions", json=self._payload(messages, False), headers=self._headers()),
+                self.timeout
+            )
+            response.raise_for_status()
+            text = response.json()["choices"][0]["message"]["content"]
+        except asyncio.CancelledError:
+            self.breaker.probing = False
+            raise
+        except Exception as e:
+            raise self._failed(e) from e
+        finally:
+            self._release()
+
+        self.breaker.record_success()
+        self.stats["succeeded"] += 1
+        logger.debug("LLM回复: %s", text)
+        return text
+
+    async def stream(self, messages: List[Dict]) -> AsyncIterator[str]:
+        """
+        流式调用，逐个产出增量文本；首个片段须在 AI_TIMEOUT 内到达，之后每次读取各自计时，
+        整个流不超过 AI_STREAM_TIMEOUT（持续缓慢输出的流也不会一直占用并发名额）
+        """
+        self.stats["streams"] += 1
+        await self._acquire()
+        deadline = time.monotonic() + self.stream_timeout
+        completed = False
+        try:
+            async with self.client.stream("POST", "/chat/completions", json=self._payload(messages, True),
+                                          headers=self._headers()) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    response.raise_for_status()
+                lines = response.aiter_lines()
+                while True:
+                    try:
+                        line = await asyncio.wait_for(anext(lines), deadline - time.monotonic())
+                    except StopAsyncIteration:
+                        break
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    choices = json.loads(data).get("choices") or [{}]
+                    delta = (choices[0].get("delta") or {}).get("content")
+                    if delta:
+                        yield delta
+            completed = True
+        except Exception as e:
+            raise self._failed(e) from e
+        finally:
+            self._release()
+            if not completed:
+                # 取消、调用方提前关闭生成器或失败时都要释放试探名额，否则熔断器一直拒绝调用
+                self.breaker.probing = False
+
+        self.breaker.record_success()
+        self.stats["succeeded"] += 1
+
+    async def stop(self):
+        if self.client is not None:
+            await self.client.aclose()
+        self.client = None
+        self.loop = None
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "breaker": self.breaker.state,
+            "base_url": self.base_url,
+            "model": self.model,
+        }
+
+
+# 全局大模型客户端实例
+llm_client = LLMClient()
@@ -4,12 +4,13 @@ import asyncio
 from typing import Dict, List, Optional
 from datetime import datetime
 import threading
-import time
 
 from app.config import settings
 from app.database import SessionLocal
 from app.models.device import Device
-from app.models.sensor_data import SensorData, AlertLog
+from app.models.sensor_data import SensorData
+from app.services.ingest_service import ingest_service
+from app.services.sensor_decoders import decoder_registry
 
 
 class MQTTService:
@@ -51,26 +52,11 @@ class MQTTService:
             self.reconnect()
 
     def on_message(self, client, userdata, msg):
-        """MQTT消息接收回调"""
+        """MQTT消息接收回调（只解码并入队，落库由写入管道完成）"""
         try:
-            payload = msg.payload.decode('utf-8')
-            hi_data = payload.split(',')
-            data = SensorData(
-                device_id="hi3861_001",
-                temperature = float(hi_data[4]),  # 温度
-                humidity = float(hi_data[5]),  # 湿度
-                human_detected = int(hi_data[2]),  # 人体检测
-                light_intensity = int(hi_data[3]),  # 光照强度
-                gas_level = float(hi_data[1]),  # 可燃气体浓度
-                flame_detected = int(hi_data[0]),  # 是否检测到火焰
-                timestamp = datetime.now(),
-            )
-            self.check_and_send_alerts(data)
-
-            db = SessionLocal()
-            db.add(data)
-            db.commit()
-            db.close()
+            reading = decoder_registry.decode(msg.topic, msg.payload)
+            if reading is not None:
+                ingest_service.submit(reading)
 
         except Exception as e:
             print(f"MQTT message error: {e}")
@@ -82,8 +68,7 @@ class MQTTService:
             # ("hongmeng/devices/+/status", 1),  # 设备状态
             # ("hongmeng/devices/+/heartbeat", 0),  # 设备心跳
             # ("hongmeng/system/alerts", 1),  # 系统警报
-            ("hi3861/publish", 1),
-        ]
+        ] + decoder_registry.subscriptions()  # 已注册解码器的传感器主题
 
         for topic, qos in topics:
             result = self.client.subscribe(topic, qos)
@@ -164,109 +149,6 @@ class MQTTService:
             if device_id in self.device_status_cache:
                 self.device_status_cache[device_id]["last_heartbeat"] = datetime.now().isoformat()
 
-    def check_and_send_alerts(self, sensor_data: SensorData):
-        """检查传感器数据并发送警报"""
-        alerts = []
-        db = SessionLocal()
-        # 火焰检测
-        if sensor_data.flame_detected:
-            alerts.append({
-                "type": "fire",
-                "severity": "high",
-                "message": "Fire detected",
-                "device_id": sensor_data.device_id
-            })
-
-        # 可燃气体检测
-        if sensor_data.gas_level and sensor_data.gas_level > 300:
-            alerts.append({
-                "type": "gas",
-                "severity": "high",
-                "message": f"可燃气体检测超标: {sensor_data.gas_level}pp",
-                "device_id": sensor_data.device_id
-            })
-
-        # 温度异常
-        if sensor_data.temperature and sensor_data.temperature > 35:
-            alerts.append({
-                "type": "temp",
-                "severity": "medium",
-                "message": f"室内温度过高: {sensor_data.temperature}°C",
-                "device_id": sensor_data.device_id
-            })
-            
-        # 人体检测
-        if sensor_data.human_detected and sensor_data.human_detected > 1000:
-            alerts.append({
-                "type": "human",
-                "severity": "medium",
-                "message": f"有人经过，请注意！",
-                "device_id": sensor_data.device_id
-            })
-
-        # 土壤湿度过低
-        # if sensor_data.soil_moisture and sensor_data.soil_moisture < 20:
-        #     alerts.append({
-        #         "type": "soil",
-        #         "severity": "low",
-        #         "message": f"Low soil moisture: {sensor_data.soil_moisture}%",
-        #         "device_id": sensor_data.device_id
-        #     })
-
-        # 处理警报
-        for alert in alerts:
-            # 保存到数据库
-            alert_log = AlertLog(
-                device_id=sensor_data.device_id,
-                house_id=sensor_data.house_id,
-                alert_type=alert["type"],
-                message=alert["message"],
-                severity=alert["severity"],
-                created_at=datetime.now(),
-            )
-            db.add(alert_log)
-            print(f"alert: {alert_log.message}")    
-
-            # 通过MQTT发送警报
-            # self.publish_alert(alert)
-            # print(f"Alert: {alert['type']} - {alert['message']}")
-
-        if alerts:
-            db.commit()
-
-    def publish_device_control(self, module: str, device: str) -> bool:
-        """发布设备控制指令"""
-        if not self.connected:
-            print("MQTT not connected")
-            return False
-
-        topic = f"hi3861/subscribe"
-
-        try:
-            # result = self.client.publish(topic, device)
-            # if result.rc == mqtt.MQTT_ERR_SUCCESS:
-            #     print(f"Control device sent: {device}")
-            # else:
-            #     print(f"Control device send failed: {result.rc}")
-            #     return False
-            # time.sleep(1)
-            result = self.client.publish(topic, module)
-            if result.rc == mqtt.MQTT_ERR_SUCCESS:
-                print(f"Control module sent: {module}")
-            else:
-                print(f"Control module send failed: {result.rc}")
-                return False
-            time.sleep(1)
-            result = self.client.publish(topic, device)
-            if result.rc == mqtt.MQTT_ERR_SUCCESS:
-                print(f"Control device sent: {device}")
-            else:
-                print(f"Control device send failed: {result.rc}")
-                return False
-        except Exception as e:
-            print(f"Control send error: {e}")
-            return False
-
     def publish_scene_execution(self, scene_name: str, actions: list) -> bool:
         """发布场景执行指令"""
         if not self.connected:
@@ -0,0 +1,214 @@
+import bisect
+import calendar
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app.config import settings
+from app.database import RoutingSession
+from app.models.schedule import RecurringSchedule
+
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def _add_months(anchor: date, months: int) -> date:
+    """按月偏移，目标月份没有对应日期时取该月最后一天（如1月31日 -> 2月28日）"""
+    month_index = anchor.year * 12 + anchor.month - 1 + months
+    year, month = divmod(month_index, 12)
+    day = min(anchor.day, calendar.monthrange(year, month + 1)[1])
+    return date(year, month + 1, day)
+
+
+class ExpandedRule:
+    """重复日程规则的快照及其已展开的日期窗口"""
+
+    def __init__(self, rule: RecurringSchedule):
+        self.id = rule.id
+        self.title = rule.title
+        self.description = rule.description
+        self.time = rule.time
+        self.location = rule.location
+        self.priority = rule.priority
+        self.reminder = rule.reminder
+        self.created_by = rule.created_by
+        self.house_id = rule.house_id
+
+        self.repeat_type = rule.repeat_type
+        self.interval = max(rule.repeat_interval or 1, 1)
+        self.count = rule.repeat_count
+        self.end = _parse_date(rule.repeat_end_date)
+        self.anchor = _parse_date(rule.start_date) or (rule.created_at or datetime.now()).date()
+        # 周重复的星期几偏移（0=周一），未指定时取开始日期的星期
+        weekdays = sorted({int(d) - 1 for d in (rule.weekdays or "").split(",") if d.strip().isdigit()
+                           and 1 <= int(d) <= 7})
+        self.weekdays = weekdays or [self.anchor.weekday()]
+
+        # 已展开的窗口 [lo, hi] 及窗口内的日期（升序）
+        self.window: Optional[Tuple[date, date]] = None
+        self.dates: List[date] = []
+
+    def _iter_from(self, start: date):
+        """
+        从 start 所在的周期直接跳转开始生成 (序号, 日期)，序号用于重复次数限制，
+        不需要从开始日期逐个推算
+        """
+        interval = self.interval
+        if self.repeat_type == "daily":
+            k = max(0, -(-(start - self.anchor).days // interval))
+            while True:
+                yield k, self.anchor + timedelta(days=k * interval)
+                k += 1
+
+        elif self.repeat_type == "weekly":
+            week0 = self.anchor - timedelta(days=self.anchor.weekday())
+            first_week = [d for d in self.weekdays if d >= self.anchor.weekday()]
+            per_week = len(self.weekdays)
+            k = max(0, (start - week0).days // 7 // interval)
+            while True:
+                week_start = week0 + timedelta(weeks=k * interval)
+                if k == 0:
+                    for position, offset in enumerate(first_week):
+                        yield position, week_start + timedelta(days=offset)
+                else:
+                    base = len(first_week) + (k - 1) * per_week
+                    for position, offset in enumerate(self.weekdays):
+                        yield base + position, week_start + timedelta(days=offset)
+                k += 1
+
+        elif self.repeat_type in ("monthly", "yearly"):
+            step = interval * (12 if self.repeat_type == "yearly" else 1)
+            months = (start.year - self.anchor.year) * 12 + start.month - self.anchor.month
+            k = max(0, months // step)
+            while True:
+                yield k, _add_months(self.anchor, k * step)
+                k += 1
+
+    def generate(self, start: date, end: date) -> List[date]:
+        """生成 [start, end] 内的全部发生日期"""
+        if self.end is not None:
+            end = min(end, self.end)
+        start = max(start, self.anchor)
+        if start > end:
+            return []
+
+        dates = []
+        for index, day in self._iter_from(start):
+            if day > end or (self.count is not None and index >= self.count):
+                break
+            if day >= start:
+                dates.append(day)
+        return dates
+
+
+class RecurrenceExpander:
+    """
+    重复日程展开器：按规则缓存一段滚动窗口内的发生日期，
+    查询落在已展开的窗口内时直接二分截取，超出窗口时从查询起点跳转重新展开；
+    规则新增、修改、删除后只重新载入变化的规则
+    """
+
+    def __init__(self):
+        self.window = timedelta(days=settings.RECURRENCE_WINDOW_DAYS)
+        self.lock = threading.Lock()
+        self.rules: Dict[int, ExpandedRule] = {}
+        self.loaded = False
+        # 已变化、待重新载入的规则ID
+        self.stale: Set[int] = set()
+
+        self.stats = {
+            "rules_loaded": 0,
+            "window_hits": 0,
+            "expansions": 0,
+            "occurrences_generated": 0,
+        }
+
+    def invalidate(self, rule_id: Optional[int] = None):
+        """规则变化时调用；不带ID时下次查询重新载入全部规则"""
+        with self.lock:
+            if rule_id is None:
+                self.loaded = False
+                self.rules.clear()
+                self.stale.clear()
+            else:
+                self.stale.add(rule_id)
+
+    def _refresh(self, db: Session):
+        """首次查询时载入全部启用的规则，之后只载入变化过的规则（调用方持有锁）"""
+        if not self.loaded:
+            rules = db.query(RecurringSchedule).filter(RecurringSchedule.is_active == True).all()
+            self.rules = {rule.id: ExpandedRule(rule) for rule in rules}
+            self.stale.clear()
+            self.loaded = True
+            self.stats["rules_loaded"] += len(rules)
+        elif self.stale:
+            ids = list(self.stale)
+            self.stale.clear()
+            for rule_id in ids:
+                self.rules.pop(rule_id, None)
+            rules = db.query(RecurringSchedule).filter(
+                RecurringSchedule.id.in_(ids), RecurringSchedule.is_active == True
+            ).all()
+            for rule in rules:
+                self.rules[rule.id] = ExpandedRule(rule)
+            self.stats["rules_loaded"] += len(rules)
+
+    def expand(self, db: Session, start: date, end: date) -> List[Tuple[date, ExpandedRule]]:
+        """返回 [start, end] 内全部重复日程的 (日期, 规则)，按日期和时间排序"""
+        occurrences = []
+        with self.lock:
+            self._refresh(db)
+            for rule in self.rules.values():
+                if rule.window and rule.window[0] <= start and end <= rule.window[1]:
+                    self.stats["window_hits"] += 1
+                else:
+                    hi = max(end, start + self.window)
+                    rule.dates = rule.generate(start, hi)
+                    rule.window = (start, hi)
+                    self.stats["expansions"] += 1
+                    self.stats["occurrences_generated"] += len(rule.dates)
+
+                lo_index = bisect.bisect_left(rule.dates, start)
+                hi_index = bisect.bisect_right(rule.dates, end)
+                occurrences.extend((day, rule) for day in rule.dates[lo_index:hi_index])
+
+        occurrences.sort(key=lambda item: (item[0], item[1].time))
+        return occurrences
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {**self.stats, "rules": len(self.rules), "stale": len(self.stale)}
+
+
+# 全局重复日程展开器实例
+recurrence_expander = RecurrenceExpander()
+
+
+@event.listens_for(RecurringSchedule, "after_insert")
+@event.listens_for(RecurringSchedule, "after_update")
+@event.listens_for(RecurringSchedule, "after_delete")
+def _track_rule_change(mapper, connection, target):
+    # 记录在会话上，提交成功后再让展开器重新载入这些规则
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("recurring_rules", set()).add(target.id)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _publish_rule_changes(session):
+    for rule_id in session.info.pop("recurring_rules", ()):
+        recurrence_expander.invalidate(rule_id)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _discard_rule_changes(session):
+    session.info.pop("recurring_rules", None)
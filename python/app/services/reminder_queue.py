@@ -0,0 +1,178 @@
+import asyncio
+import heapq
+import threading
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.schedule import Schedule, ScheduleReminder
+from app.services.timer_scheduler import timer_scheduler
+
+DUE_TIMER = ("reminders", "due")
+HORIZON_TIMER = ("reminders", "horizon")
+
+
+class ReminderQueue:
+    """
+    待发送日程提醒的内存优先队列：启动时只载入未来一段时间（滑动窗口）内的提醒，
+    由定时调度器在最早的提醒到期时唤醒，窗口到期时再载入下一段。
+    ScheduleService 创建、修改、删除提醒时同步更新队列，不需要定时轮询数据库。
+    """
+
+    def __init__(self):
+        self.horizon = timedelta(hours=settings.REMINDER_HORIZON_HOURS)
+        self.lock = threading.Lock()
+        # (提醒时间, 提醒ID)
+        self.heap = []
+        # 提醒ID -> (提醒时间, 日程ID)，堆中不在此表里的条目视为已删除
+        self.entries: Dict[int, tuple] = {}
+        # 日程ID -> 提醒ID集合
+        self.by_schedule: Dict[int, Set[int]] = {}
+        self.loaded_until: Optional[datetime] = None
+        # 到期提醒的投递回调，参数为提醒ID列表
+        self.deliver: Optional[Callable[[List[int]], Awaitable[None]]] = None
+
+        self.stats = {
+            "loaded": 0,
+            "added": 0,
+            "removed": 0,
+            "delivered_batches": 0,
+            "delivered": 0,
+            "max_lateness_ms": 0.0,
+        }
+
+    def load(self, db: Session, now: Optional[datetime] = None):
+        """载入截至窗口末尾的全部未发送提醒（包括已过期未发送的），并设置下一次窗口滑动"""
+        until = (now or datetime.now()) + self.horizon
+        self._apply(self._query(db, until), until)
+
+    async def reload(self):
+        """在线程池中查询下一段窗口内的提醒，回到事件循环后载入队列，查询不阻塞事件循环"""
+        until = datetime.now() + self.horizon
+        rows = await asyncio.to_thread(self._query_window, until)
+        self._apply(rows, until)
+
+    @staticmethod
+    def _query(db: Session, until: datetime) -> List[tuple]:
+        return db.query(ScheduleReminder.id, ScheduleReminder.schedule_id, ScheduleReminder.reminder_time).join(
+            Schedule, ScheduleReminder.schedule_id == Schedule.id
+        ).filter(
+            and_(
+                ScheduleReminder.reminder_time < until,
+                ScheduleReminder.is_sent == False,
+                Schedule.completed == False
+            )
+        ).all()
+
+    def _query_window(self, until: datetime) -> List[tuple]:
+        from app.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            return self._query(db, until)
+        finally:
+            db.close()
+
+    def _apply(self, rows: List[tuple], until: datetime):
+        """把查询到的提醒加入队列，窗口到期时由定时调度器调用 reload"""
+        with self.lock:
+            self.loaded_until = until
+            for reminder_id, schedule_id, reminder_time in rows:
+                self._push(reminder_id, schedule_id, reminder_time)
+            self.stats["loaded"] += len(rows)
+
+        timer_scheduler.schedule(HORIZON_TIMER, until, self.reload)
+        self._arm()
+
+    def _push(self, reminder_id: int, schedule_id: int, reminder_time: datetime):
+        """加入队列（调用方持有锁）"""
+        if reminder_id in self.entries:
+            return
+        self.entries[reminder_id] = (reminder_time, schedule_id)
+        self.by_schedule.setdefault(schedule_id, set()).add(reminder_id)
+        heapq.heappush(self.heap, (reminder_time, reminder_id))
+
+    def add(self, reminder_id: int, schedule_id: int, reminder_time: datetime):
+        """新建提醒后调用，窗口外的提醒等窗口滑动时再载入"""
+        with self.lock:
+            if self.loaded_until is None or reminder_time >= self.loaded_until:
+                return
+            self._push(reminder_id, schedule_id, reminder_time)
+            self.stats["added"] += 1
+        self._arm()
+
+    def discard_schedules(self, schedule_ids):
+        """日程的提醒被删除或重建前调用"""
+        with self.lock:
+            for schedule_id in schedule_ids:
+                for reminder_id in self.by_schedule.pop(schedule_id, ()):
+                    if self.entries.pop(reminder_id, None) is not None:
+                        self.stats["removed"] += 1
+        self._arm()
+
+    def _pop_due(self, now: datetime) -> List[int]:
+        due = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                reminder_time, reminder_id = heapq.heappop(self.heap)
+                entry = self.entries.pop(reminder_id, None)
+                if entry is None or entry[0] != reminder_time:
+                    continue
+                reminder_ids = self.by_schedule.get(entry[1])
+                if reminder_ids is not None:
+                    reminder_ids.discard(reminder_id)
+                    if not reminder_ids:
+                        del self.by_schedule[entry[1]]
+                lateness = (now - reminder_time).total_seconds() * 1000
+                if lateness < self.horizon.total_seconds() * 1000:
+                    # 启动时补发的过期提醒不计入延迟统计
+                    self.stats["max_lateness_ms"] = max(self.stats["max_lateness_ms"], round(lateness, 1))
+                due.append(reminder_id)
+        return due
+
+    def _arm(self):
+        """把最早的有效提醒时间登记到定时调度器"""
+        with self.lock:
+            while self.heap and self.heap[0][1] not in self.entries:
+                heapq.heappop(self.heap)
+            next_due = self.heap[0][0] if self.heap else None
+        if next_due is None:
+            timer_scheduler.cancel(DUE_TIMER)
+        else:
+            timer_scheduler.schedule(DUE_TIMER, next_due, self._fire)
+
+    async def _fire(self):
+        due = self._pop_due(datetime.now())
+        try:
+            if due and self.deliver is not None:
+                await self.deliver(due)
+                self.stats["delivered_batches"] += 1
+                self.stats["delivered"] += len(due)
+        finally:
+            self._arm()
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            next_due = min((entry[0] for entry in self.entries.values()), default=None)
+            return {
+                **self.stats,
+                "pending": len(self.entries),
+                "next_due": next_due.isoformat() if next_due else None,
+                "loaded_until": self.loaded_until.isoformat() if self.loaded_until else None,
+            }
+
+    def stop(self):
+        timer_scheduler.cancel(DUE_TIMER)
+        timer_scheduler.cancel(HORIZON_TIMER)
+        with self.lock:
+            self.heap.clear()
+            self.entries.clear()
+            self.by_schedule.clear()
+            self.loaded_until = None
+
+
+# 全局日程提醒队列实例
+reminder_queue = ReminderQueue()
@@ -0,0 +1,318 @@
+import copy
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.device import Device, Room
+from app.models.scene import Scene
+from app.services.context_cache import context_cache
+
+# 只缓存可以安全重放的动作（新建场景等重复执行会产生副作用）
+CACHEABLE_ACTIONS = ("control_device", "execute_scene")
+
+# 设备类型在口语中的叫法，用于判断指令是否明确指向了计划中的设备
+DEVICE_TYPE_WORDS = {
+    "light": ("灯",),
+    "air": ("空调",),
+    "fan": ("风扇", "电扇"),
+    "shower": ("热水器", "淋浴"),
+    "curtain": ("窗帘",),
+}
+
+# 决定动作方向或数值的字，相近匹配时这些字必须完全一致（"开灯"与"关灯"不能互相命中）
+_SIGNATURE_CHARS = set("开关启闭停亮暗高低大小增减加降升多少冷热暖凉强弱快慢上下前后半全不别")
+_PUNCTUATION = re.compile(r"[\W_]+")
+_PREFIXES = re.compile(r"^(请你|请|麻烦你|麻烦|帮我|帮忙|给我)+")
+_SUFFIXES = re.compile(r"(一下|吧|呀|啊|哦|嘛|了)+$")
+
+
+def normalize_query(query: str) -> str:
+    """统一全半角和大小写，去掉标点、空白、礼貌用语和语气词"""
+    text = unicodedata.normalize("NFKC", query).lower()
+    text = _PUNCTUATION.sub("", text)
+    text = _PREFIXES.sub("", text)
+    text = _SUFFIXES.sub("", text)
+    return text.replace("的", "").replace("把", "")
+
+
+def _grams(text: str) -> Set[str]:
+    """字符二元组；单字查询退化为单字"""
+    if len(text) < 2:
+        return {text}
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _signature(text: str) -> str:
+    return "".join(ch for ch in text if ch in _SIGNATURE_CHARS or ch.isdigit())
+
+
+class CachedPlan:
+    """一条缓存的动作计划及其生效条件"""
+
+    __slots__ = ("house_id", "query", "plan", "context_key", "device_ids", "fingerprint",
+                 "expires_at", "grams", "signature", "scene_name")
+
+    def __init__(self, house_id: int, query: str, plan: Dict, context_key: Tuple, device_ids: List,
+                 fingerprint: str, expires_at: float, scene_name: Optional[str] = None):
+        self.house_id = house_id
+        self.query = query
+        self.plan = plan
+        self.context_key = context_key
+        self.device_ids = device_ids
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+        self.grams = _grams(query)
+        self.signature = _signature(query)
+        # 场景指令中归一化后的场景名
+        self.scene_name = scene_name
+
+
+class ResponseCache:
+    """
+    AI 指令响应缓存：相同或相近的设备控制、场景执行指令直接重放缓存的动作计划，不调用大模型。
+    按 (house_id, 归一化指令) 精确匹配，未命中时在同一家庭内用字符二元组做相近匹配；
+    家庭的设备清单或场景版本变化、计划涉及的设备状态与生成计划时不同，缓存都不生效。
+    条目有 TTL，超过容量时淘汰最久未使用的条目。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ttl = settings.AI_CACHE_TTL
+        self.max_entries = settings.AI_CACHE_MAX_ENTRIES
+        self.similarity = settings.AI_CACHE_SIMILARITY
+        # (house_id, 归一化指令) -> CachedPlan，按最近使用排序
+        self.entries: "OrderedDict[Tuple[int, str], CachedPlan]" = OrderedDict()
+        # house_id -> 二元组 -> 归一化指令集合
+        self.index: Dict[int, Dict[str, Set[str]]] = {}
+
+        self.stats = {
+            "exact_hits": 0,
+            "similar_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "skipped": 0,
+            "state_changed": 0,
+            "target_mismatch": 0,
+            "invalidated": 0,
+            "expired": 0,
+            "evicted": 0,
+        }
+
+    @staticmethod
+    def context_key(house_id: int) -> Tuple[int, int]:
+        """家庭上下文的版本：设备清单和场景列表"""
+        return context_cache.version(house_id, "inventory"), context_cache.version(house_id, "scenes")
+
+    @staticmethod
+    def _plan_devices(plan: Dict) -> Optional[List]:
+        """计划涉及的设备ID；格式不符合预期时返回 None"""
+        parameters = plan.get("parameters")
+        if not isinstance(parameters, dict):
+            return None
+        if plan.get("action") == "execute_scene":
+            return [] if parameters.get("scene_id") is not None else None
+        devices = parameters.get("devices")
+        if not devices or not isinstance(devices, list):
+            return None
+        ids = [op.get("device_id") for op in devices if isinstance(op, dict)]
+        if len(ids) != len(devices) or any(isinstance(i, (dict, list)) or i is None for i in ids):
+            return None
+        return sorted(set(ids), key=str)
+
+    @staticmethod
+    def _load_devices(db: Session, house_id: int, device_ids: List) -> List[tuple]:
+        if not device_ids:
+            return []
+        return db.query(
+            Device.id, Device.name, Device.device_type, Room.name, Device.status
+        ).outerjoin(
+            Room, Room.id == Device.room_id
+        ).filter(
+            Device.house_id == house_id,
+            Device.id.in_(device_ids)
+        ).order_by(Device.id).all()
+
+    @staticmethod
+    def _fingerprint(rows: List[tuple]) -> str:
+        return json.dumps([[row[0], row[4]] for row in rows], sort_keys=True, ensure_ascii=False, default=str)
+
+    @staticmethod
+    def _names_devices(query: str, rows: List[tuple]) -> bool:
+        """指令是否明确提到了每个设备（名称、房间或类型），"低一点"这类依赖上文的指令不缓存"""
+        for _, name, device_type, room_name, _ in rows:
+            words = [name, room_name, *DEVICE_TYPE_WORDS.get(device_type, ())]
+            if not any(word and normalize_query(word) in query for word in words):
+                return False
+        return True
+
+    @staticmethod
+    def _same_target(query: str, entry: CachedPlan, rows: List[tuple]) -> bool:
+        """
+        相近命中时确认新指令指的仍是计划中的设备或场景：每个设备的名称（场景名）须出现在新指令中，
+        且两条指令不同的二元组不能落在设备名、房间名上（"左边床头灯"与"右边床头灯"）
+        """
+        if entry.scene_name is not None:
+            names = [entry.scene_name]
+        else:
+            if len(rows) != len(entry.device_ids):
+                return False
+            names = [normalize_query(row[1]) for row in rows]
+        if not all(name and name in query for name in names):
+            return False
+        names += [normalize_query(row[3]) for row in rows if row[3]]
+
+        differing = _grams(query) ^ entry.grams
+        return not any(differing & _grams(name) for name in names if len(name) >= 2)
+
+    def _remove(self, key: Tuple[int, str]):
+        """移除条目（调用方持有锁）"""
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        grams = self.index.get(entry.house_id, {})
+        for gram in entry.grams:
+            queries = grams.get(gram)
+            if queries is not None:
+                queries.discard(entry.query)
+                if not queries:
+                    del grams[gram]
+        if not grams:
+            self.index.pop(entry.house_id, None)
+
+    def _find_similar(self, house_id: int, query: str) -> Optional[CachedPlan]:
+        """在同一家庭的条目中找二元组 Jaccard 相似度最高且方向字一致的指令（调用方持有锁）"""
+        grams = self.index.get(house_id)
+        if not grams:
+            return None
+        query_grams = _grams(query)
+        signature = _signature(query)
+        overlaps = Counter()
+        for gram in query_grams:
+            overlaps.update(grams.get(gram, ()))
+
+        best, best_score = None, self.similarity
+        for candidate, overlap in overlaps.items():
+            entry = self.entries[(house_id, candidate)]
+            score = overlap / (len(query_grams) + len(entry.grams) - overlap)
+            if score >= best_score and entry.signature == signature:
+                best, best_score = entry, score
+        return best
+
+    def lookup(self, db: Session, house_id: int, query: str) -> Optional[Dict]:
+        """返回可以直接重放的动作计划（副本），没有可用缓存时返回 None"""
+        normalized = normalize_query(query)
+        if not normalized:
+            return None
+
+        now = time.monotonic()
+        context_key = self.context_key(house_id)
+        with self.lock:
+            entry = self.entries.get((house_id, normalized))
+            kind = "exact_hits"
+            if entry is None:
+                entry = self._find_similar(house_id, normalized)
+                kind = "similar_hits"
+            if entry is not None and entry.expires_at <= now:
+                self._remove((house_id, entry.query))
+                self.stats["expired"] += 1
+                entry = None
+            elif entry is not None and entry.context_key != context_key:
+                self._remove((house_id, entry.query))
+                self.stats["invalidated"] += 1
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+
+        rows = self._load_devices(db, house_id, entry.device_ids)
+        if kind == "similar_hits" and not self._same_target(normalized, entry, rows):
+            with self.lock:
+                self.stats["target_mismatch"] += 1
+                self.stats["misses"] += 1
+            return None
+
+        # 计划涉及的设备状态须与生成计划时一致（相对调节类指令依赖当时的状态）
+        if self._fingerprint(rows) != entry.fingerprint:
+            with self.lock:
+                self.stats["state_changed"] += 1
+                self.stats["misses"] += 1
+            return None
+
+        with self.lock:
+            if (house_id, entry.query) in self.entries:
+                self.entries.move_to_end((house_id, entry.query))
+            self.stats[kind] += 1
+        return copy.deepcopy(entry.plan)
+
+    def prepare(self, db: Session, house_id: int, query: str, plan: Dict) -> Optional[CachedPlan]:
+        """在执行动作之前调用，记录计划和涉及设备当前的状态；不可缓存时返回 None"""
+        normalized = normalize_query(query)
+        device_ids = self._plan_devices(plan) if plan.get("action") in CACHEABLE_ACTIONS else None
+        if not normalized or device_ids is None:
+            return None
+
+        rows = self._load_devices(db, house_id, device_ids)
+        scene_name = None
+        if plan["action"] == "execute_scene":
+            # 场景指令须提到场景名（"再来一次"之类依赖上文）
+            scene_name = db.query(Scene.name).filter(
+                Scene.id == plan["parameters"]["scene_id"], Scene.house_id == house_id
+            ).scalar()
+            scene_name = normalize_query(scene_name) if scene_name else None
+            named = bool(scene_name) and scene_name in normalized
+        else:
+            named = len(rows) == len(device_ids) and self._names_devices(normalized, rows)
+        if not named:
+            with self.lock:
+                self.stats["skipped"] += 1
+            return None
+
+        return CachedPlan(house_id, normalized, copy.deepcopy(plan), self.context_key(house_id),
+                          device_ids, self._fingerprint(rows), time.monotonic() + self.ttl, scene_name)
+
+    def store(self, db: Session, house_id: int, query: str, plan: Dict) -> bool:
+        """记录计划并立即加入缓存"""
+        entry = self.prepare(db, house_id, query, plan)
+        return entry is not None and self.add(entry)
+
+    def add(self, entry: CachedPlan) -> bool:
+        """动作执行成功后加入缓存"""
+        key = (entry.house_id, entry.query)
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = entry
+            grams = self.index.setdefault(entry.house_id, {})
+            for gram in entry.grams:
+                grams.setdefault(gram, set()).add(entry.query)
+            self.stats["stores"] += 1
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+                self.stats["evicted"] += 1
+        return True
+
+    def invalidate(self, house_id: Optional[int] = None):
+        """清除某个家庭（或全部）的缓存"""
+        with self.lock:
+            for key in [key for key in self.entries if house_id is None or key[0] == house_id]:
+                self._remove(key)
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            hits = self.stats["exact_hits"] + self.stats["similar_hits"]
+            total = hits + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round(hits / total, 3) if total else None,
+                "entries": len(self.entries),
+            }
+
+
+# 全局AI指令响应缓存实例
+response_cache = ResponseCache()
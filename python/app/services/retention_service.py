@@ -0,0 +1,159 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, literal_column, select
+
+from app.config import settings
+from app.database import write_engine
+from app.models.sensor_data import SensorData, SensorRollup
+
+
+class RetentionService:
+    """
+    传感器数据保留与降采样任务
+
+    时间桶汇总由写入管道实时维护（降采样在写入时已完成），这里只负责按策略删除过期数据：
+    原始数据只保留近几天，分钟汇总保留数月，小时/天汇总默认永久保留。
+    删除按固定行数分块，每块一个短事务，块之间让出写锁，避免阻塞传感器数据写入。
+    """
+
+    def __init__(self):
+        self.raw_days = settings.RETENTION_RAW_DAYS
+        self.rollup_days = {
+            "minute": settings.RETENTION_MINUTE_ROLLUP_DAYS,
+            "hour": settings.RETENTION_HOUR_ROLLUP_DAYS,
+            "day": settings.RETENTION_DAY_ROLLUP_DAYS,
+        }
+        self.chunk_size = settings.RETENTION_CHUNK_SIZE
+        self.chunk_pause = settings.RETENTION_CHUNK_PAUSE
+        self.interval = settings.RETENTION_INTERVAL
+
+        self.stop_event = threading.Event()
+        self.worker_thread = None
+        self.running = False
+
+        # 进度与统计
+        self.stats = {
+            "runs": 0,
+            "phase": "idle",
+            "phase_deleted": 0,
+            "chunks": 0,
+            "deleted": {"raw": 0, "minute": 0, "hour": 0, "day": 0},
+            "last_run_started": None,
+            "last_run_finished": None,
+            "last_run_seconds": 0.0,
+            "last_run_deleted": {},
+            "last_error": None,
+        }
+
+    def _tasks(self, now: datetime) -> List[Tuple[str, object]]:
+        """按当前策略生成 (阶段名, 选取一块待删除行的子查询) 列表"""
+        tasks = []
+        if self.raw_days > 0:
+            cutoff = now - timedelta(days=self.raw_days)
+            tasks.append(("raw", select(SensorData.id).where(
+                SensorData.timestamp < cutoff
+            ).limit(self.chunk_size)))
+
+        for granularity, days in self.rollup_days.items():
+            if days <= 0:
+                continue
+            cutoff = now - timedelta(days=days)
+            tasks.append((granularity, select(literal_column("rowid")).select_from(SensorRollup).where(
+                SensorRollup.granularity == granularity,
+                SensorRollup.bucket < cutoff
+            ).limit(self.chunk_size)))
+        return tasks
+
+    def _delete_chunks(self, phase: str, chunk_query) -> int:
+        """分块删除，直到没有过期数据或服务停止"""
+        if phase == "raw":
+            stmt = delete(SensorData).where(SensorData.id.in_(chunk_query))
+        else:
+            stmt = delete(SensorRollup).where(literal_column("rowid").in_(chunk_query))
+
+        total = 0
+        while not self.stop_event.is_set():
+            with write_engine.begin() as conn:
+                deleted = conn.execute(stmt).rowcount
+            total += deleted
+            self.stats["phase_deleted"] = total
+            self.stats["chunks"] += 1
+            self.stats["deleted"][phase] += deleted
+            if deleted < self.chunk_size:
+                break
+            if self.chunk_pause:
+                time.sleep(self.chunk_pause)
+        return total
+
+    def run_once(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """执行一轮清理，返回各阶段删除的行数"""
+        now = now or datetime.now()
+        started = time.perf_counter()
+        self.stats["last_run_started"] = datetime.now()
+        result = {}
+
+        try:
+            for phase, chunk_query in self._tasks(now):
+                self.stats["phase"] = phase
+                self.stats["phase_deleted"] = 0
+                result[phase] = self._delete_chunks(phase, chunk_query)
+        except Exception as e:
+            self.stats["last_error"] = str(e)
+            print(f"Retention error: {e}")
+        finally:
+            self.stats["phase"] = "idle"
+            self.stats["runs"] += 1
+            self.stats["last_run_finished"] = datetime.now()
+            self.stats["last_run_seconds"] = round(time.perf_counter() - started, 3)
+            self.stats["last_run_deleted"] = result
+
+        if any(result.values()):
+            print(f"INFO:\t 🧹 传感器数据清理完成: {result}")
+        return result
+
+    def _worker_loop(self):
+        """后台清理线程：启动后立即执行一次，之后按间隔执行"""
+        while not self.stop_event.is_set():
+            self.run_once()
+            self.stop_event.wait(self.interval)
+
+    def get_stats(self) -> Dict:
+        """获取清理任务进度与统计"""
+        return {
+            **self.stats,
+            "deleted": dict(self.stats["deleted"]),
+            "running": self.running,
+            "policy": {
+                "raw_days": self.raw_days,
+                **{f"{granularity}_rollup_days": days for granularity, days in self.rollup_days.items()},
+                "chunk_size": self.chunk_size,
+                "interval": self.interval,
+            },
+        }
+
+    def start(self):
+        """启动后台清理线程"""
+        if self.running:
+            return
+        self.running = True
+        self.stop_event.clear()
+        self.worker_thread = threading.Thread(target=self._worker_loop, name="sensor-retention", daemon=True)
+        self.worker_thread.start()
+        print("INFO:\t ✅ 传感器数据保留任务已启动")
+
+    def stop(self):
+        """停止清理线程（当前删除块完成后退出）"""
+        if not self.running:
+            return
+        self.running = False
+        self.stop_event.set()
+        if self.worker_thread:
+            self.worker_thread.join()
+            self.worker_thread = None
+
+
+# 全局数据保留服务实例
+retention_service = RetentionService()
@@ -0,0 +1,138 @@
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.models.sensor_data import SensorRollup
+
+# 参与汇总的数值型指标
+ROLLUP_METRICS = ("temperature", "humidity", "light_intensity", "gas_level")
+
+# 粒度 -> (时间桶长度, 截断到桶起点的 replace 参数, SQLite strftime 格式)
+GRANULARITIES = {
+    "minute": (timedelta(minutes=1), {"second": 0, "microsecond": 0}, "%Y-%m-%d %H:%M:00.000000"),
+    "hour": (timedelta(hours=1), {"minute": 0, "second": 0, "microsecond": 0}, "%Y-%m-%d %H:00:00.000000"),
+    "day": (timedelta(days=1), {"hour": 0, "minute": 0, "second": 0, "microsecond": 0}, "%Y-%m-%d 00:00:00.000000"),
+}
+
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    """计算时间戳所在时间桶的起点"""
+    return timestamp.replace(**GRANULARITIES[granularity][1])
+
+
+class SensorRollupService:
+    """传感器时间桶汇总：写入时增量合并 min/max/sum/count，趋势查询直接读汇总表"""
+
+    def aggregate(self, readings: Iterable) -> List[dict]:
+        """在内存中把一批读数合并为汇总行，每个 (粒度, 指标, 桶, 房屋, 设备) 一行"""
+        buckets: Dict[Tuple, list] = {}
+        for reading in readings:
+            timestamp = reading.timestamp or datetime.now()
+            for granularity in GRANULARITIES:
+                bucket = bucket_start(timestamp, granularity)
+                for metric in ROLLUP_METRICS:
+                    value = getattr(reading, metric)
+                    if value is None:
+                        continue
+                    key = (granularity, metric, bucket, reading.house_id, reading.device_id)
+                    entry = buckets.get(key)
+                    if entry is None:
+                        buckets[key] = [1, value, value, value]
+                    else:
+                        entry[0] += 1
+                        entry[1] += value
+                        if value < entry[2]:
+                            entry[2] = value
+                        if value > entry[3]:
+                            entry[3] = value
+
+        return [
+            {
+                "granularity": granularity, "metric": metric, "bucket": bucket,
+                "house_id": house_id, "device_id": device_id,
+                "count": count, "sum": total, "min": low, "max": high,
+            }
+            for (granularity, metric, bucket, house_id, device_id), (count, total, low, high) in buckets.items()
+        ]
+
+    def apply(self, db: Session, readings: Iterable) -> int:
+        """将一批读数合并进汇总表（在调用方事务内执行），返回写入的汇总行数"""
+        rows = self.aggregate(readings)
+        if not rows:
+            return 0
+
+        stmt = sqlite_insert(SensorRollup)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["granularity", "metric", "bucket", "house_id", "device_id"],
+            set_={
+                "count": SensorRollup.count + stmt.excluded["count"],
+                "sum": SensorRollup.sum + stmt.excluded["sum"],
+                "min": func.min(SensorRollup.min, stmt.excluded["min"]),
+                "max": func.max(SensorRollup.max, stmt.excluded["max"]),
+            }
+        )
+        db.execute(stmt, rows)
+        return len(rows)
+
+    def trend(self, db: Session, metric: str, granularity: str, buckets: int,
+              now: Optional[datetime] = None) -> List[Tuple[datetime, float]]:
+        """获取最近 buckets 个时间桶的全屋均值，按时间倒序"""
+        step = GRANULARITIES[granularity][0]
+        since = bucket_start(now or datetime.now(), granularity) - step * (buckets - 1)
+
+        return db.query(
+            SensorRollup.bucket,
+            (func.sum(SensorRollup.sum) / func.sum(SensorRollup.count)).label("avg")
+        ).filter(
+            SensorRollup.granularity == granularity,
+            SensorRollup.metric == metric,
+            SensorRollup.bucket >= since
+        ).group_by(
+            SensorRollup.bucket
+        ).order_by(
+            SensorRollup.bucket.desc()
+        ).all()
+
+    def summary(self, db: Session, house_id: int, granularity: str,
+                start: datetime, end: datetime) -> Dict[str, dict]:
+        """汇总 [start, end) 内某房屋各指标的 count/avg/min/max（跨设备合并）"""
+        rows = db.query(
+            SensorRollup.metric,
+            func.sum(SensorRollup.count),
+            func.sum(SensorRollup.sum),
+            func.min(SensorRollup.min),
+            func.max(SensorRollup.max)
+        ).filter(
+            SensorRollup.granularity == granularity,
+            SensorRollup.house_id == house_id,
+            SensorRollup.bucket >= start,
+            SensorRollup.bucket < end
+        ).group_by(
+            SensorRollup.metric
+        ).all()
+
+        return {
+            metric: {"count": count, "avg": total / count, "min": low, "max": high}
+            for metric, count, total, low, high in rows if count
+        }
+
+    def backfill(self, conn: Connection):
+        """根据 sensor_data 中已有的原始数据重建汇总表（供迁移使用）"""
+        for granularity, (_, _, time_format) in GRANULARITIES.items():
+            for metric in ROLLUP_METRICS:
+                conn.execute(text(
+                    "INSERT OR REPLACE INTO sensor_rollups "
+                    "(granularity, metric, bucket, house_id, device_id, count, sum, min, max) "
+                    f"SELECT :granularity, :metric, strftime(:time_format, timestamp), house_id, device_id, "
+                    f"count({metric}), sum({metric}), min({metric}), max({metric}) "
+                    f"FROM sensor_data WHERE {metric} IS NOT NULL AND timestamp IS NOT NULL "
+                    "GROUP BY strftime(:time_format, timestamp), house_id, device_id"
+                ), {"granularity": granularity, "metric": metric, "time_format": time_format})
+
+
+# 全局汇总服务实例
+rollup_service = SensorRollupService()
@@ -1,8 +1,13 @@
 from sqlalchemy.orm import Session
-from app.models.scene import Scene, Automation
+from app.models.scene import Scene, SceneExecutionLog, Automation
 from app.models.device import Device
 from app.models.user import User
+from app.config import settings
+from app.database import run_write
+from app.services.command_dispatcher import command_dispatcher, device_bits_for
+from app.services.automation_engine import automation_engine
 import asyncio
+import time
 from datetime import datetime
 
 
@@ -10,203 +15,130 @@ class SceneService:
     def __init__(self, db: Session):
         self.db = db
 
-    async def execute_scene(self, scene: Scene, user: User):
-        """执行场景"""
-        executed_actions = []
+    def apply_actions(self, actions: list, house_id: int):
+        """
+        一次查询载入场景涉及的全部设备，在同一个事务中更新状态。
+        返回 (已更新动作列表, 失败动作列表)，已更新动作为 (执行记录, MQTT控制位) 元组
+        """
+        device_ids = {action_data.get("device_id") for action_data in actions}
+        devices = {
+            device.id: device for device in self.db.query(Device).filter(
+                Device.id.in_(device_ids),
+                Device.house_id == house_id
+            )
+        }
+
+        applied = []
         failed_actions = []
+        for action_data in actions:
+            device_id = action_data.get("device_id")
+            action = action_data.get("action")
+            parameters = action_data.get("parameters", {})
 
-        for action_data in scene.actions:
-            try:
-                device_id = action_data.get("device_id")
-                action = action_data.get("action")
-                parameters = action_data.get("parameters", {})
-
-                # 获取设备
-                device = self.db.query(Device).filter(Device.id == device_id).first()
-                if not device:
-                    failed_actions.append({
-                        "device_id": device_id,
-                        "error": "设备不存在"
-                    })
-                    continue
-
-                # 更新设备状态
-                device.status = parameters
-                device.is_online = True
-                self.db.commit()
-
-                print(f"🎭 场景执行: {device.name} -> {action} -> {parameters}")
-
-                executed_actions.append({
+            device = devices.get(device_id)
+            if not device:
+                failed_actions.append({
                     "device_id": device_id,
-                    "device_name": device.name,
                     "action": action,
-                    "parameters": parameters,
-                    "timestamp": datetime.now().isoformat()
+                    "error": "设备不存在"
                 })
+                continue
+
+            old_status = device.status.copy() if device.status else {}
+            device.status = parameters
+            device.is_online = True
+
+            applied.append(({
+                "device_id": device_id,
+                "device_name": device.name,
+                "device_type": device.device_type,
+                "action": action,
+                "old_status": old_status,
+                "new_status": parameters,
+                "mqtt_sent": False,
+                "timestamp": datetime.now().isoformat()
+            }, device_bits_for(device, parameters.get("power"))))
+
+        self.db.commit()
+        return applied, failed_actions
+
+    @staticmethod
+    async def dispatch_actions(applied: list, timeout: float = None):
+        """并发下发已更新动作的MQTT指令，每个动作单独计时和超时，返回超时的动作列表"""
+        timeout = timeout or settings.SCENE_ACTION_TIMEOUT
+        start = time.perf_counter()
+
+        async def dispatch(record: dict, bits):
+            if bits is None:
+                # 未配置硬件控制位的设备只更新状态
+                record["latency_ms"] = 0.0
+                return None
+            try:
+                ack = await asyncio.wait_for(command_dispatcher.submit(*bits), timeout)
+                record["mqtt_sent"] = ack["success"]
+            except asyncio.TimeoutError:
+                record["error"] = "指令确认超时"
+            record["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            return record if "error" in record else None
 
-                # 模拟设备响应时间
-                await asyncio.sleep(0.1)
+        results = await asyncio.gather(*(dispatch(record, bits) for record, bits in applied))
+        return [record for record in results if record is not None]
 
-            except Exception as e:
-                failed_actions.append({
-                    "device_id": action_data.get("device_id"),
-                    "error": str(e)
-                })
+    async def execute_scene(self, scene: Scene, user: User):
+        """
+        执行场景：发送场景MQTT消息，批量更新设备状态后并发下发指令，记录执行日志，
+        返回带单个动作耗时的执行报告
+        """
+        from app.services.mqtt_service import mqtt_service
+
+        print(f"Executing scene: {scene.name}")
+        start = time.perf_counter()
+        mqtt_success = mqtt_service.publish_scene_execution(scene.name, scene.actions)
+
+        # 状态更新在写连接上执行（线程池中），不阻塞事件循环
+        applied, failed_actions = await run_write(
+            lambda session: SceneService(session).apply_actions(scene.actions, user.house_id)
+        )
+        timed_out = await self.dispatch_actions(applied)
+
+        executed_actions = [record for record, _ in applied if "error" not in record]
+        failed_actions += timed_out
+        for record in executed_actions:
+            print(f"🎭 场景执行: {record['device_name']} -> {record['action']} ({record['latency_ms']}ms)")
+
+        execution_time = time.perf_counter() - start
+        success = not failed_actions
+        print(f"Scene completed: {scene.name}, Success: {success}, Time: {execution_time:.2f}s")
+
+        # 记录执行日志
+        execution_log = SceneExecutionLog(
+            scene_id=scene.id,
+            executed_by=user.id,
+            house_id=user.house_id,
+            execution_result={
+                "executed_actions": executed_actions,
+                "failed_actions": failed_actions,
+                "execution_time": execution_time,
+                "mqtt_scene_sent": mqtt_success
+            },
+            success=success,
+            error_message=None if success else f"{len(failed_actions)} actions failed"
+        )
+        await run_write(lambda session: session.add(execution_log))
 
         return {
+            "success": success,
             "executed_actions": executed_actions,
             "failed_actions": failed_actions,
             "total_actions": len(scene.actions),
             "success_count": len(executed_actions),
-            "failed_count": len(failed_actions)
+            "failed_count": len(failed_actions),
+            "execution_time": round(execution_time, 3),
+            "max_latency_ms": max((record["latency_ms"] for record, _ in applied), default=0.0)
         }
 
     async def check_automation_conditions(self, automation: Automation):
-        """检查自动化条件是否满足"""
+        """检查自动化条件是否满足（使用编译后的规则，条件读取内存中的最新读数和设备状态）"""
         if not automation.is_active:
             return False
-
-        results = []
-
-        for condition_data in automation.conditions:
-            condition_type = condition_data.get("type")
-
-            if condition_type == "time":
-                # 时间条件检查
-                result = self.check_time_condition(condition_data)
-            elif condition_type == "sensor":
-                # 传感器条件检查
-                result = await self.check_sensor_condition(condition_data)
-            elif condition_type == "device":
-                # 设备状态条件检查
-                result = self.check_device_condition(condition_data)
-            else:
-                result = False
-
-            results.append(result)
-
-        # 根据条件逻辑判断
-        if automation.condition_logic == "AND":
-            return all(results)
-        else:  # OR
-            return any(results)
-
-    def check_time_condition(self, condition):
-        """检查时间条件"""
-        # 实现时间条件逻辑
-        # 例如：{"type": "time", "parameter": "hour", "operator": "==", "value": "18"}
-        try:
-            now = datetime.now()
-            parameter = condition.get("parameter")
-            operator = condition.get("operator")
-            value = int(condition.get("value"))
-
-            if parameter == "hour":
-                current_value = now.hour
-            elif parameter == "minute":
-                current_value = now.minute
-            else:
-                return False
-
-            if operator == "==":
-                return current_value == value
-            elif operator == ">":
-                return current_value > value
-            elif operator == "<":
-                return current_value < value
-
-        except:
-            return False
-
-        return False
-
-    async def check_sensor_condition(self, condition):
-        """检查传感器条件"""
-        # 实现传感器数据条件检查
-        # 例如：{"type": "sensor", "device_id": "sensor_001", "parameter": "temperature", "operator": ">", "value": "25"}
-        try:
-            from app.models.sensor_data import SensorData
-
-            device_id = condition.get("device_id")
-            parameter = condition.get("parameter")
-            operator = condition.get("operator")
-            value = float(condition.get("value"))
-
-            # 获取最新传感器数据
-            latest_data = self.db.query(SensorData).filter(
-                SensorData.device_id == device_id
-            ).order_by(SensorData.timestamp.desc()).first()
-
-            if not latest_data:
-                return False
-
-            # 获取传感器值
-            if parameter == "temperature":
-                current_value = latest_data.temperature
-            elif parameter == "humidity":
-                current_value = latest_data.humidity
-            elif parameter == "gas_level":
-                current_value = latest_data.gas_level
-            else:
-                return False
-
-            if current_value is None:
-                return False
-
-            # 比较值
-            if operator == "==":
-                return abs(current_value - value) < 0.1
-            elif operator == ">":
-                return current_value > value
-            elif operator == "<":
-                return current_value < value
-            elif operator == ">=":
-                return current_value >= value
-            elif operator == "<=":
-                return current_value <= value
-
-        except:
-            return False
-
-        return False
-
-    def check_device_condition(self, condition):
-        """检查设备状态条件"""
-        # 实现设备状态条件检查
-        try:
-            device_id = condition.get("device_id")
-            parameter = condition.get("parameter")
-            operator = condition.get("operator")
-            value = condition.get("value")
-
-            device = self.db.query(Device).filter(Device.device_id == device_id).first()
-            if not device or not device.status:
-                return False
-
-            current_value = device.status.get(parameter)
-            if current_value is None:
-                return False
-
-            # 类型转换和比较
-            if operator == "==":
-                return str(current_value) == str(value)
-            elif operator != "==":
-                try:
-                    current_value = float(current_value)
-                    value = float(value)
-                    if operator == ">":
-                        return current_value > value
-                    elif operator == "<":
-                        return current_value < value
-                    elif operator == ">=":
-                        return current_value >= value
-                    elif operator == "<=":
-                        return current_value <= value
-                except:
-                    return False
-
-        except:
-            return False
-
-        return False
\ No newline at end of file
+        return automation_engine.evaluate(automation)
@@ -1,11 +1,57 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc, asc
-from typing import List, Optional, Dict, Any
+from sqlalchemy import and_, or_, desc, asc, case, func, tuple_, insert, select, false, literal
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, timedelta, date
+import base64
 import calendar
+import json
 
 from app.models.schedule import Schedule, ScheduleReminder, RecurringSchedule, Priority
-from app.schemas.schedule import ScheduleCreate, ScheduleUpdate, ScheduleListQuery, ScheduleResponse
+from app.schemas.schedule import (
+    ScheduleCreate, ScheduleUpdate, ScheduleListQuery, ScheduleResponse, ScheduleOccurrence
+)
+from app.services.recurrence_service import recurrence_expander
+from app.services.reminder_queue import reminder_queue
+
+
+def _count_if(condition):
+    return func.sum(case((condition, 1), else_=0))
+
+
+def _schedule_json():
+    """在SQL中把日程行编码为与 ScheduleResponse 序列化结果相同的JSON对象"""
+    return func.json_object(
+        "id", Schedule.id,
+        "title", Schedule.title,
+        "description", Schedule.description,
+        "date", Schedule.date,
+        "time", Schedule.time,
+        "location", Schedule.location,
+        # Enum 列存的是成员名（HIGH），取值为其小写
+        "priority", func.lower(Schedule.priority),
+        "reminder", Schedule.reminder,
+        "completed", func.json(case((Schedule.completed == True, "true"), else_="false")),
+        "created_by", Schedule.created_by,
+        "house_id", Schedule.house_id,
+        "created_at", func.replace(Schedule.created_at, " ", "T"),
+        "updated_at", func.replace(Schedule.updated_at, " ", "T"),
+        "completed_at", func.replace(Schedule.completed_at, " ", "T"),
+        "is_recurring", func.json("false")
+    )
+
+
+def encode_cursor(schedule: Schedule) -> str:
+    """键集分页游标：最后一条日程的 (date, time, id)"""
+    raw = f"{schedule.date}|{schedule.time}|{schedule.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str, int]:
+    try:
+        date_str, time_str, schedule_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return date_str, time_str, int(schedule_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("无效的分页游标")
 
 
 class ScheduleService:
@@ -100,6 +146,7 @@ class ScheduleService:
         # 删除日程
         self.db.delete(db_schedule)
         self.db.commit()
+        reminder_queue.discard_schedules([schedule_id])
 
         return True
 
@@ -117,22 +164,30 @@ class ScheduleService:
         if query.priority:
             conditions.append(Schedule.priority == query.priority)
 
-        # 执行查询
-        base_query = self.db.query(Schedule)
+        if query.cursor is not None:
+            return self._get_schedules_after_cursor(conditions, query)
+
+        # 总数随分页查询一起用窗口函数算出，不再单独 count()
+        base_query = self.db.query(Schedule, func.count().over())
         if conditions:
             base_query = base_query.filter(and_(*conditions))
 
-        # 计算总数
-        total = base_query.count()
-
-        # 分页和排序
-        schedules = base_query.order_by(
+        rows = base_query.order_by(
             asc(Schedule.date),
-            asc(Schedule.time)
+            asc(Schedule.time),
+            asc(Schedule.id)
         ).offset((query.page - 1) * query.size).limit(query.size).all()
 
+        if rows:
+            total = rows[0][1]
+        elif query.page > 1:
+            # 页码超出范围时没有行可带回总数
+            total = self.db.query(func.count(Schedule.id)).filter(*conditions).scalar()
+        else:
+            total = 0
+
         # 转换为Pydantic模型
-        schedule_responses = [ScheduleResponse.from_orm(schedule) for schedule in schedules]
+        schedule_responses = [ScheduleResponse.from_orm(schedule) for schedule, _ in rows]
 
         return {
             "schedules": schedule_responses,
@@ -142,54 +197,152 @@ class ScheduleService:
             "total_pages": (total + query.size - 1) // query.size
         }
 
+    def _get_schedules_after_cursor(self, conditions: list, query: ScheduleListQuery) -> Dict[str, Any]:
+        """键集分页：从游标位置沿 (date, time, id) 索引继续读取，不做 COUNT 和 OFFSET 扫描"""
+        if query.cursor:
+            conditions = conditions + [
+                tuple_(Schedule.date, Schedule.time, Schedule.id) > tuple_(*decode_cursor(query.cursor))
+            ]
+
+        schedules = self.db.query(Schedule).filter(*conditions).order_by(
+            asc(Schedule.date),
+            asc(Schedule.time),
+            asc(Schedule.id)
+        ).limit(query.size + 1).all()
+
+        has_more = len(schedules) > query.size
+        schedules = schedules[:query.size]
+
+        return {
+            "schedules": [ScheduleResponse.from_orm(schedule) for schedule in schedules],
+            "size": query.size,
+            "has_more": has_more,
+            "next_cursor": encode_cursor(schedules[-1]) if has_more else None
+        }
+
+    def get_recurring_occurrences(self, start_date: date, end_date: date) -> List[ScheduleOccurrence]:
+        """获取日期范围内重复日程的发生实例（按规则缓存展开结果）"""
+        return [
+            ScheduleOccurrence(
+                recurring_id=rule.id,
+                title=rule.title,
+                description=rule.description,
+                date=day.strftime('%Y-%m-%d'),
+                time=rule.time,
+                location=rule.location,
+                priority=rule.priority or Priority.MEDIUM,
+                reminder=rule.reminder,
+                created_by=rule.created_by,
+                house_id=rule.house_id
+            )
+            for day, rule in recurrence_expander.expand(self.db, start_date, end_date)
+        ]
+
     def get_calendar_data(self, year: int, month: int) -> Dict[str, Any]:
-        """获取月历视图数据（显示所有日程）"""
+        """
+        获取月历视图数据（显示所有日程，包括重复日程展开的实例）：
+        一条按日期 GROUP BY 的查询同时算出每天的数量、完成数、高优先级数和当天的日程JSON
+        """
         # 计算月份的日期范围
         start_date = date(year, month, 1)
         last_day = calendar.monthrange(year, month)[1]
         end_date = date(year, month, last_day)
 
         # 获取该月所有日程（无用户限制）
-        schedules = self.db.query(Schedule).filter(
+        rows = self.db.query(
+            Schedule.date,
+            func.count(Schedule.id),
+            _count_if(Schedule.completed == True),
+            _count_if(Schedule.priority == Priority.HIGH),
+            func.json_group_array(_schedule_json())
+        ).filter(
             and_(
                 Schedule.date >= start_date.strftime('%Y-%m-%d'),
                 Schedule.date <= end_date.strftime('%Y-%m-%d')
             )
-        ).order_by(asc(Schedule.date), asc(Schedule.time)).all()
-
-        # 按日期分组
-        calendar_data = {}
-        for schedule in schedules:
-            date_key = schedule.date
-            if date_key not in calendar_data:
-                calendar_data[date_key] = {
-                    "date": date_key,
-                    "schedules": [],
-                    "total_count": 0,
-                    "completed_count": 0,
-                    "high_priority_count": 0
-                }
-
-            # 转换为Pydantic模型
-            schedule_response = ScheduleResponse.from_orm(schedule)
-            calendar_data[date_key]["schedules"].append(schedule_response)
-            calendar_data[date_key]["total_count"] += 1
-
-            if schedule.completed:
-                calendar_data[date_key]["completed_count"] += 1
-            if schedule.priority == Priority.HIGH:
-                calendar_data[date_key]["high_priority_count"] += 1
-
+        ).group_by(Schedule.date).all()
+
+        calendar_data = {
+            date_key: {
+                "date": date_key,
+                "schedules": json.loads(schedules),
+                "total_count": total,
+                "completed_count": completed,
+                "high_priority_count": high
+            }
+            for date_key, total, completed, high, schedules in rows
+        }
+        one_off_count = sum(day["total_count"] for day in calendar_data.values())
+
+        # 合并重复日程实例
+        occurrences = self.get_recurring_occurrences(start_date, end_date)
+        for occurrence in occurrences:
+            day = calendar_data.setdefault(occurrence.date, {
+                "date": occurrence.date,
+                "schedules": [],
+                "total_count": 0,
+                "completed_count": 0,
+                "high_priority_count": 0
+            })
+            day["schedules"].append(occurrence.dict())
+            day["total_count"] += 1
+            if occurrence.priority == Priority.HIGH:
+                day["high_priority_count"] += 1
+
+        days = sorted(calendar_data.values(), key=lambda day: day["date"])
+        for day in days:
+            day["schedules"].sort(key=lambda entry: (entry["time"], entry.get("id", 0)))
+
+        total = one_off_count + len(occurrences)
         return {
             "year": year,
             "month": month,
-            "calendar_data": list(calendar_data.values()),
-            "total_schedules": len(schedules),
+            "calendar_data": days,
+            "total_schedules": total,
             "summary": {
-                "total_days_with_schedules": len(calendar_data),
-                "total_schedules": len(schedules),
-                "completed_schedules": sum(s.completed for s in schedules),
-                "high_priority_schedules": sum(1 for s in schedules if s.priority == Priority.HIGH)
+                "total_days_with_schedules": len(days),
+                "total_schedules": total,
+                "recurring_schedules": len(occurrences),
+                "completed_schedules": sum(day["completed_count"] for day in days),
+                "high_priority_schedules": sum(day["high_priority_count"] for day in days)
+            }
+        }
+
+    def get_statistics_overview(self, today: date) -> Dict[str, Any]:
+        """近7天和近30天的完成率及优先级分布，一次聚合查询算出"""
+        week_start = (today - timedelta(days=7)).strftime('%Y-%m-%d')
+        month_start = (today - timedelta(days=30)).strftime('%Y-%m-%d')
+        in_week = Schedule.date >= week_start
+
+        row = self.db.query(
+            _count_if(in_week),
+            _count_if(and_(in_week, Schedule.completed == True)),
+            func.count(Schedule.id),
+            _count_if(Schedule.completed == True),
+            _count_if(Schedule.priority == Priority.HIGH),
+            _count_if(Schedule.priority == Priority.MEDIUM),
+            _count_if(Schedule.priority == Priority.LOW)
+        ).filter(
+            Schedule.date >= month_start,
+            Schedule.date <= today.strftime('%Y-%m-%d')
+        ).one()
+        week_total, week_completed, month_total, month_completed, high, medium, low = (value or 0 for value in row)
+
+        return {
+            "week_stats": {
+                "total": week_total,
+                "completed": week_completed,
+                "completion_rate": round(week_completed / week_total * 100, 1) if week_total else 0
+            },
+            "month_stats": {
+                "total": month_total,
+                "completed": month_completed,
+                "completion_rate": round(month_completed / month_total * 100, 1) if month_total else 0
+            },
+            "priority_distribution": {
+                "high": high,
+                "medium": medium,
+                "low": low
             }
         }
 
@@ -210,48 +363,93 @@ class ScheduleService:
         return ScheduleResponse.from_orm(db_schedule)
 
     def batch_operations(self, schedule_ids: List[int], operation: str, data: Optional[Dict] = None) -> Dict[str, Any]:
-        """批量操作日程（任何人都可以操作）"""
-        # 获取所有指定的日程（无用户限制）
-        schedules = self.db.query(Schedule).filter(Schedule.id.in_(schedule_ids)).all()
-
-        if not schedules:
-            return {"success": False, "message": "没有找到指定的日程", "affected_count": 0}
+        """
+        批量操作日程（任何人都可以操作）：每种操作是一条集合式 UPDATE/DELETE，
+        相关提醒在同一事务中处理，影响行数取自语句结果
+        """
+        schedule_ids = list(set(schedule_ids))
+        targets = Schedule.id.in_(schedule_ids)
+        now = datetime.now()
 
-        affected_count = 0
+        if operation == "update_priority" and data and "priority" in data:
+            # 执行语句之前校验参数，无效的值按请求错误返回
+            try:
+                priority = Priority(data["priority"])
+            except ValueError:
+                return {"success": False, "message": f"无效的优先级: {data['priority']}", "affected_count": 0}
 
         if operation == "complete":
-            for schedule in schedules:
-                schedule.completed = True
-                schedule.completed_at = datetime.now()
-                schedule.updated_at = datetime.now()
-                affected_count += 1
+            affected_count = self.db.query(Schedule).filter(targets).update({
+                Schedule.completed: True,
+                Schedule.completed_at: now,
+                Schedule.updated_at: now
+            }, synchronize_session=False)
 
         elif operation == "delete":
-            # 删除相关提醒
+            # 先删除相关提醒，再删除日程
             self.db.query(ScheduleReminder).filter(
-                ScheduleReminder.schedule_id.in_([s.id for s in schedules])
-            ).delete()
-
-            # 删除日程
-            for schedule in schedules:
-                self.db.delete(schedule)
-                affected_count += 1
+                ScheduleReminder.schedule_id.in_(schedule_ids)
+            ).delete(synchronize_session=False)
+            affected_count = self.db.query(Schedule).filter(targets).delete(synchronize_session=False)
 
         elif operation == "update_priority" and data and "priority" in data:
-            new_priority = Priority(data["priority"])
-            for schedule in schedules:
-                schedule.priority = new_priority
-                schedule.updated_at = datetime.now()
-                affected_count += 1
+            affected_count = self.db.query(Schedule).filter(targets).update({
+                Schedule.priority: priority,
+                Schedule.updated_at: now
+            }, synchronize_session=False)
+
+        elif operation == "reschedule" and data and "date" in data:
+            new_date = datetime.strptime(data["date"], "%Y-%m-%d").strftime("%Y-%m-%d")
+            values = {Schedule.date: new_date, Schedule.updated_at: now}
+            if data.get("time"):
+                values[Schedule.time] = datetime.strptime(data["time"], "%H:%M").strftime("%H:%M")
+            affected_count = self.db.query(Schedule).filter(targets).update(values, synchronize_session=False)
+            if affected_count:
+                self._reschedule_reminders(schedule_ids)
+
+        else:
+            return {"success": False, "message": f"不支持的批量操作或缺少参数: {operation}", "affected_count": 0}
+
+        if not affected_count:
+            self.db.rollback()
+            return {"success": False, "message": "没有找到指定的日程", "affected_count": 0}
 
         self.db.commit()
 
+        # 完成的日程不再提醒，删除和改期的日程提醒已删除或重建
+        reminder_queue.discard_schedules(schedule_ids)
+        if operation == "reschedule":
+            for reminder_id, schedule_id, reminder_time in self.db.query(
+                ScheduleReminder.id, ScheduleReminder.schedule_id, ScheduleReminder.reminder_time
+            ).filter(ScheduleReminder.schedule_id.in_(schedule_ids)).all():
+                reminder_queue.add(reminder_id, schedule_id, reminder_time)
+
         return {
             "success": True,
             "message": f"批量{operation}操作成功",
             "affected_count": affected_count
         }
 
+    def _reschedule_reminders(self, schedule_ids: List[int]):
+        """按日程的新日期时间重建提醒：一条 DELETE 加一条 INSERT ... SELECT（不提交）"""
+        self.db.query(ScheduleReminder).filter(
+            ScheduleReminder.schedule_id.in_(schedule_ids)
+        ).delete(synchronize_session=False)
+
+        # 与 SQLAlchemy 写入 DateTime 列的格式保持一致（带6位微秒）
+        reminder_time = func.datetime(
+            Schedule.date + " " + Schedule.time,
+            "-" + Schedule.reminder + " minutes"
+        ) + ".000000"
+        self.db.execute(insert(ScheduleReminder).from_select(
+            ["schedule_id", "reminder_time", "is_sent", "reminder_type", "created_at"],
+            select(Schedule.id, reminder_time, false(), literal("notification"), func.now()).where(
+                Schedule.id.in_(schedule_ids),
+                Schedule.reminder.isnot(None),
+                Schedule.reminder != "none"
+            )
+        ))
+
     def _check_time_conflicts(self, date_str: str, time_str: str, exclude_id: Optional[int] = None) -> List[Schedule]:
         """检查时间冲突（检查所有日程）"""
         conditions = [
@@ -282,6 +480,7 @@ class ScheduleService:
 
         self.db.add(reminder)
         self.db.commit()
+        reminder_queue.add(reminder.id, schedule.id, reminder_time)
 
     def _update_reminders(self, schedule: Schedule, new_reminder: Optional[str]):
         """更新提醒设置"""
@@ -289,6 +488,7 @@ class ScheduleService:
         self.db.query(ScheduleReminder).filter(
             ScheduleReminder.schedule_id == schedule.id
         ).delete()
+        reminder_queue.discard_schedules([schedule.id])
 
         # 创建新提醒
         if new_reminder and new_reminder != "none":
@@ -309,8 +509,17 @@ class ScheduleService:
 
     def mark_reminder_sent(self, reminder_id: int):
         """标记提醒已发送"""
-        reminder = self.db.query(ScheduleReminder).filter(ScheduleReminder.id == reminder_id).first()
-        if reminder:
-            reminder.is_sent = True
-            reminder.sent_at = datetime.now()
-            self.db.commit()
\ No newline at end of file
+        self.mark_reminders_sent([reminder_id])
+
+    def mark_reminders_sent(self, reminder_ids: List[int]) -> int:
+        """一条 UPDATE 批量标记提醒已发送，返回更新行数"""
+        if not reminder_ids:
+            return 0
+        count = self.db.query(ScheduleReminder).filter(
+            ScheduleReminder.id.in_(reminder_ids)
+        ).update({
+            ScheduleReminder.is_sent: True,
+            ScheduleReminder.sent_at: datetime.now()
+        }, synchronize_session=False)
+        self.db.commit()
+        return count
\ No newline at end of file
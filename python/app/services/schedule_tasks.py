@@ -1,13 +1,16 @@
-import asyncio
 import logging
 from datetime import datetime, timedelta
 from typing import List
 
-from app.database import SessionLocal
+from sqlalchemy import select
+
+from app.config import settings
+from app.database import SessionLocal, AsyncSessionLocal, run_write
 from app.models.schedule import Schedule, ScheduleReminder
 from app.models.user import User
+from app.services.reminder_queue import reminder_queue
 from app.services.schedule_service import ScheduleService
-# from app.services.websocket_manager import websocket_manager
+from app.services.websocket_manager import websocket_manager
 
 logger = logging.getLogger(__name__)
 
@@ -15,81 +18,65 @@ logger = logging.getLogger(__name__)
 class ScheduleTaskManager:
     def __init__(self):
         self.running = False
-        self.reminder_task = None
 
     async def start_background_tasks(self):
-        """启动后台任务"""
+        """启动后台任务：载入提醒队列，到期时由定时调度器唤醒投递"""
         if self.running:
             return
 
         self.running = True
         logger.info("🕐 日程后台任务管理器启动")
 
-        # 启动提醒任务
-        self.reminder_task = asyncio.create_task(self._reminder_loop())
+        reminder_queue.deliver = self._process_reminders
+        await reminder_queue.reload()
 
     async def stop_background_tasks(self):
         """停止后台任务"""
         self.running = False
-
-        if self.reminder_task:
-            self.reminder_task.cancel()
-            try:
-                await self.reminder_task
-            except asyncio.CancelledError:
-                pass
+        reminder_queue.stop()
+        reminder_queue.deliver = None
 
         logger.info("🛑 日程后台任务管理器停止")
 
-    async def _reminder_loop(self):
-        """提醒循环任务"""
-        while self.running:
-            try:
-                await self._process_reminders()
-                await asyncio.sleep(60)  # 每分钟检查一次
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                logger.error(f"提醒任务处理异常: {e}")
-                await asyncio.sleep(60)
-
-    async def _process_reminders(self):
-        """处理待发送的提醒"""
-        db = SessionLocal()
-        try:
-            schedule_service = ScheduleService(db)
-
-            # 获取待发送的提醒
-            pending_reminders = schedule_service.get_pending_reminders()
-
-            if not pending_reminders:
+    async def _process_reminders(self, reminder_ids: List[int]):
+        """
+        投递到期提醒：一次查询取出提醒、日程和用户，一条 UPDATE 标记送达的提醒；
+        用户离线未送达的提醒保持未发送，隔一段时间重新加入队列投递
+        """
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(ScheduleReminder, Schedule, User)
+                .join(Schedule, ScheduleReminder.schedule_id == Schedule.id)
+                .join(User, Schedule.created_by == User.id)
+                .where(
+                    ScheduleReminder.id.in_(reminder_ids),
+                    ScheduleReminder.is_sent == False,
+                    Schedule.completed == False  # 只提醒未完成的日程
+                )
+            )).all()
+
+            if not rows:
                 return
 
-            logger.info(f"📅 处理 {len(pending_reminders)} 个待发送提醒")
+            logger.info(f"📅 处理 {len(rows)} 个待发送提醒")
 
-            for reminder in pending_reminders:
-                await self._send_reminder(reminder, db)
-                schedule_service.mark_reminder_sent(reminder.id)
+            sent_ids, pending = [], []
+            for reminder, schedule, user in rows:
+                if await self._send_reminder(reminder, schedule, user):
+                    sent_ids.append(reminder.id)
+                else:
+                    pending.append((reminder.id, reminder.schedule_id))
 
-        except Exception as e:
-            logger.error(f"处理提醒时出错: {e}")
-        finally:
-            db.close()
+        if sent_ids:
+            await run_write(lambda session: ScheduleService(session).mark_reminders_sent(sent_ids))
 
-    async def _send_reminder(self, reminder: ScheduleReminder, db):
-        """发送单个提醒"""
-        try:
-            # 获取关联的日程和用户信息
-            schedule = db.query(Schedule).filter(Schedule.id == reminder.schedule_id).first()
-            if not schedule:
-                logger.warning(f"提醒 {reminder.id} 关联的日程不存在")
-                return
-
-            user = db.query(User).filter(User.id == schedule.created_by).first()
-            if not user:
-                logger.warning(f"提醒 {reminder.id} 关联的用户不存在")
-                return
+        retry_at = datetime.now() + timedelta(seconds=settings.REMINDER_RETRY_SECONDS)
+        for reminder_id, schedule_id in pending:
+            reminder_queue.add(reminder_id, schedule_id, retry_at)
 
+    async def _send_reminder(self, reminder: ScheduleReminder, schedule: Schedule, user: User) -> bool:
+        """发送单个提醒（日程和用户已随提醒一起查出），返回是否送达"""
+        try:
             # 计算距离日程开始还有多长时间
             schedule_datetime = datetime.strptime(f"{schedule.date} {schedule.time}", "%Y-%m-%d %H:%M")
             now = datetime.now()
@@ -125,12 +112,14 @@ class ScheduleTaskManager:
             if success:
                 logger.info(f"✅ 提醒已发送: {schedule.title} -> 用户 {user.username}")
             else:
-                # 用户离线，可以考虑其他通知方式
+                # 用户离线，提醒保持未发送，稍后重新投递
                 logger.info(f"💤 用户离线，提醒暂存: {schedule.title} -> 用户 {user.username}")
                 # 这里可以添加离线通知逻辑，比如邮件或短信
+            return success
 
         except Exception as e:
             logger.error(f"发送提醒时出错: {e}")
+            return False
 
     async def create_daily_summary_task(self):
         """每日摘要任务（可以在特定时间运行）"""
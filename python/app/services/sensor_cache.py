@@ -0,0 +1,146 @@
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.sensor_data import SensorData
+
+# 缓存的测量字段
+METRICS = ("temperature", "humidity", "human_detected", "light_intensity", "gas_level", "flame_detected")
+
+# 看板的 /sensors/latest 只显示温度、燃气浓度的最近一个正值，单独记录；其余读者使用原始最新值
+POSITIVE_METRICS = ("temperature", "gas_level")
+
+
+class LatestReadingCache:
+    """进程内最新传感器读数缓存，按 (house_id, device_id, metric) 索引，写入路径同步更新"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (house_id, device_id, metric) -> (value, timestamp)
+        self._values: Dict[tuple, tuple] = {}
+        # (house_id, metric) -> (value, timestamp, device_id)，全屋最新值
+        self._house_latest: Dict[tuple, tuple] = {}
+        # (house_id, device_id) -> 最近一次上报时间
+        self._device_seen: Dict[tuple, datetime] = {}
+        # (house_id, metric) -> (value, timestamp)，POSITIVE_METRICS 的全屋最近正值
+        self._house_positive: Dict[tuple, tuple] = {}
+        self.loaded = False
+
+    def _put(self, house_id: int, device_id: str, metric: str, value, timestamp: datetime):
+        """写入单个测量值（调用方持有锁），只接受不早于当前缓存的数据"""
+        if value is None:
+            return
+        if metric in POSITIVE_METRICS and value > 0:
+            self._put_positive(house_id, metric, value, timestamp)
+
+        key = (house_id, device_id, metric)
+        current = self._values.get(key)
+        if current is None or timestamp >= current[1]:
+            self._values[key] = (value, timestamp)
+
+        house_key = (house_id, metric)
+        current = self._house_latest.get(house_key)
+        if current is None or timestamp >= current[1]:
+            self._house_latest[house_key] = (value, timestamp, device_id)
+
+        seen_key = (house_id, device_id)
+        seen = self._device_seen.get(seen_key)
+        if seen is None or timestamp > seen:
+            self._device_seen[seen_key] = timestamp
+
+    def _put_positive(self, house_id: int, metric: str, value, timestamp: datetime):
+        key = (house_id, metric)
+        current = self._house_positive.get(key)
+        if current is None or timestamp >= current[1]:
+            self._house_positive[key] = (value, timestamp)
+
+    def update(self, reading):
+        """用一条读数更新缓存（SensorReading 或 SensorData 均可）"""
+        timestamp = reading.timestamp or datetime.now()
+        with self.lock:
+            for metric in METRICS:
+                self._put(reading.house_id, reading.device_id, metric, getattr(reading, metric), timestamp)
+
+    def update_many(self, readings: Iterable):
+        """批量更新缓存"""
+        with self.lock:
+            for reading in readings:
+                timestamp = reading.timestamp or datetime.now()
+                for metric in METRICS:
+                    self._put(reading.house_id, reading.device_id, metric, getattr(reading, metric), timestamp)
+
+    def get(self, house_id: int, device_id: str, metric: str):
+        """获取设备某项指标的最新值"""
+        entry = self._values.get((house_id, device_id, metric))
+        return entry[0] if entry else None
+
+    def house_value(self, house_id: int, metric: str):
+        """获取全屋某项指标的最新值（不区分设备）"""
+        entry = self._house_latest.get((house_id, metric))
+        return entry[0] if entry else None
+
+    def house_positive_value(self, house_id: int, metric: str):
+        """获取全屋某项指标最近一次的正值（仅 POSITIVE_METRICS）"""
+        entry = self._house_positive.get((house_id, metric))
+        return entry[0] if entry else None
+
+    def device_snapshot(self, house_id: int, device_id: str) -> Optional[dict]:
+        """获取设备所有指标的最新值，设备从未上报时返回None"""
+        last_update = self._device_seen.get((house_id, device_id))
+        if last_update is None:
+            return None
+        snapshot = {metric: self.get(house_id, device_id, metric) for metric in METRICS}
+        snapshot["timestamp"] = last_update
+        return snapshot
+
+    def load(self, db: Session):
+        """启动时从数据库重建缓存：每个指标一条 GROUP BY 查询"""
+        with self.lock:
+            self._values.clear()
+            self._house_latest.clear()
+            self._device_seen.clear()
+            self._house_positive.clear()
+
+            for metric in METRICS:
+                column = getattr(SensorData, metric)
+                # SQLite 中与 max() 同时查询的裸列取自最大值所在的行
+                rows = db.query(
+                    SensorData.house_id,
+                    SensorData.device_id,
+                    column,
+                    func.max(SensorData.timestamp)
+                ).filter(
+                    column.isnot(None)
+                ).group_by(
+                    SensorData.house_id, SensorData.device_id
+                ).all()
+
+                for house_id, device_id, value, timestamp in rows:
+                    self._put(house_id, device_id, metric, value, timestamp)
+
+            # 最新值不是正值时，最近正值需要单独查询
+            for metric in POSITIVE_METRICS:
+                column = getattr(SensorData, metric)
+                rows = db.query(
+                    SensorData.house_id,
+                    column,
+                    func.max(SensorData.timestamp)
+                ).filter(
+                    column > 0
+                ).group_by(
+                    SensorData.house_id
+                ).all()
+
+                for house_id, value, timestamp in rows:
+                    self._put_positive(house_id, metric, value, timestamp)
+
+            self.loaded = True
+
+        print(f"INFO:\t ✅ 最新传感器读数缓存已加载: {len(self._device_seen)} 个设备")
+
+
+# 全局最新读数缓存实例
+latest_cache = LatestReadingCache()
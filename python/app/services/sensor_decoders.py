@@ -0,0 +1,139 @@
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+import paho.mqtt.client as mqtt
+
+
+class SensorReading(NamedTuple):
+    """解码后的传感器读数（轻量元组，写库时才转换为数据库行）"""
+    device_id: str
+    house_id: int
+    temperature: Optional[float]
+    humidity: Optional[float]
+    human_detected: Optional[int]
+    light_intensity: Optional[int]
+    gas_level: Optional[float]
+    flame_detected: bool
+    timestamp: datetime
+
+
+# 可由解码器填充的测量字段（按SensorReading中的顺序）
+MEASUREMENT_FIELDS = SensorReading._fields[2:-1]
+
+
+def _flag(raw: bytes) -> bool:
+    """解析 0/1 标志位"""
+    return int(raw) != 0
+
+
+def compile_csv_decoder(columns: Dict[str, Tuple[int, Callable]], separator: bytes = b",") -> Callable:
+    """
+    将CSV字段映射编译为解码函数
+
+    Args:
+        columns: {测量字段名: (CSV列下标, 转换函数)}，转换函数直接接收bytes
+        separator: 字段分隔符
+
+    Returns:
+        decode(payload, device_id, house_id) -> Optional[SensorReading]
+    """
+    unknown = set(columns) - set(MEASUREMENT_FIELDS)
+    if unknown:
+        raise ValueError(f"未知的传感器字段: {sorted(unknown)}")
+
+    width = max(index for index, _ in columns.values()) + 1
+    # 预先按SensorReading字段顺序排好 (下标, 转换函数)，解码时只做一次遍历
+    plan = tuple(columns.get(name, (None, None)) for name in MEASUREMENT_FIELDS)
+    now = datetime.now
+
+    def decode(payload, device_id: str, house_id: int) -> Optional[SensorReading]:
+        # bytes(bytes) 不会复制，memoryview/bytearray 只在这里转换一次
+        parts = bytes(payload).split(separator)
+        if len(parts) < width:
+            return None
+        try:
+            values = [None if index is None else convert(parts[index]) for index, convert in plan]
+        except ValueError:
+            return None
+        return SensorReading(device_id, house_id, *values, now())
+
+    return decode
+
+
+class DecoderRegistry:
+    """按MQTT主题注册的载荷解码器"""
+
+    def __init__(self):
+        self._exact: Dict[str, tuple] = {}
+        self._wildcard: List[tuple] = []
+        self.stats = {"decoded": 0, "rejected": 0, "unknown_topic": 0}
+
+    def register(
+            self,
+            topic: str,
+            decoder: Callable,
+            device_id: Union[str, Callable[[str], str]],
+            house_id: int = 1,
+            qos: int = 1
+    ):
+        """
+        注册主题解码器
+
+        device_id 可以是固定字符串，也可以是根据主题计算设备ID的函数（用于通配符主题）
+        """
+        entry = (topic, decoder, device_id, house_id, qos)
+        if "+" in topic or "#" in topic:
+            self._wildcard = [e for e in self._wildcard if e[0] != topic] + [entry]
+        else:
+            self._exact[topic] = entry
+
+    def unregister(self, topic: str):
+        """移除主题解码器"""
+        self._exact.pop(topic, None)
+        self._wildcard = [e for e in self._wildcard if e[0] != topic]
+
+    def _lookup(self, topic: str) -> Optional[tuple]:
+        entry = self._exact.get(topic)
+        if entry is not None:
+            return entry
+        for entry in self._wildcard:
+            if mqtt.topic_matches_sub(entry[0], topic):
+                return entry
+        return None
+
+    def decode(self, topic: str, payload) -> Optional[SensorReading]:
+        """解码一条MQTT消息，未注册主题或载荷无效时返回None"""
+        entry = self._lookup(topic)
+        if entry is None:
+            self.stats["unknown_topic"] += 1
+            return None
+
+        _, decoder, device_id, house_id, _ = entry
+        if callable(device_id):
+            device_id = device_id(topic)
+
+        reading = decoder(payload, device_id, house_id)
+        if reading is None:
+            self.stats["rejected"] += 1
+        else:
+            self.stats["decoded"] += 1
+        return reading
+
+    def subscriptions(self) -> List[Tuple[str, int]]:
+        """需要订阅的主题列表"""
+        return [(e[0], e[4]) for e in list(self._exact.values()) + self._wildcard]
+
+
+# hi3861开发板上报格式: 火焰,可燃气体,人体,光照,温度,湿度
+decode_hi3861 = compile_csv_decoder({
+    "flame_detected": (0, _flag),  # 是否检测到火焰
+    "gas_level": (1, float),  # 可燃气体浓度
+    "human_detected": (2, int),  # 人体检测
+    "light_intensity": (3, int),  # 光照强度
+    "temperature": (4, float),  # 温度
+    "humidity": (5, float),  # 湿度
+})
+
+# 全局解码器注册表
+decoder_registry = DecoderRegistry()
+decoder_registry.register("hi3861/publish", decode_hi3861, device_id="hi3861_001")
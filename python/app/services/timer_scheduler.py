@@ -0,0 +1,142 @@
+import asyncio
+import heapq
+import itertools
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Hashable, Optional
+
+
+class TimerScheduler:
+    """
+    最小堆定时器：按到期时间保存所有定时任务，后台协程睡眠到最早的到期时间再唤醒，没有固定周期的轮询。
+    任务以 key 标识，重复 schedule 同一 key 会替换原时间，cancel 采用惰性删除。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (到期时间, 序号, key)，序号保证同一时间按加入顺序执行
+        self.heap = []
+        # key -> (到期时间, 序号, 回调)，与堆顶比对序号判断堆中条目是否仍然有效
+        self.entries: Dict[Hashable, tuple] = {}
+        self.counter = itertools.count()
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.wakeup: Optional[asyncio.Event] = None
+        self.task: Optional[asyncio.Task] = None
+
+        self.stats = {
+            "scheduled": 0,
+            "cancelled": 0,
+            "fired": 0,
+            "errors": 0,
+            "wakeups": 0,
+        }
+
+    def schedule(self, key: Hashable, when: datetime, callback: Callable):
+        """添加或替换定时任务（可在任意线程调用），callback 在事件循环中执行，可返回协程"""
+        with self.lock:
+            seq = next(self.counter)
+            self.entries[key] = (when, seq, callback)
+            heapq.heappush(self.heap, (when, seq, key))
+            is_head = self.heap[0][1] == seq
+            self.stats["scheduled"] += 1
+            self._compact()
+        # 只有新任务成为最早到期时才需要提前唤醒
+        if is_head:
+            self._wake()
+
+    def cancel(self, key: Hashable):
+        with self.lock:
+            if self.entries.pop(key, None) is not None:
+                self.stats["cancelled"] += 1
+                self._compact()
+
+    def _compact(self):
+        """失效条目过多时重建堆（调用方持有锁）"""
+        if len(self.heap) > 2 * len(self.entries) + 64:
+            self.heap = [(when, seq, key) for key, (when, seq, _) in self.entries.items()]
+            heapq.heapify(self.heap)
+
+    def _pop_due(self, now: datetime) -> list:
+        """取出全部已到期的有效任务"""
+        due = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                when, seq, key = heapq.heappop(self.heap)
+                entry = self.entries.get(key)
+                if entry is None or entry[1] != seq:
+                    continue
+                del self.entries[key]
+                due.append((key, entry[2]))
+        return due
+
+    def _next_delay(self, now: datetime) -> Optional[float]:
+        """距离最早有效任务的秒数，没有任务返回None"""
+        with self.lock:
+            while self.heap:
+                when, seq, key = self.heap[0]
+                entry = self.entries.get(key)
+                if entry is not None and entry[1] == seq:
+                    return max((when - now).total_seconds(), 0.0)
+                heapq.heappop(self.heap)
+        return None
+
+    def _wake(self):
+        if self.loop is not None and self.wakeup is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    async def _run(self):
+        while True:
+            self.wakeup.clear()
+            for key, callback in self._pop_due(datetime.now()):
+                try:
+                    result = callback()
+                    if asyncio.iscoroutine(result):
+                        self.loop.create_task(result)
+                    self.stats["fired"] += 1
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    print(f"Timer callback error: {key}: {e}")
+
+            delay = self._next_delay(datetime.now())
+            if delay == 0.0:
+                await asyncio.sleep(0)
+                continue
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            self.stats["wakeups"] += 1
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            next_due = min((entry[0] for entry in self.entries.values()), default=None)
+            return {
+                **self.stats,
+                "pending": len(self.entries),
+                "heap_size": len(self.heap),
+                "next_due": next_due.isoformat() if next_due else None,
+            }
+
+    def start(self):
+        """在当前事件循环中启动调度协程"""
+        if self.task is not None and not self.task.done():
+            return
+        self.loop = asyncio.get_running_loop()
+        self.wakeup = asyncio.Event()
+        self.task = self.loop.create_task(self._run())
+        print(f"INFO:\t ✅ 定时调度器已启动: {len(self.entries)} 个定时任务")
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        self.loop = None
+
+
+# 全局定时调度器实例
+timer_scheduler = TimerScheduler()
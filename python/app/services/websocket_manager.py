@@ -0,0 +1,226 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from fastapi import WebSocket
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 关闭码：服务端过载 / 违反策略
+CLOSE_TRY_AGAIN_LATER = 1013
+CLOSE_POLICY_VIOLATION = 1008
+
+
+class ClientConnection:
+    """一个 WebSocket 连接及其发送队列，由独立的发送任务按顺序写出"""
+
+    def __init__(self, websocket: WebSocket, user_id: Optional[int], house_id: Optional[int]):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.house_id = house_id
+        # [合并键, 文本]；合并键相同的未发送消息只保留最新一条
+        self.queue = deque()
+        self.coalesce: Dict[str, list] = {}
+        self.ready = asyncio.Event()
+        self.sender: Optional[asyncio.Task] = None
+        self.closed = False
+        self.connected_at = time.time()
+
+
+class WebSocketHub:
+    """
+    WebSocket 推送中心：按用户和家庭索引连接，广播时只把序列化好的文本放入各连接的发送队列，
+    由每个连接自己的发送任务并发写出，慢连接不会拖住其他连接。
+    队列满或发送超时的连接被断开，带合并键的消息（如状态快照）在队列中只保留最新一条。
+    """
+
+    def __init__(self):
+        self.max_connections = settings.MAX_WEBSOCKET_CONNECTIONS
+        self.queue_size = settings.WEBSOCKET_SEND_QUEUE_SIZE
+        self.send_timeout = settings.WEBSOCKET_SEND_TIMEOUT
+        self.heartbeat_interval = settings.WEBSOCKET_HEARTBEAT_INTERVAL
+
+        self.connections: Set[ClientConnection] = set()
+        self.by_user: Dict[int, Set[ClientConnection]] = {}
+        self.by_house: Dict[int, Set[ClientConnection]] = {}
+        self.heartbeat_task: Optional[asyncio.Task] = None
+
+        self.stats = {
+            "accepted": 0,
+            "rejected": 0,
+            "disconnected": 0,
+            "dropped_slow": 0,
+            "queued": 0,
+            "sent": 0,
+            "coalesced": 0,
+        }
+
+    async def connect(self, websocket: WebSocket, user_id: Optional[int] = None,
+                      house_id: Optional[int] = None) -> Optional[ClientConnection]:
+        """接受并登记连接；超过最大连接数时拒绝握手并返回 None"""
+        if len(self.connections) >= self.max_connections:
+            self.stats["rejected"] += 1
+            await websocket.close(code=CLOSE_TRY_AGAIN_LATER)
+            logger.warning(f"WebSocket连接数已达上限 {self.max_connections}，拒绝新连接")
+            return None
+
+        await websocket.accept()
+        conn = ClientConnection(websocket, user_id, house_id)
+        self.connections.add(conn)
+        if user_id is not None:
+            self.by_user.setdefault(user_id, set()).add(conn)
+        if house_id is not None:
+            self.by_house.setdefault(house_id, set()).add(conn)
+        conn.sender = asyncio.create_task(self._sender(conn))
+        self.stats["accepted"] += 1
+        return conn
+
+    def disconnect(self, conn: ClientConnection):
+        """注销连接并停止其发送任务（可重复调用）"""
+        if conn.closed:
+            return
+        conn.closed = True
+        self.connections.discard(conn)
+        for index, key in ((self.by_user, conn.user_id), (self.by_house, conn.house_id)):
+            members = index.get(key)
+            if members is not None:
+                members.discard(conn)
+                if not members:
+                    del index[key]
+        conn.queue.clear()
+        conn.coalesce.clear()
+        if conn.sender is not None and conn.sender is not asyncio.current_task():
+            conn.sender.cancel()
+        self.stats["disconnected"] += 1
+
+    def _drop_slow(self, conn: ClientConnection, reason: str):
+        if conn.closed:
+            return
+        self.stats["dropped_slow"] += 1
+        logger.warning(f"断开慢速WebSocket连接(用户 {conn.user_id}): {reason}")
+        self.disconnect(conn)
+        asyncio.get_running_loop().create_task(self._close(conn.websocket, CLOSE_TRY_AGAIN_LATER))
+
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    def _enqueue(self, conn: ClientConnection, text: str, coalesce_key: Optional[str] = None) -> bool:
+        if conn.closed:
+            return False
+        if coalesce_key is not None:
+            pending = conn.coalesce.get(coalesce_key)
+            if pending is not None:
+                pending[1] = text
+                self.stats["coalesced"] += 1
+                return True
+        if len(conn.queue) >= self.queue_size:
+            self._drop_slow(conn, "发送队列已满")
+            return False
+
+        item = [coalesce_key, text]
+        conn.queue.append(item)
+        if coalesce_key is not None:
+            conn.coalesce[coalesce_key] = item
+        conn.ready.set()
+        self.stats["queued"] += 1
+        return True
+
+    async def _sender(self, conn: ClientConnection):
+        """
+        按顺序写出连接的发送队列：每次取出当前积压的全部消息一起写，
+        整批写出超时或失败即断开（积压越多批次越大，超时计时的开销按批分摊）
+        """
+        try:
+            while not conn.closed:
+                if not conn.queue:
+                    conn.ready.clear()
+                    await conn.ready.wait()
+                    continue
+                batch = []
+                while conn.queue:
+                    coalesce_key, text = item = conn.queue.popleft()
+                    if coalesce_key is not None and conn.coalesce.get(coalesce_key) is item:
+                        del conn.coalesce[coalesce_key]
+                    batch.append(text)
+                try:
+                    await asyncio.wait_for(self._write(conn.websocket, batch), self.send_timeout)
+                except asyncio.TimeoutError:
+                    self._drop_slow(conn, f"发送超过 {self.send_timeout} 秒")
+                    return
+                self.stats["sent"] += len(batch)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # 对端已断开
+            logger.debug(f"WebSocket发送失败(用户 {conn.user_id}): {e}")
+            self.disconnect(conn)
+
+    @staticmethod
+    async def _write(websocket: WebSocket, batch: List[str]):
+        for text in batch:
+            await websocket.send_text(text)
+
+    @staticmethod
+    def _encode(message: Any) -> str:
+        return message if isinstance(message, str) else json.dumps(message, ensure_ascii=False, default=str)
+
+    def _fan_out(self, conns: Iterable[ClientConnection], message: Any, coalesce_key: Optional[str]) -> int:
+        """消息只序列化一次，放入每个连接的发送队列，返回成功入队的连接数"""
+        text = self._encode(message)
+        return sum(self._enqueue(conn, text, coalesce_key) for conn in list(conns))
+
+    def send(self, conn: ClientConnection, message: Any, coalesce_key: Optional[str] = None) -> bool:
+        """向单个连接发送（如对话回复）"""
+        return self._enqueue(conn, self._encode(message), coalesce_key)
+
+    async def send_to_user(self, user_id: int, message: Any, coalesce_key: Optional[str] = None) -> bool:
+        """推送给用户的全部连接，用户不在线时返回 False"""
+        return self._fan_out(self.by_user.get(user_id, ()), message, coalesce_key) > 0
+
+    async def send_to_house(self, house_id: int, message: Any, coalesce_key: Optional[str] = None) -> int:
+        """推送给家庭成员的全部连接，返回送达的连接数"""
+        return self._fan_out(self.by_house.get(house_id, ()), message, coalesce_key)
+
+    async def broadcast(self, message: Any, coalesce_key: Optional[str] = None) -> int:
+        return self._fan_out(self.connections, message, coalesce_key)
+
+    async def _heartbeat(self):
+        """定期向所有连接发送心跳，写不出去的连接由发送任务断开"""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            await self.broadcast({"type": "ping", "timestamp": time.time()}, coalesce_key="ping")
+
+    def start(self):
+        if self.heartbeat_task is None and self.heartbeat_interval > 0:
+            self.heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+
+    async def stop(self):
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+            self.heartbeat_task = None
+        for conn in list(self.connections):
+            self.disconnect(conn)
+            await self._close(conn.websocket, 1001)
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "connections": len(self.connections),
+            "users": len(self.by_user),
+            "houses": len(self.by_house),
+            "max_connections": self.max_connections,
+            "max_queue_depth": max((len(conn.queue) for conn in self.connections), default=0),
+        }
+
+
+# 全局WebSocket推送中心实例
+websocket_manager = WebSocketHub()
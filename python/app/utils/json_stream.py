@@ -0,0 +1,101 @@
+"""
+流式 JSON 解析工具：大模型按片段输出 {"action": ..., "parameters": {..., "response": "..."}}，
+在完整 JSON 到达之前先把 response 字段的文字逐段解码出来推送给用户
+"""
+import json
+import re
+from typing import Optional
+
+_RESPONSE_KEY = re.compile(r'"response"\s*:\s*"')
+# 键可能被切在两个片段之间，未匹配时保留末尾这么多字符继续查找
+_KEY_TAIL = 16
+
+
+class ResponseTextExtractor:
+    """
+    增量提取大模型输出中 response 字段的文本。
+    输出以 { 或 ``` 开头时按 JSON 处理，只返回 response 字符串解码后的内容；
+    否则视为纯文本原样返回。feed 每次返回本片段新增的可展示文字。
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.mode: Optional[str] = None  # None: 未判断; "json"; "raw"
+        self.pos = 0
+        self.in_string = False
+        self.done = False
+
+    def feed(self, chunk: str) -> str:
+        self.text += chunk
+        if self.mode is None:
+            head = self.text.lstrip()
+            if not head:
+                return ""
+            if head[0] in "{`":
+                self.mode = "json"
+            else:
+                self.mode = "raw"
+                return self.text
+        if self.mode == "raw":
+            return chunk
+        if self.done:
+            return ""
+
+        if not self.in_string:
+            match = _RESPONSE_KEY.search(self.text, self.pos)
+            if match is None:
+                self.pos = max(self.pos, len(self.text) - _KEY_TAIL)
+                return ""
+            self.pos = match.end()
+            self.in_string = True
+        return self._decode_string()
+
+    def _decode_string(self) -> str:
+        """从 pos 开始解码 JSON 字符串内容，转义序列不完整时等待下一片段"""
+        text, pos = self.text, self.pos
+        out = []
+        while pos < len(text):
+            ch = text[pos]
+            if ch == '"':
+                self.done = True
+                pos += 1
+                break
+            if ch != "\\":
+                end = pos
+                while end < len(text) and text[end] not in '"\\':
+                    end += 1
+                out.append(text[pos:end])
+                pos = end
+                continue
+
+            escape = self._escape_length(text, pos)
+            if escape is None:
+                break
+            try:
+                out.append(json.loads(f'"{text[pos:pos + escape]}"'))
+            except ValueError:
+                out.append(text[pos:pos + escape])
+            pos += escape
+        self.pos = pos
+        return "".join(out)
+
+    @staticmethod
+    def _escape_length(text: str, pos: int) -> Optional[int]:
+        """转义序列长度；片段末尾不完整时返回 None"""
+        if pos + 1 >= len(text):
+            return None
+        if text[pos + 1] != "u":
+            return 2
+        if pos + 6 > len(text):
+            return None
+        try:
+            code = int(text[pos + 2:pos + 6], 16)
+        except ValueError:
+            return 6
+        # 高位代理需要和后面的低位代理一起解码
+        if 0xD800 <= code <= 0xDBFF:
+            if pos + 12 > len(text):
+                return None
+            if text[pos + 6:pos + 8] == "\\u":
+                return 12
+        return 6
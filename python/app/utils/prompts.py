@@ -4,9 +4,12 @@ AI提示词管理系统 - 基于原有的manager_action_space优化
 """
 
 import json
+import logging
 from typing import Dict, Any, List
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 # 主提示词模板 - 基于你原来的manager_action_space
 manager_action_space ='''
  # ROLE: 你的身份与角色
@@ -317,114 +320,34 @@ class PromptManager:
         self.base_prompt = manager_action_space
 
     def build_context_data(self, db, current_user) -> str:
-        from app.models.device import Device, Room
-        from app.models.scene import Scene
-        from app.models.sensor_data import SensorData, AlertLog
-
-        # 1. 获取设备列表
-        devices = db.query(Device).filter(Device.house_id == current_user.house_id).all()
-        device_list_json = []
-        for d in devices:
-            room_name = "未分配"
-            if d.room_id:
-                room = db.query(Room).filter(Room.id == d.room_id).first()
-                if room:
-                    room_name = room.name
-
-            device_list_json.append({
-                "id": d.id,
-                "name": d.name,
-                "device_type": d.device_type,
-                "room_name": room_name,
-                "is_online": d.is_online,
-                "status": d.status or {}
-            })
-
-        # 2. 获取场景列表
-        scenes = db.query(Scene).filter(Scene.house_id == current_user.house_id).all()
-        scene_list_json = [{"id": s.id, "name": s.name} for s in scenes]
-
-        # 3. 获取传感器摘要和警报
-        # 3.1 获取客厅环境传感器最新数据
-        living_sensor_data = db.query(SensorData).filter(
-            SensorData.device_id == "sensor_living_env",
-            SensorData.house_id == current_user.house_id
-        ).order_by(SensorData.timestamp.desc()).first()
-
-        # 3.2 获取厨房安全传感器最新数据
-        kitchen_sensor_data = db.query(SensorData).filter(
-            SensorData.device_id == "sensor_kitchen_safety",
-            SensorData.house_id == current_user.house_id
-        ).order_by(SensorData.timestamp.desc()).first()
+        """
+        构建实时上下文。设备、场景、传感器、警报各自的 JSON 片段按家庭缓存，
+        只在对应版本被写入方递增后重新查询和序列化
+        """
+        from app.services.context_cache import context_cache
 
-        alerts = db.query(AlertLog).filter(
-            AlertLog.house_id == current_user.house_id,
-            AlertLog.is_resolved == False
-        ).all()
+        house_id = current_user.house_id
 
-        # 5. 构建传感器摘要（按房间分类）
-        def determine_safety_status(living_data, kitchen_data):
-            """根据各传感器数据综合判断安全状态"""
-            issues = []
+        # 1. 获取设备列表（设备与房间一次连接查询）
+        device_json = context_cache.get(house_id, "devices", lambda: self._device_list_json(db, house_id))
 
-            # 厨房安全检查（优先级最高）
-            if kitchen_data:
-                if kitchen_data.gas_level and kitchen_data.gas_level > 20:
-                    issues.append(f"厨房气体浓度{kitchen_data.gas_level}ppm超标")
-                if kitchen_data.flame_detected:
-                    issues.append("厨房检测到火源")
-
-            # 客厅环境检查
-            if living_data:
-                if living_data.temperature and living_data.temperature > 30:
-                    issues.append(f"客厅温度过高{living_data.temperature}°C")
-                elif living_data.temperature and living_data.temperature < 15:
-                    issues.append(f"客厅温度过低{living_data.temperature}°C")
-
-            # 整体湿度检查
-            if living_data and living_data.humidity:
-                if living_data.humidity > 70:
-                    issues.append("室内湿度过高")
-                elif living_data.humidity < 30:
-                    issues.append("室内湿度过低")
+        # 2. 获取场景列表
+        scene_json = context_cache.get(house_id, "scenes", lambda: self._scene_list_json(db, house_id))
 
-            return "安全正常" if not issues else f"需要注意: {' | '.join(issues)}"
+        # 3. 获取传感器摘要（最新读数缓存）和未解决的警报
+        sensors = context_cache.get(house_id, "sensors", lambda: self._sensor_fragment(house_id))
+        priority_alerts, alerts_json = context_cache.get(house_id, "alerts", lambda: self._alert_fragment(db, house_id))
 
-        # 6. 构建详细的传感器摘要
-        sensor_summary_json = {
-            "living_room": {
-                "device_id": "sensor_living_env",
-                "temperature": living_sensor_data.temperature if living_sensor_data else None,
-                "humidity": living_sensor_data.humidity if living_sensor_data else None,
-                "light_intensity": living_sensor_data.light_intensity if living_sensor_data else None,
-                "last_update": living_sensor_data.timestamp.isoformat() if living_sensor_data else None,
-                "status": "在线" if living_sensor_data else "离线"
-            },
-            "kitchen": {
-                "device_id": "sensor_kitchen_safety",
-                "temperature": kitchen_sensor_data.temperature if kitchen_sensor_data else None,
-                "humidity": kitchen_sensor_data.humidity if kitchen_sensor_data else None,
-                "gas_level": kitchen_sensor_data.gas_level if kitchen_sensor_data else None,
-                "flame_detected": kitchen_sensor_data.flame_detected if kitchen_sensor_data else False,
-                "last_update": kitchen_sensor_data.timestamp.isoformat() if kitchen_sensor_data else None,
-                "status": "在线" if kitchen_sensor_data else "离线"
-            },
-            "overall_safety": {
-                "status": determine_safety_status(living_sensor_data, kitchen_sensor_data),
-                "priority_alerts": len([a for a in alerts if a.severity in ["high", "critical"]]),
-                "last_check": datetime.now().isoformat()
-            },
-            "alerts": [
-                {
-                    "id": a.id,
-                    "message": a.message,
-                    "severity": a.severity,
-                    "device_id": a.device_id,
-                    "created_at": a.created_at.isoformat()
-                }
-                for a in alerts
-            ]
+        # 6. 构建详细的传感器摘要（与整体 json.dumps 的输出一致）
+        overall_safety = {
+            "status": sensors["safety_status"],
+            "priority_alerts": priority_alerts,
+            "last_check": datetime.now().isoformat()
         }
+        sensor_summary_json = (
+            f'{{"living_room": {sensors["living_room"]}, "kitchen": {sensors["kitchen"]}, '
+            f'"overall_safety": {json.dumps(overall_safety, ensure_ascii=False)}, "alerts": {alerts_json}}}'
+        )
 
         # 7. 获取外部数据
         external_data = {
@@ -442,13 +365,13 @@ class PromptManager:
     * `"{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}"`
 
 2.  `[DEVICE_LIST_JSON]`:
-    * `{json.dumps(device_list_json, ensure_ascii=False)}`
+    * `{device_json}`
 
 3.  `[SCENE_LIST_JSON]`:
-    * `{json.dumps(scene_list_json, ensure_ascii=False)}`
+    * `{scene_json}`
 
 4.  `[SENSOR_SUMMARY_JSON]`:
-    * `{json.dumps(sensor_summary_json, ensure_ascii=False)}`
+    * `{sensor_summary_json}`
 
 5.  `[EXTERNAL_DATA]`:
     * `{{"weather": {{"city": "重庆", "condition": "晴", "temperature": "28°C"}}}}`
@@ -457,49 +380,155 @@ class PromptManager:
     * `{json.dumps([], ensure_ascii=False)}`
 """
         return context
-    def build_full_prompt(self, context_data: str, conversation_history: List[Dict] = None) -> str:
-        """构建完整提示词 - 强制替换版本"""
 
-        if conversation_history:
-            # 只取最近5轮对话
-            recent_history = conversation_history[-5:]
-            history_json = json.dumps(recent_history, ensure_ascii=False)
+    @staticmethod
+    def _device_list_json(db, house_id: int) -> str:
+        from app.models.device import Device, Room
+
+        rows = db.query(
+            Device.id, Device.name, Device.device_type, Room.name, Device.is_online, Device.status
+        ).outerjoin(
+            Room, Room.id == Device.room_id
+        ).filter(
+            Device.house_id == house_id
+        ).order_by(Device.id).all()
+
+        return json.dumps([
+            {
+                "id": device_id,
+                "name": name,
+                "device_type": device_type,
+                "room_name": room_name or "未分配",
+                "is_online": is_online,
+                "status": status or {}
+            }
+            for device_id, name, device_type, room_name, is_online, status in rows
+        ], ensure_ascii=False)
+
+    @staticmethod
+    def _scene_list_json(db, house_id: int) -> str:
+        from app.models.scene import Scene
 
-            print(f"💬 准备替换对话历史: {len(recent_history)} 条记录")
-            print(f"📝 历史内容预览: {history_json[:100]}...")
+        rows = db.query(Scene.id, Scene.name).filter(Scene.house_id == house_id).order_by(Scene.id).all()
+        return json.dumps([{"id": scene_id, "name": name} for scene_id, name in rows], ensure_ascii=False)
+
+    @staticmethod
+    def _alert_fragment(db, house_id: int):
+        """未解决警报的 (高危数量, JSON)"""
+        from app.models.sensor_data import AlertLog
+
+        alerts = db.query(
+            AlertLog.id, AlertLog.message, AlertLog.severity, AlertLog.device_id, AlertLog.created_at
+        ).filter(
+            AlertLog.house_id == house_id,
+            AlertLog.is_resolved == False
+        ).order_by(AlertLog.id).all()
+
+        priority_alerts = sum(1 for a in alerts if a.severity in ["high", "critical"])
+        return priority_alerts, json.dumps([
+            {
+                "id": a.id,
+                "message": a.message,
+                "severity": a.severity,
+                "device_id": a.device_id,
+                "created_at": a.created_at.isoformat()
+            }
+            for a in alerts
+        ], ensure_ascii=False)
+
+    @staticmethod
+    def _sensor_fragment(house_id: int) -> Dict[str, str]:
+        """客厅、厨房传感器摘要的 JSON 及综合安全状态"""
+        from app.services.sensor_cache import latest_cache
+
+        # 3.1 获取客厅环境传感器最新数据
+        living_sensor_data = latest_cache.device_snapshot(house_id, "sensor_living_env")
+        # 3.2 获取厨房安全传感器最新数据
+        kitchen_sensor_data = latest_cache.device_snapshot(house_id, "sensor_kitchen_safety")
+
+        def determine_safety_status(living_data, kitchen_data):
+            """根据各传感器数据综合判断安全状态"""
+            issues = []
+
+            # 厨房安全检查（优先级最高）
+            if kitchen_data:
+                if kitchen_data["gas_level"] and kitchen_data["gas_level"] > 20:
+                    issues.append(f"厨房气体浓度{kitchen_data['gas_level']}ppm超标")
+                if kitchen_data["flame_detected"]:
+                    issues.append("厨房检测到火源")
+
+            # 客厅环境检查
+            if living_data:
+                if living_data["temperature"] and living_data["temperature"] > 30:
+                    issues.append(f"客厅温度过高{living_data['temperature']}°C")
+                elif living_data["temperature"] and living_data["temperature"] < 15:
+                    issues.append(f"客厅温度过低{living_data['temperature']}°C")
+
+            # 整体湿度检查
+            if living_data and living_data["humidity"]:
+                if living_data["humidity"] > 70:
+                    issues.append("室内湿度过高")
+                elif living_data["humidity"] < 30:
+                    issues.append("室内湿度过低")
+
+            return "安全正常" if not issues else f"需要注意: {' | '.join(issues)}"
+
+        living_room = {
+            "device_id": "sensor_living_env",
+            "temperature": living_sensor_data["temperature"] if living_sensor_data else None,
+            "humidity": living_sensor_data["humidity"] if living_sensor_data else None,
+            "light_intensity": living_sensor_data["light_intensity"] if living_sensor_data else None,
+            "last_update": living_sensor_data["timestamp"].isoformat() if living_sensor_data else None,
+            "status": "在线" if living_sensor_data else "离线"
+        }
+        kitchen = {
+            "device_id": "sensor_kitchen_safety",
+            "temperature": kitchen_sensor_data["temperature"] if kitchen_sensor_data else None,
+            "humidity": kitchen_sensor_data["humidity"] if kitchen_sensor_data else None,
+            "gas_level": kitchen_sensor_data["gas_level"] if kitchen_sensor_data else None,
+            "flame_detected": kitchen_sensor_data["flame_detected"] if kitchen_sensor_data else False,
+            "last_update": kitchen_sensor_data["timestamp"].isoformat() if kitchen_sensor_data else None,
+            "status": "在线" if kitchen_sensor_data else "离线"
+        }
+        return {
+            "living_room": json.dumps(living_room, ensure_ascii=False),
+            "kitchen": json.dumps(kitchen, ensure_ascii=False),
+            "safety_status": determine_safety_status(living_sensor_data, kitchen_sensor_data),
+        }
+
+    def build_full_prompt(self, context_data: str, history_json: str = None) -> str:
+        """
+        构建完整提示词 - 强制替换版本
+        history_json 为对话记忆已按 token 预算裁剪并序列化好的对话历史（摘要 + 近期消息）
+        """
+
+        if history_json:
+            logger.debug("准备替换对话历史: %d 字符", len(history_json))
 
             # 方法1：精确查找并替换
             old_pattern = '`{json.dumps([], ensure_ascii=False)}`'
             if old_pattern in context_data:
                 context_data = context_data.replace(old_pattern, f'`{history_json}`')
-                print("✅ 方法1替换成功")
+                logger.debug("方法1替换成功")
             else:
-                print("⚠️ 方法1未找到匹配，尝试方法2")
+                logger.debug("方法1未找到匹配，尝试方法2")
 
                 # 方法2：模糊匹配替换
                 import re
                 pattern = r'`\[CONVERSATION_HISTORY\]`:\s*\*\s*`.*?`'
                 replacement = f'`[CONVERSATION_HISTORY]`:\n    * `{history_json}`'
                 context_data = re.sub(pattern, replacement, context_data, flags=re.DOTALL)
-                print("✅ 方法2正则替换完成")
+                logger.debug("方法2正则替换完成")
 
             # 验证替换结果
-            if history_json in context_data:
-                print("✅ 对话历史替换验证成功")
-            else:
-                print("❌ 对话历史替换验证失败，使用强制插入")
+            if history_json not in context_data:
+                logger.warning("对话历史替换验证失败，使用强制插入")
                 # 方法3：强制插入（最后保底方案）
                 context_data += f"\n\n# 补充对话历史:\n[CONVERSATION_HISTORY]: {history_json}"
-        else:
-            print("📝 无对话历史需要传递")
 
-        # 保存最终的完整提示词用于调试
         final_prompt = f"{self.base_prompt}\n{context_data}"
-
-        with open('final_prompt.txt', 'w', encoding='utf-8') as f:
-            f.write(final_prompt)
-
-        print(f"📄 最终提示词长度: {len(final_prompt)} 字符")
+        # 调试时开启 DEBUG 日志查看完整提示词，不再每次写文件
+        logger.debug("最终提示词长度: %d 字符\n%s", len(final_prompt), final_prompt)
 
         return final_prompt
 
@@ -0,0 +1,175 @@
+"""
+异步数据库层压测：在子进程中启动 uvicorn，按不同并发度请求已迁移到 AsyncSession 的接口，
+并与同一查询的旧写法（async 接口中直接调用同步 Session）对比吞吐量。
+
+运行: python python/test/async_load_bench.py [每组请求数]
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+CONCURRENCY_LEVELS = (1, 4, 16, 32)
+DEFAULT_ENV = {
+    "SECRET_KEY": "bench", "ALGORITHM": "HS256", "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+    "MQTT_BROKER_HOST": "127.0.0.1", "MQTT_BROKER_PORT": "1",
+    "HOST": "127.0.0.1", "PORT": "8000",
+    "PROJECT_NAME": "SmartHome", "VERSION": "bench", "DESCRIPTION": "async load bench",
+}
+
+
+def seed():
+    """写入压测数据：1个用户、5个房间、50个设备、当月300条日程、两天的传感器数据"""
+    import random
+    from datetime import datetime, timedelta
+    from app.database import init_db, SessionLocal
+    from app.models.device import Device, Room
+    from app.models.schedule import Schedule, Priority
+    from app.models.user import User, UserRole
+    from app.services.ingest_service import ingest_service
+    from app.services.sensor_decoders import SensorReading
+
+    init_db()
+    db = SessionLocal()
+    try:
+        user = User(username="bench", role=UserRole.OWNER, house_id=1)
+        db.add(user)
+        db.flush()
+        rooms = [Room(name=f"房间{i}", user_id=user.id, house_id=1) for i in range(5)]
+        db.add_all(rooms)
+        db.flush()
+        for i in range(50):
+            db.add(Device(
+                name=f"设备{i}", device_type="light", device_id=f"light_{i:05d}", user_id=user.id,
+                room_id=rooms[i % 5].id, house_id=1, status={"power": bool(i % 2)},
+                is_online=True, module=i % 8, device=i % 10, description="bench",
+            ))
+        today = datetime.now()
+        for i in range(300):
+            db.add(Schedule(
+                title=f"日程{i}", date=today.replace(day=1 + i % 28).strftime("%Y-%m-%d"),
+                time=f"{8 + i % 12:02d}:{i % 60:02d}", priority=random.choice(list(Priority)),
+                created_by=user.id, house_id=1,
+            ))
+        db.commit()
+    finally:
+        db.close()
+
+    now = datetime.now()
+    readings = [
+        SensorReading("hi3861_001", 1, random.uniform(15, 30), random.uniform(30, 80), 0,
+                      random.randint(0, 1000), random.uniform(1, 100), 0, now - timedelta(seconds=30 * i))
+        for i in range(2 * 24 * 120)
+    ]
+    for offset in range(0, len(readings), 1000):
+        ingest_service._flush(readings[offset:offset + 1000])
+
+
+def serve(port: int):
+    """子进程：加入旧写法的对照接口后启动服务"""
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+    import uvicorn
+    from fastapi import Depends
+    from sqlalchemy.orm import Session
+    from app.main import app
+    from app.database import get_db
+    from app.models.device import Device, Room
+    from app.models.user import User
+    from app.services.schedule_service import ScheduleService
+
+    seed()
+
+    @app.get("/bench/legacy/devices/{username}")
+    async def legacy_devices(username: str, db: Session = Depends(get_db)):
+        rows = db.query(Device, User.username, Room.name) \
+            .join(User, Device.user_id == User.id) \
+            .join(Room, Device.room_id == Room.id) \
+            .filter(User.username == username, Device.house_id == 1).all()
+        return {username: {row[0].id: {"id": row[0].id, "name": row[0].name, "status": row[0].status,
+                                        "scene": row[2]} for row in rows}}
+
+    @app.get("/bench/legacy/calendar/{year}/{month}")
+    async def legacy_calendar(year: int, month: int, db: Session = Depends(get_db)):
+        return ScheduleService(db).get_calendar_data(year, month)
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+async def load(client, url: str, total: int, concurrency: int) -> tuple:
+    """以固定并发发出 total 个请求，返回 (每秒成功请求数, 失败数)"""
+    remaining = total
+    failed = 0
+
+    async def worker():
+        nonlocal remaining, failed
+        while remaining > 0:
+            remaining -= 1
+            try:
+                response = await client.get(url)
+                response.raise_for_status()
+            except Exception:
+                failed += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return (total - failed) / (time.perf_counter() - start), failed
+
+
+async def drive(port: int, total: int):
+    import httpx
+    from datetime import datetime
+
+    now = datetime.now()
+    endpoints = [
+        ("设备列表", "/api/v1/devices/bench", "/bench/legacy/devices/bench"),
+        ("月历", f"/api/v1/schedules/calendar/{now.year}/{now.month}", f"/bench/legacy/calendar/{now.year}/{now.month}"),
+        ("温度趋势", "/api/v1/sensors/latest/temperature/day", None),
+    ]
+    base = f"http://127.0.0.1:{port}"
+    limits = httpx.Limits(max_connections=max(CONCURRENCY_LEVELS))
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=10) as client:
+        for _ in range(100):
+            try:
+                await client.get("/health")
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+
+        header = "".join(f"{f'c={c}':>10}" for c in CONCURRENCY_LEVELS)
+        print(f"{'接口':<12}{'实现':<8}{header}   (req/s)")
+        for name, url, legacy_url in endpoints:
+            for label, target in (("async", url), ("legacy", legacy_url)):
+                if target is None:
+                    continue
+                await load(client, target, 50, 4)  # 预热
+                results = [await load(client, target, total, c) for c in CONCURRENCY_LEVELS]
+                print(f"{name:<12}{label:<8}" + "".join(
+                    f"{rate:>10.0f}" if not failed else f"{f'{rate:.0f}/{failed}失败':>10}" for rate, failed in results
+                ))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--serve"]:
+        serve(int(sys.argv[2]))
+        sys.exit(0)
+
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    env = dict(os.environ)
+    for key, value in DEFAULT_ENV.items():
+        env.setdefault(key, value)
+    env["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/load.db"
+
+    server = subprocess.Popen([sys.executable, __file__, "--serve", str(port)], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        asyncio.run(drive(port, total))
+    finally:
+        server.terminate()
+        server.wait()
@@ -0,0 +1,85 @@
+"""
+认证开销基准：对比每次请求解码JWT并查询用户（原实现）与带缓存的 get_current_user
+
+运行: python python/test/auth_bench.py [请求数]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/auth_bench.db"
+for key, value in {
+    "SECRET_KEY": "bench", "ALGORITHM": "HS256", "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+    "MQTT_BROKER_HOST": "localhost", "MQTT_BROKER_PORT": "1883",
+    "HOST": "127.0.0.1", "PORT": "8000",
+    "PROJECT_NAME": "SmartHome", "VERSION": "bench", "DESCRIPTION": "auth bench",
+}.items():
+    os.environ.setdefault(key, value)
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+import app.main  # noqa: F401  注册全部模型
+from jose import jwt
+from app.api.auth import get_current_user
+from app.config import settings
+from app.database import init_db, SessionLocal
+from app.models.user import User, UserRole
+from app.services.auth_service import auth_cache
+from app.utils.security import create_access_token
+
+
+async def legacy_auth(token: str) -> User:
+    """原实现：每次请求解码JWT并查询数据库"""
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    db = SessionLocal()
+    try:
+        return db.query(User).filter(User.id == int(payload["sub"])).first()
+    finally:
+        db.close()
+
+
+async def cold_auth(token: str) -> User:
+    """缓存未命中：每次都清空缓存"""
+    auth_cache.clear()
+    return await get_current_user(token)
+
+
+async def bench(name: str, func, token: str, count: int):
+    for _ in range(min(count, 100)):  # 预热
+        await func(token)
+    start = time.perf_counter()
+    for _ in range(count):
+        user = await func(token)
+    elapsed = time.perf_counter() - start
+    assert user is not None and user.username == "bench"
+    per_request = elapsed / count * 1e6
+    print(f"{name:<10} {per_request:10.1f} us/请求")
+    return per_request
+
+
+async def main(count: int):
+    init_db()
+    db = SessionLocal()
+    try:
+        user = User(username="bench", role=UserRole.OWNER, house_id=1)
+        db.add(user)
+        db.commit()
+        user_id = user.id
+    finally:
+        db.close()
+    token = create_access_token({"sub": str(user_id)}, expires_delta=timedelta(days=1))
+
+    print(f"认证 {count} 次请求")
+    legacy = await bench("legacy", legacy_auth, token, count)
+    cold = await bench("cold", cold_auth, token, count)
+    auth_cache.clear()
+    cached = await bench("cached", get_current_user, token, count)
+    print(f"缓存命中相对原实现加速: {legacy / cached:.1f}x（未命中路径 {cold / legacy:.2f}x）")
+    print(auth_cache.get_stats())
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000))
@@ -0,0 +1,122 @@
+"""
+自动化规则计算基准：对比每个事件重新检查全部规则（原实现，设备条件每次查库）
+与按索引只计算受影响规则的编译引擎
+
+运行: python python/test/automation_bench.py [规则数] [事件数]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/automation_bench.db"
+for key, value in {
+    "SECRET_KEY": "bench", "ALGORITHM": "HS256", "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+    "MQTT_BROKER_HOST": "localhost", "MQTT_BROKER_PORT": "1883",
+    "HOST": "127.0.0.1", "PORT": "8000",
+    "PROJECT_NAME": "SmartHome", "VERSION": "bench", "DESCRIPTION": "automation bench",
+}.items():
+    os.environ.setdefault(key, value)
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+import app.main  # noqa: F401  注册全部模型
+from app.database import init_db, SessionLocal
+from app.models.device import Device
+from app.models.scene import Automation
+from app.models.user import User, UserRole
+from app.services.automation_engine import automation_engine
+from app.services.sensor_cache import latest_cache
+from app.services.sensor_decoders import SensorReading
+
+SENSORS = 50
+DEVICES = 50
+
+
+def seed(rule_count: int):
+    random.seed(3)
+    db = SessionLocal()
+    try:
+        user = User(username="bench", role=UserRole.OWNER, house_id=1)
+        db.add(user)
+        db.flush()
+        db.add_all(Device(name=f"设备{i}", device_type="light", device_id=f"dev_{i}", user_id=user.id,
+                          house_id=1, status={"power": False, "brightness": 50}) for i in range(DEVICES))
+        for i in range(rule_count):
+            conditions = [{"type": "sensor", "device_id": f"sensor_{random.randrange(SENSORS)}",
+                           "parameter": random.choice(("temperature", "humidity")), "operator": ">", "value": "40"}]
+            if i % 2:
+                conditions.append({"type": "device", "device_id": f"dev_{random.randrange(DEVICES)}",
+                                   "parameter": "brightness", "operator": ">=", "value": "80"})
+            db.add(Automation(name=f"规则{i}", house_id=1, created_by=user.id, conditions=conditions,
+                              actions=[], condition_logic="AND"))
+        db.commit()
+    finally:
+        db.close()
+
+
+def legacy_check(db, automation: Automation) -> bool:
+    """原实现：逐条解释条件，设备条件每次查库"""
+    results = []
+    for condition in automation.conditions:
+        operator = condition.get("operator")
+        if condition["type"] == "sensor":
+            current = latest_cache.get(automation.house_id, condition["device_id"], condition["parameter"])
+            value = float(condition["value"])
+        else:
+            device = db.query(Device).filter(Device.device_id == condition["device_id"]).first()
+            current = device.status.get(condition["parameter"]) if device else None
+            current = float(current) if current is not None else None
+            value = float(condition["value"])
+        if current is None:
+            results.append(False)
+        elif operator == ">":
+            results.append(current > value)
+        elif operator == ">=":
+            results.append(current >= value)
+        else:
+            results.append(False)
+    return all(results)
+
+
+def main(rule_count: int, events: int):
+    init_db()
+    seed(rule_count)
+    readings = [
+        SensorReading(f"sensor_{random.randrange(SENSORS)}", 1, random.uniform(15, 45), random.uniform(30, 80),
+                      0, 100, 10.0, 0, datetime.now())
+        for _ in range(events)
+    ]
+
+    db = SessionLocal()
+    try:
+        rules = db.query(Automation).all()
+        legacy_events = max(events // 20, 1)
+        start = time.perf_counter()
+        for item in readings[:legacy_events]:
+            latest_cache.update(item)
+            for rule in rules:
+                legacy_check(db, rule)
+        legacy = (time.perf_counter() - start) / legacy_events * 1e6
+
+        automation_engine.load(db)
+    finally:
+        db.close()
+
+    start = time.perf_counter()
+    for item in readings:
+        latest_cache.update(item)
+        automation_engine.on_readings([item])
+    engine = (time.perf_counter() - start) / events * 1e6
+
+    stats = automation_engine.get_stats()
+    print(f"{rule_count} 条规则，{SENSORS} 个传感器")
+    print(f"legacy  {legacy:12.1f} us/事件（全部规则，设备条件查库）")
+    print(f"engine  {engine:12.1f} us/事件（平均每事件计算 {stats['evaluations'] / stats['events']:.1f} 条规则）")
+    print(f"加速: {legacy / engine:.0f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000, int(sys.argv[2]) if len(sys.argv) > 2 else 2000)
@@ -0,0 +1,119 @@
+"""
+设备指令下发基准：对比原实现（模块帧与设备帧之间 time.sleep）与异步合并下发，
+统计并发控制请求下的事件循环最大卡顿、发出的帧数和指令确认延迟。
+MQTT客户端替换为本地记录发布内容的客户端，on_publish 在另一个线程中回调，模拟网络线程。
+
+运行: python python/test/command_dispatcher_bench.py [并发指令数] [帧间隔秒数]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/command_bench.db"
+for key, value in {
+    "SECRET_KEY": "bench", "ALGORITHM": "HS256", "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+    "MQTT_BROKER_HOST": "localhost", "MQTT_BROKER_PORT": "1883",
+    "HOST": "127.0.0.1", "PORT": "8000",
+    "PROJECT_NAME": "SmartHome", "VERSION": "bench", "DESCRIPTION": "command bench",
+}.items():
+    os.environ.setdefault(key, value)
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+import paho.mqtt.client as mqtt
+from app.services.command_dispatcher import command_dispatcher, build_frame, MODULE_FRAME_BASE, DEVICE_FRAME_BASE
+from app.services.mqtt_service import mqtt_service
+
+
+class RecordingClient:
+    """记录发布内容，延迟若干毫秒后在其他线程回调 on_publish"""
+
+    def __init__(self, delay=0.005):
+        self.delay = delay
+        self.published = []
+        self.on_publish = None
+        self.mid = 0
+
+    def publish(self, topic, payload, qos=0):
+        self.mid += 1
+        mid = self.mid
+        self.published.append((topic, payload))
+        info = mqtt.MQTTMessageInfo(mid)
+        info.rc = mqtt.MQTT_ERR_SUCCESS
+
+        def ack():
+            info._published = True
+            if self.on_publish:
+                self.on_publish(self, None, mid)
+        threading.Timer(self.delay, ack).start()
+        return info
+
+
+async def watch_loop(stop: asyncio.Event) -> float:
+    """每10ms唤醒一次，返回事件循环的最大卡顿（毫秒）"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        worst = max(worst, (time.perf_counter() - start - 0.01) * 1000)
+    return worst
+
+
+async def legacy(count: int, interval: float, client: RecordingClient):
+    """原实现：每条指令在 async 接口中同步发送两帧，中间 time.sleep"""
+    async def control(index):
+        module_frame = build_frame(MODULE_FRAME_BASE, {index % 7 + 1: 1})
+        device_frame = build_frame(DEVICE_FRAME_BASE, {index % 9 + 1: 1})
+        client.publish("hi3861/subscribe", module_frame)
+        time.sleep(interval)
+        client.publish("hi3861/subscribe", device_frame)
+        return time.perf_counter()
+
+    start = time.perf_counter()
+    done = await asyncio.gather(*(control(i) for i in range(count)))
+    return [(t - start) * 1000 for t in done]
+
+
+async def dispatched(count: int, interval: float, client: RecordingClient):
+    command_dispatcher.frame_interval = interval
+    command_dispatcher.start()
+
+    async def control(index):
+        ack = await command_dispatcher.send({index % 7 + 1: 1}, {index % 9 + 1: 1})
+        assert ack["success"], ack
+        return ack["latency_ms"]
+
+    return await asyncio.gather(*(control(i) for i in range(count)))
+
+
+async def run(name: str, func, count: int, interval: float):
+    client = RecordingClient()
+    mqtt_service.client = client
+    mqtt_service.connected = True
+
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(watch_loop(stop))
+    await asyncio.sleep(0.05)
+    latencies = sorted(await func(count, interval, client))
+    stop.set()
+    worst = await watcher
+    print(f"{name:<10}{count:>8}{len(client.published):>8}{worst:>14.0f}"
+          f"{latencies[len(latencies) // 2]:>12.0f}{latencies[-1]:>12.0f}")
+    return client.published
+
+
+async def main(count: int, interval: float):
+    print(f"{'实现':<10}{'指令数':>8}{'帧数':>8}{'循环卡顿(ms)':>14}{'p50(ms)':>12}{'max(ms)':>12}")
+    await run("legacy", legacy, count, interval)
+    published = await run("dispatcher", dispatched, count, interval)
+    print("合并后的最终帧:", [payload for _, payload in published])
+    print(command_dispatcher.get_stats())
+    await command_dispatcher.stop()
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    interval = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    asyncio.run(main(count, interval))
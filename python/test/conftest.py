@@ -0,0 +1,99 @@
+"""
+测试公共配置：整个测试进程共用一个临时数据库。
+app.database 在首次导入时按 DATABASE_URL 创建引擎，所以环境变量必须在任何测试模块导入 app 之前设置。
+seed_house 为各测试模块创建独立家庭的用户、房间、设备和场景。
+
+运行: python -m pytest python/test
+"""
+import itertools
+import os
+import sys
+import tempfile
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+import pytest
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/test.db"
+# 其余配置沿用 .env，缺省时给出测试用默认值
+for key, value in {
+    "SECRET_KEY": "test", "ALGORITHM": "HS256", "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+    "MQTT_BROKER_HOST": "localhost", "MQTT_BROKER_PORT": "1883",
+    "HOST": "127.0.0.1", "PORT": "8000",
+    "PROJECT_NAME": "SmartHome", "VERSION": "test", "DESCRIPTION": "SmartHome test",
+}.items():
+    os.environ.setdefault(key, value)
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+# 向开发数据库写入演示数据的脚本，不是测试
+collect_ignore = ["test_device.py"]
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    """注册全部模型，建表并执行迁移"""
+    import app.main  # noqa: F401  注册全部模型
+    from app.database import init_db
+
+    init_db()
+    yield _tmp_dir
+
+
+class SeededHouse(NamedTuple):
+    """seed_house 创建的家庭及其数据的ID"""
+    house_id: int
+    user_ids: List[int]
+    rooms: Dict[str, int]
+    devices: Dict[str, int]
+    scenes: Dict[str, int]
+
+
+# 自动分配的家庭ID，与测试中直接写出的家庭ID错开
+_house_ids = itertools.count(100001)
+
+
+@pytest.fixture(scope="session")
+def seed_house(database):
+    """
+    创建一个独立家庭的测试数据并返回各自的ID：users 个房主用户，
+    devices 为 {房间名: [(设备名, 设备类型), ...]}（设备关闭，归第一个用户），scenes 为场景名列表
+    """
+    from app.database import SessionLocal
+    from app.models.device import Device, Room
+    from app.models.scene import Scene
+    from app.models.user import User, UserRole
+
+    def seed(users: int = 1, devices: Dict[str, Sequence[Tuple[str, str]]] = None,
+             scenes: Sequence[str] = ()) -> SeededHouse:
+        house_id = next(_house_ids)
+        db = SessionLocal()
+        try:
+            user_rows = [User(username=f"house{house_id}_user{i}", role=UserRole.OWNER, house_id=house_id)
+                         for i in range(users)]
+            db.add_all(user_rows)
+            db.flush()
+            owner = user_rows[0].id
+            room_rows, device_rows = {}, {}
+            for room_name, room_devices in (devices or {}).items():
+                room = room_rows[room_name] = Room(name=room_name, user_id=owner, house_id=house_id)
+                db.add(room)
+                db.flush()
+                for name, device_type in room_devices:
+                    device_rows[name] = Device(name=name, device_type=device_type,
+                                               device_id=f"house{house_id}_{len(device_rows)}", user_id=owner,
+                                               house_id=house_id, room_id=room.id, status={"power": False})
+            db.add_all(device_rows.values())
+            scene_rows = {name: Scene(name=name, house_id=house_id, actions=[], created_by=owner) for name in scenes}
+            db.add_all(scene_rows.values())
+            db.commit()
+            return SeededHouse(
+                house_id, [user.id for user in user_rows],
+                {name: room.id for name, room in room_rows.items()},
+                {name: device.id for name, device in device_rows.items()},
+                {name: scene.id for name, scene in scene_rows.items()},
+            )
+        finally:
+            db.close()
+
+    return seed
@@ -0,0 +1,152 @@
+"""
+数据库并发基准：后台持续写入传感器数据的同时，多个线程执行看板读取查询，统计读延迟分布。
+分别以旧配置（回滚日志、synchronous=FULL、无 mmap）和当前配置（WAL 等）各运行一次进行对比。
+
+运行: python python/test/db_concurrency_bench.py [秒数] [读线程数] [每秒写入条数]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# 旧配置：与调整前的默认连接参数一致
+LEGACY_ENV = {
+    "DB_JOURNAL_MODE": "DELETE",
+    "DB_SYNCHRONOUS": "FULL",
+    "DB_MMAP_SIZE": "0",
+    "DB_CACHE_SIZE": "-2000",
+}
+DEFAULT_ENV = {
+    "SECRET_KEY": "bench", "ALGORITHM": "HS256", "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+    "MQTT_BROKER_HOST": "localhost", "MQTT_BROKER_PORT": "1883",
+    "HOST": "127.0.0.1", "PORT": "8000",
+    "PROJECT_NAME": "SmartHome", "VERSION": "bench", "DESCRIPTION": "db concurrency bench",
+}
+
+
+def percentile(samples: list, pct: float) -> float:
+    index = min(len(samples) - 1, int(len(samples) * pct / 100))
+    return samples[index]
+
+
+def worker(duration: float, readers: int, rate: int):
+    """在子进程中执行一轮混合负载，结果以JSON输出"""
+    import random
+    import threading
+    import time
+    from datetime import datetime, timedelta
+
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+    import app.main  # noqa: F401  注册全部模型
+    from sqlalchemy import desc, func
+    from app.database import init_db, SessionLocal
+    from app.models.sensor_data import SensorData, AlertLog
+    from app.services.ingest_service import ingest_service
+    from app.services.rollup_service import rollup_service
+    from app.services.sensor_decoders import SensorReading
+
+    def reading(timestamp):
+        return SensorReading(
+            device_id=f"hi3861_{random.randint(1, 5):03d}", house_id=1,
+            temperature=round(random.uniform(15, 40), 1), humidity=round(random.uniform(30, 80), 1),
+            human_detected=0, light_intensity=random.randint(0, 1000),
+            gas_level=round(random.uniform(1, 400), 1), flame_detected=0, timestamp=timestamp,
+        )
+
+    init_db()
+    # 预置两天的历史数据
+    now = datetime.now()
+    history = [reading(now - timedelta(seconds=30 * i)) for i in range(2 * 24 * 120)]
+    for offset in range(0, len(history), 1000):
+        ingest_service._flush(history[offset:offset + 1000])
+    ingest_service.start()
+
+    queries = [
+        lambda db: rollup_service.trend(db, "temperature", "hour", 24),
+        lambda db: rollup_service.trend(db, "humidity", "minute", 180),
+        lambda db: db.query(AlertLog).filter(AlertLog.house_id == 1).order_by(desc(AlertLog.created_at)).limit(50).all(),
+        lambda db: db.query(func.avg(SensorData.temperature)).filter(
+            SensorData.timestamp >= datetime.now() - timedelta(hours=1)).scalar(),
+    ]
+    latencies = []
+    errors = []
+    stop = threading.Event()
+
+    def read_loop():
+        samples = []
+        while not stop.is_set():
+            db = SessionLocal()
+            try:
+                start = time.perf_counter()
+                random.choice(queries)(db)
+                samples.append((time.perf_counter() - start) * 1000)
+            except Exception as e:
+                errors.append(str(e))
+            finally:
+                db.close()
+        latencies.extend(samples)
+
+    def write_loop():
+        interval = 1.0 / rate
+        next_time = time.perf_counter()
+        while not stop.is_set():
+            ingest_service.submit(reading(datetime.now()))
+            next_time += interval
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    threads = [threading.Thread(target=read_loop) for _ in range(readers)]
+    threads.append(threading.Thread(target=write_loop))
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    ingest_service.stop()
+
+    latencies.sort()
+    stats = ingest_service.get_stats()
+    print(json.dumps({
+        "reads": len(latencies),
+        "errors": len(errors),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": latencies[-1],
+        "written": stats["written"],
+        "avg_flush_ms": stats["avg_flush_ms"],
+    }))
+
+
+def run(label: str, overrides: dict, duration: float, readers: int, rate: int) -> dict:
+    env = dict(os.environ)
+    for key, value in DEFAULT_ENV.items():
+        env.setdefault(key, value)
+    env.update(overrides)
+    env["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/{label}.db"
+
+    output = subprocess.run(
+        [sys.executable, __file__, "--worker", str(duration), str(readers), str(rate)],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--worker"]:
+        worker(float(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]))
+        sys.exit(0)
+
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 15
+    readers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    rate = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+
+    print(f"混合负载 {duration:.0f}s：{readers} 个读线程，写入 {rate} 条/秒")
+    print(f"{'配置':<8} {'读次数':>8} {'错误':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>9} {'写入条数':>9} {'平均刷新':>9}  (ms)")
+    for label, overrides in (("legacy", LEGACY_ENV), ("tuned", {})):
+        result = run(label, overrides, duration, readers, rate)
+        print(f"{label:<8} {result['reads']:>8} {result['errors']:>6} {result['p50']:>8.2f} {result['p95']:>8.2f} "
+              f"{result['p99']:>8.2f} {result['max']:>9.2f} {result['written']:>9} {result['avg_flush_ms']:>9.2f}")
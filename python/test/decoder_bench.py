@@ -0,0 +1,70 @@
+"""
+hi3861载荷解析微基准：对比原 on_message 路径（decode + split + 构造ORM对象）与解码器注册表路径
+
+运行: python python/test/decoder_bench.py [消息数]
+"""
+import random
+import sys, os
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from app.models.sensor_data import SensorData
+from app.services.sensor_decoders import decoder_registry
+
+TARGET_RATE = 10000  # 目标吞吐：每秒1万条消息
+
+
+def make_payloads(count: int) -> list:
+    payloads = []
+    for _ in range(count):
+        payloads.append(
+            f"{random.randint(0, 1)},{random.uniform(0, 500):.1f},{random.randint(0, 2000)},"
+            f"{random.randint(0, 1000)},{random.uniform(10, 40):.1f},{random.uniform(20, 90):.1f}".encode()
+        )
+    return payloads
+
+
+def legacy_decode(payload: bytes):
+    """原实现：先解码为字符串并直接构造ORM对象"""
+    hi_data = payload.decode('utf-8').split(',')
+    return SensorData(
+        device_id="hi3861_001",
+        temperature=float(hi_data[4]),
+        humidity=float(hi_data[5]),
+        human_detected=int(hi_data[2]),
+        light_intensity=int(hi_data[3]),
+        gas_level=float(hi_data[1]),
+        flame_detected=int(hi_data[0]),
+        timestamp=datetime.now(),
+    )
+
+
+def registry_decode(payload: bytes):
+    """新实现：按主题查找已编译的解码器，直接从bytes解析为元组"""
+    return decoder_registry.decode("hi3861/publish", payload)
+
+
+def bench(name: str, func, payloads: list, rounds: int = 5):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for payload in payloads:
+            func(payload)
+        best = min(best, time.perf_counter() - start)
+
+    per_msg_us = best / len(payloads) * 1e6
+    rate = len(payloads) / best
+    budget = TARGET_RATE * per_msg_us / 1e6 * 100  # 达到目标吞吐时占用单核的百分比
+    print(f"{name:<10} {per_msg_us:8.2f} us/msg {rate:12,.0f} msg/s  @10k msg/s 占用单核 {budget:5.1f}%")
+    return best
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else TARGET_RATE
+    payloads = make_payloads(count)
+
+    print(f"解析 {count} 条 hi3861 载荷（取5轮最优）")
+    legacy = bench("legacy", legacy_decode, payloads)
+    registry = bench("registry", registry_decode, payloads)
+    print(f"加速比: {legacy / registry:.2f}x")
@@ -0,0 +1,92 @@
+"""
+本地大模型桩服务：实现 OpenAI 兼容的 /chat/completions（含 SSE 流式输出），
+在没有 DashScope 的环境下测试 AI 调用链路
+
+运行: python python/test/llm_stub_server.py [端口]，然后设置 AI_BASE_URL=http://127.0.0.1:<端口>
+用户消息控制行为：包含 "slow:<秒>" 时延迟响应，包含 "error:<状态码>" 时返回该状态码，
+否则以 answer_user 动作回显用户消息
+"""
+import asyncio
+import json
+import re
+import socket
+import sys
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def create_app(chunk_size: int = 4, chunk_delay: float = 0.01) -> FastAPI:
+    app = FastAPI()
+    app.state.stats = {"requests": 0, "in_flight": 0, "max_in_flight": 0}
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        query = body["messages"][-1]["content"]
+        stats = app.state.stats
+        stats["requests"] += 1
+
+        error = re.search(r"error:(\d+)", query)
+        if error:
+            return JSONResponse({"error": {"message": "stub error"}}, status_code=int(error.group(1)))
+
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            slow = re.search(r"slow:([\d.]+)", query)
+            if slow:
+                await asyncio.sleep(float(slow.group(1)))
+        finally:
+            stats["in_flight"] -= 1
+
+        reply = json.dumps({"action": "answer_user", "parameters": {"response": f"收到：{query}"}}, ensure_ascii=False)
+        if not body.get("stream"):
+            return {"choices": [{"index": 0, "message": {"role": "assistant", "content": reply}}]}
+
+        async def events():
+            for i in range(0, len(reply), chunk_size):
+                chunk = {"choices": [{"index": 0, "delta": {"content": reply[i:i + chunk_size]}}]}
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                await asyncio.sleep(chunk_delay)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+class StubServer:
+    """在后台线程中运行桩服务"""
+
+    def __init__(self, port: int = 0, **options):
+        if port == 0:
+            with socket.socket() as sock:
+                sock.bind(("127.0.0.1", 0))
+                port = sock.getsockname()[1]
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.app = create_app(**options)
+        self.server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def stats(self):
+        return self.app.state.stats
+
+    def start(self) -> "StubServer":
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+if __name__ == "__main__":
+    uvicorn.run(create_app(), host="127.0.0.1", port=int(sys.argv[1]) if len(sys.argv) > 1 else 8765)
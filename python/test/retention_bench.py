@@ -0,0 +1,122 @@
+"""
+数据保留基准：模拟一年（默认每分钟一条读数）的传感器数据写入，每30天执行一次保留清理，
+记录各类查询延迟随数据量的变化。开启保留策略后表规模和查询延迟应基本保持平稳。
+
+运行: python python/test/retention_bench.py [天数] [--no-retention]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/retention_bench.db"
+for key, value in {
+    "SECRET_KEY": "bench", "ALGORITHM": "HS256", "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+    "MQTT_BROKER_HOST": "localhost", "MQTT_BROKER_PORT": "1883",
+    "HOST": "127.0.0.1", "PORT": "8000",
+    "PROJECT_NAME": "SmartHome", "VERSION": "bench", "DESCRIPTION": "retention bench",
+}.items():
+    os.environ.setdefault(key, value)
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+import app.main  # noqa: F401  注册全部模型
+from sqlalchemy import func
+from app.database import init_db, SessionLocal
+from app.models.sensor_data import SensorData, SensorRollup
+from app.services.ingest_service import ingest_service
+from app.services.retention_service import retention_service
+from app.services.rollup_service import rollup_service
+from app.services.sensor_cache import latest_cache
+from app.services.sensor_decoders import SensorReading
+
+CHECKPOINT_DAYS = 30
+
+
+def day_readings(day_start: datetime) -> list:
+    """生成一天内每分钟一条的读数"""
+    readings = []
+    for minute in range(24 * 60):
+        readings.append(SensorReading(
+            device_id="hi3861_001", house_id=1,
+            temperature=round(random.uniform(15, 30), 1),
+            humidity=round(random.uniform(30, 80), 1),
+            human_detected=0, light_intensity=random.randint(0, 1000),
+            gas_level=round(random.uniform(1, 100), 1), flame_detected=0,
+            timestamp=day_start + timedelta(minutes=minute),
+        ))
+    return readings
+
+
+def timed(func, rounds: int = 5) -> float:
+    """返回多轮执行的中位延迟（毫秒）"""
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def measure(now: datetime) -> dict:
+    db = SessionLocal()
+    try:
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        return {
+            "raw_rows": db.query(func.count(SensorData.id)).scalar(),
+            "rollup_rows": db.query(func.count()).select_from(SensorRollup).scalar(),
+            "3hours": timed(lambda: rollup_service.trend(db, "temperature", "minute", 180, now=now)),
+            "day": timed(lambda: rollup_service.trend(db, "temperature", "hour", 24, now=now)),
+            "15days": timed(lambda: rollup_service.trend(db, "temperature", "day", 15, now=now)),
+            "summary": timed(lambda: rollup_service.summary(db, 1, "day", today - timedelta(days=1), today)),
+            "raw_24h": timed(lambda: db.query(func.avg(SensorData.temperature)).filter(
+                SensorData.timestamp >= now - timedelta(days=1)).scalar()),
+            # 全表 GROUP BY：最依赖表规模的查询
+            "cache_load": timed(lambda: latest_cache.load(db), rounds=1),
+        }
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    days = int(args[0]) if args else 365
+    with_retention = "--no-retention" not in sys.argv
+
+    random.seed(42)
+    init_db()
+    retention_service.chunk_pause = 0
+
+    start_day = (datetime.now() - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    print(f"模拟 {days} 天数据（每分钟一条），保留策略: {'开启' if with_retention else '关闭'}")
+    print(f"{'天数':>4} {'原始行数':>9} {'汇总行数':>9} {'3hours':>8} {'day':>8} {'15days':>8} "
+          f"{'昨日摘要':>8} {'原始24h':>8} {'全表加载':>8} {'清理耗时':>8}  (ms)")
+
+    results = []
+    for day in range(days):
+        day_start = start_day + timedelta(days=day)
+        readings = day_readings(day_start)
+        for offset in range(0, len(readings), ingest_service.batch_size):
+            ingest_service._flush(readings[offset:offset + ingest_service.batch_size])
+
+        if (day + 1) % CHECKPOINT_DAYS == 0 or day == days - 1:
+            now = day_start + timedelta(days=1)
+            cleanup_ms = 0.0
+            if with_retention:
+                started = time.perf_counter()
+                retention_service.run_once(now=now)
+                cleanup_ms = (time.perf_counter() - started) * 1000
+
+            row = measure(now)
+            results.append(row)
+            print(f"{day + 1:>4} {row['raw_rows']:>9} {row['rollup_rows']:>9} {row['3hours']:>8.2f} "
+                  f"{row['day']:>8.2f} {row['15days']:>8.2f} {row['summary']:>8.2f} {row['raw_24h']:>8.2f} "
+                  f"{row['cache_load']:>8.1f} {cleanup_ms:>8.0f}")
+
+    first, last = results[0], results[-1]
+    print("首末检查点延迟比（last / first）：")
+    for key in ("3hours", "day", "15days", "summary", "raw_24h", "cache_load"):
+        print(f"  {key:<10} {last[key] / first[key]:.2f}x")
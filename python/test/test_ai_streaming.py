@@ -0,0 +1,75 @@
+"""
+大模型流式输出测试：JSON 中 response 字段的文字在任意切分下都能增量解码，
+流式处理时首个片段到达即转发，结束后再解析动作并记录首字延迟
+
+运行: python -m pytest python/test/test_ai_streaming.py
+"""
+import asyncio
+import json
+import time
+
+from app.database import SessionLocal
+from app.models.user import User, UserRole
+from app.services.ai_service import AIService
+from app.utils.json_stream import ResponseTextExtractor
+
+REPLY = '好的，已将\\"客厅主灯\\"调暗\\n当前亮度 30%\\\\ \\u4eae\\u5ea6 \\ud83d\\udca1 🎬'
+OUTPUT = '{"action": "control_device", "parameters": {"devices": [{"device_id": 1, "action": "adjust_brightness", ' \
+         '"status": {"brightness": 30}}], "response": "' + REPLY + '"}}'
+
+
+def feed_all(chunks):
+    extractor = ResponseTextExtractor()
+    return "".join(extractor.feed(chunk) for chunk in chunks)
+
+
+def test_extractor_decodes_response_under_any_split():
+    expected = json.loads(OUTPUT)["parameters"]["response"]
+    for i in range(len(OUTPUT)):
+        assert feed_all([OUTPUT[:i], OUTPUT[i:]]) == expected, i
+    assert feed_all(list(OUTPUT)) == expected
+    assert feed_all(["```json\n", OUTPUT, "\n```"]) == expected
+    # 非JSON输出按纯文本原样转发
+    assert feed_all(["  你好，", "我是鸿蒙管家"]) == "  你好，我是鸿蒙管家"
+
+
+def test_stream_forwards_tokens_before_completion():
+    db = SessionLocal()
+    try:
+        user = User(username="stream_user", role=UserRole.OWNER, house_id=4242)
+        db.add(user)
+        db.commit()
+
+        service = AIService()
+
+        async def fake_deltas(prompt, user_query):
+            for i in range(0, len(OUTPUT), 8):
+                await asyncio.sleep(0.01)
+                yield OUTPUT[i:i + 8]
+
+        service._iter_llm_deltas = fake_deltas
+        service._execute_llm_action = lambda action, db, user: _answer(action)
+        received = []
+
+        async def run():
+            start = time.perf_counter()
+            result = await service.process_message(
+                "灯太亮了", user, db, on_token=lambda text: received.append((time.perf_counter() - start, text)))
+            return result, time.perf_counter() - start
+
+        result, elapsed = asyncio.run(run())
+        expected = json.loads(OUTPUT)["parameters"]["response"]
+        assert "".join(text for _, text in received) == expected
+        # response 字段一开始解码就转发，而不是等整段输出结束
+        assert received[0][0] < elapsed * 0.8
+        assert result["intent"] == "control_device" and result["reply"] == expected
+        timing = result["timing"]
+        assert 0 < timing["ttft_ms"] < timing["total_ms"]
+        stats = service.get_stream_stats()
+        assert stats["streams"] == 1 and stats["ttft_p50_ms"] == timing["ttft_ms"]
+    finally:
+        db.close()
+
+
+async def _answer(action):
+    return action["parameters"]["response"]
@@ -0,0 +1,173 @@
+"""
+警报推送测试：写入管道提交的警报带ID发布并推送到家庭的 WebSocket 连接；
+轮询接口需要登录，只返回本家庭的警报，每个用户及客户端独立游标并返回 X-Next-Cursor，游标早于内存缓冲时按索引查库
+
+运行: python -m pytest python/test/test_alert_stream.py
+"""
+import asyncio
+from datetime import datetime
+
+import app.main
+from fastapi.testclient import TestClient
+from app.database import engine, SessionLocal
+from app.models.sensor_data import AlertLog
+from app.models.user import User, UserRole
+from app.services.alert_stream import AlertStream, alert_stream
+from app.services.ingest_service import ingest_service
+from app.services.sensor_decoders import SensorReading
+from app.services.websocket_manager import websocket_manager
+from app.utils.security import create_access_token
+
+from test_websocket_hub import FakeSocket
+
+
+def fire_reading(house_id: int) -> SensorReading:
+    return SensorReading("alert_dev", house_id, 25.0, 50.0, 0, 100, 0.0, True, datetime.now())
+
+
+def test_ingest_flush_publishes_and_pushes_to_house():
+    async def run():
+        alert_stream.start()
+        socket = FakeSocket()
+        conn = await websocket_manager.connect(socket, 1, 77)
+        try:
+            before = alert_stream.last_id
+            await asyncio.to_thread(ingest_service._flush, [fire_reading(77), fire_reading(78)])
+            for _ in range(100):
+                await asyncio.sleep(0.005)
+                if socket.sent:
+                    break
+
+            db = SessionLocal()
+            try:
+                ids = [row.id for row in db.query(AlertLog.id).filter(AlertLog.id > before).order_by(AlertLog.id)]
+            finally:
+                db.close()
+            assert alert_stream.last_id == ids[-1]
+            # 只推送本家庭的警报，消息ID与数据库一致
+            assert [(m["type"], m["alert"]["id"], m["alert"]["house_id"]) for m in socket.sent] == [("alert", ids[0], 77)]
+            assert [a["id"] for a in alert_stream.read_buffer(before)][-2:] == ids
+        finally:
+            websocket_manager.disconnect(conn)
+            alert_stream.stop()
+
+    asyncio.run(run())
+
+
+def test_buffer_read_falls_back_to_index_below_floor():
+    db = SessionLocal()
+    try:
+        db.add_all([AlertLog(house_id=5, device_id="d", alert_type="gas", message=f"m{i}", severity="high",
+                             created_at=datetime.now()) for i in range(10)])
+        db.commit()
+        ids = [row.id for row in db.query(AlertLog.id).filter(AlertLog.house_id == 5).order_by(AlertLog.id)]
+
+        stream = AlertStream()
+        stream.buffer = type(stream.buffer)(maxlen=4)
+        stream.load(db)
+        assert stream.read_buffer(ids[0]) is None
+        alerts = stream.read(db, ids[0], house_id=5, limit=3)
+        assert [a["id"] for a in alerts] == ids[1:4] and stream.stats["db_reads"] == 1
+
+        # 缓冲区写满后，被挤出的部分不再由缓冲区回答
+        stream.publish([{"id": ids[-1] + i, "house_id": 5, "type": "gas"} for i in range(1, 7)])
+        assert stream.buffer_floor == ids[-1] + 2
+        assert stream.read_buffer(ids[-1] + 1) is None
+        assert [a["id"] for a in stream.read_buffer(ids[-1] + 3)] == [ids[-1] + i for i in range(4, 7)]
+
+        with engine.connect() as conn:
+            plan = " ".join(str(row[-1]) for row in conn.exec_driver_sql(
+                "EXPLAIN QUERY PLAN SELECT id FROM alert_logs WHERE house_id = 5 AND id > 1 ORDER BY id"))
+        assert "ix_alert_logs_house_id" in plan and "TEMP B-TREE" not in plan, plan
+    finally:
+        db.close()
+
+
+def test_buffer_stays_in_id_order():
+    stream = AlertStream()
+    stream.buffer = type(stream.buffer)(maxlen=4)
+    # 写入线程的发布顺序可能与ID顺序不同
+    stream.publish([{"id": 10, "house_id": 1}, {"id": 12, "house_id": 1}])
+    stream.publish([{"id": 11, "house_id": 2}])
+    assert [a["id"] for a in stream.read_buffer(9)] == [10, 11, 12]
+    assert [a["id"] for a in stream.read_buffer(10, house_id=2)] == [11]
+
+    stream.publish([{"id": 14, "house_id": 1}])
+    stream.publish([{"id": 13, "house_id": 1}])
+    assert [a["id"] for a in stream.read_buffer(10)] == [11, 12, 13, 14] and stream.buffer_floor == 10
+    # 早于缓冲区的警报不进入缓冲区，由数据库回答
+    stream.publish([{"id": 9, "house_id": 1}])
+    assert [a["id"] for a in stream.buffer] == [11, 12, 13, 14] and stream.read_buffer(8) is None
+
+
+def test_new_client_starts_after_latest_alert():
+    stream = AlertStream()
+    stream.buffer = type(stream.buffer)(maxlen=4)
+    stream.publish([{"id": i, "house_id": 1} for i in range(1, 11)])
+    # 缓冲区已经绕回，新客户端也不会重放缓冲区中的旧警报
+    assert stream.buffer_floor == 6
+    assert stream.client("new").cursor == 10
+
+
+def test_alerts_publish_on_commit_only():
+    db = SessionLocal()
+    try:
+        def add_alert():
+            alert = AlertLog(house_id=6, device_id="d", alert_type="gas", message="m", severity="high",
+                             created_at=datetime.now())
+            db.add(alert)
+            db.flush()
+            alert_stream.publish_on_commit(db, [{"id": alert.id, "house_id": 6, "type": "gas"}])
+            return alert.id
+
+        published = alert_stream.stats["published"]
+        add_alert()
+        db.rollback()
+        assert alert_stream.stats["published"] == published and "alert_stream" not in db.info
+
+        alert_id = add_alert()
+        db.commit()
+        assert alert_stream.stats["published"] == published + 1
+        assert alert_stream.buffer[-1]["id"] == alert_id
+    finally:
+        db.close()
+
+
+def make_user(username: str, house_id: int) -> dict:
+    """创建用户并返回认证请求头"""
+    db = SessionLocal()
+    try:
+        user = User(username=username, role=UserRole.OWNER, house_id=house_id)
+        db.add(user)
+        db.commit()
+        return {"Authorization": f"Bearer {create_access_token(data={'sub': str(user.id)})}"}
+    finally:
+        db.close()
+
+
+def test_polling_cursor_is_per_user_and_client():
+    client = TestClient(app.main.app)
+    alice, bob = make_user("poll_alice", 1), make_user("poll_bob", 1)
+    start = alert_stream.last_id
+    alert_stream.publish([{"id": start + 1, "house_id": 1, "type": "fire", "content": "a"},
+                          {"id": start + 2, "house_id": 2, "type": "fire", "content": "other house"},
+                          {"id": start + 3, "house_id": 1, "type": "gas", "content": "b"}])
+
+    assert client.get("/api/v1/messages/").status_code == 401
+
+    # 只返回本家庭的警报
+    first = client.get("/api/v1/messages/", params={"cursor": start}, headers=alice)
+    assert [m["id"] for m in first.json()] == [start + 1, start + 3]
+    assert first.headers["X-Next-Cursor"] == str(start + 3)
+    # 同一用户再次轮询没有新警报；同一地址的其他用户、同一用户的其他客户端各自读取
+    again = client.get("/api/v1/messages/", headers=alice)
+    assert again.json() == [] and again.headers["X-Next-Cursor"] == str(start + 3)
+    other = client.get("/api/v1/messages/", params={"cursor": start + 1}, headers=bob)
+    assert [m["id"] for m in other.json()] == [start + 3]
+    tablet = client.get("/api/v1/messages/", params={"client_id": "tablet", "cursor": start}, headers=alice)
+    assert [m["id"] for m in tablet.json()] == [start + 1, start + 3]
+
+    # 同类警报在限流时间内对同一客户端只返回一次，游标仍然前进
+    alert_stream.publish([{"id": start + 4, "house_id": 1, "type": "fire", "content": "c"}])
+    throttled = client.get("/api/v1/messages/", headers=alice)
+    assert throttled.json() == [] and throttled.headers["X-Next-Cursor"] == str(start + 4)
@@ -0,0 +1,74 @@
+"""
+认证缓存失效测试：用户的角色变更或删除提交后，下一次请求立即生效；
+flush 之后、提交之前缓存保持不变，回滚不清除缓存
+
+运行: python -m pytest python/test/test_auth_cache.py
+"""
+import app.main
+from fastapi.testclient import TestClient
+from app.database import SessionLocal
+from app.models.user import User, UserRole
+from app.services.auth_service import auth_cache
+from app.utils.security import create_access_token
+
+ALERTS = "/api/v1/sensors/alerts"
+
+
+def make_user(username: str) -> int:
+    db = SessionLocal()
+    try:
+        user = User(username=username, role=UserRole.OWNER, house_id=8080)
+        db.add(user)
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+def headers(user_id: int) -> dict:
+    return {"Authorization": f"Bearer {create_access_token(data={'sub': str(user_id)})}"}
+
+
+def test_role_change_applies_on_next_request():
+    client = TestClient(app.main.app)
+    user_id = make_user("auth_role_user")
+    auth = headers(user_id)
+
+    assert client.get(ALERTS, headers=auth).status_code == 200
+    assert auth_cache.get_user(user_id).role == UserRole.OWNER
+
+    db = SessionLocal()
+    try:
+        user = db.get(User, user_id)
+        user.role = UserRole.GUEST
+        db.flush()
+        # 尚未提交：缓存中仍是已提交的数据
+        assert auth_cache.get_user(user_id).role == UserRole.OWNER
+        db.rollback()
+        assert auth_cache.get_user(user_id) is not None and "auth_users" not in db.info
+
+        user = db.get(User, user_id)
+        user.role = UserRole.GUEST
+        db.commit()
+    finally:
+        db.close()
+
+    assert auth_cache.get_user(user_id) is None
+    # 访客不能查看警报
+    assert client.get(ALERTS, headers=auth).status_code == 403
+
+
+def test_deleted_user_is_rejected_on_next_request():
+    client = TestClient(app.main.app)
+    user_id = make_user("auth_deleted_user")
+    auth = headers(user_id)
+    assert client.get(ALERTS, headers=auth).status_code == 200
+
+    db = SessionLocal()
+    try:
+        db.delete(db.get(User, user_id))
+        db.commit()
+    finally:
+        db.close()
+
+    assert client.get(ALERTS, headers=auth).status_code == 401
@@ -0,0 +1,185 @@
+"""
+自动化引擎测试：规则按依赖的指标和设备建立索引，读数和设备状态变化只重新计算受影响的规则，
+条件由假变真时执行动作
+
+运行: python -m pytest python/test/test_automation_engine.py
+"""
+import asyncio
+from datetime import datetime
+
+from app.database import SessionLocal
+from app.models.device import Device
+from app.models.scene import Automation
+from app.models.user import User, UserRole
+from app.services.automation_engine import AutomationEngine, automation_engine, compile_condition
+from app.services.ingest_service import ingest_service
+from app.services.sensor_decoders import SensorReading
+
+
+def reading(device_id: str, temperature: float, humidity: float = 50.0) -> SensorReading:
+    return SensorReading(device_id, 1, temperature, humidity, 0, 100, 10.0, 0, datetime.now())
+
+
+def seed():
+    db = SessionLocal()
+    try:
+        user = User(username="automation", role=UserRole.OWNER, house_id=1)
+        db.add(user)
+        db.flush()
+        fan = Device(name="风扇", device_type="fan", device_id="fan_001", user_id=user.id,
+                     house_id=1, status={"power": False})
+        lamp = Device(name="台灯", device_type="light", device_id="lamp_001", user_id=user.id,
+                      house_id=1, status={"power": False})
+        db.add_all([fan, lamp])
+        db.flush()
+        rules = [
+            Automation(name="高温开风扇", house_id=1, created_by=user.id, condition_logic="AND",
+                       conditions=[{"type": "sensor", "device_id": "hi3861_001", "parameter": "temperature",
+                                    "operator": ">", "value": "30"}],
+                       actions=[{"device_id": fan.id, "action": "turn_on", "parameters": {"power": True}}]),
+            Automation(name="风扇开则开灯", house_id=1, created_by=user.id, condition_logic="AND",
+                       conditions=[{"type": "device", "device_id": "fan_001", "parameter": "power",
+                                    "operator": "==", "value": "True"}],
+                       actions=[{"device_id": lamp.id, "action": "turn_on", "parameters": {"power": True}}]),
+        ]
+        # 其他设备的无关规则，不应被 hi3861_001 的读数触发计算
+        rules += [
+            Automation(name=f"无关规则{i}", house_id=1, created_by=user.id, condition_logic="AND",
+                       conditions=[{"type": "sensor", "device_id": f"other_{i}", "parameter": "humidity",
+                                    "operator": "<", "value": "10"}],
+                       actions=[])
+            for i in range(200)
+        ]
+        db.add_all(rules)
+        db.commit()
+        return fan.id, lamp.id
+    finally:
+        db.close()
+
+
+def device_power(device_pk: int):
+    db = SessionLocal()
+    try:
+        return db.get(Device, device_pk).status.get("power")
+    finally:
+        db.close()
+
+
+def test_compile_condition_semantics():
+    states = {(1, "fan_001"): {"power": True, "speed": "3"}}
+    predicate, key = compile_condition(
+        {"type": "device", "device_id": "fan_001", "parameter": "speed", "operator": ">=", "value": "2"}, 1, states)
+    assert predicate() and key == ("device", (1, "fan_001"))
+    predicate, key = compile_condition(
+        {"type": "sensor", "device_id": None, "parameter": "temperature", "operator": "??", "value": "1"}, 1, states)
+    assert not predicate() and key is None
+    predicate, key = compile_condition(
+        {"type": "sensor", "parameter": "temperature", "operator": ">", "value": "abc"}, 1, states)
+    assert not predicate() and key is None
+    predicate, key = compile_condition(
+        {"type": "time", "parameter": "hour", "operator": "==", "value": str(datetime.now().hour)}, 1, states)
+    assert predicate() and key == ("time", ("hour", datetime.now().hour))
+
+
+def test_empty_device_id_is_a_house_wide_condition():
+    predicate, key = compile_condition(
+        {"type": "sensor", "device_id": "", "parameter": "temperature", "operator": ">", "value": "30"}, 4242, {})
+    assert key == ("sensor", (4242, None, "temperature"))
+
+    engine = AutomationEngine()
+    engine.add_rule(Automation(id=424201, name="全屋高温", house_id=4242, is_active=True, condition_logic="AND",
+                               conditions=[{"type": "sensor", "device_id": "", "parameter": "temperature",
+                                            "operator": ">", "value": "30"}],
+                               actions=[]))
+    # 任一设备的读数都重新计算全屋条件
+    engine.on_readings([SensorReading("any_dev", 4242, 25.0, 50.0, 0, 100, 0.0, False, datetime.now())])
+    assert engine.stats["evaluations"] == 1
+
+
+def test_readings_only_evaluate_affected_rules_and_fire_on_edge():
+    fan_pk, lamp_pk = seed()
+
+    async def run():
+        db = SessionLocal()
+        try:
+            automation_engine.load(db)
+        finally:
+            db.close()
+        automation_engine.start()
+        db = SessionLocal()
+        try:
+            assert automation_engine.get_stats()["rules"] == db.query(Automation).filter(Automation.is_active == True).count()
+        finally:
+            db.close()
+
+        before = automation_engine.stats["evaluations"]
+        ingest_service._flush([reading("hi3861_001", 25.0)])
+        # 只计算依赖 hi3861_001 温度的一条规则
+        assert automation_engine.stats["evaluations"] - before == 1
+        await asyncio.sleep(0.1)
+        assert device_power(fan_pk) is False
+
+        ingest_service._flush([reading("hi3861_001", 32.0)])
+        for _ in range(50):
+            await asyncio.sleep(0.05)
+            if device_power(lamp_pk):
+                break
+        # 高温规则打开风扇，风扇状态变化又触发第二条规则打开台灯
+        assert device_power(fan_pk) is True
+        assert device_power(lamp_pk) is True
+        fired = automation_engine.stats["fired"]
+        assert fired == 2
+
+        # 条件持续为真时不重复触发
+        ingest_service._flush([reading("hi3861_001", 33.0)])
+        await asyncio.sleep(0.2)
+        assert automation_engine.stats["fired"] == fired
+
+    asyncio.run(run())
+
+
+def test_rule_changes_recompile():
+    db = SessionLocal()
+    try:
+        rule = db.query(Automation).filter(Automation.name == "无关规则0").first()
+        rule.is_active = False
+        db.commit()
+        assert rule.id not in automation_engine.rules
+        rule.is_active = True
+        db.commit()
+        assert rule.id in automation_engine.rules
+        db.delete(rule)
+        db.commit()
+        assert rule.id not in automation_engine.rules
+    finally:
+        db.close()
+
+
+def test_rule_changes_apply_only_after_commit():
+    db = SessionLocal()
+    try:
+        rule = db.query(Automation).filter(Automation.name == "无关规则1").first()
+        assert rule.id in automation_engine.rules
+
+        # flush 之后、提交之前引擎不变，回滚后丢弃
+        rule.is_active = False
+        db.flush()
+        assert rule.id in automation_engine.rules
+        db.rollback()
+        assert rule.id in automation_engine.rules and "automation_rules" not in db.info
+
+        added = Automation(name="未提交规则", house_id=1, created_by=rule.created_by, condition_logic="AND",
+                           conditions=[], actions=[])
+        db.add(added)
+        db.flush()
+        added_id = added.id
+        assert added_id not in automation_engine.rules
+        db.rollback()
+        assert added_id not in automation_engine.rules
+
+        rule.is_active = False
+        db.flush()
+        db.commit()
+        assert rule.id not in automation_engine.rules
+    finally:
+        db.close()
@@ -0,0 +1,176 @@
+"""
+对话记忆测试：历史按用户和会话隔离；近期消息受 token 预算限制，较早消息折叠为摘要；
+消息和摘要写入数据库，新实例可以恢复，异步接口在线程池中载入冷会话；/conversation-history 的读取和清空；
+/ws/chat 需要 token，未指定会话的连接互不共享记忆
+
+运行: python -m pytest python/test/test_conversation_memory.py
+"""
+import asyncio
+import json
+import threading
+
+import pytest
+
+import app.main
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from app.database import SessionLocal
+from app.models.conversation import ConversationMessage
+from app.models.user import User
+from app.services.ai_service import AIService, ai_service
+from app.services.conversation_memory import ConversationMemory, conversation_memory, estimate_tokens
+from app.utils.security import create_access_token
+
+
+@pytest.fixture(scope="module")
+def users(seed_house):
+    """同一家庭的三个用户"""
+    return seed_house(users=3).user_ids
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("打开客厅灯") == 5 + 4
+    assert estimate_tokens("turn on the light") == (17 + 3) // 4 + 4
+
+
+def test_history_is_isolated_per_user_and_session(users):
+    alice_id, bob_id = users[:2]
+    db = SessionLocal()
+    try:
+        service = AIService()
+        prompts = []
+
+        async def fake_llm(prompt, query):
+            prompts.append(prompt)
+            return {"action": "answer_user", "parameters": {"response": f"回复：{query}"}}
+
+        service._call_large_language_model = fake_llm
+        alice, bob = db.get(User, alice_id), db.get(User, bob_id)
+
+        asyncio.run(service.process_message("我喜欢二十四度", alice, db))
+        asyncio.run(service.process_message("今天有什么安排", bob, db))
+        asyncio.run(service.process_message("新会话的问题", alice, db, session_id="tablet"))
+
+        assert "今天有什么安排" in prompts[1] and "我喜欢二十四度" not in prompts[1]
+        assert "新会话的问题" in prompts[2] and "我喜欢二十四度" not in prompts[2]
+
+        history = conversation_memory.history(alice_id, "default")
+        assert history["messages"] == [{"role": "user", "content": "我喜欢二十四度"},
+                                       {"role": "assistant", "content": "回复：我喜欢二十四度"}]
+        assert history["total_messages"] == 2
+    finally:
+        db.close()
+
+
+def test_token_budget_folds_old_turns_into_summary_and_persists(users):
+    carol_id = users[2]
+    memory = ConversationMemory()
+    memory.token_budget = 60
+    memory.summary_budget = 40
+    for i in range(10):
+        memory.append(carol_id, "budget", "user", f"第{i}条消息，把客厅的温度调到二十{i}度")
+        memory.append(carol_id, "budget", "assistant", f"好的{i}")
+
+    session = memory.sessions[(carol_id, "budget")]
+    assert session.tokens <= memory.token_budget and session.total == 20
+    assert session.tokens == sum(turn[3] for turn in session.turns)
+    assert session.summary and session.summary_tokens <= memory.summary_budget
+    assert session.summary[-1].startswith(("用户：", "助手："))
+
+    prompt = json.loads(memory.prompt_json(carol_id, "budget"))
+    assert prompt[0]["role"] == "system" and "较早的对话摘要" in prompt[0]["content"]
+    assert prompt[-1] == {"role": "assistant", "content": "好的9"}
+    assert memory.prompt_json(carol_id, "budget") is memory.prompt_json(carol_id, "budget")
+
+    # 被折叠的消息从数据库删除，新实例从数据库恢复同样的记忆
+    db = SessionLocal()
+    try:
+        stored = db.query(ConversationMessage).filter(
+            ConversationMessage.user_id == carol_id, ConversationMessage.session_id == "budget").count()
+    finally:
+        db.close()
+    assert stored == len(session.turns)
+
+    restored = ConversationMemory()
+    history = restored.history(carol_id, "budget", limit=100)
+    assert history["messages"] == memory.history(carol_id, "budget", limit=100)["messages"]
+    assert history["summary"] == "\n".join(session.summary) and history["total_messages"] == 20
+    assert restored.stats["loads"] == 1
+
+
+def test_cold_session_loads_off_the_loop(users, monkeypatch):
+    alice_id = users[0]
+    conversation_memory.append(alice_id, "cold", "user", "明天几点起床")
+    memory = ConversationMemory()
+    threads = []
+    load = memory._load
+
+    def recording_load(key):
+        threads.append(threading.get_ident())
+        return load(key)
+
+    monkeypatch.setattr(memory, "_load", recording_load)
+
+    async def run():
+        history = await memory.history_async(alice_id, "cold")
+        prompt = await memory.prompt_json_async(alice_id, "cold")
+        return history, prompt
+    history, prompt = asyncio.run(run())
+
+    # 只载入一次，且不在事件循环线程中查询
+    assert len(threads) == 1 and threads[0] != threading.get_ident()
+    assert history["messages"] == [{"role": "user", "content": "明天几点起床"}]
+    assert json.loads(prompt) == history["messages"]
+
+
+def test_conversation_history_endpoints(users):
+    bob_id = users[1]
+    conversation_memory.append(bob_id, "phone", "user", "手机上的问题")
+    client = TestClient(app.main.app)
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': str(bob_id)})}"}
+
+    body = client.get("/api/v1/ai/conversation-history?limit=1", headers=headers).json()
+    assert body["conversation_history"] == [{"role": "assistant", "content": "回复：今天有什么安排"}]
+    assert body["total_messages"] == 2
+
+    client.delete("/api/v1/ai/conversation-history?session_id=default", headers=headers)
+    assert client.get("/api/v1/ai/conversation-history", headers=headers).json()["total_messages"] == 0
+    assert conversation_memory.history(bob_id, "phone")["total_messages"] == 1
+
+    client.delete("/api/v1/ai/conversation-history", headers=headers)
+    assert conversation_memory.history(bob_id, "phone")["total_messages"] == 0
+    assert ConversationMemory().history(bob_id, "phone")["total_messages"] == 0
+
+
+def test_chat_websocket_requires_token_and_isolates_connections(users):
+    carol_id = users[2]
+    client = TestClient(app.main.app)
+    try:
+        with client.websocket_connect("/api/v1/ai/ws/chat?token=invalid") as websocket:
+            websocket.receive_text()
+        rejected = False
+    except WebSocketDisconnect:
+        rejected = True
+    assert rejected
+
+    prompts = []
+
+    async def fake_stream(prompt, query, on_token):
+        prompts.append(prompt)
+        return {"action": "answer_user", "parameters": {"response": "好的"}}, None
+
+    original = ai_service._stream_large_language_model
+    ai_service._stream_large_language_model = fake_stream
+    token = create_access_token(data={"sub": str(carol_id)})
+    try:
+        for text in ("手机连接上的问题", "平板连接上的问题"):
+            with client.websocket_connect(f"/api/v1/ai/ws/chat?token={token}") as websocket:
+                websocket.send_text(json.dumps({"message": text}))
+                while websocket.receive_json().get("event") != "DONE":
+                    pass
+    finally:
+        ai_service._stream_large_language_model = original
+
+    # 第二个连接没有带上第一个连接的对话
+    assert "手机连接上的问题" in prompts[0]
+    assert "平板连接上的问题" in prompts[1] and "手机连接上的问题" not in prompts[1]
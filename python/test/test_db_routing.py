@@ -0,0 +1,65 @@
+"""
+读写分离路由测试：text() 写语句走写连接；run_write 在线程池中用写连接执行并提交，
+同步接口的写入不占用事件循环；异步会话只读，不会出现第二个写者
+
+运行: python -m pytest python/test/test_db_routing.py
+"""
+import asyncio
+import threading
+
+from sqlalchemy import text
+from app.database import engine, write_engine, SessionLocal, AsyncSessionLocal, run_write
+from app.models.user import User, UserRole
+
+
+def test_text_dml_goes_to_writer():
+    db = SessionLocal()
+    try:
+        assert db.get_bind(clause=text("SELECT 1")) is engine
+        assert db.get_bind(clause=text("  select * from users where username = 'update'")) is engine
+        assert db.get_bind(clause=text("UPDATE users SET house_id = house_id WHERE id = -1")) is write_engine
+        assert db.get_bind(clause=text("\n  delete from users where id = -1")) is write_engine
+        assert db.get_bind(clause=text("WITH t AS (SELECT 1) INSERT INTO users (username) SELECT 'x' WHERE 0")) \
+            is write_engine
+
+        # 写入之后本事务的查询留在写连接上
+        db.execute(text("UPDATE users SET house_id = house_id WHERE id = -1"))
+        assert db.get_bind(clause=text("SELECT 1")) is write_engine
+        db.commit()
+        assert db.get_bind(clause=text("SELECT 1")) is engine
+    finally:
+        db.close()
+
+
+def test_run_write_runs_off_the_loop_and_commits():
+    loop_thread = threading.get_ident()
+    threads = []
+
+    def create(session):
+        threads.append(threading.get_ident())
+        user = User(username="routing_user", role=UserRole.OWNER, house_id=7070)
+        session.add(user)
+        return user
+
+    user = asyncio.run(run_write(create))
+    assert threads and threads[0] != loop_thread
+    # 提交后对象不过期，可以直接在事件循环中读取
+    assert user.id is not None and user.username == "routing_user"
+
+    db = SessionLocal()
+    try:
+        assert db.get(User, user.id).house_id == 7070
+    finally:
+        db.close()
+
+
+def test_async_session_rejects_writes():
+    async def run():
+        async with AsyncSessionLocal() as db:
+            db.add(User(username="async_writer", role=UserRole.OWNER, house_id=7070))
+            try:
+                await db.flush()
+            except RuntimeError as e:
+                return str(e)
+
+    assert "run_write" in asyncio.run(run())
@@ -0,0 +1,148 @@
+"""
+传感器写入管道测试：按批量大小落库；队列满时丢弃最旧读数或将最旧一批写入溢出文件；
+空闲时补写溢出文件，上次中途退出遗留的补写文件不会被覆盖，写库失败时保留尚未写入的读数
+
+运行: python -m pytest python/test/test_ingest_service.py
+"""
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+from app.database import SessionLocal
+from app.models.sensor_data import SensorData
+from app.services.ingest_service import SensorIngestService
+from app.services.sensor_decoders import SensorReading
+
+BASE = datetime.now().replace(microsecond=0) - timedelta(hours=1)
+
+
+def reading(device_id: str, i: int) -> SensorReading:
+    return SensorReading(device_id, 9090, 20.0 + i, 50.0, 0, 100, 0.0, False, BASE + timedelta(seconds=i))
+
+
+def make_service(tmp_path, **overrides) -> SensorIngestService:
+    service = SensorIngestService()
+    service.max_queue = 100
+    service.batch_size = 5
+    service.flush_interval = 0.05
+    service.overflow_policy = "drop_oldest"
+    service.spill_path = str(tmp_path / "spill.jsonl")
+    for key, value in overrides.items():
+        setattr(service, key, value)
+    return service
+
+
+def stored_temperatures(device_id: str) -> list:
+    db = SessionLocal()
+    try:
+        return [row.temperature for row in db.query(SensorData.temperature)
+                .filter(SensorData.device_id == device_id).order_by(SensorData.timestamp)]
+    finally:
+        db.close()
+
+
+def spilled_temperatures(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["temperature"] for line in f if line.strip()]
+
+
+def test_readings_are_written_in_batches(tmp_path):
+    service = make_service(tmp_path)
+    for i in range(12):
+        service.submit(reading("batch_dev", i))
+
+    service.start()
+    try:
+        for _ in range(200):
+            if service.stats["written"] == 12:
+                break
+            time.sleep(0.01)
+    finally:
+        service.stop()
+
+    # 满批立即写入，剩余不足一批的读数在刷新间隔到达后写入
+    assert service.stats["batches"] == 3 and service.stats["last_batch_size"] == 2
+    assert stored_temperatures("batch_dev") == [20.0 + i for i in range(12)]
+
+
+def test_drop_oldest_when_queue_is_full(tmp_path):
+    service = make_service(tmp_path, max_queue=3)
+    for i in range(5):
+        service.submit(reading("drop_dev", i))
+
+    assert service.stats["dropped"] == 2 and service.stats["enqueued"] == 5
+    assert [r.temperature for r in service.queue] == [22.0, 23.0, 24.0]
+    assert not os.path.exists(service.spill_path)
+
+
+def test_spill_oldest_batch_and_restore(tmp_path):
+    service = make_service(tmp_path, max_queue=4, batch_size=2, overflow_policy="spill")
+    for i in range(7):
+        service.submit(reading("spill_dev", i))
+
+    # 两次溢出各写出最旧的一批，队列保留最新的读数
+    assert service.stats["spilled"] == 4 and service.stats["dropped"] == 0
+    assert spilled_temperatures(service.spill_path) == [20.0, 21.0, 22.0, 23.0]
+    assert [r.temperature for r in service.queue] == [24.0, 25.0, 26.0]
+    assert service.spill_pending
+
+    service._restore_spilled()
+    assert service.stats["spill_restored"] == 4 and not service.spill_pending
+    assert stored_temperatures("spill_dev") == [20.0, 21.0, 22.0, 23.0]
+    assert os.listdir(tmp_path) == []
+
+
+def test_restore_keeps_leftover_draining_file(tmp_path):
+    service = make_service(tmp_path, max_queue=2, batch_size=2, overflow_policy="spill")
+    for i in range(4):
+        service.submit(reading("leftover_dev", i))
+    # 模拟补写中途退出：溢出文件已改名但未删除
+    leftover = f"{service.spill_path}.0.draining"
+    os.replace(service.spill_path, leftover)
+
+    for i in range(4, 6):
+        service.submit(reading("leftover_dev", i))
+    assert os.path.exists(service.spill_path)
+
+    # 重启后发现遗留文件，补写时两份文件都写入
+    restarted = make_service(tmp_path, batch_size=2)
+    restarted.start()
+    try:
+        for _ in range(200):
+            if restarted.stats["spill_restored"] == 4:
+                break
+            time.sleep(0.01)
+    finally:
+        restarted.stop()
+
+    assert sorted(stored_temperatures("leftover_dev")) == [20.0, 21.0, 22.0, 23.0]
+    assert os.listdir(tmp_path) == []
+
+
+def test_failed_restore_keeps_unwritten_readings(tmp_path, monkeypatch):
+    service = make_service(tmp_path, max_queue=2, batch_size=2, overflow_policy="spill")
+    for i in range(8):
+        service.submit(reading("outage_dev", i))
+    assert spilled_temperatures(service.spill_path) == [20.0, 21.0, 22.0, 23.0, 24.0, 25.0]
+
+    # 第二批写库时数据库不可用
+    flush = service._flush
+    calls = []
+
+    def failing_flush(batch):
+        calls.append(len(batch))
+        return flush(batch) if len(calls) != 2 else False
+
+    monkeypatch.setattr(service, "_flush", failing_flush)
+    service._restore_spilled()
+
+    # 已写入的批次从文件中去掉，其余读数保留并等待重试
+    (draining,) = os.listdir(tmp_path)
+    assert draining.endswith(".draining") and service.spill_pending
+    assert spilled_temperatures(str(tmp_path / draining)) == [22.0, 23.0, 24.0, 25.0]
+    assert stored_temperatures("outage_dev") == [20.0, 21.0]
+
+    service._restore_spilled()
+    assert stored_temperatures("outage_dev") == [20.0, 21.0, 22.0, 23.0, 24.0, 25.0]
+    assert os.listdir(tmp_path) == [] and not service.spill_pending
@@ -0,0 +1,125 @@
+"""
+本地快速意图识别测试：无歧义的开关、数值设置、场景指令直接生成动作且不调用大模型；
+提问、否定、相对调节、名称有歧义、数值越界时交给大模型；设备改名后索引重建
+
+运行: python -m pytest python/test/test_intent_matcher.py
+"""
+import asyncio
+
+import pytest
+
+from app.database import SessionLocal
+from app.models.device import Device
+from app.models.user import User
+from app.services.ai_service import AIService
+from app.services.intent_matcher import IntentMatcher, intent_matcher
+
+
+@pytest.fixture(scope="module")
+def house(seed_house):
+    return seed_house(devices={"客厅": [("主灯", "light"), ("落地灯", "light"), ("温湿度传感器", "sensor")],
+                               "卧室": [("空调", "air"), ("台灯", "light")]},
+                      scenes=["电影模式"])
+
+
+def controlled(plan):
+    assert plan["action"] == "control_device", plan
+    return [(op["device_id"], op["action"], op["status"]) for op in plan["parameters"]["devices"]]
+
+
+def test_unambiguous_commands_match(house):
+    house_id, devices, scene_id = house.house_id, house.devices, house.scenes["电影模式"]
+    db = SessionLocal()
+    try:
+        matcher = IntentMatcher()
+        assert controlled(matcher.match(db, house_id, "打开客厅主灯")) == [(devices["主灯"], "turn_on", {"power": True})]
+        assert controlled(matcher.match(db, house_id, "请帮我把卧室的空调调到26度！")) == [
+            (devices["空调"], "adjust_temperature", {"power": True, "temperature": 26})]
+        assert controlled(matcher.match(db, house_id, "把台灯调到40")) == [
+            (devices["台灯"], "adjust_brightness", {"power": True, "brightness": 40})]
+        both = controlled(matcher.match(db, house_id, "打开主灯和台灯"))
+        assert [op[0] for op in both] == [devices["主灯"], devices["台灯"]]
+        assert controlled(matcher.match(db, house_id, "卧室灯开一下")) == [(devices["台灯"], "turn_on", {"power": True})]
+
+        scene = matcher.match(db, house_id, "开启电影模式")
+        assert scene["action"] == "execute_scene" and scene["parameters"]["scene_id"] == scene_id
+        assert matcher.match(db, house_id, "电影模式")["parameters"]["scene_id"] == scene_id
+
+        # 设备已经是目标状态时直接告知
+        already = matcher.match(db, house_id, "客厅落地灯关掉吧")
+        assert already["action"] == "answer_user" and "落地灯" in already["parameters"]["response"]
+        assert matcher.stats["already_in_state"] == 1
+    finally:
+        db.close()
+
+
+def test_uncertain_commands_fall_back(house):
+    house_id = house.house_id
+    db = SessionLocal()
+    try:
+        matcher = IntentMatcher()
+        for query in ["打开客厅灯",        # 客厅有两盏灯
+                      "客厅主灯开着吗",     # 提问
+                      "空调温度多少",
+                      "不要打开主灯",       # 否定
+                      "主灯调暗一点",       # 相对调节
+                      "把空调调到50度",     # 超出范围
+                      "把空调调到26度吧？",
+                      "打开厨房灯",         # 没有这个设备
+                      "打开温湿度传感器",   # 传感器不可控制
+                      "创建一个睡眠模式",
+                      "今天天气怎么样"]:
+            assert matcher.match(db, house_id, query) is None, query
+        assert matcher.stats["hits"] == 0 and matcher.stats["fallbacks"] == 11
+        assert matcher.stats["index_builds"] == 1
+    finally:
+        db.close()
+
+
+def test_index_rebuilds_after_rename(house):
+    house_id, devices = house.house_id, house.devices
+    db = SessionLocal()
+    try:
+        matcher = IntentMatcher()
+        assert matcher.match(db, house_id, "打开床头灯") is None
+        device = db.get(Device, devices["台灯"])
+        device.name = "床头灯"
+        db.commit()
+        assert controlled(matcher.match(db, house_id, "打开床头灯")) == [(devices["台灯"], "turn_on", {"power": True})]
+        assert matcher.match(db, house_id, "打开台灯") is None
+        assert matcher.stats["index_builds"] == 2
+        device.name = "台灯"
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_process_message_skips_llm_on_fast_path(house):
+    devices = house.devices
+    db = SessionLocal()
+    try:
+        user = db.get(User, house.user_ids[0])
+        service = AIService()
+        calls = []
+
+        async def fake_llm(prompt, query):
+            calls.append(query)
+            return {"action": "answer_user", "parameters": {"response": "大模型回复"}}
+
+        service._call_large_language_model = fake_llm
+        intent_matcher.llm_samples.clear()
+        intent_matcher.record_llm(1500.0)
+
+        result = asyncio.run(service.process_message("打开客厅主灯", user, db))
+        assert result["fast_path"] and not calls
+        assert result["reply"] == "好的，已为您打开客厅主灯。"
+        db.expire_all()
+        assert db.get(Device, devices["主灯"]).status == {"power": True}
+
+        result = asyncio.run(service.process_message("今天适合开窗吗", user, db))
+        assert not result["fast_path"] and calls == ["今天适合开窗吗"]
+
+        stats = intent_matcher.get_stats()
+        assert stats["hits"] >= 1 and stats["saved_ms"] > 1000 and stats["avg_match_ms"] < 50
+    finally:
+        db.close()
@@ -0,0 +1,199 @@
+"""
+大模型客户端测试（使用本地桩服务）：调用不阻塞事件循环，超时按 AI_TIMEOUT 生效，
+并发数受信号量限制，连续失败后熔断并在冷却后由试探请求恢复；提前关闭的流释放试探名额，整个流受总时长限制
+
+运行: python -m pytest python/test/test_llm_client.py
+"""
+import asyncio
+import json
+import time
+
+from app.services.ai_service import AIService
+from app.services.llm_client import LLMClient, LLMError, CircuitBreaker
+
+from llm_stub_server import StubServer
+
+stub = StubServer().start()
+
+
+def make_client(**options) -> LLMClient:
+    client = LLMClient()
+    client.base_url = stub.url
+    for name, value in options.items():
+        setattr(client, name, value)
+    return client
+
+
+def messages(query: str):
+    return [{"role": "system", "content": "stub"}, {"role": "user", "content": query}]
+
+
+def test_chat_and_stream_through_stub():
+    client = make_client()
+
+    async def run():
+        text = await client.chat(messages("你好"))
+        deltas = [delta async for delta in client.stream(messages("你好"))]
+        await client.stop()
+        return text, deltas
+
+    text, deltas = asyncio.run(run())
+    assert json.loads(text)["parameters"]["response"] == "收到：你好"
+    assert len(deltas) > 1 and "".join(deltas) == text
+    assert client.stats["succeeded"] == 2 and client.in_flight == 0
+
+
+def test_slow_call_does_not_block_event_loop():
+    client = make_client()
+    gaps = []
+
+    async def ticker(stop: asyncio.Event):
+        last = time.perf_counter()
+        while not stop.is_set():
+            await asyncio.sleep(0.01)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    async def run():
+        stop = asyncio.Event()
+        task = asyncio.create_task(ticker(stop))
+        await client.chat(messages("slow:0.5"))
+        stop.set()
+        await task
+        await client.stop()
+
+    asyncio.run(run())
+    assert len(gaps) > 20 and max(gaps) < 0.1, max(gaps)
+
+
+def test_timeout_and_concurrency_limit():
+    client = make_client(timeout=0.2)
+
+    async def run():
+        start = time.perf_counter()
+        try:
+            await client.chat(messages("slow:1"))
+            assert False, "应当超时"
+        except LLMError as e:
+            assert "超时" in str(e)
+        return time.perf_counter() - start
+
+    assert asyncio.run(run()) < 0.5
+    assert client.stats["timeouts"] == 1
+
+    # 等桩服务处理完已超时放弃的请求
+    while stub.stats["in_flight"]:
+        time.sleep(0.05)
+    client = make_client(max_concurrency=2)
+    stub.stats["max_in_flight"] = 0
+
+    async def burst():
+        results = await asyncio.gather(*(client.chat(messages("slow:0.1")) for _ in range(6)))
+        await client.stop()
+        return results
+
+    assert len(asyncio.run(burst())) == 6
+    assert stub.stats["max_in_flight"] == 2
+
+
+def test_circuit_breaker_opens_and_recovers():
+    client = make_client()
+    client.breaker = CircuitBreaker(failure_threshold=2, cooldown=0.3)
+
+    async def run():
+        for _ in range(2):
+            try:
+                await client.chat(messages("error:503"))
+            except LLMError:
+                pass
+        assert client.breaker.state == "open"
+
+        requests = stub.stats["requests"]
+        try:
+            await client.chat(messages("你好"))
+            assert False, "熔断期间应直接拒绝"
+        except LLMError as e:
+            assert "熔断" in str(e)
+        assert stub.stats["requests"] == requests
+
+        await asyncio.sleep(0.35)
+        assert client.breaker.state == "half_open"
+        await client.chat(messages("你好"))
+        assert client.breaker.state == "closed"
+
+        # 客户端错误不计入熔断
+        for _ in range(3):
+            try:
+                await client.chat(messages("error:400"))
+            except LLMError:
+                pass
+        assert client.breaker.state == "closed"
+        await client.stop()
+
+    asyncio.run(run())
+    assert client.stats["rejected_open"] == 1
+
+
+def test_stream_closed_early_releases_probe():
+    client = make_client()
+    client.breaker = CircuitBreaker(failure_threshold=1, cooldown=0)
+    client.breaker.record_failure()
+
+    async def run():
+        assert client.breaker.state == "half_open"
+        stream = client.stream(messages("你好"))
+        assert await anext(stream)
+        # 调用方只取了第一个片段就关闭生成器
+        await stream.aclose()
+        assert not client.breaker.probing and client.in_flight == 0
+        deltas = [delta async for delta in client.stream(messages("你好"))]
+        await client.stop()
+        return deltas
+
+    assert asyncio.run(run())
+    assert client.breaker.state == "closed"
+
+
+def test_stream_is_bounded_by_overall_deadline():
+    # 每个片段都在单次读取超时内到达，但整个流超过总时长上限
+    client = make_client(stream_timeout=0.1)
+
+    async def run():
+        deltas = []
+        start = time.perf_counter()
+        try:
+            async for delta in client.stream(messages("慢" * 200)):
+                deltas.append(delta)
+            assert False, "应当超时"
+        except LLMError as e:
+            assert "超时" in str(e)
+        await client.stop()
+        return deltas, time.perf_counter() - start
+
+    deltas, elapsed = asyncio.run(run())
+    assert deltas and elapsed < 0.5
+    assert client.in_flight == 0 and client.stats["timeouts"] == 1
+
+
+def test_ai_service_falls_back_when_llm_unavailable():
+    service = AIService()
+
+    async def run():
+        from app.services import ai_service as module
+        original = module.llm_client
+        module.llm_client = make_client()
+        module.llm_client.breaker = CircuitBreaker(failure_threshold=1, cooldown=60)
+        try:
+            ok = await service._call_large_language_model("stub", "你好")
+            failed = await service._call_large_language_model("stub", "error:500")
+            rejected = await service._call_large_language_model("stub", "你好")
+        finally:
+            await module.llm_client.stop()
+            module.llm_client = original
+        return ok, failed, rejected
+
+    ok, failed, rejected = asyncio.run(run())
+    assert ok == {"action": "answer_user", "parameters": {"response": "收到：你好"}}
+    assert failed["parameters"]["response"].startswith("AI暂时不可用")
+    assert "熔断" in rejected["parameters"]["response"]
@@ -0,0 +1,132 @@
+"""
+提示词上下文缓存测试：设备与房间一次连接查询；家庭无变化时重复构建不访问数据库；
+设备、房间、场景、警报、传感器的写入只让对应片段重新构建，回滚不使缓存失效
+
+运行: python -m pytest python/test/test_prompt_context.py
+"""
+import json
+import re
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import event
+from app.database import engine, write_engine, SessionLocal
+from app.models.device import Device, Room
+from app.models.scene import Scene
+from app.models.sensor_data import AlertLog
+from app.models.user import User, UserRole
+from app.services.ingest_service import ingest_service
+from app.services.sensor_decoders import SensorReading
+from app.utils.prompts import prompt_manager
+
+HOUSE = 5151
+
+
+@contextmanager
+def capture_sql():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE")):
+            statements.append(statement)
+
+    for target in (engine, write_engine):
+        event.listen(target, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for target in (engine, write_engine):
+            event.remove(target, "before_cursor_execute", before_cursor_execute)
+
+
+def section(context: str, name: str):
+    match = re.search(r"`\[" + name + r"\]`:\s*\*\s*`(.*)`", context)
+    return json.loads(match.group(1))
+
+
+def seed():
+    db = SessionLocal()
+    try:
+        user = User(username="context_user", role=UserRole.OWNER, house_id=HOUSE)
+        db.add(user)
+        db.flush()
+        rooms = [Room(name=f"房间{i}", user_id=user.id, house_id=HOUSE) for i in range(3)]
+        db.add_all(rooms)
+        db.flush()
+        db.add_all([
+            Device(name=f"设备{i}", device_type="light", device_id=f"ctx_{i}", user_id=user.id, house_id=HOUSE,
+                   room_id=rooms[i % 3].id if i % 4 else None, status={"power": i % 2 == 0})
+            for i in range(20)
+        ])
+        db.add(Scene(name="电影模式", house_id=HOUSE, actions=[], created_by=user.id))
+        db.add(AlertLog(house_id=HOUSE, device_id="sensor_kitchen_safety", alert_type="gas",
+                        message="燃气超标", severity="high", created_at=datetime.now()))
+        db.commit()
+        return user.id, [room.id for room in rooms]
+    finally:
+        db.close()
+
+
+def test_context_cached_until_writers_bump_versions():
+    user_id, room_ids = seed()
+    user = User(id=user_id, username="context_user", role=UserRole.OWNER, house_id=HOUSE)
+    db = SessionLocal()
+    try:
+        with capture_sql() as statements:
+            context = prompt_manager.build_context_data(db, user)
+        # 设备+房间、场景、警报各一条查询，没有逐设备的房间查询
+        assert len(statements) == 3, statements
+        devices = section(context, "DEVICE_LIST_JSON")
+        assert len(devices) == 20
+        assert devices[0]["room_name"] == "未分配" and devices[1]["room_name"] == "房间1"
+        summary = section(context, "SENSOR_SUMMARY_JSON")
+        assert summary["overall_safety"]["priority_alerts"] == 1
+        assert [a["message"] for a in summary["alerts"]] == ["燃气超标"]
+        assert section(context, "SCENE_LIST_JSON")[0]["name"] == "电影模式"
+
+        with capture_sql() as statements:
+            again = prompt_manager.build_context_data(db, user)
+        assert statements == []
+        assert section(again, "DEVICE_LIST_JSON") == devices
+
+        # 设备状态变化只重建设备片段
+        device = db.query(Device).filter(Device.device_id == "ctx_1").one()
+        device.status = {"power": True, "brightness": 30}
+        db.commit()
+        with capture_sql() as statements:
+            context = prompt_manager.build_context_data(db, user)
+        assert len(statements) == 1 and "devices" in statements[0]
+        assert section(context, "DEVICE_LIST_JSON")[1]["status"] == {"power": True, "brightness": 30}
+
+        # 回滚的修改不使缓存失效
+        db.query(Room).filter(Room.id == room_ids[1]).one().name = "书房"
+        db.flush()
+        db.rollback()
+        with capture_sql() as statements:
+            prompt_manager.build_context_data(db, user)
+        assert statements == []
+
+        # 房间改名影响设备列表的 room_name
+        db.query(Room).filter(Room.id == room_ids[1]).one().name = "书房"
+        db.commit()
+        context = prompt_manager.build_context_data(db, user)
+        assert section(context, "DEVICE_LIST_JSON")[1]["room_name"] == "书房"
+
+        # 写入管道的读数和批量插入的警报
+        reading = SensorReading("sensor_kitchen_safety", HOUSE, 26.0, 40.0, 0, 100, 400.0, False, datetime.now())
+        ingest_service._flush([reading])
+        with capture_sql() as statements:
+            context = prompt_manager.build_context_data(db, user)
+        assert len(statements) == 1 and "alert_logs" in statements[0]
+        summary = section(context, "SENSOR_SUMMARY_JSON")
+        assert summary["kitchen"]["gas_level"] == 400.0 and summary["kitchen"]["status"] == "在线"
+        assert "厨房气体浓度" in summary["overall_safety"]["status"]
+        assert summary["overall_safety"]["priority_alerts"] == 2
+
+        scene = db.query(Scene).filter(Scene.house_id == HOUSE).one()
+        scene.name = "影院模式"
+        db.commit()
+        context = prompt_manager.build_context_data(db, user)
+        assert section(context, "SCENE_LIST_JSON") == [{"id": scene.id, "name": "影院模式"}]
+    finally:
+        db.close()
@@ -0,0 +1,108 @@
+"""
+热点查询执行计划回归测试：捕获接口实际发出的SQL，用 EXPLAIN QUERY PLAN 检查
+sensor_data / alert_logs / sensor_rollups 上的查询都走索引，出现全表扫描即失败
+
+运行: python -m pytest python/test/test_query_plans.py
+"""
+import asyncio
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app.database import engine, write_engine, async_engine, SessionLocal, AsyncSessionLocal
+from app.models.user import User, UserRole
+
+HOT_TABLES = ("sensor_data", "alert_logs", "sensor_rollups")
+
+
+@contextmanager
+def capture_sql():
+    """记录期间发出的全部SQL及参数"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    targets = (engine, write_engine, async_engine.sync_engine)
+    for target in targets:
+        event.listen(target, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for target in targets:
+            event.remove(target, "before_cursor_execute", before_cursor_execute)
+
+
+def full_scans(statements) -> list:
+    """返回热点表上出现全表扫描的 (SQL, 计划) 列表"""
+    problems = []
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            if not statement.lstrip().upper().startswith(("SELECT", "DELETE")):
+                continue
+            if not any(table in statement for table in HOT_TABLES):
+                continue
+            plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+            details = [row[-1] for row in plan]
+            for detail in details:
+                if any(detail.startswith(f"SCAN {table}") for table in HOT_TABLES):
+                    problems.append((statement, details))
+    return problems
+
+
+def make_user() -> User:
+    return User(id=1, username="房主", role=UserRole.OWNER, house_id=1)
+
+
+async def _run_async(factory):
+    async with AsyncSessionLocal() as db:
+        await factory(db)
+
+
+def run_and_check(factory, use_async: bool = False):
+    """执行 factory(db)，use_async 为 True 时传入 AsyncSession"""
+    with capture_sql() as statements:
+        if use_async:
+            asyncio.run(_run_async(factory))
+        else:
+            db = SessionLocal()
+            try:
+                result = factory(db)
+                if asyncio.iscoroutine(result):
+                    asyncio.run(result)
+            finally:
+                db.close()
+
+    assert statements, "未捕获到任何SQL"
+    problems = full_scans(statements)
+    assert not problems, "以下查询出现全表扫描:\n" + "\n\n".join(
+        f"{sql}\n  -> {plan}" for sql, plan in problems
+    )
+
+
+def test_alert_queries_use_indexes():
+    from app.api import sensors, messages
+    from app.services.ai_service import ai_service
+
+    run_and_check(lambda db: sensors.get_alerts(resolved=None, limit=50, current_user=make_user(), db=db), use_async=True)
+    run_and_check(lambda db: sensors.get_alerts(resolved=False, limit=50, current_user=make_user(), db=db), use_async=True)
+    # 游标早于内存缓冲时回退查库
+    run_and_check(lambda db: messages.read_alerts(db, -1), use_async=True)
+    run_and_check(lambda db: messages.read_alerts(db, -1, house_id=1), use_async=True)
+    run_and_check(lambda db: ai_service.check_and_alert_safety_issues(db, make_user()))
+
+
+def test_sensor_queries_use_indexes():
+    from app.api import sensors
+    from app.services.ai_service import ai_service
+
+    for sensor_type in ("temperature", "humidity"):
+        for time_range in ("3hours", "day", "15days"):
+            run_and_check(lambda db: sensors.get_latest_sensor_data(sensor_type, time_range, db=db), use_async=True)
+    run_and_check(lambda db: ai_service.get_daily_summary(make_user(), db))
+
+
+def test_retention_deletes_use_indexes():
+    from app.services.retention_service import retention_service
+
+    run_and_check(lambda db: retention_service.run_once())
@@ -0,0 +1,137 @@
+"""
+重复日程展开测试：跳转展开的结果与从开始日期逐个推算一致；展开结果按规则缓存在滚动窗口内，
+规则变化后只重新载入该规则；月历和未来一周合并一次性日程与重复日程实例
+
+运行: python -m pytest python/test/test_recurrence.py
+"""
+import random
+from datetime import date, timedelta
+
+import app.main
+from fastapi.testclient import TestClient
+from app.database import SessionLocal
+from app.models.schedule import RecurringSchedule, Schedule
+from app.models.user import User, UserRole
+from app.services.recurrence_service import ExpandedRule, _add_months, recurrence_expander
+from app.services.schedule_service import ScheduleService
+
+
+def naive_dates(rule: RecurringSchedule, start: date, end: date):
+    """从开始日期逐天推算，作为对照"""
+    anchor = date.fromisoformat(rule.start_date)
+    until = min(end, date.fromisoformat(rule.repeat_end_date)) if rule.repeat_end_date else end
+    weekdays = [int(d) - 1 for d in rule.weekdays.split(",")] if rule.weekdays else [anchor.weekday()]
+    week0 = anchor - timedelta(days=anchor.weekday())
+    monthly = {_add_months(anchor, k * rule.repeat_interval * (12 if rule.repeat_type == "yearly" else 1))
+               for k in range(2000)}
+
+    dates, index, day = [], 0, anchor
+    while day <= until:
+        if rule.repeat_type == "daily":
+            hit = (day - anchor).days % rule.repeat_interval == 0
+        elif rule.repeat_type == "weekly":
+            hit = day.weekday() in weekdays and (day - week0).days // 7 % rule.repeat_interval == 0
+        else:
+            hit = day in monthly
+        if hit:
+            if rule.repeat_count is not None and index >= rule.repeat_count:
+                break
+            index += 1
+            if day >= start:
+                dates.append(day)
+        day += timedelta(days=1)
+    return dates
+
+
+def make_user() -> int:
+    db = SessionLocal()
+    try:
+        user = User(username=f"recurrence_{random.random()}", role=UserRole.OWNER, house_id=1)
+        db.add(user)
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+def test_jump_expansion_matches_naive_walk():
+    random.seed(15)
+    for i in range(300):
+        repeat_type = random.choice(("daily", "weekly", "monthly", "yearly"))
+        anchor = date(2020, 1, 1) + timedelta(days=random.randrange(2000))
+        rule = RecurringSchedule(
+            id=i, title="规则", time="08:00", repeat_type=repeat_type,
+            repeat_interval=random.randint(1, 3), start_date=anchor.isoformat(),
+            repeat_count=random.choice((None, random.randint(1, 40))),
+            repeat_end_date=random.choice((None, (anchor + timedelta(days=random.randrange(3000))).isoformat())),
+            weekdays=",".join(sorted({str(random.randint(1, 7)) for _ in range(3)})) if repeat_type == "weekly" else None,
+            created_by=1, house_id=1
+        )
+        start = anchor + timedelta(days=random.randrange(-30, 2500))
+        end = start + timedelta(days=random.randrange(0, 400))
+        assert ExpandedRule(rule).generate(start, end) == naive_dates(rule, start, end), (repeat_type, i)
+
+
+def test_expansions_cached_per_rule_and_refreshed_on_change():
+    user_id = make_user()
+    today = date.today()
+    db = SessionLocal()
+    try:
+        daily = RecurringSchedule(title="晨跑", time="06:30", repeat_type="daily", repeat_interval=1,
+                                  start_date="2020-01-01", created_by=user_id, house_id=1)
+        weekly = RecurringSchedule(title="周会", time="10:00", repeat_type="weekly", repeat_interval=1,
+                                   weekdays="1,3", start_date="2021-06-01", created_by=user_id, house_id=1)
+        db.add_all([daily, weekly])
+        db.commit()
+
+        service = ScheduleService(db)
+        service.get_recurring_occurrences(today, today + timedelta(days=7))
+        generated = recurrence_expander.stats["occurrences_generated"]
+        expansions = recurrence_expander.stats["expansions"]
+        # 只展开查询起点之后的滚动窗口，而不是从2020年开始的全部实例
+        assert generated <= 2 * (recurrence_expander.window.days + 8)
+
+        # 窗口内的查询直接命中缓存
+        occurrences = service.get_recurring_occurrences(today + timedelta(days=1), today + timedelta(days=14))
+        assert recurrence_expander.stats["expansions"] == expansions
+        assert sum(1 for o in occurrences if o.recurring_id == daily.id) == 14
+
+        # 修改一条规则后只重新展开该规则
+        weekly.weekdays = "1,2,3,4,5"
+        db.commit()
+        occurrences = service.get_recurring_occurrences(today + timedelta(days=1), today + timedelta(days=14))
+        assert recurrence_expander.stats["expansions"] == expansions + 1
+        assert sum(1 for o in occurrences if o.recurring_id == weekly.id) == 10
+
+        daily.is_active = False
+        db.commit()
+        occurrences = service.get_recurring_occurrences(today, today + timedelta(days=14))
+        assert all(o.recurring_id != daily.id for o in occurrences)
+    finally:
+        db.close()
+
+
+def test_calendar_and_upcoming_week_merge_recurring_entries():
+    user_id = make_user()
+    today = date.today()
+    db = SessionLocal()
+    try:
+        db.add(RecurringSchedule(title="吃药", time="21:00", repeat_type="daily", repeat_interval=2,
+                                 start_date=today.isoformat(), created_by=user_id, house_id=1))
+        db.add(Schedule(title="看牙医", date=today.isoformat(), time="15:00", created_by=user_id, house_id=1))
+        db.commit()
+    finally:
+        db.close()
+
+    client = TestClient(app.main.app)
+    data = client.get(f"/api/v1/schedules/calendar/{today.year}/{today.month}").json()
+    day = next(d for d in data["calendar_data"] if d["date"] == today.isoformat())
+    titles = [s["title"] for s in day["schedules"]]
+    assert titles.index("看牙医") < titles.index("吃药")
+    assert next(s for s in day["schedules"] if s["title"] == "吃药")["is_recurring"] is True
+    assert data["summary"]["recurring_schedules"] >= 1
+
+    week = client.get("/api/v1/schedules/upcoming/week").json()
+    pills = [s["date"] for s in week["schedules"] if s["title"] == "吃药"]
+    assert pills == [(today + timedelta(days=d)).isoformat() for d in range(0, 8, 2)]
+    assert week["total_count"] == len(week["schedules"])
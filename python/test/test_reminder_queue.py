@@ -0,0 +1,256 @@
+"""
+日程提醒队列测试：提醒在到期时刻被唤醒投递，一次查询取出提醒、日程和用户，一条 UPDATE 标记已发送；
+用户离线时提醒保持未发送并稍后重新投递；窗口滑动时在线程池中查询，不阻塞事件循环；
+ScheduleService 创建、修改、删除提醒时队列同步更新
+
+运行: python -m pytest python/test/test_reminder_queue.py
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+from app.config import settings
+from app.database import SessionLocal, async_engine, engine, write_engine
+from app.models.schedule import Schedule, ScheduleReminder
+from app.models.user import User, UserRole
+from app.schemas.schedule import ScheduleCreate, ScheduleUpdate
+from app.services import schedule_tasks
+from app.services.reminder_queue import HORIZON_TIMER, reminder_queue
+from app.services.schedule_service import ScheduleService
+from app.services.timer_scheduler import timer_scheduler
+
+
+class RecordingHub:
+    """记录发送给用户的消息，offline 中的用户视为离线"""
+
+    def __init__(self):
+        self.sent = []
+        self.offline = set()
+
+    async def send_to_user(self, user_id, message):
+        if user_id in self.offline:
+            return False
+        self.sent.append((user_id, message, time.perf_counter()))
+        return True
+
+
+@pytest.fixture(autouse=True)
+def empty_queue():
+    """每个测试从空的提醒队列和日程表开始，不受其他测试模块留下的提醒影响"""
+    reminder_queue.stop()
+    db = SessionLocal()
+    try:
+        db.query(ScheduleReminder).delete(synchronize_session=False)
+        db.query(Schedule).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    yield
+    reminder_queue.stop()
+
+
+def make_user() -> int:
+    db = SessionLocal()
+    try:
+        user = User(username=f"reminder_{time.time_ns()}", role=UserRole.OWNER, house_id=1)
+        db.add(user)
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+def test_due_reminders_delivered_on_time_in_one_query_and_one_update(monkeypatch):
+    user_id = make_user()
+    hub = RecordingHub()
+    monkeypatch.setattr(schedule_tasks, "websocket_manager", hub)
+
+    statements = []
+
+    def capture(conn, cursor, statement, *args):
+        statements.append(statement.lstrip().split()[0])
+
+    async def run():
+        timer_scheduler.start()
+        await schedule_tasks.schedule_task_manager.start_background_tasks()
+
+        db = SessionLocal()
+        try:
+            due = datetime.now() + timedelta(seconds=0.3)
+            schedules = [
+                Schedule(title=f"会议{i}", date=due.strftime("%Y-%m-%d"), time=due.strftime("%H:%M"),
+                         created_by=user_id, house_id=1)
+                for i in range(20)
+            ]
+            db.add_all(schedules)
+            db.flush()
+            reminders = [ScheduleReminder(schedule_id=s.id, reminder_time=due) for s in schedules]
+            db.add_all(reminders)
+            db.commit()
+            for reminder in reminders:
+                reminder_queue.add(reminder.id, reminder.schedule_id, reminder.reminder_time)
+            ids = [r.id for r in reminders]
+        finally:
+            db.close()
+
+        for bind in (async_engine.sync_engine, write_engine):
+            event.listen(bind, "before_cursor_execute", capture)
+        try:
+            expected = time.perf_counter() + (due - datetime.now()).total_seconds()
+            for _ in range(40):
+                await asyncio.sleep(0.05)
+                if len(hub.sent) == 20 and "UPDATE" in statements:
+                    break
+        finally:
+            for bind in (async_engine.sync_engine, write_engine):
+                event.remove(bind, "before_cursor_execute", capture)
+            await schedule_tasks.schedule_task_manager.stop_background_tasks()
+            await timer_scheduler.stop()
+        return ids, expected
+
+    ids, expected = asyncio.run(run())
+
+    assert len(hub.sent) == 20
+    lateness = max(sent_at for _, _, sent_at in hub.sent) - expected
+    assert lateness < 0.1, lateness
+    assert statements.count("SELECT") == 1
+    assert statements.count("UPDATE") == 1
+
+    db = SessionLocal()
+    try:
+        rows = db.query(ScheduleReminder).filter(ScheduleReminder.id.in_(ids)).all()
+        assert all(row.is_sent and row.sent_at for row in rows)
+    finally:
+        db.close()
+
+
+def test_offline_reminders_stay_unsent_and_are_retried(monkeypatch):
+    online_id, offline_id = make_user(), make_user()
+    hub = RecordingHub()
+    hub.offline.add(offline_id)
+    monkeypatch.setattr(schedule_tasks, "websocket_manager", hub)
+    monkeypatch.setattr(settings, "REMINDER_RETRY_SECONDS", 0.3)
+
+    db = SessionLocal()
+    try:
+        reminder_queue.load(db)
+        start = datetime.now() + timedelta(hours=1)
+        schedules = [
+            Schedule(title=f"复诊{user_id}", date=start.strftime("%Y-%m-%d"), time=start.strftime("%H:%M"),
+                     created_by=user_id, house_id=1)
+            for user_id in (online_id, offline_id)
+        ]
+        db.add_all(schedules)
+        db.flush()
+        reminders = [ScheduleReminder(schedule_id=s.id, reminder_time=datetime.now()) for s in schedules]
+        db.add_all(reminders)
+        db.commit()
+        online, offline = [r.id for r in reminders]
+        offline_schedule = schedules[1].id
+    finally:
+        db.close()
+
+    def is_sent(reminder_id):
+        db = SessionLocal()
+        try:
+            return db.get(ScheduleReminder, reminder_id).is_sent
+        finally:
+            db.close()
+
+    async def run():
+        timer_scheduler.start()
+        try:
+            await schedule_tasks.schedule_task_manager._process_reminders([online, offline])
+            # 只标记送达的提醒，离线用户的提醒重新加入队列
+            assert [user_id for user_id, _, _ in hub.sent] == [online_id]
+            assert is_sent(online) and not is_sent(offline)
+            assert reminder_queue.by_schedule[offline_schedule] == {offline}
+
+            # 用户上线后，重新投递时送达并标记
+            reminder_queue.deliver = schedule_tasks.schedule_task_manager._process_reminders
+            hub.offline.clear()
+            for _ in range(40):
+                await asyncio.sleep(0.05)
+                if len(hub.sent) == 2 and is_sent(offline):
+                    break
+        finally:
+            reminder_queue.deliver = None
+            await timer_scheduler.stop()
+
+    asyncio.run(run())
+    assert [user_id for user_id, _, _ in hub.sent] == [online_id, offline_id]
+    assert is_sent(offline) and offline not in reminder_queue.entries
+
+
+def test_window_slide_queries_off_the_loop():
+    user_id = make_user()
+    db = SessionLocal()
+    try:
+        due = datetime.now() + timedelta(hours=2)
+        schedule = Schedule(title="复查", date=due.strftime("%Y-%m-%d"), time=due.strftime("%H:%M"),
+                            created_by=user_id, house_id=1)
+        db.add(schedule)
+        db.flush()
+        reminder = ScheduleReminder(schedule_id=schedule.id, reminder_time=due)
+        db.add(reminder)
+        db.commit()
+        reminder_id = reminder.id
+    finally:
+        db.close()
+
+    threads = []
+
+    def capture(conn, cursor, statement, *args):
+        if "schedule_reminders" in statement:
+            threads.append(threading.get_ident())
+
+    async def run():
+        timer_scheduler.start()
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            await reminder_queue.reload()
+            # 窗口到期时由定时调度器再次调用 reload
+            assert timer_scheduler.entries[HORIZON_TIMER][2] == reminder_queue.reload
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+            await timer_scheduler.stop()
+
+    asyncio.run(run())
+    assert threads and threading.get_ident() not in threads
+    assert reminder_id in reminder_queue.entries
+
+
+def test_schedule_service_keeps_queue_in_sync():
+    user_id = make_user()
+    db = SessionLocal()
+    try:
+        reminder_queue.load(db)
+        service = ScheduleService(db)
+        start = datetime.now() + timedelta(hours=3)
+        created = service.create_schedule(ScheduleCreate(
+            title="体检", date=start.strftime("%Y-%m-%d"), time=start.strftime("%H:%M"), reminder="30"
+        ))
+        (first,) = reminder_queue.by_schedule[created.id]
+        assert reminder_queue.entries[first][0] == start.replace(second=0, microsecond=0) - timedelta(minutes=30)
+
+        # 修改提醒时间：旧提醒移出队列，新提醒加入
+        service.update_schedule(created.id, ScheduleUpdate(reminder="60"))
+        (second,) = reminder_queue.by_schedule[created.id]
+        assert len(reminder_queue.entries) == 1
+        assert reminder_queue.entries[second][0] == start.replace(second=0, microsecond=0) - timedelta(minutes=60)
+
+        # 窗口之外的提醒等窗口滑动时再载入
+        far = datetime.now() + timedelta(days=10)
+        distant = service.create_schedule(ScheduleCreate(
+            title="旅行", date=far.strftime("%Y-%m-%d"), time="09:00", reminder="15"
+        ))
+        assert distant.id not in reminder_queue.by_schedule
+
+        service.delete_schedule(created.id)
+        assert created.id not in reminder_queue.by_schedule and second not in reminder_queue.entries
+    finally:
+        reminder_queue.stop()
+        db.close()
@@ -0,0 +1,184 @@
+"""
+AI 指令响应缓存测试：归一化后相同的设备控制指令重放缓存的动作而不调用大模型；
+设备状态与生成计划时不同、设备清单变化时不命中；相近指令须方向字一致；
+依赖上文的指令不缓存；TTL 过期和 LRU 淘汰
+
+运行: python -m pytest python/test/test_response_cache.py
+"""
+import asyncio
+
+import pytest
+
+from app.database import SessionLocal
+from app.models.device import Device, Room
+from app.models.user import User
+from app.services.ai_service import AIService
+from app.services.intent_matcher import intent_matcher
+from app.services.response_cache import ResponseCache, normalize_query, response_cache
+
+
+@pytest.fixture(scope="module")
+def house(seed_house):
+    return seed_house(devices={"客厅": [("主灯", "light"), ("落地灯", "light"), ("空调", "air")]},
+                      scenes=["电影模式"])
+
+
+def plan(*device_ids, power=True):
+    return {"action": "control_device", "parameters": {
+        "devices": [{"device_id": i, "action": "turn_on", "status": {"power": power}} for i in device_ids],
+        "response": "好的"}}
+
+
+def set_power(db, device_id, power):
+    device = db.get(Device, device_id)
+    device.status = {"power": power}
+    db.commit()
+
+
+def test_normalize_query():
+    assert normalize_query("请帮我把客厅的灯打开吧！") == normalize_query("客厅灯打开") == "客厅灯打开"
+    assert normalize_query("ＡＩ， 灯太亮了。") == "ai灯太亮"
+
+
+def test_process_message_replays_cached_plan_without_llm(house):
+    main = house.devices["主灯"]
+    db = SessionLocal()
+    try:
+        user = db.get(User, house.user_ids[0])
+        service = AIService()
+        calls = []
+
+        async def fake_llm(prompt, query):
+            calls.append(query)
+            return plan(main)
+
+        service._call_large_language_model = fake_llm
+        # 关闭本地快速识别，让第一次指令经过大模型
+        intent_matcher.enabled = False
+
+        first = asyncio.run(service.process_message("打开客厅主灯", user, db))
+        assert calls == ["打开客厅主灯"] and not first["cached"]
+        assert db.get(Device, main).status == {"power": True}
+
+        # 状态回到生成计划时的样子，归一化后相同的指令直接重放
+        set_power(db, main, False)
+        second = asyncio.run(service.process_message("请打开客厅主灯吧！", user, db))
+        assert second["cached"] and second["intent"] == "control_device" and len(calls) == 1
+        db.expire_all()
+        assert db.get(Device, main).status == {"power": True}
+
+        # 灯已经开着，状态与计划时不同，重新询问大模型
+        third = asyncio.run(service.process_message("打开客厅主灯", user, db))
+        assert not third["cached"] and len(calls) == 2
+    finally:
+        intent_matcher.enabled = True
+        db.close()
+
+
+def test_similar_queries_and_invalidation(house):
+    house_id, scene_id = house.house_id, house.scenes["电影模式"]
+    main, floor, air = house.devices.values()
+    db = SessionLocal()
+    try:
+        for device_id in (main, floor, air):
+            set_power(db, device_id, False)
+        cache = ResponseCache()
+        assert cache.store(db, house_id, "客厅主灯和落地灯都打开", plan(main, floor))
+
+        assert cache.lookup(db, house_id, "客厅主灯和落地灯都给打开") is not None
+        assert cache.stats["similar_hits"] == 1
+        # 方向字不同的相近指令不能命中
+        assert cache.lookup(db, house_id, "客厅主灯和落地灯都给关上") is None
+        assert cache.lookup(db, house_id + 1, "客厅主灯和落地灯都打开") is None
+
+        # 依赖上文、没有提到设备的指令不缓存
+        assert not cache.store(db, house_id, "低一点", plan(air))
+        assert not cache.store(db, house_id, "再来一次", {"action": "execute_scene",
+                                                        "parameters": {"scene_id": scene_id}})
+        assert cache.store(db, house_id, "开启电影模式", {"action": "execute_scene",
+                                                       "parameters": {"scene_id": scene_id, "response": "好"}})
+        assert not cache.store(db, house_id, "打开客厅空调", {"action": "answer_user", "parameters": {"response": "好"}})
+
+        # 设备改名后设备清单版本变化，缓存失效；单纯的状态变化不改变清单版本
+        device = db.get(Device, floor)
+        device.name = "沙发灯"
+        db.commit()
+        assert cache.lookup(db, house_id, "客厅主灯和落地灯都打开") is None
+        assert cache.stats["invalidated"] == 1
+    finally:
+        db.close()
+
+
+def test_similar_query_must_name_the_same_devices(house):
+    house_id, owner = house.house_id, house.user_ids[0]
+    db = SessionLocal()
+    try:
+        room = Room(name="主卧室", user_id=owner, house_id=house_id)
+        db.add(room)
+        db.flush()
+        left, right, floor = [Device(name=name, device_type="light", device_id=f"cache_bed_{name}", user_id=owner,
+                                     house_id=house_id, room_id=room.id, status={"power": False})
+                              for name in ("左边床头阅读灯", "右边床头阅读灯", "卧室落地灯")]
+        db.add_all([left, right, floor])
+        db.commit()
+
+        cache = ResponseCache()
+        assert cache.store(db, house_id, "打开主卧室右边床头阅读灯和卧室落地灯", plan(right.id, floor.id))
+        # 相似度达到阈值、方向字一致，但指的是另一盏灯
+        assert cache.lookup(db, house_id, "打开主卧室左边床头阅读灯和卧室落地灯") is None
+        assert cache.stats["target_mismatch"] == 1 and cache.stats["similar_hits"] == 0
+        assert cache.lookup(db, house_id, "请打开主卧室右边床头阅读灯和卧室落地灯吧") is not None
+    finally:
+        db.close()
+
+
+def test_failed_action_is_not_cached(house):
+    house_id, air = house.house_id, house.devices["空调"]
+    db = SessionLocal()
+    try:
+        set_power(db, air, False)
+        user = db.get(User, house.user_ids[0])
+        service = AIService()
+
+        async def fake_llm(prompt, query):
+            return plan(air)
+
+        async def failing_action(action, db, current_user):
+            return "执行操作时出现错误", False
+
+        service._call_large_language_model = fake_llm
+        service._run_llm_action = failing_action
+        intent_matcher.enabled = False
+        stores = response_cache.stats["stores"]
+
+        asyncio.run(service.process_message("打开客厅空调", user, db))
+        assert response_cache.stats["stores"] == stores
+        assert response_cache.lookup(db, house_id, "打开客厅空调") is None
+    finally:
+        intent_matcher.enabled = True
+        db.close()
+
+
+def test_ttl_and_lru_eviction(house):
+    house_id = house.house_id
+    main, floor, air = house.devices.values()
+    db = SessionLocal()
+    try:
+        for device_id in (main, floor, air):
+            set_power(db, device_id, False)
+        cache = ResponseCache()
+        cache.max_entries = 2
+        cache.store(db, house_id, "打开主灯", plan(main))
+        cache.store(db, house_id, "打开空调", plan(air))
+        assert cache.lookup(db, house_id, "打开主灯") is not None
+        cache.store(db, house_id, "关闭主灯", plan(main, power=False))
+        assert list(key[1] for key in cache.entries) == ["打开主灯", "关闭主灯"]
+        assert cache.stats["evicted"] == 1
+        assert all(entry.query != "打开空调" for entry in cache.entries.values())
+
+        cache.ttl = -1
+        cache.store(db, house_id, "打开空调", plan(air))
+        assert cache.lookup(db, house_id, "打开空调") is None and cache.stats["expired"] == 1
+        assert "打开空调" not in {q for grams in cache.index[house_id].values() for q in grams}
+    finally:
+        db.close()
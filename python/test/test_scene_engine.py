@@ -0,0 +1,167 @@
+"""
+场景执行测试：一次查询载入全部设备、一次提交，指令并发下发，
+单个动作超时只影响该动作，并报告每个动作的耗时
+
+运行: python -m pytest python/test/test_scene_engine.py
+"""
+import asyncio
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+from sqlalchemy import event
+from app.api import scenes
+from app.database import SessionLocal, AsyncSessionLocal, engine, write_engine, run_write
+from app.models.device import Device
+from app.models.scene import Scene, SceneExecutionLog
+from app.models.user import User, UserRole
+from app.services.command_dispatcher import command_dispatcher
+from app.services.mqtt_service import mqtt_service
+from app.services.scene_service import SceneService
+
+
+class RecordingClient:
+    """记录发布内容，延迟后在其他线程回调 on_publish；silent=True 时不回调（模拟丢失确认）"""
+
+    def __init__(self, delay=0.005, silent=False):
+        self.delay = delay
+        self.silent = silent
+        self.published = []
+        self.on_publish = None
+        self.mid = 0
+
+    def publish(self, topic, payload, qos=0):
+        self.mid += 1
+        mid = self.mid
+        self.published.append(payload)
+        info = mqtt.MQTTMessageInfo(mid)
+        info.rc = mqtt.MQTT_ERR_SUCCESS
+        if not self.silent:
+            threading.Timer(self.delay, lambda: self.on_publish(self, None, mid)).start()
+        return info
+
+
+def seed(count: int = 20) -> tuple:
+    """写入一个用户、count 个设备、一个包含全部设备和一个其他房屋设备的场景"""
+    db = SessionLocal()
+    try:
+        user = User(username=f"scene_{time.time_ns()}", role=UserRole.OWNER, house_id=1)
+        db.add(user)
+        db.flush()
+        devices = [
+            Device(name=f"灯{i}", device_type="light", device_id=f"light_{time.time_ns()}_{i}",
+                   user_id=user.id, house_id=1, status={"power": True}, is_online=False,
+                   module=i % 7 + 1, device=i % 9 + 1)
+            for i in range(count)
+        ]
+        other = Device(name="邻居的灯", device_type="light", device_id=f"other_{time.time_ns()}",
+                       user_id=user.id, house_id=2, status={"power": True}, module=1, device=1)
+        db.add_all(devices + [other])
+        db.flush()
+        scene = Scene(name="离家模式", house_id=1, created_by=user.id, actions=[
+            {"device_id": d.id, "action": "turn_off", "parameters": {"power": False}}
+            for d in devices + [other]
+        ])
+        db.add(scene)
+        db.commit()
+        return user.id, scene.id, [d.id for d in devices], other.id
+    finally:
+        db.close()
+
+
+def setup_client(**kwargs) -> RecordingClient:
+    client = RecordingClient(**kwargs)
+    mqtt_service.client = client
+    mqtt_service.connected = True
+    command_dispatcher.frame_interval = 0.05
+    command_dispatcher.boards.clear()
+    return client
+
+
+def test_scene_applies_in_one_query_and_dispatches_concurrently():
+    user_id, scene_id, device_ids, other_id = seed()
+    client = setup_client()
+
+    statements = []
+
+    def capture(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    for bind in (engine, write_engine):
+        event.listen(bind, "before_cursor_execute", capture)
+    db = SessionLocal()
+    try:
+        scene = db.get(Scene, scene_id)
+        user = db.get(User, user_id)
+        statements.clear()
+
+        async def run():
+            command_dispatcher.start()
+            return await SceneService(db).execute_scene(scene, user)
+        report = asyncio.run(run())
+    finally:
+        db.close()
+        for bind in (engine, write_engine):
+            event.remove(bind, "before_cursor_execute", capture)
+
+    device_selects = [s for s in statements if s.lstrip().startswith("SELECT") and "FROM devices" in s]
+    assert len(device_selects) == 1
+    assert report["success_count"] == len(device_ids)
+    assert [a["device_id"] for a in report["failed_actions"]] == [other_id]
+    assert all(a["mqtt_sent"] and a["latency_ms"] > 0 for a in report["executed_actions"])
+    # 场景消息之外，20 个动作合并为一组模块帧和设备帧
+    assert '"scene_name"' in client.published[0] and len(client.published) == 3
+    assert report["execution_time"] < 1.0
+
+    db = SessionLocal()
+    try:
+        rows = db.query(Device).filter(Device.id.in_(device_ids)).all()
+        assert all(row.status == {"power": False} and row.is_online for row in rows)
+        assert db.get(Device, other_id).status == {"power": True}
+    finally:
+        db.close()
+
+
+def test_action_timeout_is_reported_per_action():
+    user_id, scene_id, device_ids, _ = seed(3)
+    setup_client(silent=True)
+
+    async def run():
+        command_dispatcher.start()
+        async with AsyncSessionLocal() as db:
+            user = await db.get(User, user_id)
+            applied, failed = await run_write(
+                lambda session: SceneService(session).apply_actions(session.get(Scene, scene_id).actions, user.house_id)
+            )
+            start = time.perf_counter()
+            timed_out = await SceneService.dispatch_actions(applied, timeout=0.2)
+            return time.perf_counter() - start, timed_out
+    elapsed, timed_out = asyncio.run(run())
+
+    assert sorted(a["device_id"] for a in timed_out) == sorted(device_ids)
+    assert all(a["error"] == "指令确认超时" and a["latency_ms"] >= 200 for a in timed_out)
+    # 各动作并发等待，总耗时约为一个超时
+    assert elapsed < 0.5
+
+
+def test_execute_scene_endpoint_report():
+    user_id, scene_id, device_ids, _ = seed(5)
+    setup_client()
+
+    async def run():
+        command_dispatcher.start()
+        async with AsyncSessionLocal() as db:
+            user = await db.get(User, user_id)
+            return await scenes.execute_scene(scene_id, current_user=user, db=db)
+    result = asyncio.run(run())
+
+    assert result.success_count == 5 and result.failed_count == 1
+    assert result.max_latency_ms > 0
+    assert all("latency_ms" in a for a in result.executed_actions)
+
+    db = SessionLocal()
+    try:
+        log = db.query(SceneExecutionLog).filter(SceneExecutionLog.scene_id == scene_id).one()
+        assert not log.success and log.execution_result["mqtt_scene_sent"]
+    finally:
+        db.close()
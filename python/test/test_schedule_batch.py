@@ -0,0 +1,121 @@
+"""
+日程批量操作测试：完成、改优先级、改期、删除各为一条集合式语句，提醒在同一事务中处理，
+影响行数取自语句结果；数千个ID的批量操作也只有一条语句；无效的优先级返回 400
+
+运行: python -m pytest python/test/test_schedule_batch.py
+"""
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import app.main
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from app.database import engine, write_engine, SessionLocal
+from app.models.schedule import Schedule, ScheduleReminder, Priority
+from app.models.user import User, UserRole
+from app.services.reminder_queue import reminder_queue
+from app.services.schedule_service import ScheduleService
+
+
+@contextmanager
+def capture_sql():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement.lstrip().split()[0])
+
+    for target in (engine, write_engine):
+        event.listen(target, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for target in (engine, write_engine):
+            event.remove(target, "before_cursor_execute", before_cursor_execute)
+
+
+def seed(count: int, reminder: str = "30"):
+    tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+    db = SessionLocal()
+    try:
+        user = User(username=f"batch_{time.time_ns()}", role=UserRole.OWNER, house_id=1)
+        db.add(user)
+        db.flush()
+        schedules = [Schedule(title=f"批量{i}", date=tomorrow, time="09:00", reminder=reminder,
+                              created_by=user.id, house_id=1) for i in range(count)]
+        db.add_all(schedules)
+        db.flush()
+        db.add_all([ScheduleReminder(schedule_id=s.id, reminder_time=datetime.strptime(
+            f"{tomorrow} 08:30", "%Y-%m-%d %H:%M")) for s in schedules])
+        db.commit()
+        return [s.id for s in schedules]
+    finally:
+        db.close()
+
+
+def test_batch_operations_are_set_based():
+    ids = seed(5000)
+    db = SessionLocal()
+    try:
+        service = ScheduleService(db)
+
+        with capture_sql() as statements:
+            result = service.batch_operations(ids + [10 ** 9], "complete")
+        assert result["success"] and result["affected_count"] == 5000
+        # 5000 个ID也只有一条 UPDATE，不逐行查询
+        assert statements == ["UPDATE"], statements
+        assert db.query(Schedule).filter(Schedule.id.in_(ids), Schedule.completed == True).count() == 5000
+
+        with capture_sql() as statements:
+            result = service.batch_operations(ids[:100], "update_priority", {"priority": "urgent"})
+        assert not result["success"] and "urgent" in result["message"] and statements == []
+
+        result = service.batch_operations(ids[:100], "update_priority", {"priority": "high"})
+        assert result["affected_count"] == 100
+        assert db.query(Schedule).filter(Schedule.priority == Priority.HIGH, Schedule.id.in_(ids)).count() == 100
+
+        with capture_sql() as statements:
+            result = service.batch_operations(ids, "delete")
+        assert result["affected_count"] == 5000
+        assert statements.count("DELETE") == 2
+        assert db.query(ScheduleReminder).filter(ScheduleReminder.schedule_id.in_(ids)).count() == 0
+
+        result = service.batch_operations(ids, "delete")
+        assert not result["success"] and result["affected_count"] == 0
+    finally:
+        db.close()
+
+
+def test_batch_endpoint_rejects_unknown_priority():
+    ids = seed(3)
+    client = TestClient(app.main.app)
+    response = client.post("/api/v1/schedules/batch", json={
+        "schedule_ids": ids, "operation": "update_priority", "data": {"priority": "urgent"}
+    })
+    assert response.status_code == 400 and response.json()["detail"] == "无效的优先级: urgent"
+
+
+def test_reschedule_rebuilds_reminders_in_same_transaction():
+    ids = seed(50)
+    seed_none = seed(10, reminder="none")
+    db = SessionLocal()
+    try:
+        reminder_queue.load(db)
+        service = ScheduleService(db)
+        target = (datetime.now() + timedelta(hours=5)).replace(second=0, microsecond=0)
+        result = service.batch_operations(ids + seed_none, "reschedule",
+                                          {"date": target.strftime("%Y-%m-%d"), "time": target.strftime("%H:%M")})
+        assert result["affected_count"] == 60
+
+        reminders = db.query(ScheduleReminder).filter(ScheduleReminder.schedule_id.in_(ids + seed_none)).all()
+        assert sorted(r.schedule_id for r in reminders) == sorted(ids)
+        assert {r.reminder_time for r in reminders} == {target - timedelta(minutes=30)}
+        assert all(not r.is_sent for r in reminders)
+        # 重建的提醒在窗口内，进入提醒队列
+        assert all(reminder_queue.by_schedule.get(schedule_id) for schedule_id in ids)
+
+        rescheduled = db.query(Schedule).filter(Schedule.id.in_(ids)).all()
+        assert {(s.date, s.time) for s in rescheduled} == {(target.strftime("%Y-%m-%d"), target.strftime("%H:%M"))}
+    finally:
+        reminder_queue.stop()
+        db.close()
@@ -0,0 +1,131 @@
+"""
+日程查询测试：月历一条 GROUP BY 查询的结果与逐条转换 ScheduleResponse 的结果一致；
+统计概览一次聚合查询；键集分页不做 COUNT/OFFSET、沿索引读取，且与页码分页顺序一致
+
+运行: python -m pytest python/test/test_schedule_queries.py
+"""
+import random
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from sqlalchemy import event
+from app.database import engine, SessionLocal
+from app.models.schedule import Schedule, Priority
+from app.models.user import User, UserRole
+from app.schemas.schedule import ScheduleListQuery, ScheduleResponse
+from app.services.schedule_service import ScheduleService
+
+
+@contextmanager
+def capture_sql():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def seed_month(year: int, month: int, count: int) -> int:
+    random.seed(16)
+    db = SessionLocal()
+    try:
+        user = User(username=f"calendar_{year}_{month}", role=UserRole.OWNER, house_id=1)
+        db.add(user)
+        db.flush()
+        db.add_all([
+            Schedule(title=f"日程{i}", date=f"{year}-{month:02d}-{random.randint(1, 28):02d}",
+                     time=f"{random.randint(0, 23):02d}:{random.choice((0, 30)):02d}",
+                     priority=random.choice(list(Priority)), completed=random.random() < 0.3,
+                     location=random.choice((None, "客厅")), created_by=user.id, house_id=1)
+            for i in range(count)
+        ])
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+def test_calendar_grouped_in_sql_matches_per_row_conversion():
+    seed_month(2027, 3, 300)
+    db = SessionLocal()
+    try:
+        with capture_sql() as statements:
+            data = ScheduleService(db).get_calendar_data(2027, 3)
+        assert sum(1 for s, _ in statements if "FROM schedules" in s) == 1
+
+        schedules = db.query(Schedule).filter(Schedule.date.like("2027-03-%")).all()
+        expected = {}
+        for schedule in sorted(schedules, key=lambda s: (s.date, s.time, s.id)):
+            expected.setdefault(schedule.date, []).append(ScheduleResponse.from_orm(schedule).model_dump(mode="json"))
+
+        # 同一进程中其他测试模块可能留下重复日程规则，这里只比较一次性日程
+        days = {day["date"]: day for day in data["calendar_data"]}
+        for date_key, schedules_of_day in expected.items():
+            day = days[date_key]
+            recurring = [s for s in day["schedules"] if s["is_recurring"]]
+            assert [s for s in day["schedules"] if not s["is_recurring"]] == schedules_of_day
+            assert day["total_count"] == len(schedules_of_day) + len(recurring)
+            assert day["completed_count"] == sum(s["completed"] for s in schedules_of_day)
+            assert day["high_priority_count"] == sum(s["priority"] == "high" for s in day["schedules"])
+        assert data["summary"]["total_schedules"] - data["summary"]["recurring_schedules"] == 300
+        assert data["summary"]["completed_schedules"] == sum(s.completed for s in schedules)
+    finally:
+        db.close()
+
+
+def test_statistics_overview_single_aggregate():
+    user_id = seed_month(2027, 4, 0)
+    today = date(2027, 4, 30)
+    db = SessionLocal()
+    try:
+        db.add_all([
+            Schedule(title=f"统计{i}", date=(today - timedelta(days=i)).isoformat(), time="09:00",
+                     priority=(Priority.HIGH, Priority.LOW)[i % 2], completed=i % 3 == 0,
+                     created_by=user_id, house_id=1)
+            for i in range(40)
+        ])
+        db.commit()
+        with capture_sql() as statements:
+            stats = ScheduleService(db).get_statistics_overview(today)
+        assert len(statements) == 1
+        assert stats["week_stats"] == {"total": 8, "completed": 3, "completion_rate": 37.5}
+        assert stats["month_stats"]["total"] == 31
+        assert stats["priority_distribution"] == {"high": 16, "medium": 0, "low": 15}
+    finally:
+        db.close()
+
+
+def test_keyset_pagination_walks_index_without_count_or_offset():
+    seed_month(2027, 5, 250)
+    db = SessionLocal()
+    try:
+        service = ScheduleService(db)
+        base = dict(start_date="2027-05-01", end_date="2027-05-31", size=40)
+        offset_ids = []
+        for page in range(1, 8):
+            result = service.get_schedules_list(ScheduleListQuery(page=page, **base))
+            assert result["total"] == 250
+            offset_ids += [s.id for s in result["schedules"]]
+
+        keyset_ids, cursor = [], ""
+        with capture_sql() as statements:
+            while cursor is not None:
+                result = service.get_schedules_list(ScheduleListQuery(cursor=cursor, **base))
+                keyset_ids += [s.id for s in result["schedules"]]
+                cursor = result["next_cursor"]
+        assert keyset_ids == offset_ids and len(keyset_ids) == 250
+        # SQLite 方言总会渲染 OFFSET，键集分页的偏移量恒为0
+        assert not any("count(" in s.lower() for s, _ in statements)
+        assert all(parameters[-1] == 0 for _, parameters in statements)
+
+        statement, parameters = statements[-1]
+        with engine.connect() as conn:
+            plan = " ".join(str(row[-1]) for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters))
+        assert "ix_schedules_date_time_id" in plan and "TEMP B-TREE" not in plan, plan
+    finally:
+        db.close()
@@ -0,0 +1,28 @@
+"""
+最新读数缓存测试：缓存保存原始的最新值，规则和提示词读到的是当前值，看板的正值视图单独提供
+
+运行: python -m pytest python/test/test_sensor_cache.py
+"""
+from datetime import datetime
+
+from app.services import automation_engine
+from app.services.automation_engine import compile_condition
+from app.services.sensor_cache import LatestReadingCache
+from app.services.sensor_decoders import SensorReading
+
+
+def test_cache_keeps_raw_latest_values(monkeypatch):
+    # 燃气恢复为 0 后，规则和提示词读到的是 0；看板仍显示最近一次正值
+    cache = LatestReadingCache()
+    cache.update(SensorReading("kitchen", 1, 25.0, 50.0, 0, 100, 30.0, False, datetime(2024, 1, 1, 8)))
+    cache.update(SensorReading("kitchen", 1, -2.0, 50.0, 0, 100, 0.0, False, datetime(2024, 1, 1, 9)))
+    assert cache.get(1, "kitchen", "gas_level") == 0.0
+    assert cache.house_value(1, "temperature") == -2.0
+    assert cache.device_snapshot(1, "kitchen")["gas_level"] == 0.0
+    assert cache.house_positive_value(1, "gas_level") == 30.0
+    assert cache.house_positive_value(1, "temperature") == 25.0
+
+    monkeypatch.setattr(automation_engine, "latest_cache", cache)
+    predicate, _ = compile_condition(
+        {"type": "sensor", "device_id": "kitchen", "parameter": "gas_level", "operator": "<", "value": "5"}, 1, {})
+    assert predicate()
@@ -0,0 +1,73 @@
+"""
+传感器载荷解码测试：CSV字段映射编译为解码函数，字段不足或无法转换的载荷返回None；
+解码器按MQTT主题注册，精确主题优先于通配符主题，并统计解码、拒绝和未知主题
+
+运行: python -m pytest python/test/test_sensor_decoders.py
+"""
+import pytest
+
+from app.services.sensor_decoders import DecoderRegistry, SensorReading, compile_csv_decoder, decode_hi3861
+
+
+def test_decode_valid_payload():
+    reading = decode_hi3861(b"0,12.5,1,300,23.4,55", "dev", 7)
+    assert isinstance(reading, SensorReading)
+    assert (reading.device_id, reading.house_id) == ("dev", 7)
+    assert reading.flame_detected is False and reading.gas_level == 12.5
+    assert (reading.human_detected, reading.light_intensity) == (1, 300)
+    assert (reading.temperature, reading.humidity) == (23.4, 55.0)
+
+    # memoryview/bytearray 载荷与 bytes 解码结果一致
+    assert decode_hi3861(memoryview(b"1,0,0,0,20,40"), "dev", 7).flame_detected is True
+    assert decode_hi3861(bytearray(b"1,0,0,0,20,40"), "dev", 7).temperature == 20.0
+
+
+def test_unmapped_fields_are_none_and_separator_is_configurable():
+    decode = compile_csv_decoder({"temperature": (2, float), "humidity": (0, float)}, separator=b";")
+    reading = decode(b"60;ignored;21.5", "dev", 1)
+    assert (reading.temperature, reading.humidity) == (21.5, 60.0)
+    assert reading.gas_level is None and reading.human_detected is None
+
+
+def test_short_payload_is_rejected():
+    assert decode_hi3861(b"0,12.5,1,300,23.4", "dev", 1) is None
+    assert decode_hi3861(b"", "dev", 1) is None
+
+
+def test_non_numeric_payload_is_rejected():
+    assert decode_hi3861(b"0,abc,1,300,23.4,55", "dev", 1) is None
+    # 整数字段不接受小数
+    assert decode_hi3861(b"0,12.5,1.5,300,23.4,55", "dev", 1) is None
+
+
+def test_unknown_field_is_rejected_at_compile_time():
+    with pytest.raises(ValueError):
+        compile_csv_decoder({"pressure": (0, float)})
+
+
+def test_per_topic_registration():
+    registry = DecoderRegistry()
+    temperature_only = compile_csv_decoder({"temperature": (0, float)})
+    registry.register("home/+/sensor", temperature_only, device_id=lambda topic: topic.split("/")[1], house_id=3)
+    registry.register("home/kitchen/sensor", decode_hi3861, device_id="kitchen_board", house_id=3, qos=0)
+
+    # 精确主题优先于通配符主题
+    kitchen = registry.decode("home/kitchen/sensor", b"0,1,0,0,25,50")
+    assert kitchen.device_id == "kitchen_board" and kitchen.humidity == 50.0
+    # 通配符主题按主题计算设备ID
+    bedroom = registry.decode("home/bedroom/sensor", b"19.5")
+    assert (bedroom.device_id, bedroom.house_id, bedroom.temperature) == ("bedroom", 3, 19.5)
+
+    assert registry.decode("other/topic", b"19.5") is None
+    assert registry.decode("home/bedroom/sensor", b"warm") is None
+    assert registry.stats == {"decoded": 2, "rejected": 1, "unknown_topic": 1}
+    assert sorted(registry.subscriptions()) == [("home/+/sensor", 1), ("home/kitchen/sensor", 0)]
+
+    # 重复注册同一主题替换原解码器，注销后不再匹配
+    registry.register("home/+/sensor", temperature_only, device_id="shared", house_id=3)
+    assert registry.decode("home/bedroom/sensor", b"20").device_id == "shared"
+    assert len(registry.subscriptions()) == 2
+    registry.unregister("home/kitchen/sensor")
+    assert registry.decode("home/kitchen/sensor", b"0,1,0,0,25,50").device_id == "shared"
+    registry.unregister("home/+/sensor")
+    assert registry.subscriptions() == []
@@ -0,0 +1,89 @@
+"""
+定时调度测试：堆定时器按到期时间唤醒、支持替换和取消；
+时间条件的下一变化时刻与逐分钟扫描的结果一致；自动化规则增删时同步登记定时任务
+
+运行: python -m pytest python/test/test_timer_scheduler.py
+"""
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+
+from app.database import SessionLocal
+from app.models.scene import Automation
+from app.models.user import User, UserRole
+from app.services.automation_engine import automation_engine, next_time_boundary, OPERATORS, TIME_FIELDS
+from app.services.timer_scheduler import TimerScheduler, timer_scheduler
+
+
+def test_scheduler_fires_in_order_and_honours_cancel():
+    scheduler = TimerScheduler()
+    fired = []
+
+    async def run():
+        scheduler.start()
+        now = datetime.now()
+        start = time.perf_counter()
+        for i, offset in enumerate((0.30, 0.10, 0.20, 0.15)):
+            scheduler.schedule(f"t{i}", now + timedelta(seconds=offset),
+                               lambda i=i: fired.append((f"t{i}", time.perf_counter() - start)))
+        scheduler.cancel("t3")
+        # 替换已有任务的时间
+        scheduler.schedule("t0", now + timedelta(seconds=0.05), lambda: fired.append(("t0", time.perf_counter() - start)))
+        await asyncio.sleep(0.45)
+        await scheduler.stop()
+
+    asyncio.run(run())
+    assert [key for key, _ in fired] == ["t0", "t1", "t2"]
+    for (key, elapsed), expected in zip(fired, (0.05, 0.10, 0.20)):
+        assert expected <= elapsed < expected + 0.05, (key, elapsed)
+    assert scheduler.get_stats()["pending"] == 0
+
+
+def test_next_time_boundary_matches_minute_scan():
+    random.seed(11)
+    for _ in range(300):
+        now = datetime(2026, 3, 14) + timedelta(seconds=random.randrange(2 * 86400))
+        triggers = []
+        predicates = []
+        for _ in range(random.randint(1, 2)):
+            field = random.choice(("hour", "minute"))
+            value = random.randrange(24 if field == "hour" else 60)
+            op = random.choice(("==", ">", "<"))
+            triggers.append((field, value))
+            predicates.append(lambda t, f=TIME_FIELDS[field], c=OPERATORS[op], v=value: c(f(t), v))
+
+        boundary = next_time_boundary(triggers, now)
+        # 逐分钟扫描：到下一个边界之前结果不变
+        state = [p(now) for p in predicates]
+        moment = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        while moment < boundary:
+            assert [p(moment) for p in predicates] == state
+            moment += timedelta(minutes=1)
+        assert boundary > now and boundary.second == 0
+
+
+def test_time_rules_are_registered_incrementally():
+    db = SessionLocal()
+    try:
+        user = User(username="timer", role=UserRole.OWNER, house_id=1)
+        db.add(user)
+        db.flush()
+        rules = [
+            Automation(name=f"定时{i}", house_id=1, created_by=user.id, condition_logic="AND", actions=[],
+                       conditions=[{"type": "time", "parameter": "hour", "operator": "==", "value": str(i % 24)}])
+            for i in range(2000)
+        ]
+        db.add_all(rules)
+        db.commit()
+        assert automation_engine.get_stats()["time_rules"] == 2000
+        key = ("automation", rules[5].id)
+        assert key in timer_scheduler.entries
+        assert timer_scheduler.entries[key][0] == next_time_boundary([("hour", 5)], datetime.now())
+
+        db.delete(rules[5])
+        db.commit()
+        assert key not in timer_scheduler.entries
+        assert timer_scheduler.get_stats()["pending"] == 1999
+    finally:
+        db.close()
@@ -0,0 +1,140 @@
+"""
+WebSocket 推送中心测试：按用户/家庭索引连接并推送，慢连接被断开而不拖住其他连接，
+带合并键的消息只保留最新一条，超过最大连接数拒绝握手；推送通道需要有效令牌
+
+运行: python -m pytest python/test/test_websocket_hub.py
+"""
+import asyncio
+import json
+import time
+
+import app.main
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from app.database import SessionLocal
+from app.models.user import User, UserRole
+from app.utils.security import create_access_token
+from app.services.websocket_manager import WebSocketHub
+
+
+class FakeSocket:
+    """记录收到的文本；stall=True 时 send_text 永远不返回，模拟慢客户端"""
+
+    def __init__(self, stall: bool = False):
+        self.stall = stall
+        self.sent = []
+        self.accepted = False
+        self.close_code = None
+
+    async def accept(self):
+        self.accepted = True
+
+    async def send_text(self, text):
+        if self.stall:
+            await asyncio.Event().wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.close_code = code
+
+
+def test_routes_by_user_and_house():
+    async def run():
+        hub = WebSocketHub()
+        sockets = [FakeSocket() for _ in range(4)]
+        conns = [await hub.connect(sockets[0], 1, 10), await hub.connect(sockets[1], 1, 10),
+                 await hub.connect(sockets[2], 2, 10), await hub.connect(sockets[3], 3, 20)]
+
+        assert await hub.send_to_user(1, {"type": "reminder"})
+        assert await hub.send_to_house(10, {"type": "alert"}) == 3
+        assert not await hub.send_to_user(99, {"type": "reminder"})
+        await asyncio.sleep(0.01)
+        assert [len(s.sent) for s in sockets] == [2, 2, 1, 0]
+
+        hub.disconnect(conns[0])
+        hub.disconnect(conns[0])
+        assert hub.by_user[1] == {conns[1]} and len(hub.by_house[10]) == 2
+        hub.disconnect(conns[3])
+        assert 3 not in hub.by_user and 20 not in hub.by_house
+        await hub.stop()
+        assert hub.get_stats()["connections"] == 0
+
+    asyncio.run(run())
+
+
+def test_slow_consumer_dropped_without_stalling_others():
+    async def run():
+        hub = WebSocketHub()
+        hub.queue_size = 50
+        hub.send_timeout = 0.2
+        fast = [FakeSocket() for _ in range(20)]
+        slow = FakeSocket(stall=True)
+        for socket in fast:
+            await hub.connect(socket, 1, 1)
+        slow_conn = await hub.connect(slow, 2, 1)
+
+        start = time.perf_counter()
+        for i in range(200):
+            await hub.send_to_house(1, {"seq": i})
+            await asyncio.sleep(0)
+        for _ in range(100):
+            await asyncio.sleep(0.005)
+            if all(len(s.sent) == 200 for s in fast):
+                break
+        elapsed = time.perf_counter() - start
+
+        assert all([m["seq"] for m in s.sent] == list(range(200)) for s in fast)
+        assert elapsed < 0.2, elapsed
+        assert slow_conn.closed and slow_conn not in hub.connections
+        assert hub.stats["dropped_slow"] == 1
+        await asyncio.sleep(0)
+        assert slow.close_code == 1013
+        await hub.stop()
+
+    asyncio.run(run())
+
+
+def test_coalesced_messages_keep_latest_and_connection_limit():
+    async def run():
+        hub = WebSocketHub()
+        hub.max_connections = 2
+        socket = FakeSocket()
+        conn = await hub.connect(socket, 1, 1)
+        # 发送任务尚未运行，同一合并键的消息在队列中被替换
+        for value in range(10):
+            hub.send(conn, {"type": "status", "value": value}, coalesce_key="status")
+        hub.send(conn, {"type": "reminder"})
+        await asyncio.sleep(0.01)
+        assert socket.sent == [{"type": "status", "value": 9}, {"type": "reminder"}]
+        assert hub.stats["coalesced"] == 9
+
+        await hub.connect(FakeSocket(), 2, 1)
+        rejected = FakeSocket()
+        assert await hub.connect(rejected, 3, 1) is None
+        assert not rejected.accepted and rejected.close_code == 1013
+        await hub.stop()
+
+    asyncio.run(run())
+
+
+def test_notifications_endpoint_requires_token():
+    db = SessionLocal()
+    try:
+        user = User(username="ws_user", role=UserRole.OWNER, house_id=1)
+        db.add(user)
+        db.commit()
+        token = create_access_token(data={"sub": str(user.id)})
+    finally:
+        db.close()
+
+    client = TestClient(app.main.app)
+    with client.websocket_connect(f"/api/v1/messages/ws?token={token}") as websocket:
+        websocket.send_text(json.dumps({"type": "ping", "timestamp": 1}))
+        assert websocket.receive_json() == {"type": "pong", "timestamp": 1}
+
+    try:
+        with client.websocket_connect("/api/v1/messages/ws?token=invalid") as websocket:
+            websocket.receive_text()
+        assert False, "无效令牌应被拒绝"
+    except WebSocketDisconnect as e:
+        assert e.code == 1008